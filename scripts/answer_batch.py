@@ -0,0 +1,57 @@
+"""Answer a JSONL file of questions (e.g. queued support emails) into a JSONL file of results"""
+import argparse
+import sys
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from agent.batch import BatchAnswerer
+from agent.model_router import ModelRouter
+from rag.logging_utils import configure_logging
+from dotenv import load_dotenv
+
+load_dotenv()
+configure_logging(level="INFO", style_name="plain", stream=sys.stderr, use_queue=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        epilog="Input lines: {\"id\": \"...\", \"question\": \"...\", ...}. Re-run with the same output "
+               "file to resume: questions already answered there are skipped."
+    )
+    parser.add_argument("input", help="Questions JSONL")
+    parser.add_argument("output", help="Results JSONL (appended; doubles as the checkpoint)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Model calls in flight")
+    parser.add_argument("--batch-size", type=int, default=64,
+                        help="Questions per retrieval batch (one embedding request, one vector query)")
+    parser.add_argument("--context-tokens", type=int, default=1500, help="Token budget for each question's context")
+    parser.add_argument("--max-attempts", type=int, default=5, help="Tries per question on rate-limit errors")
+    parser.add_argument("--retry-errors", action="store_true", help="Answer again questions that failed last time")
+    parser.add_argument("--limit", type=int, default=None, help="Answer at most this many questions in this run")
+    parser.add_argument("--tenant", default=None, help="Answer from this tenant's knowledge base")
+    args = parser.parse_args()
+
+    answerer = BatchAnswerer(
+        concurrency=args.concurrency,
+        batch_size=args.batch_size,
+        max_tokens=args.context_tokens,
+        max_attempts=args.max_attempts,
+        model_router=ModelRouter.from_env(),
+        tenant=args.tenant
+    )
+    stats = answerer.run(args.input, args.output, retry_errors=args.retry_errors, limit=args.limit)
+
+    done = stats["answered"] + stats["failed"]
+    print(f"\n{stats['answered']} answered, {stats['failed']} failed, {stats['skipped']} already done "
+          f"in {stats['seconds']:.1f} s ({done / max(stats['seconds'], 1e-9):.1f} questions/s)")
+    print(f"{stats['retrieval_batches']} retrieval batches, {stats['model_calls']} model calls, "
+          f"{stats['retries']} rate-limit retries")
+    print(f"Tokens: {stats['input_tokens']:,} in / {stats['output_tokens']:,} out, ${stats['cost_usd']:.4f}")
+    if stats["failed"]:
+        print(f"Re-run with --retry-errors to retry the {stats['failed']} failed questions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Replay a skewed question mix through the agent with and without the answer cache (stubbed model)"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from agent import core
+from agent.answer_cache import AnswerCache, normalize_question
+from agent.output import NullSink
+from stub_models import StubAnthropic
+
+FAQ = [
+    "What pricing plans do you offer?",
+    "How do I connect to Snowflake?",
+    "Do you have SSO on the Pro plan?",
+    "Is API access available on the free plan?",
+    "How do I set up Slack alerts?",
+]
+
+
+def vary(question: str, rng: random.Random) -> str:
+    """Same question, different surface form (case, punctuation, spacing)"""
+    variants = [question, question.lower(), question.rstrip("?"), "  " + question.upper() + "  "]
+    return rng.choice(variants)
+
+
+def workload(n: int, faq_share: float, seed: int):
+    """FAQ questions with Zipf-like popularity, mixed with one-off long-tail questions"""
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(len(FAQ))]
+    questions = []
+    for i in range(n):
+        if rng.random() < faq_share:
+            questions.append(vary(rng.choices(FAQ, weights)[0], rng))
+        else:
+            questions.append(f"Question about edge case #{i} in my pipeline?")
+    return questions
+
+
+def fake_chunk_ids(question: str):
+    """Stand-in retrieval: the same normalized question retrieves the same chunks"""
+    topic = normalize_question(question)
+    return [f"{topic}_chunk_{i}" for i in range(3)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--faq-share", type=float, default=0.7, help="Fraction of traffic that is FAQ")
+    parser.add_argument("--capacity", type=int, default=16)
+    parser.add_argument("--first-token-delay", type=float, default=0.05)
+    parser.add_argument("--token-delay", type=float, default=0.001)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    core.TOOL_FUNCTIONS["search_documentation"] = lambda query, sources=None: "--- Source: stub.md ---\nDocs\n"
+    questions = workload(args.questions, args.faq_share, args.seed)
+
+    print("=" * 70)
+    print("ANSWER CACHE BENCHMARK")
+    print("=" * 70)
+    print(f"{len(questions)} questions, {args.faq_share:.0%} FAQ, cache capacity {args.capacity}")
+
+    for label, cache in (("No cache", None),
+                         ("Answer cache", AnswerCache(capacity=args.capacity, chunk_ids_fn=fake_chunk_ids))):
+        client = StubAnthropic(token_delay=args.token_delay, first_token_delay=args.first_token_delay)
+        timings = []
+        start = time.perf_counter()
+        for question in questions:
+            t0 = time.perf_counter()
+            core.run_agent_streaming(question, client=client, sink=NullSink(), answer_cache=cache)
+            timings.append(time.perf_counter() - t0)
+        total = time.perf_counter() - start
+
+        print(f"\n{label}:")
+        print(f"   Model calls: {len(client.calls)}")
+        print(f"   Total: {total:.2f} s, median per question {statistics.median(timings) * 1000:.1f} ms")
+        if cache is not None:
+            stats = cache.get_stats()
+            print(f"   Hit rate: {stats['hit_rate']:.1%} ({stats['hits']}/{stats['lookups']})")
+            print(f"   Entries: {stats['entries']}/{stats['capacity']}, admitted {stats['admissions']}, "
+                  f"rejected {stats['rejections']}, evicted {stats['evictions']}")
+            print(f"   Saved tokens: {stats['saved_input_tokens']:,} input, "
+                  f"{stats['saved_output_tokens']:,} output")
+            faq_cached = sum(1 for q in FAQ if cache.key_for(q) in cache.entries)
+            print(f"   FAQ answers resident: {faq_cached}/{len(FAQ)}")
+
+
+if __name__ == "__main__":
+    main()
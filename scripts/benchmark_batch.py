@@ -0,0 +1,81 @@
+"""One-at-a-time run_agent_streaming loop vs batch mode over a queue of questions (stubbed model and search)"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add src and tests to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+sys.path.insert(0, str(Path(__file__).parent.parent / "tests"))
+
+from agent import core
+from agent.batch import BatchAnswerer
+from agent.output import NullSink
+from stub_models import StubAnthropic
+from test_cases import TEST_CASES
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--embedding-latency", type=float, default=0.15, help="Seconds per embedding request")
+    parser.add_argument("--query-latency", type=float, default=0.02, help="Seconds per vector store query")
+    parser.add_argument("--first-token-delay", type=float, default=0.4)
+    parser.add_argument("--token-delay", type=float, default=0.005)
+    args = parser.parse_args()
+
+    requests = {"embedding": 0, "query": 0}
+
+    def search(query: str, sources: list = None) -> str:
+        requests["embedding"] += 1
+        requests["query"] += 1
+        time.sleep(args.embedding_latency + args.query_latency)
+        return f"--- Source: stub.md ---\nDocumentation about {query}\n"
+
+    def search_batch(queries, max_tokens, max_distance):
+        requests["embedding"] += 1
+        requests["query"] += 1
+        time.sleep(args.embedding_latency + args.query_latency)
+        return [f"--- Source: stub.md ---\nDocumentation about {query}\n" for query in queries]
+
+    core.TOOL_FUNCTIONS["search_documentation"] = search
+    base = [case["query"] for case in TEST_CASES]
+    questions = [f"{base[i % len(base)]} (ticket {i})" for i in range(args.questions)]
+
+    print("=" * 70)
+    print("BATCH ANSWERING BENCHMARK")
+    print("=" * 70)
+    print(f"{len(questions)} questions")
+
+    client = StubAnthropic(token_delay=args.token_delay, first_token_delay=args.first_token_delay, stop_delay=0)
+    start = time.perf_counter()
+    for question in questions:
+        core.run_agent_streaming(question, client=client, sink=NullSink())
+    loop_time = time.perf_counter() - start
+    print(f"\nOne at a time: {loop_time:.1f} s ({len(questions) / loop_time:.1f} questions/s), "
+          f"{len(client.calls)} model calls, {requests['embedding']} embedding requests, "
+          f"{requests['query']} vector queries")
+
+    requests.update(embedding=0, query=0)
+    client = StubAnthropic(token_delay=args.token_delay, first_token_delay=args.first_token_delay, stop_delay=0)
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path, output_path = os.path.join(tmp, "questions.jsonl"), os.path.join(tmp, "answers.jsonl")
+        with open(input_path, "w") as f:
+            for i, question in enumerate(questions):
+                f.write(json.dumps({"id": i, "question": question}) + "\n")
+        answerer = BatchAnswerer(client=client, concurrency=args.concurrency, batch_size=args.batch_size,
+                                 search_batch_fn=search_batch)
+        stats = answerer.run(input_path, output_path)
+    print(f"Batch mode:    {stats['seconds']:.1f} s ({len(questions) / stats['seconds']:.1f} questions/s), "
+          f"{len(client.calls)} model calls, {requests['embedding']} embedding requests, "
+          f"{requests['query']} vector queries (concurrency {args.concurrency}, batches of {args.batch_size})")
+    print(f"\nSpeed-up: {loop_time / stats['seconds']:.1f}×")
+
+
+if __name__ == "__main__":
+    main()
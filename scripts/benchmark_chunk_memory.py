@@ -0,0 +1,132 @@
+"""Memory of per-chunk Documents + parallel lists vs a columnar ChunkBatch, at ingest scale (synthetic chunks)"""
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+from array import array
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from rag.chunk_batch import ChunkBatch
+from rag.document_processor import Document
+
+
+def synthetic_chunks(n: int, chunks_per_file: int, sections_per_file: int, text_chars: int):
+    """(text, metadata) like DocumentProcessor output: shared per-file strings, unique text"""
+    filler = "Monitors check freshness, volume and schema of every table. " * (text_chars // 60 + 1)
+    files = {}
+    for i in range(n):
+        f = i // chunks_per_file
+        if f not in files:
+            name = f"{f:05d}_guide.md"
+            files[f] = (name, f"Guide {f}", f"docs/knowledge_base/{name}",
+                        [f"Section {s} of guide {f}" for s in range(sections_per_file)])
+        source, title, file_path, sections = files[f]
+        position = i % chunks_per_file
+        text = f"[{i}] " + filler[:text_chars]
+        metadata = {
+            "source": source,
+            "title": title,
+            "section": sections[position % sections_per_file],
+            "file_path": file_path,
+            "chunk_id": position // sections_per_file,
+            "chunk_start": position * 800,
+            "chunk_end": position * 800 + text_chars,
+        }
+        yield text, metadata
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    gc.collect()
+    return current, elapsed
+
+
+def build_documents(n, args):
+    """What ingest_documents.py held before storing: Documents, then texts/ids/metadatas lists"""
+    documents = [Document(text, metadata) for text, metadata in
+                 synthetic_chunks(n, args.chunks_per_file, args.sections_per_file, args.text_chars)]
+    texts = [doc.content for doc in documents]
+    ids = [doc.id for doc in documents]
+    metadatas = [doc.metadata for doc in documents]
+    return documents, texts, ids, metadatas
+
+
+def build_batch(n, args):
+    batch = ChunkBatch()
+    for text, metadata in synthetic_chunks(n, args.chunks_per_file, args.sections_per_file, args.text_chars):
+        file = batch.add_file(metadata["source"], metadata["title"], metadata["file_path"])
+        batch.append(text, file, metadata["section"], metadata["chunk_id"],
+                     metadata["chunk_start"], metadata["chunk_end"])
+    return batch
+
+
+def embedding_lists(n, dimension):
+    return [[float(i % 97) / 97 + j * 1e-6 for j in range(dimension)] for i in range(n)]
+
+
+def embedding_buffer(n, dimension):
+    buffer = array('f')
+    for i in range(n):
+        buffer.extend(float(i % 97) / 97 + j * 1e-6 for j in range(dimension))
+    return buffer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=1_000_000)
+    parser.add_argument("--chunks-per-file", type=int, default=500)
+    parser.add_argument("--sections-per-file", type=int, default=40)
+    parser.add_argument("--text-chars", type=int, default=200, help="Characters per synthetic chunk")
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--embedding-sample", type=int, default=5000,
+                        help="Chunks whose embeddings are materialized (memory is scaled up to --chunks)")
+    args = parser.parse_args()
+    n = args.chunks
+    mb = 1024 * 1024
+
+    print("=" * 70)
+    print("CHUNK MEMORY BENCHMARK")
+    print("=" * 70)
+    print(f"{n:,} chunks, {n // args.chunks_per_file:,} files, {args.text_chars}-char texts, "
+          f"{args.dimension}-dim embeddings")
+
+    text_bytes, _ = measure(lambda: [text for text, _ in synthetic_chunks(
+        n, args.chunks_per_file, args.sections_per_file, args.text_chars)])
+    docs_bytes, docs_time = measure(lambda: build_documents(n, args))
+    batch_bytes, batch_time = measure(lambda: build_batch(n, args))
+
+    sample = min(args.embedding_sample, n)
+    scale = n / sample
+    lists_bytes, _ = measure(lambda: embedding_lists(sample, args.dimension))
+    buffer_bytes, _ = measure(lambda: embedding_buffer(sample, args.dimension))
+    lists_bytes *= scale
+    buffer_bytes *= scale
+
+    print(f"\nChunk texts alone: {text_bytes / mb:,.0f} MB (same in both layouts)")
+    print(f"\n{'':<28} {'Documents + lists':>18} {'ChunkBatch':>12} {'saved':>8}")
+    rows = [
+        ("Chunks (text + metadata + ids)", docs_bytes, batch_bytes),
+        ("  excluding the texts", docs_bytes - text_bytes, batch_bytes - text_bytes),
+        (f"Embeddings (from {sample:,})", lists_bytes, buffer_bytes),
+        ("Total", docs_bytes + lists_bytes, batch_bytes + buffer_bytes),
+    ]
+    for label, before, after in rows:
+        print(f"{label:<28} {before / mb:>15,.0f} MB {after / mb:>9,.0f} MB {1 - after / before:>8.1%}")
+    print(f"\nPer chunk, excluding texts and embeddings: {(docs_bytes - text_bytes) / n:.0f} B -> "
+          f"{(batch_bytes - text_bytes) / n:.0f} B")
+    print(f"Build time (under tracemalloc): {docs_time:.1f} s -> {batch_time:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
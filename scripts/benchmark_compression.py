@@ -0,0 +1,149 @@
+"""Measure how much extractive compression shrinks search context and whether the answer survives (no API calls)"""
+import argparse
+import hashlib
+import random
+import re
+import statistics
+import sys
+import tempfile
+from pathlib import Path
+
+# Add src and tests to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+sys.path.insert(0, str(Path(__file__).parent.parent / "tests"))
+
+import tiktoken
+
+from rag.compressor import ExtractiveCompressor
+from rag.document_processor import DocumentProcessor, clean_text
+from rag.logging_utils import configure_logging
+from rag.snapshot import SnapshotStore, write_snapshot
+from rag.vector_store import RAGRetriever
+from test_cases import TEST_CASES
+
+configure_logging(level="WARNING", style_name="plain", stream=sys.stdout, use_queue=False)
+
+_WORD_RE = re.compile(r"[A-Za-z][A-Za-z0-9'-]+")
+
+
+class LocalEmbeddings:
+    """
+    Just enough of EmbeddingManager for RAGRetriever.search_with_context
+
+    Embeddings are hashed bags of words, so retrieval is keyword-driven but
+    runs through the real vector search, re-ranking and assembly path.
+    """
+
+    def __init__(self, dimension: int = 512):
+        self.dimension = dimension
+        self.encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.encoding.encode(text))
+
+    def create_embedding(self, text: str):
+        vector = [0.0] * self.dimension
+        for word in _WORD_RE.findall(text.lower()):
+            digest = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=4).digest(), 'little')
+            vector[digest % self.dimension] += 1.0 if digest & 1 << 31 else -1.0
+        norm = sum(v * v for v in vector) ** 0.5 or 1.0
+        return [v / norm for v in vector]
+
+
+def normalize(text: str) -> str:
+    return " ".join(_WORD_RE.findall(text.lower()))
+
+
+def sample_queries(processor, chunks, n: int, seed: int):
+    """
+    Partial restatements of KB sentences: (query, answer sentence)
+
+    The query keeps about half of the sentence's words, so the sentence is
+    the answer but other sentences can share its terms.
+    """
+    rng = random.Random(seed)
+    candidates = []
+    for chunk in chunks:
+        text = chunk['content']
+        for start, end in processor.split_sentences(text):
+            sentence = text[start:end].strip()
+            words = _WORD_RE.findall(sentence)
+            if len(words) >= 10 and not sentence.startswith(('#', '|', '`')):
+                candidates.append((words, sentence))
+    queries = []
+    for words, sentence in rng.sample(candidates, min(n, len(candidates))):
+        kept = sorted(rng.sample(range(len(words)), len(words) // 2))
+        queries.append((" ".join(words[i] for i in kept), sentence))
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs-dir", default=str(Path(__file__).parent.parent / "docs" / "knowledge_base"))
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=30, help="Results per search (enough to fill --max-tokens)")
+    parser.add_argument("--max-tokens", type=int, default=3000, help="search_with_context token budget")
+    parser.add_argument("--budgets", default="500,1000,1500,2000", help="Comma-separated compression budgets (tokens)")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    processor = DocumentProcessor(chunk_size=1000, chunk_overlap=200)
+    chunks = [{'content': clean_text(d.content), 'metadata': d.metadata, 'id': d.id}
+              for d in processor.process_directory(args.docs_dir)]
+    embeddings = LocalEmbeddings()
+    snapshot = str(Path(tempfile.mkdtemp()) / "kb.snapshot")
+    write_snapshot(
+        snapshot,
+        ids=[chunk['id'] for chunk in chunks],
+        texts=[chunk['content'] for chunk in chunks],
+        metadatas=[chunk['metadata'] for chunk in chunks],
+        embeddings=[embeddings.create_embedding(chunk['content']) for chunk in chunks],
+        token_counts=[embeddings.count_tokens(chunk['content']) for chunk in chunks],
+        model="local-hashed-bow"
+    )
+    retriever = RAGRetriever(SnapshotStore(snapshot), embeddings)
+
+    def context(query, compressor=None):
+        # The same call (and budget) the agent's search tool makes
+        return retriever.search_with_context(query, n_results=args.k, max_tokens=args.max_tokens,
+                                             compressor=compressor)
+
+    queries = sample_queries(processor, chunks, args.queries, args.seed)
+    docs_cases = [case for case in TEST_CASES if case["expected_tool"] == "search_documentation"]
+
+    print("=" * 70)
+    print("CONTEXT COMPRESSION BENCHMARK")
+    print("=" * 70)
+    print(f"{len(chunks)} chunks, search_with_context(n_results={args.k}, max_tokens={args.max_tokens}), "
+          f"{len(queries)} sampled questions")
+
+    full = [context(query) for query, _ in queries]
+    answered = [normalize(sentence) in normalize(text) for (_, sentence), text in zip(queries, full)]
+    full_tokens = [embeddings.count_tokens(text) for text in full]
+    print(f"\nUncompressed: median {statistics.median(full_tokens):.0f} tokens per context, "
+          f"answer sentence present in {sum(answered) / len(queries):.1%}")
+
+    print(f"\n{'budget':>7} {'tokens':>7} {'ratio':>6} {'answer kept':>12} {'expected terms':>15}")
+    for budget in (int(b) for b in args.budgets.split(",")):
+        compressor = ExtractiveCompressor(max_tokens=budget)
+        compressed = [context(query, compressor) for query, _ in queries]
+        tokens = [embeddings.count_tokens(text) for text in compressed]
+        kept = sum(1 for (_, sentence), text, had in zip(queries, compressed, answered)
+                   if had and normalize(sentence) in normalize(text))
+
+        # tests/test_cases.py: expected answer terms still in the context
+        terms_full = terms_kept = 0
+        for case in docs_cases:
+            before = context(case["query"]).lower()
+            after = context(case["query"], compressor).lower()
+            terms_full += sum(term in before for term in case["expected_contains"])
+            terms_kept += sum(term in after for term in case["expected_contains"])
+
+        print(f"{budget:>7} {statistics.median(tokens):>7.0f} {sum(tokens) / sum(full_tokens):>6.1%} "
+              f"{kept / max(sum(answered), 1):>12.1%} {terms_kept:>7}/{terms_full}")
+
+    print("\nratio = compressed/uncompressed tokens; answer kept = of contexts that contained the answer sentence")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Compare flat 1000-char chunks with the parent/child index on section-level retrieval (BM25, no API calls)"""
+import argparse
+import random
+import re
+import sys
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from rag.context_assembler import ContextAssembler
+from rag.document_processor import DocumentProcessor, clean_text
+from rag.hierarchy import ParentStore
+from rag.lexical import LexicalIndex
+from rag.logging_utils import configure_logging
+
+configure_logging(level="WARNING", style_name="plain", stream=sys.stdout, use_queue=False)
+
+
+def as_chunks(documents):
+    return [{'content': clean_text(doc.content), 'metadata': doc.metadata, 'id': doc.id} for doc in documents]
+
+
+def sample_queries(processor, parents, n: int, seed: int):
+    """A sentence of 8+ words from a random section, with the section it came from"""
+    rng = random.Random(seed)
+    candidates = []
+    for parent in parents:
+        text = parent['content']
+        for start, end in processor.split_sentences(text):
+            sentence = text[start:end].strip()
+            words = re.findall(r"[A-Za-z][A-Za-z0-9'-]+", sentence)
+            if len(words) >= 8 and not sentence.startswith('#'):
+                candidates.append((" ".join(words), parent['metadata']))
+    return rng.sample(candidates, min(n, len(candidates)))
+
+
+def evaluate(label, queries, search, k: int):
+    hits_at_1 = hits_at_k = fragments = distinct = chars = 0
+    for query, metadata in queries:
+        excerpts = search(query)
+        target = (metadata['source'], metadata['section'])
+        keys = [(e['metadata'].get('source'), e['metadata'].get('section')) for e in excerpts]
+        hits_at_1 += bool(keys) and keys[0] == target
+        hits_at_k += target in keys
+        fragments += len(keys)
+        distinct += len(set(keys))
+        chars += sum(len(e['content']) for e in excerpts)
+
+    n = len(queries)
+    print(f"\n{label}:")
+    print(f"   Section hit@1: {hits_at_1 / n:.1%}   hit@{k}: {hits_at_k / n:.1%}")
+    print(f"   Excerpts per answer: {fragments / n:.2f} ({(fragments - distinct) / n:.2f} repeating a section)")
+    print(f"   Context per answer: ~{chars / n / 4:,.0f} tokens")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs-dir", default=str(Path(__file__).parent.parent / "docs" / "knowledge_base"))
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=3)
+    parser.add_argument("--child-size", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    processor = DocumentProcessor(chunk_size=1000, chunk_overlap=200)
+    flat = as_chunks(processor.process_directory(args.docs_dir))
+    parents, children = processor.process_directory_hierarchical(args.docs_dir, child_size=args.child_size)
+    children = as_chunks(children)
+    parent_store = ParentStore()
+    parent_store.add(parents)
+
+    print("=" * 70)
+    print("HIERARCHICAL INDEX BENCHMARK")
+    print("=" * 70)
+    print(f"Flat: {len(flat)} chunks, {sum(len(c['content']) for c in flat):,} characters embedded")
+    print(f"Hierarchical: {len(children)} child chunks, {sum(len(c['content']) for c in children):,} characters "
+          f"embedded; {len(parents)} sections stored once")
+
+    queries = sample_queries(processor, parents, args.queries, args.seed)
+    print(f"{len(queries)} queries (a sentence from a random section; target = that section)")
+
+    flat_index = LexicalIndex(flat)
+    assembler = ContextAssembler()
+    evaluate("Flat chunks", queries,
+             lambda q: assembler.assemble(flat_index.search(q, n_results=args.k)), args.k)
+
+    child_index = LexicalIndex(children)
+    evaluate("Parent/child", queries,
+             lambda q: parent_store.expand(child_index.search(q, n_results=args.k * 3), args.k), args.k)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Ingestion planning: chars // 4 estimate vs exact token counts, per-chunk vs batched multithreaded counting"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from rag.document_processor import DocumentProcessor, clean_text
+from rag.embeddings import estimate_embedding_cost, get_encoding
+from rag.ingest_plan import count_tokens, plan_ingest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs-dir", default=str(Path(__file__).parent.parent / "docs" / "knowledge_base"))
+    parser.add_argument("--scale", type=int, default=20, help="Copies of the knowledge base (larger corpus)")
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    documents = DocumentProcessor(chunk_size=1000, chunk_overlap=200).process_directory_batch(args.docs_dir)
+    texts = [f"[{copy}] {clean_text(text)}" for copy in range(args.scale) for text in documents.texts]
+    ids = [f"chunk-{i}" for i in range(len(texts))]
+
+    print("=" * 70)
+    print("INGEST PLAN BENCHMARK")
+    print("=" * 70)
+    print(f"{len(texts):,} chunks ({args.scale} × {len(documents)}), {sum(map(len, texts)):,} characters")
+
+    encoding = get_encoding()
+    start = time.perf_counter()
+    sequential = [len(encoding.encode(text, disallowed_special=())) for text in texts]
+    sequential_s = time.perf_counter() - start
+
+    for threads in (1, args.threads):
+        start = time.perf_counter()
+        counts = count_tokens(texts, encoding=encoding, num_threads=threads)
+        print(f"\nencode_batch, {threads} thread(s): {time.perf_counter() - start:.3f}s "
+              f"(one encode() per chunk: {sequential_s:.3f}s)")
+        assert list(counts) == sequential
+
+    exact = sum(sequential)
+    estimated, _ = estimate_embedding_cost(sum(map(len, texts)))
+    print(f"\nTokens: exact {exact:,}, chars // 4 estimate {estimated:,} ({(estimated - exact) / exact:+.1%})")
+    error = [abs(len(text) // 4 - n) / max(n, 1) for text, n in zip(texts, sequential)]
+    print(f"Per-chunk estimate error: mean {sum(error) / len(error):.1%}, max {max(error):.1%}")
+
+    for stored in (0, len(texts) // 2, len(texts)):
+        plan = plan_ingest(texts, ids, ids[:stored], num_threads=args.threads)
+        print(f"\n{stored:,} chunks already stored: {plan.to_embed:,} to embed, {plan.tokens:,} tokens, "
+              f"${plan.cost:.6f}, {plan.requests} requests, ~{plan.estimated_seconds:.1f}s ({plan.bound})")
+
+
+if __name__ == "__main__":
+    main()
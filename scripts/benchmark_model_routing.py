@@ -0,0 +1,111 @@
+"""Run a mixed workload with every call on the strong model vs tiered model routing (stubbed model)"""
+import argparse
+import hashlib
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Add src and tests to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+sys.path.insert(0, str(Path(__file__).parent.parent / "tests"))
+
+from agent import core
+from agent.model_router import FAST, STRONG, ModelRouter
+from agent.output import NullSink
+from agent.router import IntentRouter
+from agent.router_examples import ROUTER_EXAMPLES
+from rag.tenants import llm_cost
+from stub_models import StubAnthropic
+from test_cases import TEST_CASES
+
+# (message, tier the turn should end on)
+EXPECTED = [
+    ("Is SSO included in the Enterprise plan?", "fast"),
+    ("How do I set up a freshness monitor?", "fast"),
+    ("My Snowflake connection fails with a timeout error", "strong"),
+    ("Alerts stopped firing and I can't figure out why", "strong"),
+    ("Please open a ticket, our monitors are all failing", "strong"),
+    ("Tell me about " + "our warehouse setup and the many tables we have, " * 10, "strong"),
+]
+
+
+def stub_search(query: str, sources: list = None) -> str:
+    """One query in five finds almost nothing"""
+    if hashlib.md5(query.encode()).digest()[0] % 5 == 0:
+        return "No close match."
+    return "--- Source: stub.md ---\n" + "Relevant documentation for this question. " * 30
+
+
+class UsageSink(NullSink):
+    """Collects usage events to price the baseline run"""
+
+    def __init__(self):
+        self.cost = 0.0
+
+    def usage(self, model: str, input_tokens: int, output_tokens: int):
+        self.cost += llm_cost(model, input_tokens, output_tokens)
+
+
+def run(workload, client, model_router=None):
+    sink = UsageSink()
+    timings = []
+    for message in workload:
+        start = time.perf_counter()
+        core.run_agent_streaming(message, client=client, sink=sink, model_router=model_router)
+        timings.append(time.perf_counter() - start)
+    return sink.cost, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--fast-delays", default="0.15,0.004", help="Fast model time to first token, per token (s)")
+    parser.add_argument("--strong-delays", default="0.4,0.012", help="Strong model time to first token, per token (s)")
+    args = parser.parse_args()
+
+    core.TOOL_FUNCTIONS["search_documentation"] = stub_search
+    core.TOOL_FUNCTIONS["create_support_ticket"] = lambda **kwargs: "✅ Support ticket created: TKT-STUB"
+    delays = {
+        FAST.model: tuple(float(x) for x in args.fast_delays.split(",")),
+        STRONG.model: tuple(float(x) for x in args.strong_delays.split(",")),
+    }
+
+    print("=" * 70)
+    print("MODEL ROUTING BENCHMARK")
+    print("=" * 70)
+    classifier = IntentRouter.train().classifier
+
+    print("\nRouting decisions:")
+    for message, expected in EXPECTED:
+        client = StubAnthropic(token_delay=0, first_token_delay=0, stop_delay=0)
+        model_router = ModelRouter(classifier=classifier)
+        core.run_agent_streaming(message, client=client, sink=NullSink(), model_router=model_router)
+        tiers = [FAST.name if call["model"] == FAST.model else STRONG.name for call in client.calls]
+        verdict = "✓" if tiers[-1] == expected else "✗"
+        reasons = ", ".join(model_router.get_stats()["reasons"])
+        print(f"   {verdict} {' -> '.join(tiers):<20} {reasons:<40} {message[:50]!r}")
+
+    workload = [case["query"] for case in TEST_CASES] + [text for text, _ in ROUTER_EXAMPLES]
+    print(f"\n{len(workload)} turns (search, then answer), one search in five comes back thin")
+
+    client = StubAnthropic(stop_delay=0, model_delays={STRONG.model: delays[STRONG.model]})
+    cost, timings = run(workload, client)
+    print(f"\nStrong model only: {len(client.calls)} calls, ${cost:.4f}, "
+          f"median turn {statistics.median(timings) * 1000:.0f} ms")
+
+    client = StubAnthropic(stop_delay=0, model_delays=delays)
+    model_router = ModelRouter(classifier=classifier)
+    _, timings = run(workload, client, model_router)
+    stats = model_router.get_stats()
+    total = sum(tier["cost_usd"] for tier in stats["tiers"].values())
+    print(f"Tiered routing:    {len(client.calls)} calls, ${total:.4f}, "
+          f"median turn {statistics.median(timings) * 1000:.0f} ms")
+    for name, tier in stats["tiers"].items():
+        print(f"   {name:<7} {tier['turns']:>3} turns started, {tier['calls']:>3} calls, "
+              f"p50 {tier['p50_ms']} ms, p95 {tier['p95_ms']} ms, ${tier['cost_usd']:.4f}")
+    print(f"   Escalations: {stats['escalations']}")
+    print(f"   Reasons: {stats['reasons']}")
+
+
+if __name__ == "__main__":
+    main()
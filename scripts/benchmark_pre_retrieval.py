@@ -0,0 +1,62 @@
+"""Benchmark end-to-end latency with and without pre-retrieval (stubbed model and search)"""
+import argparse
+import contextlib
+import io
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from agent import core
+from agent.pre_retrieval import PreRetriever
+from stub_models import StubAnthropic
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--search-latency", type=float, default=0.3, help="Seconds per knowledge-base search")
+    parser.add_argument("--first-token-delay", type=float, default=0.6, help="Model time to first token")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="Seconds between streamed chunks")
+    parser.add_argument("--max-tokens", type=int, default=1500, help="Pre-retrieval token budget")
+    args = parser.parse_args()
+
+    def slow_search(query: str, sources: list = None, max_tokens: int = 3000, max_distance=None) -> str:
+        time.sleep(args.search_latency)
+        return f"--- Source: stub.md ---\nDocumentation about {query}\n"
+
+    core.TOOL_FUNCTIONS["search_documentation"] = slow_search
+    pre_retriever = PreRetriever(
+        max_tokens=args.max_tokens,
+        search_fn=lambda query, max_tokens, max_distance: slow_search(query, max_tokens=max_tokens)
+    )
+    question = "What's included in the Pro plan?"
+
+    print("=" * 70)
+    print("PRE-RETRIEVAL BENCHMARK")
+    print("=" * 70)
+
+    medians = {}
+    for label, retriever in (("Tool round trip", None), ("Pre-retrieval", pre_retriever)):
+        timings, calls = [], []
+        for _ in range(args.runs):
+            client = StubAnthropic(token_delay=args.token_delay, first_token_delay=args.first_token_delay)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                core.run_agent_streaming(question, client=client, pre_retriever=retriever)
+            timings.append(time.perf_counter() - start)
+            calls.append(len(client.calls))
+        medians[label] = statistics.median(timings)
+        print(f"\n{label}:")
+        print(f"   Model calls: {statistics.median(calls):.0f}")
+        print(f"   End-to-end (median of {args.runs}): {medians[label] * 1000:.0f} ms")
+
+    saved = medians["Tool round trip"] - medians["Pre-retrieval"]
+    print(f"\nSaved per conversation: {saved * 1000:.0f} ms ({saved / medians['Tool round trip']:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Benchmark speculative documentation prefetch against a stubbed streaming model"""
+import argparse
+import contextlib
+import io
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from agent import core
+from stub_models import StubAnthropic
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--search-latency", type=float, default=0.3, help="Seconds per documentation search")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="Seconds between streamed chunks")
+    parser.add_argument("--stop-delay", type=float, default=0.05,
+                        help="Seconds between the tool_use block and message_stop")
+    args = parser.parse_args()
+
+    def slow_search(query: str, sources: list = None) -> str:
+        time.sleep(args.search_latency)
+        return f"--- Source: stub.md ---\nDocumentation about {query}\n"
+
+    # Stub retrieval; the model is stubbed per run below
+    core.TOOL_FUNCTIONS["search_documentation"] = slow_search
+    question = "How do I connect DataPulse to Snowflake with key-pair authentication?"
+
+    print("=" * 70)
+    print("SPECULATIVE PREFETCH BENCHMARK")
+    print("=" * 70)
+    print(f"Search latency: {args.search_latency * 1000:.0f} ms, "
+          f"token delay: {args.token_delay * 1000:.0f} ms, stop delay: {args.stop_delay * 1000:.0f} ms")
+
+    results = {}
+    for prefetch in (False, True):
+        timings = []
+        for _ in range(args.runs):
+            client = StubAnthropic(token_delay=args.token_delay, stop_delay=args.stop_delay)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                core.run_agent_streaming(question, client=client, prefetch=prefetch)
+            timings.append(time.perf_counter() - start)
+        results[prefetch] = statistics.median(timings)
+        label = "With prefetch" if prefetch else "Without prefetch"
+        print(f"\n{label}: {results[prefetch] * 1000:.0f} ms end-to-end (median of {args.runs})")
+
+    saved = results[False] - results[True]
+    print(f"\nRetrieval latency hidden: {saved * 1000:.0f} ms "
+          f"({saved / args.search_latency:.0%} of one search)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Session store latency, size and concurrency: in-memory vs SQLite, plus a conversation moving between workers"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from agent import core
+from agent.output import NullSink
+from agent.sessions import InMemorySessionStore, SQLiteSessionStore
+from stub_models import StubAnthropic, default_script
+
+
+def turn_messages(turn: int, doc_chars: int):
+    """One search-then-answer turn as stored: user, tool_use, tool_result, answer"""
+    docs = ("--- Source: 03_monitors.md ---\nFreshness monitors alert when a table has not been updated "
+            "within its expected interval. ") * (doc_chars // 110 + 1)
+    return [
+        {"role": "user", "content": f"Question {turn}: how do freshness monitors work?"},
+        {"role": "assistant", "content": [
+            {"type": "text", "text": "Let me check the documentation."},
+            {"type": "tool_use", "id": f"toolu_{turn}", "name": "search_documentation",
+             "input": {"query": "freshness monitors"}}]},
+        {"role": "user", "content": [
+            {"type": "tool_result", "tool_use_id": f"toolu_{turn}", "content": docs[:doc_chars]}]},
+        {"role": "assistant", "content": [
+            {"type": "text", "text": "Freshness monitors compare the last update time to the expected interval. " * 6}]},
+    ]
+
+
+def ms(values):
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return f"p50 {cuts[49] * 1000:6.2f} ms  p99 {cuts[98] * 1000:6.2f} ms"
+
+
+def measure(store, sessions: int, turns: int, doc_chars: int):
+    loads, appends = [], []
+    for turn in range(turns):
+        for s in range(sessions):
+            start = time.perf_counter()
+            session = store.load(f"s{s}")
+            loads.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            store.append_turn(session, turn_messages(turn, doc_chars))
+            appends.append(time.perf_counter() - start)
+    return loads, appends
+
+
+def race(store, workers: int, turns: int) -> int:
+    """Workers appending turns to one session at once; returns messages stored"""
+    def work(w):
+        for turn in range(turns):
+            store.append_turn(store.load("shared"), turn_messages(w * 1000 + turn, 200), max_attempts=50)
+
+    threads = [threading.Thread(target=work, args=(w,)) for w in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return store.load("shared").version
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=10, help="Turns per session (4 messages each)")
+    parser.add_argument("--doc-chars", type=int, default=2000, help="Characters of search result per turn")
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("SESSION STORE BENCHMARK")
+    print("=" * 70)
+    print(f"{args.sessions} sessions × {args.turns} turns, {args.doc_chars}-char tool results")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "sessions.db")
+        plain = sum(len(json.dumps(m)) for t in range(args.turns) for m in turn_messages(t, args.doc_chars))
+        for label, store in (("In-memory", InMemorySessionStore()), ("SQLite", SQLiteSessionStore(db))):
+            loads, appends = measure(store, args.sessions, args.turns, args.doc_chars)
+            print(f"\n{label}:")
+            print(f"   load   {ms(loads)}   (up to {args.turns * 4} messages)")
+            print(f"   append {ms(appends)}   (4 messages)")
+            if isinstance(store, SQLiteSessionStore):
+                stored = sum(len(row[0]) for row in store._conn().execute(
+                    "SELECT data FROM messages WHERE session_id = 's0'"))
+                print(f"   stored {stored:,} bytes per session vs {plain:,} as plain JSON ({stored / plain:.0%})")
+
+        print("\nOptimistic concurrency (8 workers, 20 turns each, one session):")
+        for label, store in (("In-memory", InMemorySessionStore()), ("SQLite", SQLiteSessionStore(db))):
+            stored = race(store, 8, 20)
+            print(f"   {label:<10} {stored} messages stored, expected {8 * 20 * 4}")
+
+        store = SQLiteSessionStore(db, ttl=0.2)
+        store.append_turn(store.load("short-lived"), turn_messages(0, 100))
+        time.sleep(0.3)
+        print(f"\nTTL: expired session loads with {store.load('short-lived').version} messages, "
+              f"purge removed {store.purge_expired()} expired sessions")
+
+        # Two workers (separate store instances on one database) alternate turns of one conversation
+        core.TOOL_FUNCTIONS["search_documentation"] = lambda query, sources=None: "--- Source: stub.md ---\nDocs."
+        sent = []
+        script = lambda request: (sent.append(len(request["messages"])), default_script(request))[1]
+        client = StubAnthropic(script=script, token_delay=0, first_token_delay=0, stop_delay=0)
+        workers = [SQLiteSessionStore(db), SQLiteSessionStore(db)]
+        for turn in range(4):
+            core.run_agent_streaming(f"Follow-up question {turn}", client=client, sink=NullSink(),
+                                     session_id="handoff", session_store=workers[turn % 2])
+        print(f"\nConversation alternating between 2 workers: messages sent per model call {sent}")
+
+
+if __name__ == "__main__":
+    main()
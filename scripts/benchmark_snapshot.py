@@ -0,0 +1,107 @@
+"""Benchmark opening a KB snapshot vs cold-opening the ChromaDB directory"""
+import argparse
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from rag.snapshot import write_snapshot
+
+
+# Each measurement runs in a fresh interpreter so nothing is warm except the OS page cache
+SNAPSHOT_PROBE = """
+import sys, time
+sys.path.insert(0, {src!r})
+start = time.perf_counter()
+from rag.snapshot import SnapshotStore
+store = SnapshotStore({path!r})
+opened = time.perf_counter()
+store.query(list(store.embedding(0)), n_results=3)
+queried = time.perf_counter()
+print(opened - start, queried - start)
+"""
+
+CHROMA_PROBE = """
+import sys, time
+sys.path.insert(0, {src!r})
+start = time.perf_counter()
+from rag.vector_store import VectorStore
+store = VectorStore(persist_directory={path!r}, collection_name={collection!r})
+store.get_collection_info()
+opened = time.perf_counter()
+embedding = store.collection.get(limit=1, include=["embeddings"])["embeddings"][0]
+store.query(list(embedding), n_results=3)
+queried = time.perf_counter()
+print(opened - start, queried - start)
+"""
+
+
+def probe(script: str, runs: int):
+    """Run a probe script `runs` times; return (open times, open+first-query times)"""
+    opens, queries = [], []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True)
+        opened, queried = (float(x) for x in output.stdout.split())
+        opens.append(opened)
+        queries.append(queried)
+    return opens, queries
+
+
+def report(label: str, opens, queries):
+    print(f"\n{label}:")
+    print(f"   Open (median):              {statistics.median(opens) * 1000:8.1f} ms")
+    print(f"   Open + first query (median): {statistics.median(queries) * 1000:8.1f} ms")
+
+
+def main():
+    base_dir = Path(__file__).parent.parent
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--snapshot", help="Existing snapshot (default: synthetic)")
+    parser.add_argument("--persist-dir", default=str(base_dir / "data" / "chroma_db"))
+    parser.add_argument("--collection", default="datapulse_docs")
+    parser.add_argument("--chunks", type=int, default=5000, help="Synthetic snapshot size")
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    src = str(base_dir / "src")
+
+    print("=" * 70)
+    print("SNAPSHOT LOAD BENCHMARK")
+    print("=" * 70)
+
+    snapshot = args.snapshot
+    if snapshot is None:
+        snapshot = str(Path(tempfile.mkdtemp()) / "synthetic.snapshot")
+        print(f"\nWriting synthetic snapshot: {args.chunks:,} chunks x {args.dimension} dims")
+        write_snapshot(
+            snapshot,
+            ids=[f"chunk_{i}" for i in range(args.chunks)],
+            texts=[f"Synthetic chunk {i} " * 40 for i in range(args.chunks)],
+            metadatas=[{"source": f"{i % 15:02d}_doc.md", "section": f"S{i % 7}", "chunk_id": i}
+                       for i in range(args.chunks)],
+            embeddings=[[random.random() for _ in range(args.dimension)] for _ in range(args.chunks)],
+            token_counts=[200] * args.chunks,
+            model="text-embedding-3-small"
+        )
+
+    report("Snapshot (mmap)", *probe(SNAPSHOT_PROBE.format(src=src, path=snapshot), args.runs))
+
+    if Path(args.persist_dir).exists():
+        try:
+            script = CHROMA_PROBE.format(src=src, path=args.persist_dir, collection=args.collection)
+            report("ChromaDB directory", *probe(script, args.runs))
+        except subprocess.CalledProcessError as e:
+            print(f"\n⚠️  ChromaDB probe failed: {e.stderr.strip().splitlines()[-1]}")
+    else:
+        print(f"\n⚠️  No ChromaDB directory at {args.persist_dir}; skipping comparison")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Benchmark support-ticket creation under many concurrent sessions"""
+import argparse
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from tools.ticket_store import TicketStore
+
+
+def run(sessions: int, tickets_per_session: int, retry_every: int, batch_window: float, max_batch: int):
+    """Create tickets from `sessions` threads and report throughput/latency"""
+    db_path = Path(tempfile.mkdtemp()) / "tickets.db"
+    store = TicketStore(str(db_path), batch_window=batch_window, max_batch=max_batch)
+
+    latencies = []
+    created = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(sessions)
+
+    def session(session_id: int):
+        local_latencies = []
+        local_created = 0
+        barrier.wait()
+        for i in range(tickets_per_session):
+            description = f"Session {session_id}: monitor {i} failing on warehouse sync"
+            attempts = 2 if retry_every and i % retry_every == 0 else 1
+            for _ in range(attempts):
+                start = time.perf_counter()
+                # A retry re-executes the same tool call
+                ticket = store.create_ticket(description, "high", scope=f"session-{session_id}|toolu_{i}")
+                local_latencies.append(time.perf_counter() - start)
+                local_created += ticket["created"]
+        with lock:
+            latencies.extend(local_latencies)
+            created.append(local_created)
+
+    threads = [threading.Thread(target=session, args=(n,)) for n in range(sessions)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    stats = store.get_stats()
+    stored = store.count()
+    store.close()
+
+    latencies.sort()
+    expected = sessions * tickets_per_session
+    print(f"  Requests:        {len(latencies):,} ({len(latencies) - expected:,} retries)")
+    print(f"  Tickets stored:  {stored:,} (expected {expected:,}, created {sum(created):,})")
+    print(f"  Throughput:      {len(latencies) / elapsed:,.0f} req/s")
+    print(f"  Latency p50:     {statistics.median(latencies) * 1000:.2f} ms")
+    print(f"  Latency p99:     {latencies[int(len(latencies) * 0.99) - 1] * 1000:.2f} ms")
+    print(f"  Transactions:    {stats['transactions']:,} (avg batch {stats['avg_batch_size']:.1f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sessions", type=int, default=64, help="Concurrent sessions (threads)")
+    parser.add_argument("--tickets", type=int, default=50, help="Tickets per session")
+    parser.add_argument("--retry-every", type=int, default=5, help="Retry every Nth request (0 disables)")
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("TICKET STORE BENCHMARK")
+    print("=" * 70)
+    print(f"{args.sessions} sessions x {args.tickets} tickets")
+
+    print("\nOne transaction per ticket:")
+    run(args.sessions, args.tickets, args.retry_every, batch_window=0.0, max_batch=1)
+
+    print("\nGroup commit (everything queued, up to 128 per transaction):")
+    run(args.sessions, args.tickets, args.retry_every, batch_window=0.0, max_batch=128)
+
+    print("\nGroup commit with 1ms linger:")
+    run(args.sessions, args.tickets, args.retry_every, batch_window=0.001, max_batch=128)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Accuracy, coverage and latency of the local intent router, and the model calls it saves (stubbed model)"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+
+# Add src and tests to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+sys.path.insert(0, str(Path(__file__).parent.parent / "tests"))
+
+from agent import core
+from agent.output import NullSink
+from agent.router import DEFAULT_THRESHOLDS, READ_ONLY_TOOLS, IntentRouter, LinearIntentClassifier
+from agent.router_examples import NONE, ROUTER_EXAMPLES
+from stub_models import StubAnthropic
+from test_cases import TEST_CASES
+
+
+def stratified_folds(examples, k: int, seed: int):
+    """Split examples into k folds with every label spread evenly"""
+    rng = random.Random(seed)
+    by_label = defaultdict(list)
+    for example in examples:
+        by_label[example[1]].append(example)
+    folds = [[] for _ in range(k)]
+    for members in by_label.values():
+        rng.shuffle(members)
+        for i, example in enumerate(members):
+            folds[i % k].append(example)
+    return folds
+
+
+def cross_validate(k: int, seed: int):
+    """Out-of-fold (label, predicted, confidence) for every example"""
+    folds = stratified_folds(ROUTER_EXAMPLES, k, seed)
+    predictions = []
+    for i, held_out in enumerate(folds):
+        train = [example for j, fold in enumerate(folds) if j != i for example in fold]
+        classifier = LinearIntentClassifier().fit(train)
+        for text, label in held_out:
+            predicted, confidence = classifier.predict(text)
+            predictions.append((label, predicted, confidence))
+    return predictions
+
+
+def sweep(predictions, thresholds):
+    """Coverage and precision of direct (read-only) dispatch at a uniform threshold"""
+    print(f"\n{'threshold':>10} {'dispatched':>11} {'precision':>10} {'wrong tool':>11}")
+    tool_messages = sum(1 for label, _, _ in predictions if label in READ_ONLY_TOOLS)
+    for threshold in thresholds:
+        dispatched = [(label, predicted) for label, predicted, confidence in predictions
+                      if predicted in READ_ONLY_TOOLS and confidence >= threshold]
+        correct = sum(1 for label, predicted in dispatched if label == predicted)
+        precision = correct / len(dispatched) if dispatched else 0.0
+        print(f"{threshold:>10.2f} {len(dispatched) / tool_messages:>10.1%} {precision:>10.1%} "
+              f"{len(dispatched) - correct:>11}")
+
+
+def scripted_model(expected_tools):
+    """Stub model that calls the labelled tool first, then answers from its result"""
+    def script(request):
+        messages = request["messages"]
+        last = messages[-1]["content"]
+        if isinstance(last, list) and any(isinstance(p, dict) and p.get("type") == "tool_result" for p in last):
+            return [{"type": "text", "text": "Here is what I found for you. " * 6}]
+        tool = expected_tools[last]
+        if tool == NONE:
+            return [{"type": "text", "text": "Happy to help!"}]
+        return [
+            {"type": "text", "text": "Let me look that up."},
+            {"type": "tool_use", "id": f"toolu_{len(messages)}", "name": tool, "input": {"query": last}},
+        ]
+    return script
+
+
+def end_to_end(router, examples, first_token_delay: float):
+    expected = {text: label for text, label in examples}
+    client = StubAnthropic(script=scripted_model(expected), token_delay=0.0005, first_token_delay=first_token_delay)
+    timings = []
+    for text, _ in examples:
+        start = time.perf_counter()
+        core.run_agent_streaming(text, client=client, sink=NullSink(), router=router)
+        timings.append(time.perf_counter() - start)
+    return len(client.calls), statistics.mean(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--first-token-delay", type=float, default=0.05,
+                        help="Stub model time to first token (s)")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    # Tools are stubbed: no retrieval, no tickets written
+    for name in core.TOOL_FUNCTIONS:
+        core.TOOL_FUNCTIONS[name] = lambda **kwargs: "Stub tool result."
+
+    print("=" * 70)
+    print("INTENT ROUTER EVALUATION")
+    print("=" * 70)
+    labels = Counter(label for _, label in ROUTER_EXAMPLES)
+    print(f"{len(ROUTER_EXAMPLES)} labelled examples: " + ", ".join(f"{n} {label}" for label, n in sorted(labels.items())))
+
+    predictions = cross_validate(args.folds, args.seed)
+    accuracy = sum(1 for label, predicted, _ in predictions if label == predicted) / len(predictions)
+    print(f"\n{args.folds}-fold cross-validated accuracy: {accuracy:.1%}")
+    for label in sorted(labels):
+        rows = [(l, p) for l, p, _ in predictions if l == label]
+        hits = sum(1 for l, p in rows if l == p)
+        confused = Counter(p for l, p in rows if l != p)
+        print(f"   {label:<24} {hits}/{len(rows)}" + (f"  (confused with {dict(confused)})" if confused else ""))
+
+    sweep(predictions, [0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95])
+    print(f"Default thresholds: {DEFAULT_THRESHOLDS}")
+
+    start = time.perf_counter()
+    router = IntentRouter.train()
+    print(f"\nTraining on all examples: {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    print("\nHeld-out cases (tests/test_cases.py):")
+    for case in TEST_CASES:
+        route = router.route(case["query"])
+        label, confidence = router.classifier.predict(case["query"])
+        verdict = "✓" if label == case["expected_tool"] else "✗"
+        action = f"dispatch {route.tool} {route.input}" if route else "model decides"
+        print(f"   {verdict} {confidence:.2f} {case['query']!r} -> {action}")
+
+    for text, _ in ROUTER_EXAMPLES:
+        router.route(text)
+    stats = router.get_stats()
+    print(f"\nRouting latency: p50 {stats['latency']['p50_ms']} ms, p95 {stats['latency']['p95_ms']} ms")
+
+    workload = [(case["query"], case["expected_tool"]) for case in TEST_CASES] + list(ROUTER_EXAMPLES)
+    print(f"\nEnd to end over {len(workload)} messages (stub model, {args.first_token_delay * 1000:.0f} ms to first token):")
+    for label, candidate in (("Model picks tools", None), ("Local router", IntentRouter.train())):
+        calls, mean = end_to_end(candidate, workload, args.first_token_delay)
+        print(f"   {label:<18} {calls} model calls, {mean * 1000:.0f} ms per message")
+        if candidate is not None:
+            print(f"   Routed {candidate.get_stats()['route_rate']:.0%}: {candidate.get_stats()['outcomes']}")
+
+
+if __name__ == "__main__":
+    main()
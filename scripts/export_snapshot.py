@@ -0,0 +1,65 @@
+"""Export the ChromaDB knowledge base to a portable single-file snapshot"""
+import argparse
+import sys
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from rag.embeddings import EmbeddingManager
+from rag.vector_store import VectorStore
+from rag.sharded_store import ShardedVectorStore
+from rag.snapshot import export_vector_store, SnapshotStore
+from rag.embedding_spaces import SpaceRegistry
+from rag.logging_utils import configure_logging
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+configure_logging(level="INFO", style_name="plain", stream=sys.stdout, use_queue=False)
+
+
+def main():
+    """Export data/chroma_db to data/kb.snapshot (no embedding calls)"""
+    base_dir = Path(__file__).parent.parent
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--persist-dir", default=str(base_dir / "data" / "chroma_db"))
+    parser.add_argument("--collection", default=None, help="Default: the active embedding space")
+    parser.add_argument("--model", default=None, help="Default: the embedding space's model")
+    parser.add_argument("--output", default=str(base_dir / "data" / "kb.snapshot"))
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("KNOWLEDGE BASE SNAPSHOT EXPORT")
+    print("=" * 70)
+
+    if ShardedVectorStore.exists(args.persist_dir, args.collection or "datapulse_docs"):
+        vector_store = ShardedVectorStore(args.persist_dir, args.collection or "datapulse_docs")
+        model = args.model or "text-embedding-3-small"
+    else:
+        spaces = SpaceRegistry(args.persist_dir, "datapulse_docs")
+        space = spaces.get(args.collection) if args.collection else spaces.active()
+        collection = args.collection or space["name"]
+        model = args.model or (space["model"] if space else "text-embedding-3-small")
+        vector_store = VectorStore(persist_directory=args.persist_dir, collection_name=collection)
+    embedding_manager = EmbeddingManager(model=model)
+    if getattr(vector_store, 'parents', None) is not None and not vector_store.parents.is_empty():
+        print("⚠️  Snapshots hold chunks only: searches will return child chunks, not parent sections")
+
+    manifest = export_vector_store(vector_store, embedding_manager, args.output)
+
+    # Verify the snapshot opens
+    snapshot = SnapshotStore(args.output)
+    size = Path(args.output).stat().st_size
+
+    print(f"\n✅ Snapshot written: {args.output}")
+    print(f"   Chunks: {manifest['count']:,}")
+    print(f"   Model: {manifest['model']} ({manifest['dimension']} dimensions)")
+    print(f"   Tokens: {manifest['total_tokens']:,}")
+    print(f"   Sources: {len(snapshot.list_sources())}")
+    print(f"   Size: {size / 1024:.1f} KB")
+    print("\nServe it by placing it at data/kb.snapshot or setting KB_SNAPSHOT_PATH.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,40 +1,88 @@
 """Script to ingest markdown documents into ChromaDB"""
+import argparse
+import json
 import os
 import sys
+from array import array
 from pathlib import Path
 
 # Add src to path
 sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
 
+from rag.chunk_batch import ChunkBatch
 from rag.document_processor import DocumentProcessor, clean_text
+from rag.dedup import ChunkDeduplicator
 from rag.embeddings import EmbeddingManager, estimate_embedding_cost
+from rag.ingest_plan import plan_ingest
 from rag.vector_store import VectorStore
+from rag.sharded_store import ShardedVectorStore, reusable_ids, sync_shards
+from rag.embedding_spaces import SpaceRegistry
+from rag.tenants import QuotaExceededError, get_tenant_registry
+from tools.plan_matrix import compile_plan_matrix
+from rag.logging_utils import configure_logging
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
+configure_logging(level="INFO", style_name="plain", stream=sys.stdout, use_queue=False)
 
 
 def main():
     """Main ingestion process"""
+    parser = argparse.ArgumentParser(description="Ingest the knowledge base into ChromaDB")
+    parser.add_argument("--sharded", action="store_true",
+                        help="Store one collection per shard and rebuild only shards whose documents changed")
+    parser.add_argument("--partition-by", default=None,
+                        help="Shard key: 'source_family' (default) or a metadata field such as tenant_id")
+    parser.add_argument("--tenant", default=None,
+                        help="Ingest into this tenant's knowledge base (data/tenants/<tenant>) "
+                             "and charge its embedding budget")
+    parser.add_argument("--docs-dir", default=None,
+                        help="Markdown directory (default: docs/knowledge_base, or docs/tenants/<tenant>)")
+    parser.add_argument("--persist-dir", default=None,
+                        help="ChromaDB directory (default: data/chroma_db, or data/tenants/<tenant>/chroma_db)")
+    parser.add_argument("--hierarchical", action="store_true",
+                        help="Embed sentence-sized child chunks and return their whole sections as context "
+                             "(ingest into an empty collection)")
+    parser.add_argument("--child-size", type=int, default=300,
+                        help="Maximum characters per child chunk with --hierarchical")
+    parser.add_argument("--no-dedup", action="store_true",
+                        help="Embed every chunk, including near-duplicates")
+    parser.add_argument("--dedup-threshold", type=float, default=0.8,
+                        help="Estimated Jaccard similarity at which chunks are merged")
+    parser.add_argument("--yes", "-y", action="store_true",
+                        help="Embed without asking for confirmation (required when stdin is not a terminal)")
+    parser.add_argument("--plan-only", "--dry-run", action="store_true",
+                        help="Print the cost plan and exit without embedding anything")
+    parser.add_argument("--plan-json", default=None, help="Also write the cost plan to this JSON file")
+    parser.add_argument("--max-cost", type=float, default=_env_float("INGEST_MAX_COST_USD"),
+                        help="Spend ceiling in USD: refuse a plan above it and stop if the run reaches it "
+                             "(default: $INGEST_MAX_COST_USD)")
+    parser.add_argument("--batch-size", type=int, default=100, help="Texts per embedding request")
+    parser.add_argument("--rpm", type=int, default=3000, help="Embedding requests per minute allowed")
+    parser.add_argument("--tpm", type=int, default=1_000_000, help="Embedding tokens per minute allowed")
+    args = parser.parse_args()
+    if args.hierarchical and args.sharded:
+        parser.error("--hierarchical is not supported with --sharded")
+
     print("=" * 70)
     print("DATAPULSE KNOWLEDGE BASE INGESTION")
     print("=" * 70)
 
     # Configuration
-    docs_dir = Path(__file__).parent.parent / "docs" / "knowledge_base"
-    persist_dir = Path(__file__).parent.parent / "data" / "chroma_db"
+    base_dir = Path(__file__).parent.parent
+    registry = get_tenant_registry()
+    if args.tenant:
+        docs_dir = Path(args.docs_dir or base_dir / "docs" / "tenants" / args.tenant)
+        persist_dir = Path(args.persist_dir or registry.tenant_dir(args.tenant) / "chroma_db")
+        print(f"\nTenant: {args.tenant}")
+    else:
+        docs_dir = Path(args.docs_dir or base_dir / "docs" / "knowledge_base")
+        persist_dir = Path(args.persist_dir or base_dir / "data" / "chroma_db")
 
     print(f"\nDocuments directory: {docs_dir}")
     print(f"Vector DB directory: {persist_dir}")
 
-    # Check if OPENAI_API_KEY is set
-    if not os.getenv("OPENAI_API_KEY"):
-        print("\n❌ ERROR: OPENAI_API_KEY environment variable not set!")
-        print("Please add it to your .env file:")
-        print("OPENAI_API_KEY=sk-...")
-        return
-
     # Step 1: Process documents
     print("\n" + "=" * 70)
     print("STEP 1: PROCESSING DOCUMENTS")
@@ -45,72 +93,126 @@ def main():
         chunk_overlap=200   # 200 character overlap
     )
 
-    documents = processor.process_directory(str(docs_dir), pattern="*.md")
+    # Chunks are kept column-wise (rag.chunk_batch) from here to the vector store
+    parents = []
+    if args.hierarchical:
+        parents, children = processor.process_directory_hierarchical(
+            str(docs_dir), pattern="*.md", child_size=args.child_size
+        )
+        documents = ChunkBatch.from_documents(children)
+    else:
+        documents = processor.process_directory_batch(str(docs_dir), pattern="*.md")
 
-    if not documents:
+    if not len(documents):
         print("\n❌ No documents found!")
         return
 
-    # Calculate estimated cost
-    total_chars = sum(len(doc.content) for doc in documents)
-    est_tokens, est_cost = estimate_embedding_cost(total_chars, model="text-embedding-3-small")
+    # Ids keep hashing the raw chunk text; what is embedded and stored is cleaned
+    documents.texts = [clean_text(text) for text in documents.texts]
 
-    print(f"\n📊 Statistics:")
-    print(f"   Total documents/chunks: {len(documents)}")
-    print(f"   Total characters: {total_chars:,}")
-    print(f"   Estimated tokens: {est_tokens:,}")
-    print(f"   Estimated cost: ${est_cost:.6f}")
+    if not args.no_dedup:
+        documents = deduplicate(documents, args.dedup_threshold)
 
-    # Ask for confirmation
-    print("\n⚠️  This will create embeddings using OpenAI API (costs money)")
-    response = input("Continue? (yes/no): ").strip().lower()
+    # Compile the plan/feature matrix used by check_plan_feature (no API cost)
+    pricing_doc = docs_dir / "03_pricing_plans.md"
+    if pricing_doc.exists():
+        matrix = compile_plan_matrix(str(pricing_doc), str(persist_dir.parent / "plan_matrix.json"))
+        print(f"\n📋 Compiled plan matrix: {len(matrix['features'])} features")
 
-    if response not in ['yes', 'y']:
-        print("Aborted.")
-        return
+    # Unsharded stores are written to the active embedding space (see scripts/migrate_embeddings.py)
+    space = SpaceRegistry(str(persist_dir), "datapulse_docs").active()
+    model = "text-embedding-3-small" if args.sharded else space["model"]
 
-    # Step 2: Create embeddings
-    print("\n" + "=" * 70)
-    print("STEP 2: CREATING EMBEDDINGS")
-    print("=" * 70)
+    ids = documents.ids()
+    if args.sharded:
+        store = ShardedVectorStore(str(persist_dir), "datapulse_docs", partition_by=args.partition_by)
+        existing_ids = reusable_ids(store, documents, ids)
+    else:
+        store = VectorStore(persist_directory=str(persist_dir), collection_name=space["name"])
+        existing_ids = store.get_ids()
 
-    embedding_manager = EmbeddingManager(model="text-embedding-3-small")
+    # Exact plan: only chunks not already stored are tokenized, priced and embedded
+    plan = plan_ingest(documents.texts, ids, existing_ids, model=model, batch_size=args.batch_size,
+                       rpm=args.rpm, tpm=args.tpm)
 
-    # Clean and prepare texts
-    texts = [clean_text(doc.content) for doc in documents]
+    print(f"\n📊 Ingestion plan ({model}):")
+    print(f"   Total documents/chunks: {plan.chunks}")
+    if parents:
+        print(f"   Parent sections (stored once, not embedded): {len(parents)}")
+    print(f"   Already embedded (reused): {plan.existing}")
+    print(f"   To embed: {plan.to_embed}")
+    print(f"   Tokens: {plan.tokens:,} (largest chunk {plan.max_input_tokens:,})")
+    print(f"   Cost: ${plan.cost:.6f}")
+    print(f"   Requests: {plan.requests} of up to {plan.batch_size} texts "
+          f"(largest {plan.max_request_tokens:,} tokens)")
+    print(f"   Expected duration: {plan.estimated_seconds:.1f}s (bound by {plan.bound})")
+    if args.max_cost is not None:
+        print(f"   Spend ceiling: ${args.max_cost:.6f}")
+    for warning in plan.warnings:
+        print(f"   ⚠️  {warning}")
 
-    # Create embeddings in batches
-    print(f"\nCreating embeddings for {len(texts)} documents...")
-    embeddings = embedding_manager.create_embeddings_batch(texts, batch_size=100)
+    if args.plan_json:
+        with open(args.plan_json, "w", encoding="utf-8") as f:
+            json.dump({**plan.to_dict(), "max_cost_usd": args.max_cost}, f, indent=2)
 
-    # Print usage
-    embedding_manager.print_usage_summary()
+    if args.plan_only:
+        return
 
-    # Step 3: Store in ChromaDB
-    print("\n" + "=" * 70)
-    print("STEP 3: STORING IN VECTOR DATABASE")
-    print("=" * 70)
+    if args.max_cost is not None and plan.cost > args.max_cost:
+        print(f"\n❌ Plan costs ${plan.cost:.6f}, above the ${args.max_cost:.6f} ceiling. Aborted.")
+        sys.exit(2)
 
-    vector_store = VectorStore(
-        persist_directory=str(persist_dir),
-        collection_name="datapulse_docs"
-    )
+    # Check if OPENAI_API_KEY is set
+    if not os.getenv("OPENAI_API_KEY"):
+        print("\n❌ ERROR: OPENAI_API_KEY environment variable not set!")
+        print("Please add it to your .env file:")
+        print("OPENAI_API_KEY=sk-...")
+        sys.exit(1)
 
-    # Prepare data for storage
-    ids = [doc.id for doc in documents]
-    metadatas = [doc.metadata for doc in documents]
+    if args.tenant:
+        embedding_manager = registry.embedding_manager_for(args.tenant, model=model)
+    else:
+        embedding_manager = EmbeddingManager(model=model)
+    embedding_manager.max_spend = args.max_cost
 
-    # Add to vector store
-    vector_store.add_documents(
-        documents=texts,
-        embeddings=embeddings,
-        metadatas=metadatas,
-        ids=ids
-    )
+    # A ceiling is an explicit approval; otherwise ask, but only someone who can answer
+    if plan.to_embed and not (args.yes or args.max_cost is not None):
+        if not sys.stdin.isatty():
+            print("\n❌ Not a terminal: pass --yes (or --max-cost) to embed without confirmation.")
+            sys.exit(2)
+        print("\n⚠️  This will create embeddings using OpenAI API (costs money)")
+        response = input("Continue? (yes/no): ").strip().lower()
+        if response not in ['yes', 'y']:
+            print("Aborted.")
+            return
+
+    # Refuse up front rather than stopping halfway through a tenant's budget
+    # (a check only: each request is charged as it is sent)
+    if plan.cost:
+        try:
+            embedding_manager.check_budget(plan.cost)
+        except QuotaExceededError as e:
+            print(f"\n❌ {e}")
+            sys.exit(2)
+
+    try:
+        if args.sharded:
+            ingest_sharded(documents, store, embedding_manager, args.batch_size)
+            return
+        vector_store = ingest(documents.select(plan.indices), plan.token_counts, store, embedding_manager,
+                              args.batch_size)
+    except QuotaExceededError as e:
+        embedding_manager.print_usage_summary()
+        print(f"\n❌ Stopped: {e}")
+        print("   Chunks embedded so far are stored; re-running embeds only the rest.")
+        sys.exit(3)
+
+    if parents:
+        vector_store.parents.add(parents)
 
     # Step 4: Verify
     print("\n" + "=" * 70)
-    print("STEP 4: VERIFICATION")
+    print("STEP 3: VERIFICATION")
     print("=" * 70)
 
     info = vector_store.get_collection_info()
@@ -131,5 +233,74 @@ def main():
     print("Run: python src/main.py")
 
 
+def _env_float(name: str):
+    value = os.getenv(name)
+    return float(value) if value else None
+
+
+def ingest(documents, token_counts, vector_store: VectorStore, embedding_manager: EmbeddingManager,
+           batch_size: int = 100, window: int = 1000) -> VectorStore:
+    """
+    Embed planned chunks and store them, one window at a time
+
+    Each window is stored as soon as it is embedded, so a run stopped by the
+    spend ceiling (or a failure) keeps what it paid for.
+    """
+    print("\n" + "=" * 70)
+    print("STEP 2: CREATING EMBEDDINGS AND STORING")
+    print("=" * 70)
+
+    print(f"\nCreating embeddings for {len(documents)} documents...")
+    for start in range(0, len(documents), window):
+        stop = min(start + window, len(documents))
+        part = documents.select(range(start, stop))
+        # Straight into the batch's float32 buffer, with the plan's token counts
+        part.set_embeddings(embedding_manager.create_embeddings_batch(
+            part.texts, batch_size=batch_size, out=array('f'), token_counts=token_counts[start:stop]
+        ))
+        vector_store.add_batch(part)
+
+    embedding_manager.print_usage_summary()
+    return vector_store
+
+
+def deduplicate(documents, threshold: float):
+    """Collapse near-duplicate chunks and report what that saves"""
+    print("\n" + "=" * 70)
+    print("STEP 1b: REMOVING NEAR-DUPLICATE CHUNKS")
+    print("=" * 70)
+
+    kept, stats = ChunkDeduplicator(threshold=threshold).deduplicate(documents)
+    saved_tokens, saved_cost = estimate_embedding_cost(stats["chars_saved"])
+
+    print(f"\n🧹 {stats['input_chunks']} chunks -> {stats['output_chunks']}")
+    print(f"   Near-duplicates merged: {stats['near_duplicates']} (into {stats['clusters']} canonical chunks)")
+    print(f"   Overlap tails dropped: {stats['overlap_tails']}")
+    print(f"   Embeddings and index entries saved: {stats['input_chunks'] - stats['output_chunks']}")
+    print(f"   Tokens saved: ~{saved_tokens:,} (${saved_cost:.6f} per ingest)")
+    return kept
+
+
+def ingest_sharded(documents, store: ShardedVectorStore, embedding_manager: EmbeddingManager, batch_size: int = 100):
+    """Incrementally sync documents into a sharded store (unchanged shards cost nothing)"""
+    print("\n" + "=" * 70)
+    print("STEP 2: SYNCING SHARDS")
+    print("=" * 70)
+
+    report = sync_shards(
+        store,
+        documents,
+        embed_fn=lambda texts: embedding_manager.create_embeddings_batch(texts, batch_size=batch_size)
+    )
+
+    embedding_manager.print_usage_summary()
+
+    info = store.get_collection_info()
+    print(f"\n✅ SUCCESS! {info['count']} documents in {len(info['shards'])} shards "
+          f"(partitioned by {info['partition_by']})")
+    for shard, status in report.items():
+        print(f"   - {shard}: {status} ({info['shards'].get(shard, 0)} documents)")
+
+
 if __name__ == "__main__":
     main()
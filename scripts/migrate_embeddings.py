@@ -0,0 +1,226 @@
+"""Move the knowledge base to another embedding model without downtime
+
+    python scripts/migrate_embeddings.py status
+    python scripts/migrate_embeddings.py build --model text-embedding-3-large --budget 0.50 --tokens-per-minute 200000
+    python scripts/migrate_embeddings.py shadow            # compare spaces, start live shadow reads
+    python scripts/migrate_embeddings.py cutover           # atomically switch queries to the new space
+    python scripts/migrate_embeddings.py drop --space NAME # delete a retired space's collection
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from rag.embedding_spaces import READY, RETIRED, ReembedJob, ShadowComparator, SpaceRegistry
+from rag.embeddings import EmbeddingManager
+from rag.vector_store import VectorStore, RAGRetriever
+from rag.tenants import get_tenant_registry
+from rag.logging_utils import configure_logging
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+configure_logging(level="INFO", style_name="plain", stream=sys.stdout, use_queue=False)
+
+SHADOW_QUERIES = [
+    "What pricing plans do you offer?",
+    "How do I connect to Snowflake?",
+    "Do you support SSO?",
+    "How do I set up Slack alerts?",
+    "What are the API rate limits?",
+    "Why is my BigQuery sync failing?",
+    "How do I export a dashboard?",
+    "Is my data encrypted at rest?",
+]
+
+
+def open_store(spaces: SpaceRegistry, space) -> VectorStore:
+    return VectorStore(persist_directory=spaces.persist_directory, collection_name=space["name"])
+
+
+def embedding_manager(args, model: str) -> EmbeddingManager:
+    if args.tenant:
+        return get_tenant_registry().embedding_manager_for(args.tenant, model=model)
+    return EmbeddingManager(model=model)
+
+
+def cmd_status(spaces: SpaceRegistry, args):
+    active = spaces.active()
+    shadow = spaces.shadow()
+    print(f"Active: {active['name']}")
+    print(f"Shadow: {shadow['name'] if shadow else '-'}")
+    print()
+    for space in spaces.spaces():
+        count = open_store(spaces, space).collection.count()
+        print(f"   v{space['version']} {space['name']}")
+        print(f"      model {space['model']} ({space['dimension']}d), {space['status']}, {count} chunks, "
+              f"re-embedding spend ${space['spent_usd']:.4f} of ${space['budget_usd']:.2f}")
+
+
+def cmd_build(spaces: SpaceRegistry, args):
+    active = spaces.active()
+    if args.model == active["model"]:
+        print(f"❌ {args.model} is already the active space's model")
+        return
+
+    space = spaces.create(args.model)
+    space = spaces.update(space["name"], budget_usd=space["budget_usd"] + args.budget)
+    print(f"Re-embedding {active['name']} -> {space['name']}")
+    print(f"   Budget this run: ${args.budget:.4f}; throttle: "
+          f"{f'{args.tokens_per_minute:,} tokens/min' if args.tokens_per_minute else 'none'}")
+
+    spent_before = space["spent_usd"]
+    job = ReembedJob(
+        source=open_store(spaces, active),
+        target=open_store(spaces, space),
+        embedding_manager=embedding_manager(args, args.model),
+        budget_usd=args.budget,
+        tokens_per_minute=args.tokens_per_minute,
+        batch_size=args.batch_size,
+        on_progress=lambda progress: spaces.update(space["name"], spent_usd=spent_before + progress["spent_usd"])
+    )
+
+    # Runs in the background; Ctrl-C finishes the current batch and stops (resume by re-running)
+    job.start()
+    try:
+        while job.running:
+            job.join(timeout=0.5)
+    except KeyboardInterrupt:
+        print("\nStopping after the current batch...")
+        job.stop()
+        job.join()
+
+    progress = job.progress
+    if progress["status"] == "complete":
+        dimension = progress.get("dimension", space["dimension"])
+        if dimension != space["dimension"]:
+            print(f"⚠️  {args.model} returned {dimension}d vectors (expected {space['dimension']}d)")
+        spaces.update(space["name"], status=READY, dimension=dimension)
+        print(f"\n✅ {space['name']} is ready ({progress['embedded']} chunks embedded this run, "
+              f"${progress['spent_usd']:.4f})")
+        print("Next: python scripts/migrate_embeddings.py shadow")
+    elif progress["status"] == "budget":
+        print(f"\n⏸  Budget reached: {progress['embedded']} embedded, {progress['remaining']} remaining "
+              f"(${progress['spent_usd']:.4f}). Re-run with more --budget to continue.")
+    else:
+        print(f"\n⏸  {progress['status']}: {progress['embedded']} embedded, {progress['remaining']} remaining. "
+              "Re-run to continue.")
+
+
+def cmd_shadow(spaces: SpaceRegistry, args):
+    if args.stop:
+        spaces.set_shadow(None)
+        print("Shadow reads stopped.")
+        return
+
+    candidate = spaces.get(args.space) if args.space else next(
+        (space for space in reversed(spaces.spaces()) if space["status"] == READY), None
+    )
+    if candidate is None:
+        print("❌ No ready space to shadow. Run the build command first.")
+        return
+
+    active = spaces.active()
+    comparator = ShadowComparator(
+        RAGRetriever(open_store(spaces, active), embedding_manager(args, active["model"])),
+        RAGRetriever(open_store(spaces, candidate), embedding_manager(args, candidate["model"])),
+        n_results=args.k
+    )
+
+    queries = SHADOW_QUERIES
+    if args.queries:
+        with open(args.queries, 'r', encoding='utf-8') as f:
+            queries = [line.strip() for line in f if line.strip()]
+
+    print(f"Comparing {active['name']} ({active['model']}) with {candidate['name']} ({candidate['model']})")
+    for query in queries:
+        result = comparator.compare(query)
+        print(f"   overlap@{args.k} {result['overlap']:.2f} {'top-1 ✓' if result['top1'] else 'top-1 ✗'}  {query}")
+
+    stats = comparator.get_stats()
+    print(f"\nMean overlap@{args.k}: {stats['mean_overlap']:.2f}")
+    print(f"Top-1 agreement: {stats['top1_agreement']:.0%}")
+    print(f"Latency p50/p95: primary {stats['primary']['p50_ms']}/{stats['primary']['p95_ms']} ms, "
+          f"shadow {stats['shadow']['p50_ms']}/{stats['shadow']['p95_ms']} ms")
+    comparator.close()
+
+    spaces.set_shadow(candidate["name"])
+    print(f"\nLive shadow reads enabled for {candidate['name']} "
+          f"(KB_SHADOW_SAMPLE_RATE of queries; see the retriever's shadow stats).")
+    print("Next: python scripts/migrate_embeddings.py cutover")
+
+
+def cmd_cutover(spaces: SpaceRegistry, args):
+    previous = spaces.active()
+    space = spaces.cutover(args.space)
+    print(f"✅ Queries now use {space['name']} ({space['model']}).")
+    print(f"   {previous['name']} is retired but kept; cut back over to it to roll back, "
+          "or delete it with the drop command.")
+
+
+def cmd_drop(spaces: SpaceRegistry, args):
+    space = spaces.get(args.space)
+    if space is None:
+        print(f"❌ Unknown space {args.space}")
+        return
+    if space["status"] not in (RETIRED, "building"):
+        print(f"❌ {args.space} is {space['status']}; only retired or unfinished spaces can be dropped")
+        return
+    spaces.remove(args.space)
+    open_store(spaces, space).drop()
+    print(f"Dropped {args.space}.")
+
+
+def main():
+    base_dir = Path(__file__).parent.parent
+    parser = argparse.ArgumentParser(description="Migrate the knowledge base between embedding models")
+    parser.add_argument("--persist-dir", default=None, help="ChromaDB directory (default: data/chroma_db)")
+    parser.add_argument("--tenant", default=None, help="Migrate this tenant's knowledge base (charges its budget)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("status", help="List embedding spaces")
+
+    build = commands.add_parser("build", help="Re-embed the active space into a new one (resumable)")
+    build.add_argument("--model", required=True)
+    build.add_argument("--budget", type=float, required=True, help="Most this run may spend (USD)")
+    build.add_argument("--tokens-per-minute", type=int, default=None)
+    build.add_argument("--batch-size", type=int, default=100)
+
+    shadow = commands.add_parser("shadow", help="Compare a ready space with the active one and shadow live reads")
+    shadow.add_argument("--space", default=None, help="Default: newest ready space")
+    shadow.add_argument("--queries", default=None, help="File with one query per line")
+    shadow.add_argument("-k", type=int, default=5)
+    shadow.add_argument("--stop", action="store_true", help="Stop live shadow reads")
+
+    cutover = commands.add_parser("cutover", help="Switch queries to a ready space")
+    cutover.add_argument("--space", default=None, help="Default: the shadow space")
+
+    drop = commands.add_parser("drop", help="Delete a retired space")
+    drop.add_argument("--space", required=True)
+
+    args = parser.parse_args()
+
+    if args.tenant:
+        persist_dir = Path(args.persist_dir or get_tenant_registry().tenant_dir(args.tenant) / "chroma_db")
+    else:
+        persist_dir = Path(args.persist_dir or base_dir / "data" / "chroma_db")
+
+    if args.command in ("build", "shadow") and not os.getenv("OPENAI_API_KEY"):
+        print("❌ ERROR: OPENAI_API_KEY environment variable not set!")
+        return
+
+    spaces = SpaceRegistry(str(persist_dir), "datapulse_docs")
+    {
+        "status": cmd_status,
+        "build": cmd_build,
+        "shadow": cmd_shadow,
+        "cutover": cmd_cutover,
+        "drop": cmd_drop,
+    }[args.command](spaces, args)
+
+
+if __name__ == "__main__":
+    main()
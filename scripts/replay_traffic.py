@@ -0,0 +1,363 @@
+"""Replay captured traffic (AGENT_CAPTURE_PATH) at N× speed against local stand-ins for the model and embedding APIs"""
+import argparse
+import contextvars
+import hashlib
+import random
+import statistics
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Set
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from agent import core
+from agent.answer_cache import AnswerCache
+from agent.capture import RecordedTurn, load_capture
+from agent.model_router import ModelRouter
+from agent.output import NullSink
+from agent.pre_retrieval import PreRetriever
+from agent.router import IntentRouter
+from agent.sessions import InMemorySessionStore
+from clients import install_client
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Replay state of the turn being driven; copied into prefetch and pre-retrieval threads
+replay_turn: contextvars.ContextVar[Optional['TurnState']] = contextvars.ContextVar("replay_turn", default=None)
+
+
+class TurnState:
+    """Recorded calls still to be served for one replayed turn, and the time spent waiting on them"""
+
+    def __init__(self, turn: RecordedTurn):
+        self.turn = turn
+        self.model_calls = deque(turn.model_calls)
+        self.embedding_calls = deque(turn.embedding_calls)
+        self.tool_calls = list(turn.tool_calls)
+        self.upstream = 0.0
+        self.tools = 0.0
+        self.fallbacks = 0
+        # (start, end) of every stand-in wait, to find the time nothing external was pending
+        self.waits: List = []
+        self._lock = threading.Lock()
+
+    def wait_until(self, deadline: float, kind: str) -> float:
+        """Sleep until `deadline` (perf_counter) and charge the wait to upstream or tools"""
+        start = time.perf_counter()
+        if deadline > start:
+            time.sleep(deadline - start)
+        end = time.perf_counter()
+        with self._lock:
+            setattr(self, kind, getattr(self, kind) + end - start)
+            self.waits.append((start, end))
+        return end - start
+
+    def take_tool_call(self, name: str, tool_input: Dict) -> Optional[Dict]:
+        """Recorded call with this input, else the next recorded call of the tool"""
+        with self._lock:
+            candidates = [c for c in self.tool_calls if c["name"] == name]
+            if not candidates:
+                return None
+            call = next((c for c in candidates if c["input"] == tool_input), candidates[0])
+            self.tool_calls.remove(call)
+            return call
+
+    def external_time(self) -> float:
+        """Length of the union of all wait intervals"""
+        total, end = 0.0, None
+        for start, stop in sorted(self.waits):
+            if end is None or start > end:
+                total += stop - start
+                end = stop
+            elif stop > end:
+                total += stop - end
+                end = stop
+        return total
+
+
+def to_namespace(obj):
+    """Recorded JSON back into attribute objects like the SDK's (tool inputs stay dicts)"""
+    if isinstance(obj, dict):
+        return SimpleNamespace(**{key: value if key == "input" else to_namespace(value) for key, value in obj.items()})
+    if isinstance(obj, list):
+        return [to_namespace(value) for value in obj]
+    return obj
+
+
+class ReplayStream:
+    """Re-emits a recorded model stream, each event at its recorded offset"""
+
+    def __init__(self, call: Dict, latency_scale: float, state: Optional[TurnState]):
+        self.call = call
+        self.latency_scale = latency_scale
+        self.state = state
+        self._done = False
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __iter__(self):
+        for offset, event in self.call["events"]:
+            deadline = self._started + offset * self.latency_scale
+            if self.state is not None:
+                self.state.wait_until(deadline, "upstream")
+            else:
+                time.sleep(max(0.0, deadline - time.perf_counter()))
+            yield to_namespace(event)
+        self._done = True
+
+    def get_final_message(self):
+        if not self._done:
+            for _ in self:
+                pass
+        return to_namespace(self.call["final"])
+
+
+class ReplayAnthropic:
+    """
+    Stand-in for the Anthropic client serving each turn's recorded streams in order
+
+    A turn that makes more model calls than were recorded (e.g. the code
+    now takes another tool round) gets a recorded final answer of median
+    duration and the turn's fallback count goes up.
+    """
+
+    def __init__(self, turns: List[RecordedTurn], latency_scale: float = 1.0):
+        self.latency_scale = latency_scale
+        answers = sorted((call for turn in turns for call in turn.model_calls
+                          if call.get("final") and call["final"]["stop_reason"] != "tool_use"),
+                         key=lambda call: call["duration"])
+        self.fallback = answers[len(answers) // 2] if answers else {
+            "events": [], "final": {"stop_reason": "end_turn", "content": [],
+                                    "usage": {"input_tokens": 0, "output_tokens": 0}}
+        }
+        self.messages = self
+
+    def stream(self, **kwargs) -> ReplayStream:
+        state = replay_turn.get()
+        if state is not None and state.model_calls:
+            call = state.model_calls.popleft()
+        else:
+            call = self.fallback
+            if state is not None:
+                state.fallbacks += 1
+        return ReplayStream(call, self.latency_scale, state)
+
+
+class ReplayEmbeddings:
+    def __init__(self, client: 'ReplayOpenAI'):
+        self.client = client
+
+    def create(self, model: str, input, **kwargs):
+        state = replay_turn.get()
+        try:
+            call = state.embedding_calls.popleft() if state is not None else None
+        except IndexError:
+            call = None
+        if call is None:
+            call = self.client.fallback
+            if state is not None:
+                state.fallbacks += 1
+        deadline = time.perf_counter() + call["duration"] * self.client.latency_scale
+        if state is not None:
+            state.wait_until(deadline, "upstream")
+        else:
+            time.sleep(max(0.0, deadline - time.perf_counter()))
+        texts = input if isinstance(input, list) else [input]
+        dimension = call.get("dimension") or 1536
+        return SimpleNamespace(
+            data=[SimpleNamespace(embedding=self.client.vector(text, dimension)) for text in texts],
+            usage=SimpleNamespace(prompt_tokens=sum(len(text) // 4 for text in texts))
+        )
+
+
+class ReplayOpenAI:
+    """Stand-in for the OpenAI client: recorded embedding latencies, deterministic unit vectors"""
+
+    def __init__(self, turns: List[RecordedTurn], latency_scale: float = 1.0):
+        self.latency_scale = latency_scale
+        calls = sorted((call for turn in turns for call in turn.embedding_calls), key=lambda call: call["duration"])
+        self.fallback = calls[len(calls) // 2] if calls else {"duration": 0.0, "dimension": 1536}
+        self.embeddings = ReplayEmbeddings(self)
+
+    @staticmethod
+    def vector(text: str, dimension: int) -> List[float]:
+        rng = random.Random(int(hashlib.md5(text.encode()).hexdigest()[:8], 16))
+        values = [rng.gauss(0, 1) for _ in range(dimension)]
+        norm = sum(v * v for v in values) ** 0.5
+        return [v / norm for v in values]
+
+
+def replay_tool(name: str, latency_scale: float):
+    """Tool function answering from the turn's recorded calls, after the recorded duration"""
+    def tool(**tool_input):
+        state = replay_turn.get()
+        call = state.take_tool_call(name, tool_input) if state is not None else None
+        if call is None:
+            if state is not None:
+                state.fallbacks += 1
+            return "No recorded result."
+        state.wait_until(time.perf_counter() + call["duration"] * latency_scale, "tools")
+        return call["output"]
+
+    return tool
+
+
+class Replayer:
+    """Drives run_agent_streaming for each recorded turn with the recorded features enabled"""
+
+    def __init__(self, turns: List[RecordedTurn], latency_scale: float, live_tools: Set[str], live_kb: bool):
+        self.client = ReplayAnthropic(turns, latency_scale)
+        configs = [turn.config for turn in turns]
+        self.router = IntentRouter.train() if any(c.get("router") for c in configs) else None
+        self.model_router = ModelRouter(classifier=self.router.classifier if self.router else None) \
+            if any(c.get("model_routing") for c in configs) else None
+        # Both search the knowledge base directly (not through a tool), so they need it live
+        self.pre_retriever = PreRetriever() if live_kb and any(c.get("pre_retrieval") for c in configs) else None
+        self.answer_cache = AnswerCache() if live_kb and any(c.get("answer_cache") for c in configs) else None
+        # Recorded conversations get their history back, so later turns send what they sent when recorded
+        self.session_store = InMemorySessionStore(ttl=None) if any(c.get("session") for c in configs) else None
+
+        for name in list(core.TOOL_FUNCTIONS):
+            if name not in live_tools:
+                core.TOOL_FUNCTIONS[name] = replay_tool(name, latency_scale)
+
+    def run_turn(self, turn: RecordedTurn, scheduled: float, round_: int = 0) -> Dict:
+        state = TurnState(turn)
+        replay_turn.set(state)
+        config = turn.config
+        # Each --repeat round replays the conversation from the start
+        session_id = f"{config['session']}#{round_}" if config.get("session") else None
+        started = time.perf_counter()
+        core.run_agent_streaming(
+            turn.message,
+            client=self.client,
+            prefetch=bool(config.get("prefetch")),
+            pre_retriever=self.pre_retriever if config.get("pre_retrieval") else None,
+            sink=NullSink(),
+            answer_cache=self.answer_cache if config.get("answer_cache") else None,
+            router=self.router if config.get("router") else None,
+            model_router=self.model_router if config.get("model_routing") else None,
+            session_id=session_id,
+            session_store=self.session_store if session_id else None
+        )
+        finished = time.perf_counter()
+        service = finished - started
+        return {
+            "queued": started - scheduled,
+            "latency": finished - scheduled,
+            "service": service,
+            "upstream": state.upstream,
+            "tools": state.tools,
+            "own": max(0.0, service - state.external_time()),
+            "fallbacks": state.fallbacks,
+            "recorded": turn.duration,
+        }
+
+
+def percentiles(values: List[float]) -> str:
+    if len(values) < 2:
+        value = values[0] * 1000 if values else 0.0
+        return f"p50 {value:>8.1f}  p95 {value:>8.1f}  p99 {value:>8.1f} ms"
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return f"p50 {cuts[49] * 1000:>8.1f}  p95 {cuts[94] * 1000:>8.1f}  p99 {cuts[98] * 1000:>8.1f} ms"
+
+
+def peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("capture", help="Capture file written with AGENT_CAPTURE_PATH")
+    parser.add_argument("--speed", type=float, default=1.0, help="Compress the gaps between turn arrivals N×")
+    parser.add_argument("--concurrency", type=int, default=16, help="Turns in flight at most")
+    parser.add_argument("--repeat", type=int, default=1, help="Play the capture this many times back to back")
+    parser.add_argument("--latency-scale", type=float, default=1.0,
+                        help="Multiply recorded upstream and tool latencies (0 = isolate our own code)")
+    parser.add_argument("--live-tools", default="",
+                        help="Comma-separated tools to run for real instead of replaying their output")
+    parser.add_argument("--live-kb", action="store_true",
+                        help="Enable recorded pre-retrieval and answer caching (needs the knowledge base)")
+    args = parser.parse_args()
+
+    turns = load_capture(args.capture)
+    if not turns:
+        print(f"No turns in {args.capture}")
+        return
+    live_tools = {name for name in args.live_tools.split(",") if name}
+    replayer = Replayer(turns, args.latency_scale, live_tools, args.live_kb)
+    install_client("openai", ReplayOpenAI(turns, args.latency_scale))
+
+    origin = turns[0].start
+    span = max(turn.start + turn.duration for turn in turns) - origin
+    total = len(turns) * args.repeat
+    print("=" * 70)
+    print("TRAFFIC REPLAY")
+    print("=" * 70)
+    print(f"{len(turns)} recorded turns over {span:.1f} s, "
+          f"{sum(len(t.model_calls) for t in turns)} model calls, "
+          f"{sum(len(t.tool_calls) for t in turns)} tool calls, "
+          f"{sum(len(t.embedding_calls) for t in turns)} embedding calls")
+    print(f"Replaying {total} turns at {args.speed:g}× arrival speed, concurrency {args.concurrency}, "
+          f"latency scale {args.latency_scale:g}, live tools: {', '.join(sorted(live_tools)) or 'none'}")
+
+    executor = ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="replay")
+    futures = []
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    for round_ in range(args.repeat):
+        for turn in turns:
+            # Open loop: arrivals follow the recorded schedule even when the pool is saturated
+            scheduled = start + (round_ * span + turn.start - origin) / args.speed
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(executor.submit(replayer.run_turn, turn, scheduled, round_))
+    results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+    executor.shutdown()
+
+    column = lambda key: [r[key] for r in results]
+    print(f"\nThroughput: {total / elapsed:.1f} turns/s ({total} turns in {elapsed:.1f} s)")
+    print(f"\n{'':<22} (per turn)")
+    print(f"{'Recorded turn':<22} {percentiles(column('recorded'))}")
+    print(f"{'Latency (incl. queue)':<22} {percentiles(column('latency'))}")
+    print(f"{'Queued':<22} {percentiles(column('queued'))}")
+    print(f"{'Service time':<22} {percentiles(column('service'))}")
+    print(f"{'  upstream (replayed)':<22} {percentiles(column('upstream'))}")
+    print(f"{'  tools (replayed)':<22} {percentiles(column('tools'))}")
+    print(f"{'  our code':<22} {percentiles(column('own'))}")
+    own = sum(column("own"))
+    print(f"\nOur code: {own:.2f} s of {sum(column('service')):.2f} s service time "
+          f"({own / max(sum(column('service')), 1e-9):.1%}), "
+          f"{total / own if own else float('inf'):.0f} turns per second of own time")
+    rss = peak_rss_mb()
+    print(f"CPU: {cpu:.2f} s process time, {cpu / total * 1000:.1f} ms per turn (stand-ins included)"
+          + (f", peak RSS {rss:.0f} MB" if rss is not None else ""))
+    fallbacks = sum(column("fallbacks"))
+    if fallbacks:
+        print(f"⚠️  {fallbacks} calls had no recorded counterpart and were served a fallback "
+              f"(the code path differs from the capture)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Local stand-in for the Anthropic streaming API (for benchmarks and offline runs)"""
+import json
+import time
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+def _tokens(text: str) -> List[str]:
+    """Split text into word-ish stream chunks"""
+    words = text.split(" ")
+    return [word + (" " if i < len(words) - 1 else "") for i, word in enumerate(words)]
+
+
+class StubStream:
+    """Replays one scripted assistant message as Anthropic stream events"""
+
+    def __init__(self, blocks: List[Dict], token_delay: float, first_token_delay: float,
+                 stop_delay: float, usage: Dict):
+        self.blocks = blocks
+        self.token_delay = token_delay
+        self.first_token_delay = first_token_delay
+        self.stop_delay = stop_delay
+        self.usage = usage
+        self._final = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __iter__(self):
+        time.sleep(self.first_token_delay)
+        content = []
+        for index, block in enumerate(self.blocks):
+            if block["type"] == "text":
+                yield SimpleNamespace(type="content_block_start", index=index,
+                                      content_block=SimpleNamespace(type="text", text=""))
+                for token in _tokens(block["text"]):
+                    time.sleep(self.token_delay)
+                    yield SimpleNamespace(type="content_block_delta", index=index,
+                                          delta=SimpleNamespace(type="text_delta", text=token))
+                content.append(SimpleNamespace(type="text", text=block["text"]))
+            else:
+                yield SimpleNamespace(type="content_block_start", index=index,
+                                      content_block=SimpleNamespace(type="tool_use", id=block["id"],
+                                                                    name=block["name"], input={}))
+                # Stream the JSON arguments in small pieces, like the real API
+                raw = json.dumps(block["input"])
+                for start in range(0, len(raw), 8):
+                    time.sleep(self.token_delay)
+                    yield SimpleNamespace(type="content_block_delta", index=index,
+                                          delta=SimpleNamespace(type="input_json_delta",
+                                                                partial_json=raw[start:start + 8]))
+                content.append(SimpleNamespace(type="tool_use", id=block["id"],
+                                               name=block["name"], input=block["input"]))
+            yield SimpleNamespace(type="content_block_stop", index=index)
+
+        time.sleep(self.stop_delay)
+        stop_reason = "tool_use" if any(b["type"] == "tool_use" for b in self.blocks) else "end_turn"
+        self._final = SimpleNamespace(
+            stop_reason=stop_reason,
+            content=content,
+            usage=SimpleNamespace(**self.usage)
+        )
+        yield SimpleNamespace(type="message_stop")
+
+    def get_final_message(self):
+        if self._final is None:
+            for _ in self:
+                pass
+        return self._final
+
+
+def default_script(request: Dict) -> List[Dict]:
+    """
+    Default conversation: search the docs for the user's question, then answer
+
+    If the first user message already carries a <documentation> block
+    (pre-retrieval), answer straight away.
+
+    Args:
+        request: kwargs passed to messages.stream
+
+    Returns:
+        Content blocks for the assistant message
+    """
+    messages = request["messages"]
+    last = messages[-1]["content"]
+    has_tool_result = isinstance(last, list) and any(
+        isinstance(part, dict) and part.get("type") == "tool_result" for part in last
+    )
+    pre_retrieved = isinstance(last, list) and any(
+        isinstance(part, dict) and part.get("text", "").startswith("<documentation>") for part in last
+    )
+    if not has_tool_result and not pre_retrieved:
+        question = last if isinstance(last, str) else next(
+            (part.get("text", "") for part in last if isinstance(part, dict) and part.get("type") == "text"), ""
+        )
+        return [
+            {"type": "text", "text": "Let me check the documentation for that."},
+            {"type": "tool_use", "id": f"toolu_{len(messages)}", "name": "search_documentation",
+             "input": {"query": question}},
+        ]
+    return [{"type": "text", "text": "Based on the documentation, here is how to do that. " * 8}]
+
+
+class StubMessages:
+    def __init__(self, client: 'StubAnthropic'):
+        self.client = client
+
+    def stream(self, **kwargs) -> StubStream:
+        self.client.calls.append(kwargs)
+        blocks = self.client.script(kwargs)
+        output_tokens = sum(len(_tokens(b.get("text", json.dumps(b.get("input"))))) for b in blocks)
+        usage = {"input_tokens": len(json.dumps(kwargs.get("messages"), default=str)) // 4,
+                 "output_tokens": output_tokens}
+        first_token_delay, token_delay = self.client.model_delays.get(
+            kwargs.get("model"), (self.client.first_token_delay, self.client.token_delay)
+        )
+        return StubStream(blocks, token_delay, first_token_delay, self.client.stop_delay, usage)
+
+
+class StubAnthropic:
+    """
+    Drop-in for `anthropic.Anthropic` with scripted, latency-shaped streams
+
+    Args:
+        script: Callable mapping the request kwargs to assistant content blocks
+        token_delay: Seconds between streamed chunks
+        first_token_delay: Seconds before the first event (time to first token)
+        stop_delay: Seconds between the last content block and message_stop
+        model_delays: Per-model (first_token_delay, token_delay) overrides
+    """
+
+    def __init__(self, script: Optional[Callable[[Dict], List[Dict]]] = None, token_delay: float = 0.02,
+                 first_token_delay: float = 0.4, stop_delay: float = 0.05,
+                 model_delays: Optional[Dict[str, Tuple[float, float]]] = None):
+        self.script = script or default_script
+        self.token_delay = token_delay
+        self.first_token_delay = first_token_delay
+        self.stop_delay = stop_delay
+        self.model_delays = model_delays or {}
+        self.calls: List[Dict] = []
+        self.messages = StubMessages(self)
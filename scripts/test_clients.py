@@ -0,0 +1,252 @@
+"""Exercise the shared client layer against local fake OpenAI/Anthropic servers"""
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from clients import CircuitOpenError, get_openai_client, get_upstream, reset_clients
+from rag.logging_utils import configure_logging
+
+configure_logging(level="WARNING", style_name="plain", stream=sys.stdout, use_queue=False)
+
+
+class FakeUpstream:
+    """Scripted behaviour shared by the fake server's handler threads"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.plan = []           # per-request actions, consumed in order
+        self.default = "ok"      # action once the plan is exhausted
+        self.delay = 2.0         # seconds for "slow"
+        self.requests = 0
+        self.connections = set()
+
+    def script(self, plan, default="ok"):
+        with self.lock:
+            self.plan = list(plan)
+            self.default = default
+            self.requests = 0
+            self.connections = set()
+
+    def next_action(self, peer) -> str:
+        with self.lock:
+            self.requests += 1
+            self.connections.add(peer)
+            return self.plan.pop(0) if self.plan else self.default
+
+
+fake = FakeUpstream()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: dict):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        action = fake.next_action(self.client_address)
+
+        if action == "slow":
+            time.sleep(fake.delay)
+        if action == "throttle":
+            return self._send(529, {"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded"}})
+        if action == "fail":
+            if self.path.endswith("/messages"):
+                return self._send(500, {"type": "error", "error": {"type": "api_error",
+                                                                   "message": "upstream exploded"}})
+            return self._send(500, {"error": {"message": "upstream exploded", "type": "server_error"}})
+
+        inputs = request.get("input", [])
+        inputs = [inputs] if isinstance(inputs, str) else inputs
+        self._send(200, {
+            "object": "list",
+            "data": [{"object": "embedding", "index": i, "embedding": [1.0, float(len(text) % 7), 0.5]}
+                     for i, text in enumerate(inputs)],
+            "model": request.get("model", "text-embedding-3-small"),
+            "usage": {"prompt_tokens": len(inputs), "total_tokens": len(inputs)}
+        })
+
+
+class QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients that gave up on a stalled request (deadline/hedge) close the socket early
+        pass
+
+
+def check(label: str, condition: bool, detail: str = ""):
+    print(f"{'✅' if condition else '❌'} {label}" + (f" ({detail})" if detail else ""))
+    return condition
+
+
+def embed(text: str = "hello"):
+    client = get_openai_client()
+    upstream = get_upstream("openai_embeddings")
+    return upstream.call(
+        lambda timeout: client.embeddings.create(model="text-embedding-3-small", input=text, timeout=timeout),
+        hedge=True
+    )
+
+
+def main():
+    server = QuietServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}/v1"
+
+    os.environ.update({
+        "OPENAI_API_KEY": "test",
+        "OPENAI_BASE_URL": base_url,
+        "ANTHROPIC_API_KEY": "test",
+        "ANTHROPIC_BASE_URL": f"http://127.0.0.1:{server.server_port}",
+        "UPSTREAM_HEDGE_AFTER": "0.3",
+        "EMBEDDING_DEADLINE": "1.5",
+        "UPSTREAM_BREAKER_FAILURES": "3",
+        "UPSTREAM_BREAKER_RESET": "60",
+    })
+
+    print("=" * 70)
+    print("CLIENT LAYER CHECKS (local fake servers)")
+    print("=" * 70)
+    results = []
+
+    # 1. Keep-alive pooling: sequential calls share one connection
+    reset_clients()
+    fake.script([], default="ok")
+    for _ in range(10):
+        embed()
+    results.append(check("Keep-alive pool reuses connections", len(fake.connections) == 1,
+                         f"{fake.requests} requests over {len(fake.connections)} connection(s)"))
+
+    # 2. Bounded retries: two 500s, then success
+    reset_clients()
+    fake.script(["fail", "fail"], default="ok")
+    embed()
+    stats = get_upstream("openai_embeddings").stats.snapshot()
+    results.append(check("Retries transient failures", stats["retries"] == 2, f"retries={stats['retries']}"))
+
+    # 3. Hedging: first request stalls, hedged duplicate answers
+    reset_clients()
+    fake.script(["slow"], default="ok")
+    start = time.perf_counter()
+    embed()
+    elapsed = time.perf_counter() - start
+    stats = get_upstream("openai_embeddings").stats.snapshot()
+    results.append(check("Hedged request beats a stalled one", stats["hedges"] == 1 and elapsed < fake.delay,
+                         f"{elapsed * 1000:.0f} ms, hedges={stats['hedges']}"))
+
+    # 4. Deadline: every request stalls past the 1.5 s deadline
+    reset_clients()
+    fake.script([], default="slow")
+    start = time.perf_counter()
+    try:
+        embed()
+        timed_out = False
+    except Exception:
+        timed_out = True
+    elapsed = time.perf_counter() - start
+    results.append(check("Per-call deadline bounds latency", timed_out and elapsed < fake.delay + 0.5,
+                         f"gave up after {elapsed * 1000:.0f} ms"))
+
+    # 5. Circuit breaker: persistent failures open it, then calls fail fast
+    reset_clients()
+    fake.script([], default="fail")
+    for _ in range(3):
+        try:
+            embed()
+        except Exception:
+            pass
+    before = fake.requests
+    start = time.perf_counter()
+    try:
+        embed()
+        rejected = False
+    except CircuitOpenError:
+        rejected = True
+    results.append(check("Open breaker fails fast without a request",
+                         rejected and fake.requests == before,
+                         f"{(time.perf_counter() - start) * 1000:.1f} ms, state="
+                         f"{get_upstream('openai_embeddings').breaker.state}"))
+
+    # 6. Degraded retrieval: with the breaker open, search uses the local lexical index
+    from rag.embeddings import EmbeddingManager
+    from rag.snapshot import SnapshotStore, write_snapshot
+    from rag.vector_store import RAGRetriever
+
+    chunks = [
+        ("c0", "Connect BigQuery with a service account JSON key.", {"source": "06_bigquery_integration.md", "section": "Setup", "chunk_id": 0}),
+        ("c1", "Slack alerts are available on Pro and Enterprise plans.", {"source": "03_alerts.md", "section": "Slack", "chunk_id": 0}),
+        ("c2", "Freshness monitors check when data was last updated.", {"source": "02_monitors.md", "section": "Freshness", "chunk_id": 0}),
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "kb.snapshot")
+        write_snapshot(path, [c[0] for c in chunks], [c[1] for c in chunks], [c[2] for c in chunks],
+                       [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]], [10, 10, 10], "text-embedding-3-small")
+        store = SnapshotStore(path)
+        retriever = RAGRetriever(store, EmbeddingManager())
+        context = retriever.search_with_context("How do I set up Slack alerts?", n_results=1)
+        results.append(check("Open breaker degrades to lexical retrieval", "03_alerts.md" in context,
+                             context.splitlines()[0] if context else "no context"))
+        del retriever
+        store.close()
+
+    # 7. Model calls: a failing Anthropic upstream trips its breaker
+    from agent.core import run_agent_streaming
+    from agent.output import CollectingSink
+
+    os.environ["UPSTREAM_BREAKER_FAILURES"] = "1"
+    reset_clients()
+    fake.script([], default="fail")
+    try:
+        run_agent_streaming("hi", sink=CollectingSink())
+    except Exception:
+        pass
+    sink = CollectingSink()
+    run_agent_streaming("hi again", sink=sink)
+    logged = [e.data["message"] for e in sink.events if e.type == "log"]
+    results.append(check("Open model breaker returns a graceful message", bool(logged),
+                         logged[0] if logged else "no message"))
+
+    # 8. Throttling (529) goes to on_throttle and doesn't trip the breaker
+    reset_clients()
+    fake.script([], default="throttle")
+    attempts = []
+
+    def on_throttle(error, attempt):
+        attempts.append(attempt)
+        return attempt < 3
+
+    try:
+        run_agent_streaming("hi", sink=CollectingSink(), on_throttle=on_throttle)
+        raised = False
+    except Exception:
+        raised = True
+    breaker = get_upstream("anthropic_messages").breaker
+    results.append(check("Throttled model calls are retried without tripping the breaker",
+                         raised and attempts == [1, 2, 3] and breaker.state == "closed",
+                         f"on_throttle attempts {attempts}, state={breaker.state}"))
+
+    print(f"\n{sum(results)}/{len(results)} checks passed")
+    server.shutdown()
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,10 +7,12 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
 
 from rag.retriever import get_retriever
+from rag.logging_utils import configure_logging
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
+configure_logging(level="INFO", style_name="plain", stream=sys.stdout, use_queue=False)
 
 
 def test_search(query: str):
@@ -0,0 +1,255 @@
+"""Answer cache: replay whole answers to repeated questions over unchanged documentation"""
+import hashlib
+import os
+import re
+import threading
+import time
+from array import array
+from typing import Callable, Dict, List, Optional
+
+from agent.output import AgentEvent, OutputSink, TEXT_DELTA, TOOL_START, USAGE
+from rag.tenants import current_tenant
+
+_WORD_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+# Answers that used any other tool (e.g. created a ticket) have side effects and are never cached
+CACHEABLE_TOOLS = {"search_documentation", "check_plan_feature"}
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase words only: "What's the Pro plan?" == "what's the pro plan" """
+    return " ".join(_WORD_RE.findall(question.lower()))
+
+
+def _default_chunk_ids(question: str) -> List[str]:
+    from rag.retriever import get_retriever
+
+    retriever = get_retriever()
+    if not retriever.ready:
+        return []
+    return [doc['id'] for doc in retriever.get_relevant_docs(question, n_results=3)]
+
+
+class CountMinSketch:
+    """
+    Approximate frequency counter in fixed memory (small saturating counters)
+
+    Counts are halved every `sample_size` increments so popularity decays
+    and yesterday's hot question doesn't pin the cache forever.
+    """
+
+    MAX_COUNT = 15
+
+    def __init__(self, width: int = 4096, depth: int = 4, sample_size: Optional[int] = None):
+        self.width = width
+        self.depth = depth
+        self.sample_size = sample_size or width * 10
+        self.tables = [array('B', bytes(width)) for _ in range(depth)]
+        self.additions = 0
+
+    def _indexes(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=8 * self.depth).digest()
+        for row in range(self.depth):
+            yield row, int.from_bytes(digest[row * 8:(row + 1) * 8], 'little') % self.width
+
+    def increment(self, key: str):
+        for row, index in self._indexes(key):
+            if self.tables[row][index] < self.MAX_COUNT:
+                self.tables[row][index] += 1
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            self._age()
+
+    def estimate(self, key: str) -> int:
+        return min(self.tables[row][index] for row, index in self._indexes(key))
+
+    def _age(self):
+        for table in self.tables:
+            for i in range(self.width):
+                table[i] >>= 1
+        self.additions //= 2
+
+
+class CachedAnswer:
+    """Recorded text of one answer plus the tokens it cost to generate"""
+
+    __slots__ = ("text_events", "input_tokens", "output_tokens", "created")
+
+    def __init__(self, text_events: List[str], input_tokens: int, output_tokens: int):
+        self.text_events = text_events
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.created = time.time()
+
+
+class AnswerRecorder(OutputSink):
+    """Passes events through to a sink while recording what a cache entry needs"""
+
+    def __init__(self, inner: OutputSink):
+        self.inner = inner
+        self.text_events: List[str] = []
+        self.tools: List[str] = []
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    def emit(self, event: AgentEvent):
+        if event.type == TEXT_DELTA:
+            self.text_events.append(event.data["text"])
+        elif event.type == TOOL_START:
+            self.tools.append(event.data["name"])
+        elif event.type == USAGE:
+            self.input_tokens += event.data["input_tokens"]
+            self.output_tokens += event.data["output_tokens"]
+        self.inner.emit(event)
+
+    def flush(self):
+        self.inner.flush()
+
+    def cacheable(self) -> bool:
+        return bool(self.text_events) and all(tool in CACHEABLE_TOOLS for tool in self.tools)
+
+    def answer(self) -> CachedAnswer:
+        return CachedAnswer(self.text_events, self.input_tokens, self.output_tokens)
+
+
+class AnswerCache:
+    """
+    Frequency-aware cache of complete agent answers
+
+    Keys are the normalized question plus the ids of the chunks retrieved
+    for it. Chunk ids embed a content hash, so editing or re-ingesting the
+    relevant documentation changes the key and old answers are never served.
+
+    Admission and eviction follow TinyLFU: every lookup is counted in a
+    count-min sketch; when the cache is full, a new answer only replaces the
+    least-frequently-asked entry if its question has been asked more often.
+    One-off questions therefore can't flush the FAQ answers out.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 256,
+        chunk_ids_fn: Optional[Callable[[str], List[str]]] = None,
+        salt: str = "",
+        replay_chunk_delay: float = 0.0
+    ):
+        """
+        Initialize answer cache
+
+        Args:
+            capacity: Maximum cached answers
+            chunk_ids_fn: Returns the ids of the chunks retrieved for a question (used when
+                key_for isn't given them)
+            salt: Mixed into every key (e.g. model + system prompt version)
+            replay_chunk_delay: Seconds between replayed text deltas (0 replays at once)
+        """
+        self.capacity = capacity
+        self.chunk_ids_fn = chunk_ids_fn or _default_chunk_ids
+        self.salt = salt
+        self.replay_chunk_delay = replay_chunk_delay
+        self.entries: Dict[str, CachedAnswer] = {}
+        self.sketch = CountMinSketch(width=max(1024, capacity * 16))
+        self._lock = threading.Lock()
+
+        self.lookups = 0
+        self.hits = 0
+        self.admissions = 0
+        self.rejections = 0
+        self.evictions = 0
+        self.saved_input_tokens = 0
+        self.saved_output_tokens = 0
+
+    @classmethod
+    def from_env(cls, salt: str = "") -> Optional['AnswerCache']:
+        """Build from AGENT_ANSWER_CACHE* environment variables (None if disabled)"""
+        if os.getenv("AGENT_ANSWER_CACHE", "0") != "1":
+            return None
+        return cls(capacity=int(os.getenv("AGENT_ANSWER_CACHE_SIZE", "256")), salt=salt)
+
+    def key_for(self, question: str, chunk_ids: Optional[List[str]] = None) -> Optional[str]:
+        """
+        Cache key for a question (None if nothing was retrieved to anchor it)
+
+        Answers not grounded in retrieved chunks can't be invalidated by
+        knowledge-base changes, so they are not cached.
+
+        Args:
+            question: User message
+            chunk_ids: Chunks already retrieved for it (e.g. by pre-retrieval);
+                chunk_ids_fn is only called when these aren't known
+        """
+        if chunk_ids is None:
+            try:
+                chunk_ids = self.chunk_ids_fn(question)
+            except Exception:
+                return None
+        if not chunk_ids:
+            return None
+        # Tenants never share answers, even over identical documentation
+        scope = current_tenant.get() or ""
+        material = "\x1f".join([self.salt, scope, normalize_question(question), *sorted(chunk_ids)])
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[CachedAnswer]:
+        """Look up an answer, counting the access towards its frequency"""
+        with self._lock:
+            self.lookups += 1
+            self.sketch.increment(key)
+            answer = self.entries.get(key)
+            if answer is not None:
+                self.hits += 1
+                self.saved_input_tokens += answer.input_tokens
+                self.saved_output_tokens += answer.output_tokens
+            return answer
+
+    def put(self, key: str, answer: CachedAnswer) -> bool:
+        """
+        Offer an answer to the cache
+
+        Returns:
+            True if it was admitted
+        """
+        with self._lock:
+            if key in self.entries or len(self.entries) < self.capacity:
+                self.entries[key] = answer
+                self.admissions += 1
+                return True
+
+            victim = min(self.entries, key=self.sketch.estimate)
+            if self.sketch.estimate(key) <= self.sketch.estimate(victim):
+                self.rejections += 1
+                return False
+
+            del self.entries[victim]
+            self.evictions += 1
+            self.entries[key] = answer
+            self.admissions += 1
+            return True
+
+    def replay(self, answer: CachedAnswer, sink: OutputSink):
+        """Stream a cached answer through a sink as if it were being generated"""
+        for text in answer.text_events:
+            sink.text(text)
+            if self.replay_chunk_delay:
+                time.sleep(self.replay_chunk_delay)
+        sink.turn_end()
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+    def get_stats(self) -> Dict:
+        """Hit rate, admission/eviction counts and tokens not spent thanks to hits"""
+        with self._lock:
+            return {
+                "entries": len(self.entries),
+                "capacity": self.capacity,
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+                "admissions": self.admissions,
+                "rejections": self.rejections,
+                "evictions": self.evictions,
+                "saved_input_tokens": self.saved_input_tokens,
+                "saved_output_tokens": self.saved_output_tokens,
+            }
@@ -0,0 +1,291 @@
+"""Bulk offline question answering: questions from JSONL, batched retrieval, concurrent model calls, resumable output"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import islice
+from typing import Callable, Dict, Iterator, List, Optional, Set
+
+from agent.core import run_agent_streaming
+from agent.model_router import ModelRouter
+from agent.output import LOG, TOOL_START, USAGE, CollectingSink
+from agent.pre_retrieval import PreRetriever
+from rag.logging_utils import get_logger
+from rag.tenants import llm_cost, tenant_scope
+
+logger = get_logger("agent.batch")
+
+
+def _default_search_batch(queries: List[str], max_tokens: int, max_distance: Optional[float]) -> List[str]:
+    from rag.retriever import get_retriever
+
+    retriever = get_retriever()
+    if not retriever.ready:
+        return [""] * len(queries)
+    return retriever.search_batch(queries, n_results=3, max_tokens=max_tokens, max_distance=max_distance)
+
+
+def read_questions(path: str) -> Iterator[Dict]:
+    """
+    Read questions from JSONL
+
+    Each line is an object with a "question" and an optional "id" (default:
+    the line number). Other fields are copied to the result.
+    """
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if not record.get("question"):
+                raise ValueError(f"{path}:{number}: missing \"question\"")
+            record["id"] = str(record.get("id", number))
+            yield record
+
+
+def load_checkpoint(path: str, retry_errors: bool = False) -> Set[str]:
+    """
+    Ids already answered in an output file
+
+    A trailing partial line (the process died mid-write) is cut off so
+    appending continues from a clean line boundary.
+
+    Args:
+        path: Output JSONL of an earlier run
+        retry_errors: Don't count failed questions as done
+    """
+    done: Set[str] = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "rb+") as f:
+        good = 0
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            if not line.endswith(b"\n"):
+                break
+            good += len(line)
+            if not (retry_errors and record.get("error")):
+                done.add(str(record["id"]))
+        f.truncate(good)
+    return done
+
+
+class BatchContext(PreRetriever):
+    """Pre-retriever whose context was already fetched by the batch search"""
+
+    def __init__(self, context: str):
+        super().__init__(search_fn=lambda *args: context)
+        self.context = context
+
+    def start(self, user_message: str) -> Future:
+        future = Future()
+        future.set_result(self.context)
+        return future
+
+
+class BatchAnswerer:
+    """
+    Answers a JSONL file of questions into a JSONL file of results
+
+    Questions are read in retrieval batches: each batch's knowledge-base
+    search is one embedding request and one vector query, and its context is
+    injected like pre-retrieval, so most questions need a single model call.
+    Model calls run on `concurrency` threads while the next batch is being
+    retrieved. Rate-limit and overload errors pause every worker and retry
+    the model call that hit them (never the whole question, so tools that
+    already ran aren't repeated and the usage of every call is counted).
+
+    Each result is appended and flushed as soon as it completes; the output
+    file is the checkpoint, so re-running with the same files answers only
+    what is missing.
+    """
+
+    def __init__(
+        self,
+        client=None,
+        concurrency: int = 8,
+        batch_size: int = 64,
+        max_tokens: int = 1500,
+        max_distance: Optional[float] = 1.2,
+        max_attempts: int = 5,
+        backoff: float = 2.0,
+        model_router: Optional[ModelRouter] = None,
+        tenant: Optional[str] = None,
+        search_batch_fn: Optional[Callable[[List[str], int, Optional[float]], List[str]]] = None
+    ):
+        """
+        Initialize batch answerer
+
+        Args:
+            client: Anthropic client (defaults to the shared pooled client)
+            concurrency: Model calls in flight (size this to the rate limit)
+            batch_size: Questions per retrieval batch
+            max_tokens: Token budget for each question's injected context
+            max_distance: Relevance threshold for injected context
+            max_attempts: Tries per model call on rate-limit/overload errors
+            backoff: Initial pause after a rate-limit error (doubles per attempt)
+            model_router: Pick a fast or strong model per call
+            tenant: Answer from this tenant's knowledge base and charge its budgets
+            search_batch_fn: Batch search (queries, max_tokens, max_distance) -> contexts
+        """
+        self.client = client
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.max_tokens = max_tokens
+        self.max_distance = max_distance
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.model_router = model_router
+        self.tenant = tenant
+        self.search_batch_fn = search_batch_fn or _default_search_batch
+
+        self._lock = threading.Lock()
+        self._pause_until = 0.0
+        self.stats = {"answered": 0, "failed": 0, "skipped": 0, "retrieval_batches": 0, "retries": 0,
+                      "model_calls": 0, "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0}
+
+    def _retrieve(self, questions: List[str]) -> List[str]:
+        try:
+            if self.tenant is not None:
+                with tenant_scope(self.tenant):
+                    return self.search_batch_fn(questions, self.max_tokens, self.max_distance)
+            return self.search_batch_fn(questions, self.max_tokens, self.max_distance)
+        except Exception as e:
+            # The model can still search for itself
+            logger.warning("Batch retrieval failed (%s); answering without injected context", e)
+            return [""] * len(questions)
+
+    def _wait_for_rate_limit(self):
+        delay = self._pause_until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _answer(self, record: Dict, context: str) -> Dict:
+        """Answer one question, retrying model calls that are rate limited"""
+        started = time.perf_counter()
+        retries = 0
+
+        def on_throttle(e: Exception, attempt: int) -> bool:
+            nonlocal retries
+            if attempt >= self.max_attempts:
+                return False
+            # Back off globally: every worker is hitting the same limit
+            delay = self.backoff * 2 ** (attempt - 1)
+            with self._lock:
+                self._pause_until = max(self._pause_until, time.monotonic() + delay)
+                self.stats["retries"] += 1
+            retries += 1
+            logger.warning("Rate limited on %s (attempt %d); pausing %.1fs", record["id"], attempt, delay,
+                           extra={"id": record["id"], "attempt": attempt, "delay": delay})
+            self._wait_for_rate_limit()
+            return True
+
+        self._wait_for_rate_limit()
+        # One sink for the whole question: usage from every model call is counted
+        sink = CollectingSink()
+        error = None
+        try:
+            run_agent_streaming(
+                record["question"],
+                client=self.client,
+                pre_retriever=BatchContext(context),
+                sink=sink,
+                tenant=self.tenant,
+                model_router=self.model_router,
+                on_throttle=on_throttle
+            )
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+
+        answer = sink.get_text()
+        usage = [e.data for e in sink.events if e.type == USAGE]
+        logs = [e.data["message"] for e in sink.events if e.type == LOG]
+        if error is None and not answer and logs:
+            # Circuit open or quota exhausted: the agent explained instead of answering
+            error = logs[-1]
+        return {
+            **record,
+            "answer": answer,
+            "tools": [e.data["name"] for e in sink.events if e.type == TOOL_START],
+            "model": usage[-1]["model"] if usage else None,
+            "model_calls": len(usage),
+            "input_tokens": sum(u["input_tokens"] for u in usage),
+            "output_tokens": sum(u["output_tokens"] for u in usage),
+            "cost_usd": round(sum(llm_cost(u["model"], u["input_tokens"], u["output_tokens"]) for u in usage), 6),
+            "attempts": retries + 1,
+            "seconds": round(time.perf_counter() - started, 3),
+            "error": error,
+        }
+
+    def _write(self, out, result: Dict):
+        with self._lock:
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+            stats = self.stats
+            stats["failed" if result["error"] else "answered"] += 1
+            for key in ("model_calls", "input_tokens", "output_tokens", "cost_usd"):
+                stats[key] += result[key]
+            completed = stats["answered"] + stats["failed"]
+        if completed % 100 == 0:
+            logger.info("%d questions answered", completed, extra={"completed": completed})
+
+    def run(self, input_path: str, output_path: str, retry_errors: bool = False,
+            limit: Optional[int] = None) -> Dict:
+        """
+        Answer every question in `input_path` not yet in `output_path`
+
+        Args:
+            input_path: Questions JSONL
+            output_path: Results JSONL (appended to; doubles as the checkpoint)
+            retry_errors: Answer again questions whose earlier result was an error
+            limit: Answer at most this many questions in this run
+
+        Returns:
+            Run statistics
+        """
+        done = load_checkpoint(output_path, retry_errors)
+        started = time.perf_counter()
+
+        def pending():
+            for record in read_questions(input_path):
+                if record["id"] in done:
+                    self.stats["skipped"] += 1
+                    continue
+                done.add(record["id"])  # duplicate ids in the input are answered once
+                yield record
+
+        questions = islice(pending(), limit)
+        # Questions retrieved but not yet answered: the next batch is fetched while this one is answered
+        slots = threading.BoundedSemaphore(self.concurrency + self.batch_size)
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="batch")
+
+        with open(output_path, "a", encoding="utf-8") as out:
+            def finish(future: Future, record: Dict):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {**record, "answer": "", "tools": [], "model": None, "model_calls": 0,
+                              "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0, "attempts": 0,
+                              "seconds": 0.0, "error": f"{type(e).__name__}: {e}"}
+                self._write(out, result)
+                slots.release()
+
+            while True:
+                batch = list(islice(questions, self.batch_size))
+                if not batch:
+                    break
+                contexts = self._retrieve([record["question"] for record in batch])
+                self.stats["retrieval_batches"] += 1
+                for record, context in zip(batch, contexts):
+                    slots.acquire()
+                    future = executor.submit(self._answer, record, context)
+                    future.add_done_callback(lambda f, record=record: finish(f, record))
+            executor.shutdown(wait=True)
+
+        self.stats["cost_usd"] = round(self.stats["cost_usd"], 6)
+        self.stats["seconds"] = round(time.perf_counter() - started, 3)
+        return dict(self.stats)
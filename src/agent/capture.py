@@ -0,0 +1,278 @@
+"""Traffic capture: record conversations (messages, model streams, tool calls, timings) for replay"""
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+from rag.logging_utils import get_logger
+
+logger = get_logger("agent.capture")
+
+# Raw API stream events; the SDK's derived helper events (text, input_json, ...) are not recorded
+STREAM_EVENT_TYPES = {"message_start", "content_block_start", "content_block_delta",
+                      "content_block_stop", "message_delta", "message_stop"}
+
+# Turn being recorded; copied into prefetch and pre-retrieval threads with the rest of the context
+current_turn: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_turn", default=None)
+
+
+def to_plain(obj: Any) -> Any:
+    """SDK objects (pydantic models or namespaces) as JSON-safe dicts and lists"""
+    if obj is None or isinstance(obj, (str, int, float, bool)):
+        return obj
+    if isinstance(obj, dict):
+        return {key: to_plain(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [to_plain(value) for value in obj]
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(mode="json", exclude_none=True)
+    if hasattr(obj, "__dict__"):
+        return {key: to_plain(value) for key, value in vars(obj).items() if not key.startswith("_")}
+    return str(obj)
+
+
+class Capture:
+    """
+    Appends one JSON record per turn, model call, tool call and embedding call
+
+    Records carry the turn id, a wall-clock start and a duration. Model
+    calls keep every stream event with its offset from the start of the
+    request, so a replay can reproduce time to first token and token
+    pacing. Writes are serialized with a lock; each record is one line.
+
+    Capture files hold user messages and tool results verbatim: treat them
+    like production logs.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize capture
+
+        Args:
+            path: JSONL file to append records to
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+        self.records = 0
+
+    @classmethod
+    def from_env(cls) -> Optional['Capture']:
+        """Build from AGENT_CAPTURE_PATH (None if unset)"""
+        path = os.getenv("AGENT_CAPTURE_PATH")
+        return cls(path) if path else None
+
+    def write(self, record: Dict):
+        """Append one record (tagged with the current turn)"""
+        record.setdefault("turn", current_turn.get())
+        line = json.dumps(record, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            self.records += 1
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    @contextmanager
+    def turn(self, user_message: str, config: Optional[Dict] = None):
+        """
+        Record one run_agent_streaming call
+
+        Args:
+            user_message: The user's message
+            config: Agent features enabled for the turn (prefetch, router, ...)
+        """
+        turn_id = uuid.uuid4().hex[:12]
+        token = current_turn.set(turn_id)
+        start = time.time()
+        started = time.perf_counter()
+        try:
+            yield turn_id
+        finally:
+            self.write({"type": "turn", "turn": turn_id, "message": user_message, "config": config or {},
+                        "start": start, "duration": time.perf_counter() - started})
+            current_turn.reset(token)
+
+    def wrap_anthropic(self, client) -> 'CapturingAnthropic':
+        return CapturingAnthropic(client, self)
+
+    def wrap_openai(self, client) -> 'CapturingOpenAI':
+        return CapturingOpenAI(client, self)
+
+    def instrument_tools(self, tools: Dict[str, Callable[..., str]]):
+        """Replace each tool function in `tools` with one that records its input, output and duration"""
+        for name, function in list(tools.items()):
+            tools[name] = self._recording_tool(name, function)
+
+    def _recording_tool(self, name: str, function: Callable[..., str]) -> Callable[..., str]:
+        def tool(**tool_input):
+            start = time.time()
+            started = time.perf_counter()
+            output = function(**tool_input)
+            self.write({"type": "tool_call", "name": name, "input": tool_input, "output": output,
+                        "start": start, "duration": time.perf_counter() - started})
+            return output
+
+        tool.__wrapped__ = function
+        return tool
+
+
+class _CapturingStream:
+    """Wraps a message stream, keeping each raw event and the final message"""
+
+    def __init__(self, manager, capture: Capture, request: Dict):
+        self._manager = manager
+        self._capture = capture
+        self._request = request
+        self._stream = None
+        self._events: List = []
+        self._final = None
+
+    def __enter__(self):
+        self._start = time.time()
+        self._started = time.perf_counter()
+        self._stream = self._manager.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        result = self._manager.__exit__(*exc)
+        self._capture.write({
+            "type": "model_call",
+            **self._request,
+            "start": self._start,
+            "duration": time.perf_counter() - self._started,
+            "events": self._events,
+            "final": self._final,
+            "error": repr(exc[1]) if exc[1] is not None else None,
+        })
+        return result
+
+    def __iter__(self):
+        for event in self._stream:
+            if event.type in STREAM_EVENT_TYPES:
+                self._events.append([round(time.perf_counter() - self._started, 6), to_plain(event)])
+            yield event
+
+    def get_final_message(self):
+        message = self._stream.get_final_message()
+        self._final = {
+            "stop_reason": message.stop_reason,
+            "content": to_plain(message.content),
+            "usage": to_plain(message.usage),
+        }
+        return message
+
+
+class _CapturingMessages:
+    def __init__(self, messages, capture: Capture):
+        self._messages = messages
+        self._capture = capture
+
+    def stream(self, **kwargs) -> _CapturingStream:
+        # The conversation itself is rebuilt by the replay; only its shape is kept
+        request = {"model": kwargs.get("model"), "max_tokens": kwargs.get("max_tokens"),
+                   "messages": len(kwargs.get("messages", []))}
+        return _CapturingStream(self._messages.stream(**kwargs), self._capture, request)
+
+    def __getattr__(self, name):
+        return getattr(self._messages, name)
+
+
+class CapturingAnthropic:
+    """Anthropic client whose message streams are recorded"""
+
+    def __init__(self, client, capture: Capture):
+        self._client = client
+        self.messages = _CapturingMessages(client.messages, capture)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class _CapturingEmbeddings:
+    def __init__(self, embeddings, capture: Capture):
+        self._embeddings = embeddings
+        self._capture = capture
+
+    def create(self, **kwargs):
+        start = time.time()
+        started = time.perf_counter()
+        response = self._embeddings.create(**kwargs)
+        inputs = kwargs.get("input")
+        self._capture.write({
+            "type": "embedding_call",
+            "model": kwargs.get("model"),
+            "inputs": len(inputs) if isinstance(inputs, list) else 1,
+            "dimension": len(response.data[0].embedding) if response.data else 0,
+            "start": start,
+            "duration": time.perf_counter() - started,
+        })
+        return response
+
+    def __getattr__(self, name):
+        return getattr(self._embeddings, name)
+
+
+class CapturingOpenAI:
+    """OpenAI client whose embedding requests are timed and recorded (not their vectors)"""
+
+    def __init__(self, client, capture: Capture):
+        self._client = client
+        self.embeddings = _CapturingEmbeddings(client.embeddings, capture)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class RecordedTurn:
+    """One captured turn and the upstream and tool calls made during it, in start order"""
+
+    def __init__(self, record: Dict):
+        self.id = record["turn"]
+        self.message = record["message"]
+        self.config = record.get("config", {})
+        self.start = record["start"]
+        self.duration = record["duration"]
+        self.model_calls: List[Dict] = []
+        self.tool_calls: List[Dict] = []
+        self.embedding_calls: List[Dict] = []
+
+
+def load_capture(path: str) -> List[RecordedTurn]:
+    """
+    Read a capture file
+
+    Args:
+        path: JSONL written by Capture
+
+    Returns:
+        Turns in start order; calls made outside any turn are dropped
+    """
+    turns: Dict[str, RecordedTurn] = {}
+    calls: List[Dict] = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record["type"] == "turn":
+                turns[record["turn"]] = RecordedTurn(record)
+            else:
+                calls.append(record)
+
+    dropped = 0
+    for record in sorted(calls, key=lambda r: r["start"]):
+        turn = turns.get(record.get("turn"))
+        if turn is None:
+            dropped += 1
+            continue
+        getattr(turn, f"{record['type']}s").append(record)
+    if dropped:
+        logger.info("Dropped %d calls made outside a turn", dropped, extra={"dropped": dropped})
+    return sorted(turns.values(), key=lambda t: t.start)
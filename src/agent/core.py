@@ -1,30 +1,29 @@
 """Core agent logic - Simple working version"""
 import os
 import sys
-from anthropic import Anthropic
+import time
+import uuid
+from concurrent.futures import Future
+from contextlib import nullcontext
+from typing import Callable, Optional
 from dotenv import load_dotenv
-from tools.functions import TOOLS, TOOL_FUNCTIONS
+from clients import (CircuitOpenError, DeadlineExceededError, get_anthropic_client, get_openai_client,
+                     get_upstream, get_upstream_stats, install_client, is_throttled)
+from tools.functions import TOOLS, TOOL_FUNCTIONS, current_tool_call
+from agent.prefetch import SearchPrefetcher
+from agent.pre_retrieval import PreRetriever, PRE_RETRIEVAL_PROMPT
+from agent.output import OutputSink, ConsoleSink
+from agent.answer_cache import AnswerCache, AnswerRecorder
+from agent.router import IntentRouter
+from agent.model_router import ModelRouter
+from agent.capture import Capture
+from agent.sessions import SessionConflictError, SessionStore
+from rag.tenants import (QuotaExceededError, UnknownTenantError, current_tenant, get_tenant_registry,
+                         tenant_scope)
 
 load_dotenv()
 
-def process_tool_call(tool_name: str, tool_input: dict) -> str:
-    """Execute a tool and return the result"""
-    print(f"🔧 Using tool: {tool_name}")
-    print(f"   Input: {tool_input}")
-
-    tool_function = TOOL_FUNCTIONS[tool_name]
-    result = tool_function(**tool_input)
-
-    print(f"   Result: {result}\n")
-    return result
-
-def run_agent_streaming(user_message: str):
-    """Run the agent with streaming support"""
-    client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
-
-    messages = [{"role": "user", "content": user_message}]
-
-    system_prompt = """You are an expert customer support agent for DataPulse, a leading data observability platform that helps teams monitor, validate, and ensure the quality of their data pipelines.
+SYSTEM_PROMPT = """You are an expert customer support agent for DataPulse, a leading data observability platform that helps teams monitor, validate, and ensure the quality of their data pipelines.
 
 ## Your Role & Capabilities
 
@@ -47,6 +46,7 @@ You have access to a comprehensive knowledge base with detailed documentation ab
 2. **check_plan_feature**: Check if a feature is available on a specific plan
    - Use when users ask about plan capabilities
    - Helps users understand upgrade benefits
+   - Check several features and plans in a single call when comparing
 
 3. **create_support_ticket**: Create tickets for complex issues
    - Use when issues require account-specific help
@@ -105,74 +105,332 @@ You have access to a comprehensive knowledge base with detailed documentation ab
 
 Remember: Your knowledge base is comprehensive and accurate. Use it extensively to provide the best support possible!"""
 
+def process_tool_call(
+    tool_name: str,
+    tool_input: dict,
+    prefetched: Optional[Future] = None,
+    sink: Optional[OutputSink] = None,
+    call_scope: Optional[str] = None
+) -> str:
+    """
+    Execute a tool (or collect its prefetched result) and return the result
+
+    `call_scope` identifies the call (conversation and tool_use_id); tools
+    with side effects key their idempotency on it.
+    """
+    sink = sink or ConsoleSink()
+    sink.tool_start(tool_name, tool_input)
+
+    if prefetched is not None:
+        result = prefetched.result()
+    else:
+        tool_function = TOOL_FUNCTIONS[tool_name]
+        token = current_tool_call.set(call_scope)
+        try:
+            result = tool_function(**tool_input)
+        finally:
+            current_tool_call.reset(token)
+
+    sink.tool_end(tool_name, result, prefetched=prefetched is not None)
+    return result
+
+def run_agent_streaming(
+    user_message: str,
+    client=None,
+    prefetch: bool = False,
+    pre_retriever: Optional[PreRetriever] = None,
+    sink: Optional[OutputSink] = None,
+    answer_cache: Optional[AnswerCache] = None,
+    tenant: Optional[str] = None,
+    router: Optional[IntentRouter] = None,
+    model_router: Optional[ModelRouter] = None,
+    session_id: Optional[str] = None,
+    session_store: Optional[SessionStore] = None,
+    on_throttle: Optional[Callable[[Exception, int], bool]] = None
+):
+    """
+    Run the agent with streaming support
+
+    Args:
+        user_message: The user's message
+        client: Anthropic client (defaults to the shared pooled client)
+        prefetch: Start search_documentation as soon as its streamed query is
+            complete, hiding retrieval latency behind token generation
+        pre_retriever: Search the knowledge base for the user message while the
+            client is set up and inject the context into the first request
+        sink: Where text deltas, tool and usage events go (default: ConsoleSink)
+        answer_cache: Replay cached answers to repeated questions instead of
+            calling the model, and record new answers for it
+        tenant: Answer from this tenant's knowledge base and charge its budgets
+        router: Local intent router; when it is confident the tool is called
+            directly and the model is only asked to phrase the answer
+        model_router: Pick a fast or strong model per call (default: always
+            claude-sonnet-4-20250514)
+        session_id: Continue this conversation: its history is loaded from
+            `session_store` and the turn is appended to it (any worker can
+            pick up any session)
+        session_store: Where conversations are kept (see agent.sessions)
+        on_throttle: Called with (error, attempt) when a model call is rate
+            limited or overloaded before streaming anything; return True
+            (after waiting) to retry that call. Only the model call is
+            retried, so tools that already ran in this turn aren't repeated.
+    """
+    if tenant is not None:
+        # Tools, prefetch and pre-retrieval resolve get_retriever() to the tenant's knowledge base
+        with tenant_scope(tenant):
+            return run_agent_streaming(user_message=user_message, client=client, prefetch=prefetch,
+                                       pre_retriever=pre_retriever, sink=sink, answer_cache=answer_cache,
+                                       router=router, model_router=model_router, session_id=session_id,
+                                       session_store=session_store, on_throttle=on_throttle)
+
+    sink = sink or ConsoleSink()
+
+    try:
+        account = get_tenant_registry().get(current_tenant.get()) if current_tenant.get() else None
+    except UnknownTenantError:
+        sink.log("This account has no knowledge base. Please contact support.")
+        sink.turn_end()
+        return
+    if account is not None:
+        try:
+            account.check_llm()
+        except QuotaExceededError:
+            sink.log("This account has reached its monthly assistant budget. Please contact support.")
+            sink.turn_end()
+            return
+
+    session = None
+    if session_store is not None and session_id is not None:
+        # Sessions are per tenant: the same id under another tenant is another conversation
+        tenant_id = current_tenant.get()
+        session = session_store.load(f"{tenant_id}/{session_id}" if tenant_id else session_id)
+    history = session_store.history(session) if session is not None else []
+    # Tool calls are scoped to the tenant and conversation as well as their tool_use_id
+    conversation = session.id if session is not None else (current_tenant.get() or "")
+
+    # The router and the answer cache judge the message alone, so only a conversation's first turn uses them
+    route = router.route(user_message) if router and not history else None
+    pending = pre_retriever.start(user_message) if pre_retriever and route is None else None
+
+    recorder = None
+    cache_key = None
+    if answer_cache and not history:
+        # Key on the pre-retrieval's hits when it ran, rather than searching a second time
+        chunk_ids = pre_retriever.chunk_ids(pending) if pending is not None else None
+        cache_key = answer_cache.key_for(user_message, chunk_ids)
+    if cache_key is not None:
+        cached = answer_cache.get(cache_key)
+        if cached is not None:
+            answer_cache.replay(cached, sink)
+            if session is not None:
+                session_store.append_turn(session, [
+                    {"role": "user", "content": user_message},
+                    {"role": "assistant", "content": [{"type": "text", "text": "".join(cached.text_events)}]}
+                ])
+            return
+        sink = recorder = AnswerRecorder(sink)
+
+    client = client or get_anthropic_client()
+    upstream = get_upstream("anthropic_messages")
+
+    system_prompt = SYSTEM_PROMPT
+    if pending is not None:
+        messages = history + [pre_retriever.first_message(user_message, pending)]
+        system_prompt += PRE_RETRIEVAL_PROMPT
+    else:
+        messages = history + [{"role": "user", "content": user_message}]
+
+    if route is not None:
+        # Routed locally: run the tool now and hand the model its result, skipping
+        # the round trip in which the model would only have picked this tool
+        tool_use_id = f"toolu_routed_{uuid.uuid4().hex[:16]}"
+        result = process_tool_call(route.tool, route.input, sink=sink, call_scope=f"{conversation}|{tool_use_id}")
+        messages += [
+            {"role": "assistant", "content": [
+                {"type": "tool_use", "id": tool_use_id, "name": route.tool, "input": route.input}
+            ]},
+            {"role": "user", "content": [
+                {"type": "tool_result", "tool_use_id": tool_use_id, "content": result}
+            ]}
+        ]
+
+    routing = None
+    if model_router is not None:
+        routing = model_router.start(user_message, with_context=pending is not None or route is not None)
+        if route is not None:
+            routing.observe_tools([(route.tool, result)])
+    model = "claude-sonnet-4-20250514"
+    max_tokens = 2048
+
     # Tool use loop
     while True:
-        with client.messages.stream(
-            model="claude-sonnet-4-20250514",
-            max_tokens=2048,
-            system=system_prompt,
-            tools=TOOLS,
-            messages=messages
-        ) as stream:
-            # Collect the full response
-            full_content = []
-
-            # Stream text in real-time
-            for event in stream:
-                if event.type == "content_block_start":
-                    if event.content_block.type == "text":
-                        # Start of text block
-                        pass
-                elif event.type == "content_block_delta":
-                    if hasattr(event.delta, "text"):
-                        # Print text as it arrives
-                        print(event.delta.text, end="", flush=True)
-                elif event.type == "content_block_stop":
-                    # End of a content block
-                    pass
-
-            # Get the final message
-            final_message = stream.get_final_message()
-
-            # If no tool use, we're done
-            if final_message.stop_reason != "tool_use":
-                print()  # New line after streaming
+        if routing is not None:
+            tier = routing.next_tier(messages)
+            model, max_tokens = tier.model, tier.max_tokens
+
+        attempt = 0
+        while True:
+            attempt += 1
+            started = time.perf_counter()
+            prefetcher = SearchPrefetcher(TOOL_FUNCTIONS["search_documentation"]) if prefetch else None
+            streamed = False
+            try:
+                # Breaker + latency stats per model call; the SDK retries only before the stream starts
+                with upstream.guard() as deadline, client.messages.stream(
+                    model=model,
+                    max_tokens=max_tokens,
+                    system=system_prompt,
+                    tools=TOOLS,
+                    messages=messages
+                ) as stream:
+                    # Stream text in real-time
+                    for event in stream:
+                        deadline.check()
+                        if prefetcher is not None:
+                            prefetcher.on_event(event)
+
+                        if event.type == "content_block_delta" and hasattr(event.delta, "text"):
+                            streamed = True
+                            sink.text(event.delta.text)
+
+                    # Get the final message
+                    final_message = stream.get_final_message()
+                break
+            except CircuitOpenError:
+                sink.log("The assistant is temporarily unavailable. Please try again in a moment.")
+                sink.turn_end()
                 return
-
-            # Process tool calls
-            messages.append({"role": "assistant", "content": final_message.content})
-
-            tool_results = []
-            for content_block in final_message.content:
-                if content_block.type == "tool_use":
-                    result = process_tool_call(content_block.name, content_block.input)
-                    tool_results.append({
-                        "type": "tool_result",
-                        "tool_use_id": content_block.id,
-                        "content": result
-                    })
-
-            messages.append({"role": "user", "content": tool_results})
+            except DeadlineExceededError:
+                sink.log("The assistant took too long to respond. Please try again.")
+                sink.turn_end()
+                return
+            except Exception as e:
+                # A retry after partial output would repeat text the user has already seen
+                if streamed or not is_throttled(e) or on_throttle is None or not on_throttle(e, attempt):
+                    raise
+
+        sink.usage(model, final_message.usage.input_tokens, final_message.usage.output_tokens)
+        if routing is not None:
+            model_router.record(tier, time.perf_counter() - started,
+                                final_message.usage.input_tokens, final_message.usage.output_tokens)
+        if account is not None:
+            account.record_llm_usage(model, final_message.usage.input_tokens, final_message.usage.output_tokens)
+
+        # If no tool use, we're done
+        if final_message.stop_reason != "tool_use":
+            if session is not None:
+                # Stored without pre-retrieved documentation: later turns can search again
+                messages.append({"role": "assistant", "content": final_message.content})
+                session_store.append_turn(session, [{"role": "user", "content": user_message}]
+                                          + messages[len(history) + 1:])
+            sink.turn_end()
+            if recorder is not None and recorder.cacheable():
+                answer_cache.put(cache_key, recorder.answer())
+            return
+
+        # Process tool calls
+        messages.append({"role": "assistant", "content": final_message.content})
+
+        tool_results = []
+        tool_names = []
+        for content_block in final_message.content:
+            if content_block.type == "tool_use":
+                tool_names.append(content_block.name)
+                prefetched = prefetcher.take(content_block.id, content_block.input) if prefetcher else None
+                result = process_tool_call(content_block.name, content_block.input, prefetched, sink,
+                                           call_scope=f"{conversation}|{content_block.id}")
+                tool_results.append({
+                    "type": "tool_result",
+                    "tool_use_id": content_block.id,
+                    "content": result
+                })
+
+        messages.append({"role": "user", "content": tool_results})
+        if routing is not None:
+            routing.observe_tools(list(zip(tool_names, (r["content"] for r in tool_results))))
 
 def chat_loop():
     """Simple chat interface with streaming"""
+    # Set up capture first so every client and retriever built afterwards is recorded
+    capture = Capture.from_env()
+    if capture is not None:
+        install_client("anthropic", capture.wrap_anthropic(get_anthropic_client()))
+        install_client("openai", capture.wrap_openai(get_openai_client()))
+        capture.instrument_tools(TOOL_FUNCTIONS)
+    prefetch = os.getenv("AGENT_PREFETCH", "0") == "1"
+
+    pre_retriever = PreRetriever.from_env()
+    answer_cache = AnswerCache.from_env()
+    router = IntentRouter.from_env()
+    model_router = ModelRouter.from_env(classifier=router.classifier if router else None)
+    session_store = SessionStore.from_env()
+    session_id = os.getenv("AGENT_SESSION_ID") or uuid.uuid4().hex
+    sink = ConsoleSink()
+
     print("=" * 60)
     print("DataPulse Support Agent (Streaming Enabled)")
     print("=" * 60)
-    print("Type 'quit' to exit\n")
+    print("Type 'quit' to exit, 'stats' for upstream health\n")
+    if capture is not None:
+        print(f"Recording traffic to {capture.path}\n")
+    if session_store is not None:
+        print(f"Session {session_id} (resume with AGENT_SESSION_ID={session_id})\n")
 
     while True:
         user_input = input("You: ").strip()
 
         if user_input.lower() in ['quit', 'exit', 'q']:
             print("Goodbye!")
+            if capture is not None:
+                capture.close()
             break
 
         if not user_input:
             continue
 
+        if user_input.lower() == 'stats':
+            for name, health in get_upstream_stats().items():
+                print(f"{name}: {health}")
+            if answer_cache is not None:
+                print(f"answer_cache: {answer_cache.get_stats()}")
+            if router is not None:
+                print(f"router: {router.get_stats()}")
+            if model_router is not None:
+                print(f"model_router: {model_router.get_stats()}")
+            from rag.retriever import get_retriever
+            retriever = get_retriever()
+            shadow = getattr(retriever, "shadow", None)
+            if shadow is not None:
+                print(f"embedding_shadow: {shadow.get_stats()}")
+            compressor = getattr(retriever, "compressor", None)
+            if compressor is not None:
+                print(f"context_compression: {compressor.get_stats()}")
+            print()
+            continue
+
         print("\n🤖 Agent: ", end="", flush=True)
-        run_agent_streaming(user_input)
+        config = {"prefetch": prefetch, "pre_retrieval": pre_retriever is not None,
+                  "answer_cache": answer_cache is not None, "router": router is not None,
+                  "model_routing": model_router is not None,
+                  "session": session_id if session_store is not None else None}
+        try:
+            with capture.turn(user_input, config) if capture is not None else nullcontext():
+                run_agent_streaming(
+                    user_input,
+                    prefetch=prefetch,
+                    pre_retriever=pre_retriever,
+                    sink=sink,
+                    answer_cache=answer_cache,
+                    router=router,
+                    model_router=model_router,
+                    session_id=session_id,
+                    session_store=session_store
+                )
+        except SessionConflictError:
+            # Expired or deleted during the turn: the answer stands, but its history is gone
+            session_id = uuid.uuid4().hex
+            print(f"\n\nThis conversation expired, so the last exchange wasn't saved. "
+                  f"Starting session {session_id}.")
         print("-" * 60)
 
 if __name__ == "__main__":
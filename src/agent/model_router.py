@@ -0,0 +1,222 @@
+"""Tiered model routing: a fast model for simple turns, escalation to the strong model when a turn gets hard"""
+import os
+import re
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from clients import LatencyStats
+from rag.logging_utils import get_logger
+from rag.tenants import llm_cost
+
+logger = get_logger("agent.model_router")
+
+TROUBLESHOOTING_RE = re.compile(
+    r"\b(error\w*|fail\w*|broken|not working|doesn't work|isn't working|won't|can't|cannot|timeout|timed out|"
+    r"denied|crash\w*|stuck|missing|wrong|issue|problem|bug|outage|down|debug\w*|troubleshoot\w*)\b"
+)
+
+# Search results shorter than this leave the fast model guessing
+THIN_CONTEXT_CHARS = 200
+
+
+class ModelTier:
+    """A model and the output limit it is called with"""
+
+    __slots__ = ("name", "model", "max_tokens")
+
+    def __init__(self, name: str, model: str, max_tokens: int):
+        self.name = name
+        self.model = model
+        self.max_tokens = max_tokens
+
+    def __repr__(self):
+        return f"ModelTier({self.name}, {self.model})"
+
+
+# Same output limit on both tiers: a fast answer cut off at max_tokens would already
+# be streamed, so it can't be retried on the strong tier without repeating itself
+FAST = ModelTier("fast", "claude-3-5-haiku-20241022", 2048)
+STRONG = ModelTier("strong", "claude-sonnet-4-20250514", 2048)
+
+
+class ModelRouter:
+    """
+    Picks the model for each call of a turn
+
+    A turn starts on the fast tier unless the message looks like
+    troubleshooting, is long, or the intent classifier is unsure about it.
+    It escalates to the strong tier (and stays there for the rest of the
+    turn) when the fast model needs several tool rounds, the conversation
+    grows past a context size, a search comes back thin, or a support
+    ticket is involved.
+    """
+
+    def __init__(
+        self,
+        fast: ModelTier = FAST,
+        strong: ModelTier = STRONG,
+        classifier=None,
+        min_confidence: float = 0.6,
+        long_message_chars: int = 400,
+        max_fast_calls: int = 2,
+        max_context_tokens: int = 6000
+    ):
+        """
+        Initialize router
+
+        Args:
+            fast: Tier for simple turns
+            strong: Tier escalated to
+            classifier: Optional intent classifier (agent.router.LinearIntentClassifier);
+                messages it classifies below min_confidence start on the strong tier
+            min_confidence: Classifier confidence needed to start on the fast tier
+            long_message_chars: Messages at least this long start on the strong tier
+            max_fast_calls: Fast-tier calls in one turn before escalating
+            max_context_tokens: Estimated conversation size that escalates
+        """
+        self.fast = fast
+        self.strong = strong
+        self.classifier = classifier
+        self.min_confidence = min_confidence
+        self.long_message_chars = long_message_chars
+        self.max_fast_calls = max_fast_calls
+        self.max_context_tokens = max_context_tokens
+
+        self._lock = threading.Lock()
+        self.latency = {tier.name: LatencyStats() for tier in (fast, strong)}
+        self.usage = {tier.name: Counter() for tier in (fast, strong)}
+        self.reasons = Counter()
+        self.turns = Counter()
+        self.escalations = 0
+
+    @classmethod
+    def from_env(cls, classifier=None) -> Optional['ModelRouter']:
+        """Build from AGENT_MODEL_ROUTING* environment variables (None if disabled)"""
+        if os.getenv("AGENT_MODEL_ROUTING", "0") != "1":
+            return None
+        return cls(
+            fast=ModelTier("fast", os.getenv("AGENT_FAST_MODEL", FAST.model), FAST.max_tokens),
+            strong=ModelTier("strong", os.getenv("AGENT_STRONG_MODEL", STRONG.model), STRONG.max_tokens),
+            classifier=classifier
+        )
+
+    def start(self, user_message: str, with_context: bool = False) -> 'TurnRouting':
+        """
+        Decide the starting tier for a turn
+
+        Args:
+            user_message: The user's message
+            with_context: The first request already carries documentation or a
+                tool result (pre-retrieval or a locally routed tool)
+
+        Returns:
+            TurnRouting to consult before each model call of the turn
+        """
+        tier, reason = self._initial(user_message, with_context)
+        with self._lock:
+            self.turns[tier.name] += 1
+            self.reasons[reason] += 1
+        logger.info("Model tier %s (%s)", tier.name, reason,
+                    extra={"tier": tier.name, "model": tier.model, "reason": reason})
+        return TurnRouting(self, tier, reason)
+
+    def _initial(self, user_message: str, with_context: bool) -> Tuple[ModelTier, str]:
+        text = user_message.lower()
+        if TROUBLESHOOTING_RE.search(text):
+            return self.strong, "troubleshooting"
+        if len(user_message) >= self.long_message_chars:
+            return self.strong, "long_message"
+        if self.classifier is not None:
+            _, confidence = self.classifier.predict(user_message)
+            if confidence < self.min_confidence:
+                return self.strong, "low_confidence"
+        return self.fast, "with_context" if with_context else "simple"
+
+    def record(self, tier: ModelTier, seconds: float, input_tokens: int, output_tokens: int):
+        """Account one model call to its tier"""
+        cost = llm_cost(tier.model, input_tokens, output_tokens)
+        self.latency[tier.name].record(seconds, ok=True)
+        with self._lock:
+            usage = self.usage[tier.name]
+            usage["input_tokens"] += input_tokens
+            usage["output_tokens"] += output_tokens
+            usage["cost_usd"] += cost
+        logger.debug("%s call took %.0f ms, $%.5f", tier.model, seconds * 1000, cost,
+                     extra={"tier": tier.name, "model": tier.model, "latency_ms": round(seconds * 1000, 1),
+                            "cost_usd": cost, "sample": True})
+
+    def get_stats(self) -> Dict:
+        """Turns, escalations, and per-tier calls, latency, tokens and cost"""
+        with self._lock:
+            tiers = {
+                name: {
+                    "turns": self.turns[name],
+                    "input_tokens": self.usage[name]["input_tokens"],
+                    "output_tokens": self.usage[name]["output_tokens"],
+                    "cost_usd": round(self.usage[name]["cost_usd"], 6),
+                }
+                for name in self.usage
+            }
+            reasons = dict(self.reasons)
+            escalations = self.escalations
+        for name, latency in self.latency.items():
+            snapshot = latency.snapshot()
+            tiers[name].update(calls=snapshot["calls"], p50_ms=snapshot["p50_ms"], p95_ms=snapshot["p95_ms"])
+        return {"tiers": tiers, "reasons": reasons, "escalations": escalations}
+
+
+class TurnRouting:
+    """Tier state of one turn; escalation is one-way"""
+
+    def __init__(self, router: ModelRouter, tier: ModelTier, reason: str):
+        self.router = router
+        self.tier = tier
+        self.reason = reason
+        self.fast_calls = 0
+
+    def next_tier(self, messages: List[Dict]) -> ModelTier:
+        """Tier for the next model call, escalating if the turn has grown"""
+        if self.tier is self.router.fast:
+            if self.fast_calls >= self.router.max_fast_calls:
+                self.escalate("tool_rounds")
+            elif _estimate_tokens(messages) > self.router.max_context_tokens:
+                self.escalate("long_context")
+        if self.tier is self.router.fast:
+            self.fast_calls += 1
+        return self.tier
+
+    def observe_tools(self, calls: List[Tuple[str, str]]):
+        """Escalate on tool results the fast model shouldn't handle alone"""
+        for name, result in calls:
+            if name == "create_support_ticket":
+                self.escalate("support_ticket")
+            elif name == "search_documentation" and len((result or "").strip()) < THIN_CONTEXT_CHARS:
+                self.escalate("thin_context")
+
+    def escalate(self, reason: str):
+        if self.tier is self.router.strong:
+            return
+        self.tier = self.router.strong
+        self.reason = reason
+        with self.router._lock:
+            self.router.escalations += 1
+            self.router.reasons[f"escalated:{reason}"] += 1
+        logger.info("Escalated to %s (%s)", self.tier.model, reason,
+                    extra={"tier": self.tier.name, "model": self.tier.model, "reason": reason})
+
+
+def _estimate_tokens(messages: List[Dict]) -> int:
+    """~4 characters per token over message text and tool results"""
+    chars = 0
+    for message in messages:
+        content = message["content"]
+        if isinstance(content, str):
+            chars += len(content)
+            continue
+        for part in content:
+            if isinstance(part, dict):
+                chars += len(str(part.get("text") or part.get("content") or part.get("input") or ""))
+            else:
+                chars += len(getattr(part, "text", None) or str(getattr(part, "input", "")))
+    return chars // 4
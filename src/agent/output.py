@@ -0,0 +1,224 @@
+"""Output sinks: where the agent's streamed text, tool activity and usage go"""
+import asyncio
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, TextIO
+
+
+# Event types
+TEXT_DELTA = "text_delta"
+TOOL_START = "tool_start"
+TOOL_END = "tool_end"
+USAGE = "usage"
+LOG = "log"
+TURN_END = "turn_end"
+
+
+class AgentEvent:
+    """One unit of agent output"""
+
+    __slots__ = ("type", "data")
+
+    def __init__(self, type: str, data: Dict[str, Any]):
+        self.type = type
+        self.data = data
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"type": self.type, **self.data}
+
+    def __repr__(self):
+        return f"AgentEvent({self.type!r}, {self.data!r})"
+
+
+class OutputSink(ABC):
+    """
+    Base sink; subclasses implement emit()
+
+    The helper methods build events so call sites stay short.
+    """
+
+    @abstractmethod
+    def emit(self, event: AgentEvent):
+        """Handle one event"""
+
+    def flush(self):
+        pass
+
+    def text(self, text: str):
+        self.emit(AgentEvent(TEXT_DELTA, {"text": text}))
+
+    def tool_start(self, name: str, tool_input: Dict):
+        self.emit(AgentEvent(TOOL_START, {"name": name, "input": tool_input}))
+
+    def tool_end(self, name: str, result: str, prefetched: bool = False):
+        self.emit(AgentEvent(TOOL_END, {"name": name, "result": result, "prefetched": prefetched}))
+
+    def usage(self, model: str, input_tokens: int, output_tokens: int):
+        self.emit(AgentEvent(USAGE, {"model": model, "input_tokens": input_tokens,
+                                     "output_tokens": output_tokens}))
+
+    def log(self, message: str):
+        self.emit(AgentEvent(LOG, {"message": message}))
+
+    def turn_end(self):
+        self.emit(AgentEvent(TURN_END, {}))
+
+
+class _CoalescingSink(OutputSink):
+    """
+    Buffers text deltas and writes them out together
+
+    Buffered text is written once `flush_interval` has passed since the last
+    write (or `max_buffer` characters accumulate). If the stream pauses, a
+    timer writes whatever is pending after `flush_interval`, so text never
+    sits unseen waiting for the next delta. Other events write pending text
+    first so output stays in order.
+    """
+
+    def __init__(self, flush_interval: float, max_buffer: int):
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._buffer: List[str] = []
+        self._buffered = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+
+    @abstractmethod
+    def _write_text(self, text: str):
+        """Write coalesced text (called with the lock held)"""
+
+    @abstractmethod
+    def _write_event(self, event: AgentEvent):
+        """Write a non-text event (called with the lock held, after pending text)"""
+
+    def emit(self, event: AgentEvent):
+        with self._lock:
+            if event.type != TEXT_DELTA:
+                self._flush_locked()
+                self._write_event(event)
+                return
+
+            self._buffer.append(event.data["text"])
+            self._buffered += len(event.data["text"])
+            if (self._buffered >= self.max_buffer
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self._flush_locked()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._buffer:
+            self._write_text("".join(self._buffer))
+            self._buffer.clear()
+            self._buffered = 0
+        self._last_flush = time.monotonic()
+
+
+class NullSink(OutputSink):
+    """Discards all output"""
+
+    def emit(self, event: AgentEvent):
+        pass
+
+
+class CollectingSink(OutputSink):
+    """Keeps every event in memory (batch jobs, tests, replay capture)"""
+
+    def __init__(self):
+        self.events: List[AgentEvent] = []
+
+    def emit(self, event: AgentEvent):
+        self.events.append(event)
+
+    def get_text(self) -> str:
+        return "".join(e.data["text"] for e in self.events if e.type == TEXT_DELTA)
+
+
+class ConsoleSink(_CoalescingSink):
+    """
+    Terminal writer that coalesces text deltas
+
+    Deltas are buffered and written in one call at most every
+    `flush_interval` seconds (or once `max_buffer` characters accumulate),
+    instead of one write + flush syscall per token. A pause in the stream
+    still shows pending text after `flush_interval`, and tool and log events
+    flush pending text first so output stays in order.
+    """
+
+    def __init__(
+        self,
+        stream: Optional[TextIO] = None,
+        flush_interval: float = 0.05,
+        max_buffer: int = 4096,
+        verbose: bool = True
+    ):
+        """
+        Initialize console sink
+
+        Args:
+            stream: Output stream (default: sys.stdout)
+            flush_interval: Max seconds text may sit in the buffer
+            max_buffer: Flush once this many characters are buffered
+            verbose: Show tool inputs and results
+        """
+        super().__init__(flush_interval, max_buffer)
+        self.stream = stream or sys.stdout
+        self.verbose = verbose
+
+    def _write_text(self, text: str):
+        self.stream.write(text)
+        self.stream.flush()
+
+    def _write_event(self, event: AgentEvent):
+        if event.type == TOOL_START:
+            self.stream.write(f"🔧 Using tool: {event.data['name']}\n")
+            if self.verbose:
+                self.stream.write(f"   Input: {event.data['input']}\n")
+        elif event.type == TOOL_END and self.verbose:
+            if event.data["prefetched"]:
+                self.stream.write("   (prefetched while streaming)\n")
+            self.stream.write(f"   Result: {event.data['result']}\n\n")
+        elif event.type == LOG:
+            self.stream.write(f"{event.data['message']}\n")
+        elif event.type == TURN_END:
+            self.stream.write("\n")
+        self.stream.flush()
+
+
+class AsyncQueueSink(_CoalescingSink):
+    """
+    Forwards events to an asyncio.Queue from any thread (e.g. a server's SSE/WebSocket writer)
+
+    Consecutive text deltas are coalesced into one event per `flush_interval`
+    to cut per-token queue and network overhead. A None is put on the queue
+    after turn_end so consumers know the response is complete.
+    """
+
+    def __init__(self, queue: asyncio.Queue, loop: asyncio.AbstractEventLoop, flush_interval: float = 0.02,
+                 max_buffer: int = 4096):
+        super().__init__(flush_interval, max_buffer)
+        self.queue = queue
+        self.loop = loop
+
+    def _put(self, item: Optional[AgentEvent]):
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, item)
+
+    def _write_text(self, text: str):
+        self._put(AgentEvent(TEXT_DELTA, {"text": text}))
+
+    def _write_event(self, event: AgentEvent):
+        self._put(event)
+        if event.type == TURN_END:
+            self._put(None)
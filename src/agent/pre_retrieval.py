@@ -0,0 +1,111 @@
+"""Pre-retrieval: search the knowledge base on the raw user message before the first model call"""
+import contextvars
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List, Dict, NamedTuple, Optional, Union
+
+from rag.logging_utils import get_logger
+
+logger = get_logger("agent.pre_retrieval")
+
+PRE_RETRIEVAL_PROMPT = """
+
+## Pre-retrieved Documentation
+
+The user's message may start with a <documentation> block retrieved from the knowledge base for their question. If it answers the question, respond from it directly without calling search_documentation; search only if it is missing or insufficient."""
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="pre-retrieval")
+
+
+class Retrieval(NamedTuple):
+    """Pre-retrieved context and the ids of the chunks it came from"""
+    context: str
+    chunk_ids: List[str]
+
+
+def _default_search(query: str, max_tokens: int, max_distance: Optional[float]) -> Retrieval:
+    from rag.retriever import get_retriever
+
+    retriever = get_retriever()
+    if not retriever.ready:
+        return Retrieval("", [])
+    hit_ids: List[str] = []
+    context = retriever.search(query, n_results=3, max_tokens=max_tokens, max_distance=max_distance,
+                               hit_ids=hit_ids)
+    return Retrieval(context, hit_ids)
+
+
+class PreRetriever:
+    """Runs a knowledge-base search for the user message and injects it into the first request"""
+
+    def __init__(
+        self,
+        max_tokens: int = 1500,
+        max_distance: Optional[float] = 1.2,
+        search_fn: Optional[Callable[[str, int, Optional[float]], Union[str, Retrieval]]] = None
+    ):
+        """
+        Initialize pre-retriever
+
+        Args:
+            max_tokens: Token budget for the injected context
+            max_distance: Relevance threshold; hits farther than this are dropped
+                (squared L2 on unit embeddings, i.e. 2 - 2 * cosine similarity)
+            search_fn: Search implementation (query, max_tokens, max_distance) -> context,
+                or a Retrieval if it can also report the chunk ids
+        """
+        self.max_tokens = max_tokens
+        self.max_distance = max_distance
+        self.search_fn = search_fn or _default_search
+
+    @classmethod
+    def from_env(cls) -> Optional['PreRetriever']:
+        """Build from AGENT_PRE_RETRIEVAL* environment variables (None if disabled)"""
+        if os.getenv("AGENT_PRE_RETRIEVAL", "0") != "1":
+            return None
+        max_distance = os.getenv("AGENT_PRE_RETRIEVAL_MAX_DISTANCE", "1.2")
+        return cls(
+            max_tokens=int(os.getenv("AGENT_PRE_RETRIEVAL_TOKENS", "1500")),
+            max_distance=float(max_distance) if max_distance else None
+        )
+
+    def start(self, user_message: str) -> Future:
+        """Start the search in the background (call before creating the client)"""
+        # Run in a copy of the caller's context so tenant scoping carries over
+        return _executor.submit(contextvars.copy_context().run, self.search_fn, user_message,
+                                self.max_tokens, self.max_distance)
+
+    @staticmethod
+    def _result(pending: Future) -> Retrieval:
+        try:
+            result = pending.result()
+        except Exception as e:
+            # The model can still search for itself
+            logger.warning("Pre-retrieval failed (%s); sending the message without documentation", e)
+            return Retrieval("", [])
+        return result if isinstance(result, Retrieval) else Retrieval(result, None)
+
+    def chunk_ids(self, pending: Future) -> Optional[List[str]]:
+        """
+        Ids of the chunks the search retrieved (waits for it)
+
+        None if the search function doesn't report them.
+        """
+        return self._result(pending).chunk_ids
+
+    def first_message(self, user_message: str, pending: Future) -> Dict:
+        """
+        Build the first user message, with the retrieved context if there is any
+
+        Falls back to the plain message if retrieval failed or found nothing relevant.
+        """
+        context = self._result(pending).context
+
+        if not context or not context.strip():
+            return {"role": "user", "content": user_message}
+
+        content: List[Dict] = [
+            {"type": "text", "text": f"<documentation>\n{context}\n</documentation>"},
+            {"type": "text", "text": user_message},
+        ]
+        return {"role": "user", "content": content}
@@ -0,0 +1,91 @@
+"""Speculative documentation prefetch while the model is still streaming"""
+import contextvars
+import json
+import re
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+
+# A complete JSON string value for "query" inside partial tool input
+_QUERY_RE = re.compile(r'"query"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="prefetch")
+
+
+class SearchPrefetcher:
+    """
+    Watches stream events for a search_documentation tool_use block
+
+    As soon as the streamed `query` argument is complete the search is
+    started in the background, so retrieval overlaps with the rest of the
+    model's output. If the final tool input turns out to differ (e.g. extra
+    `sources`), the search is re-run with the full input when the block ends.
+    """
+
+    def __init__(self, search_fn: Callable[..., str], tool_name: str = "search_documentation"):
+        """
+        Initialize prefetcher
+
+        Args:
+            search_fn: Tool implementation to call with the tool input
+            tool_name: Name of the tool to prefetch
+        """
+        self.search_fn = search_fn
+        self.tool_name = tool_name
+        # content block index -> {"id", "json", "input", "future"}
+        self._blocks: Dict[int, Dict] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def on_event(self, event):
+        """Feed one raw stream event"""
+        if event.type == "content_block_start":
+            block = event.content_block
+            if block.type == "tool_use" and block.name == self.tool_name:
+                self._blocks[event.index] = {"id": block.id, "json": "", "input": None, "future": None}
+
+        elif event.type == "content_block_delta":
+            state = self._blocks.get(event.index)
+            if state is None or getattr(event.delta, "type", None) != "input_json_delta":
+                return
+            state["json"] += event.delta.partial_json
+            if state["future"] is None:
+                match = _QUERY_RE.search(state["json"])
+                if match:
+                    self._start(state, {"query": json.loads(f'"{match.group(1)}"')})
+
+        elif event.type == "content_block_stop":
+            state = self._blocks.get(event.index)
+            if state is None:
+                return
+            try:
+                tool_input = json.loads(state["json"] or "{}")
+            except json.JSONDecodeError:
+                return
+            if tool_input != state["input"]:
+                self._start(state, tool_input)
+
+    def _start(self, state: Dict, tool_input: Dict):
+        state["input"] = tool_input
+        # Run in a copy of the caller's context so tenant scoping carries over
+        state["future"] = _executor.submit(contextvars.copy_context().run, self.search_fn, **tool_input)
+
+    def take(self, tool_use_id: str, tool_input: Dict) -> Optional[Future]:
+        """
+        Return the in-flight search for a tool call, if it matches the final input
+
+        Args:
+            tool_use_id: id of the tool_use block
+            tool_input: Final tool input from the completed message
+
+        Returns:
+            Future with the search result, or None to run the tool normally
+        """
+        for index, state in list(self._blocks.items()):
+            if state["id"] == tool_use_id:
+                del self._blocks[index]
+                if state["future"] is not None and state["input"] == tool_input:
+                    self.hits += 1
+                    return state["future"]
+        self.misses += 1
+        return None
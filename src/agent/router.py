@@ -0,0 +1,247 @@
+"""Local intent router: pick the tool for a user message without a model round trip"""
+import hashlib
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from clients import LatencyStats
+from agent.router_examples import NONE, PLAN, ROUTER_EXAMPLES, SEARCH
+
+_WORD_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+# Only read-only tools are dispatched locally: a wrong search or plan lookup
+# only adds context, while a ticket (or any other side effect) must never be
+# created on the classifier's say-so. Messages classified as anything else
+# go to the model, which can ask for details first.
+DEFAULT_THRESHOLDS = {
+    SEARCH: 0.6,
+    PLAN: 0.7,
+}
+READ_ONLY_TOOLS = frozenset(DEFAULT_THRESHOLDS)
+
+_PLAN_RE = re.compile(r"\b(free|pro|enterprise)\b")
+# Matrix keys that are too generic to read as a feature inside a sentence
+_FEATURE_STOPLIST = {"support", "sla", "monitors"}
+
+
+def features(text: str, buckets: int) -> Counter:
+    """Hashed unigram and bigram counts of the lowercased message"""
+    words = _WORD_RE.findall(text.lower())
+    grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    counts = Counter()
+    for gram in grams:
+        counts[int.from_bytes(hashlib.blake2b(gram.encode(), digest_size=4).digest(), 'little') % buckets] += 1
+    return counts
+
+
+class LinearIntentClassifier:
+    """
+    Multinomial logistic regression over hashed n-gram features
+
+    Trained in pure Python by full-batch gradient descent, at startup. Cost
+    grows with epochs x examples x n-grams: the ~100 bundled examples take
+    0.2-0.3 s at 50 epochs (scripts/evaluate_router.py prints the time).
+    50 epochs at rate 2.0 match the cross-validated accuracy of 200 at 0.5
+    in a quarter of the time.
+    """
+
+    def __init__(self, buckets: int = 4096, epochs: int = 50, learning_rate: float = 2.0, l2: float = 1e-3):
+        self.buckets = buckets
+        self.epochs = epochs
+        self.learning_rate = learning_rate
+        self.l2 = l2
+        self.labels: List[str] = []
+        self.weights: List[Dict[int, float]] = []
+        self.bias: List[float] = []
+
+    def fit(self, examples: Sequence[Tuple[str, str]]) -> 'LinearIntentClassifier':
+        self.labels = sorted({label for _, label in examples})
+        data = [(features(text, self.buckets), self.labels.index(label)) for text, label in examples]
+        self.weights = [dict() for _ in self.labels]
+        self.bias = [0.0] * len(self.labels)
+
+        for _ in range(self.epochs):
+            gradients = [Counter() for _ in self.labels]
+            bias_gradients = [0.0] * len(self.labels)
+            for x, y in data:
+                probabilities = self._softmax(x)
+                for k, p in enumerate(probabilities):
+                    error = p - (1.0 if k == y else 0.0)
+                    bias_gradients[k] += error
+                    for index, value in x.items():
+                        gradients[k][index] += error * value
+
+            scale = self.learning_rate / len(data)
+            for k in range(len(self.labels)):
+                weights = self.weights[k]
+                for index in weights:
+                    weights[index] *= 1 - self.learning_rate * self.l2
+                for index, gradient in gradients[k].items():
+                    weights[index] = weights.get(index, 0.0) - scale * gradient
+                self.bias[k] -= scale * bias_gradients[k]
+        return self
+
+    def _softmax(self, x: Counter) -> List[float]:
+        scores = [
+            self.bias[k] + sum(self.weights[k].get(index, 0.0) * value for index, value in x.items())
+            for k in range(len(self.labels))
+        ]
+        top = max(scores)
+        exps = [math.exp(score - top) for score in scores]
+        total = sum(exps)
+        return [e / total for e in exps]
+
+    def predict_proba(self, text: str) -> Dict[str, float]:
+        return dict(zip(self.labels, self._softmax(features(text, self.buckets))))
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        probabilities = self.predict_proba(text)
+        label = max(probabilities, key=probabilities.get)
+        return label, probabilities[label]
+
+
+class Route:
+    """A confident routing decision: the tool to call and its arguments"""
+
+    __slots__ = ("tool", "input", "confidence")
+
+    def __init__(self, tool: str, tool_input: Dict, confidence: float):
+        self.tool = tool
+        self.input = tool_input
+        self.confidence = confidence
+
+    def __repr__(self):
+        return f"Route({self.tool}, {self.input}, {self.confidence:.2f})"
+
+
+class IntentRouter:
+    """
+    Dispatches a tool directly when the classifier is confident
+
+    A message is routed only if the top intent is a read-only tool, its
+    probability clears that tool's threshold, and the tool's arguments can be
+    filled in locally (check_plan_feature needs a feature the plan matrix
+    knows). Ticket intents are still classified, so they aren't mistaken for
+    searches, but are always left to the model.
+    Everything else returns None and goes through the normal model-driven
+    tool selection.
+    """
+
+    def __init__(
+        self,
+        classifier: LinearIntentClassifier,
+        thresholds: Optional[Dict[str, float]] = None
+    ):
+        """
+        Initialize router
+
+        Args:
+            classifier: Trained intent classifier
+            thresholds: Minimum probability per tool (default: DEFAULT_THRESHOLDS)
+        """
+        self.classifier = classifier
+        self.thresholds = {**DEFAULT_THRESHOLDS, **(thresholds or {})}
+        self.latency = LatencyStats()
+        self._lock = threading.Lock()
+        self.counts = Counter()
+
+    @classmethod
+    def train(
+        cls,
+        examples: Sequence[Tuple[str, str]] = ROUTER_EXAMPLES,
+        thresholds: Optional[Dict[str, float]] = None
+    ) -> 'IntentRouter':
+        """Train a router on labelled (message, tool or "none") examples"""
+        return cls(LinearIntentClassifier().fit(examples), thresholds)
+
+    @classmethod
+    def from_env(cls) -> Optional['IntentRouter']:
+        """Build from AGENT_ROUTER* environment variables (None if disabled)"""
+        if os.getenv("AGENT_ROUTER", "0") != "1":
+            return None
+        # One threshold for every read-only tool, replacing the per-tool defaults
+        threshold = os.getenv("AGENT_ROUTER_THRESHOLD")
+        thresholds = {tool: float(threshold) for tool in DEFAULT_THRESHOLDS} if threshold else None
+        return cls.train(thresholds=thresholds)
+
+    def route(self, message: str) -> Optional[Route]:
+        """
+        Decide whether to dispatch a tool for this message
+
+        Returns:
+            Route, or None to let the model choose
+        """
+        start = time.perf_counter()
+        label, confidence = self.classifier.predict(message)
+
+        route = None
+        if label == NONE:
+            outcome = "no_tool"
+        elif label not in READ_ONLY_TOOLS:
+            outcome = "side_effect"
+        elif confidence < self.thresholds.get(label, 1.0):
+            outcome = "low_confidence"
+        else:
+            tool_input = self.arguments(label, message)
+            outcome = "missing_arguments" if tool_input is None else label
+            if tool_input is not None:
+                route = Route(label, tool_input, confidence)
+
+        self.latency.record(time.perf_counter() - start, ok=True)
+        with self._lock:
+            self.counts[outcome] += 1
+        return route
+
+    def arguments(self, tool: str, message: str) -> Optional[Dict]:
+        """Fill in a tool's input from the message (None if it can't be done reliably)"""
+        if tool == SEARCH:
+            return {"query": message}
+        if tool == PLAN:
+            found = plan_features(message)
+            if not found:
+                return None
+            plans = list(dict.fromkeys(_PLAN_RE.findall(message.lower())))
+            return {"features": found, **({"plans": plans} if plans else {})}
+        return None
+
+    def get_stats(self) -> Dict:
+        """Routing outcomes and classification latency"""
+        with self._lock:
+            counts = dict(self.counts)
+        total = sum(counts.values())
+        routed = sum(counts.get(tool, 0) for tool in READ_ONLY_TOOLS)
+        return {
+            "messages": total,
+            "routed": routed,
+            "route_rate": routed / total if total else 0.0,
+            "outcomes": counts,
+            "latency": self.latency.snapshot(),
+        }
+
+
+def plan_features(message: str) -> List[str]:
+    """Plan-matrix features named in a message (longest exact matches, in order)"""
+    from tools.plan_matrix import feature_key, get_plan_matrix
+
+    matrix = get_plan_matrix()
+    words = _WORD_RE.findall(message.lower().replace("/", "_"))
+    found = []
+    i = 0
+    while i < len(words):
+        for size in range(min(5, len(words) - i), 0, -1):
+            key = feature_key(" ".join(words[i:i + size]))
+            if key in _FEATURE_STOPLIST:
+                continue
+            resolved = key if key in matrix.features else matrix.aliases.get(key)
+            if resolved:
+                if key not in found:
+                    found.append(key)
+                i += size
+                break
+        else:
+            i += 1
+    return found
@@ -0,0 +1,123 @@
+"""Labelled user messages for training the local intent router (label = tool the model should call)"""
+
+SEARCH = "search_documentation"
+PLAN = "check_plan_feature"
+TICKET = "create_support_ticket"
+NONE = "none"
+
+ROUTER_EXAMPLES = [
+    # search_documentation: how-tos, product behaviour, troubleshooting steps
+    ("How do I set up a freshness monitor?", SEARCH),
+    ("How can I integrate with BigQuery?", SEARCH),
+    ("What permissions does the Snowflake user need?", SEARCH),
+    ("How do I configure Slack alerts for failed checks?", SEARCH),
+    ("What monitor types are available?", SEARCH),
+    ("How does anomaly detection work?", SEARCH),
+    ("Explain how data lineage is calculated", SEARCH),
+    ("How do I authenticate with the REST API?", SEARCH),
+    ("What are the API rate limits?", SEARCH),
+    ("How do I connect Redshift to DataPulse?", SEARCH),
+    ("Can you walk me through the dbt integration?", SEARCH),
+    ("How do I create a custom SQL monitor?", SEARCH),
+    ("What does the volume monitor check?", SEARCH),
+    ("How do I reduce alert noise?", SEARCH),
+    ("What are best practices for monitoring a data warehouse?", SEARCH),
+    ("How do I set up PagerDuty notifications?", SEARCH),
+    ("Why am I getting a connection timeout with Snowflake?", SEARCH),
+    ("My BigQuery sync says permission denied, what should I check?", SEARCH),
+    ("How often do monitors run?", SEARCH),
+    ("Where can I see the schema change history?", SEARCH),
+    ("How do I export a report?", SEARCH),
+    ("Is my data encrypted at rest?", SEARCH),
+    ("Are you SOC 2 compliant?", SEARCH),
+    ("How do I invite teammates to my workspace?", SEARCH),
+    ("What pricing plans are there?", SEARCH),
+    ("How much does the Pro plan cost?", SEARCH),
+    ("What's the difference between the plans?", SEARCH),
+    ("How do I get started with DataPulse?", SEARCH),
+    ("How do ML-based monitors learn seasonality?", SEARCH),
+    ("How do I mute an alert during maintenance?", SEARCH),
+    ("What happens when a monitor fails?", SEARCH),
+    ("How do I rotate my API key?", SEARCH),
+    ("Which data sources do you support?", SEARCH),
+    ("How do I tag tables by owner?", SEARCH),
+    ("Can I monitor dbt test results?", SEARCH),
+    ("How is GDPR handled?", SEARCH),
+    ("How do I troubleshoot a monitor that never triggers?", SEARCH),
+    ("What does the incident timeline show?", SEARCH),
+    ("Do you have a Python SDK?", SEARCH),
+    ("How do I set thresholds on a row count monitor?", SEARCH),
+
+    # check_plan_feature: is <feature> included in <plan>
+    ("Is SSO included in the Enterprise plan?", PLAN),
+    ("Does the free plan include API access?", PLAN),
+    ("Can I use Slack integration on the free tier?", PLAN),
+    ("Is data lineage available on Pro?", PLAN),
+    ("Do I get custom SQL monitors with the free plan?", PLAN),
+    ("Which plans have anomaly detection?", PLAN),
+    ("Is RBAC available on the pro plan?", PLAN),
+    ("Does Pro come with webhooks?", PLAN),
+    ("Is on-premise deployment only for enterprise?", PLAN),
+    ("Can free users get PagerDuty alerts?", PLAN),
+    ("Is 24/7 support part of the pro plan?", PLAN),
+    ("Does enterprise have audit logging?", PLAN),
+    ("Are scheduled reports on the free plan?", PLAN),
+    ("Does the pro tier have column level monitoring?", PLAN),
+    ("Is SAML supported on the Pro plan?", PLAN),
+    ("Which plan do I need for a custom SLA?", PLAN),
+    ("Do I get a dedicated account manager on Pro?", PLAN),
+    ("Is multi-tenancy support in the enterprise plan?", PLAN),
+    ("Can I get white labeling on the pro plan?", PLAN),
+    ("Does the free plan have email notifications?", PLAN),
+    ("Is incident management included in Pro?", PLAN),
+    ("Are custom alert rules available on free?", PLAN),
+    ("Does the enterprise plan include dedicated infrastructure?", PLAN),
+    ("Is query performance insights a pro feature?", PLAN),
+    ("Do free accounts have data profiling and statistics?", PLAN),
+    ("What plan includes cost attribution and optimization?", PLAN),
+    ("Is the private Slack channel only on enterprise?", PLAN),
+    ("Can I use webhooks on the free plan?", PLAN),
+    ("Is lineage part of the free tier?", PLAN),
+    ("Does pro include SSO and RBAC?", PLAN),
+
+    # create_support_ticket: account-specific, broken, urgent
+    ("Our production pipeline is down and alerts stopped firing, please escalate", TICKET),
+    ("I was charged twice this month, can someone fix my invoice?", TICKET),
+    ("Please open a ticket, our monitors are all failing since this morning", TICKET),
+    ("We lost data after the last sync, this is urgent", TICKET),
+    ("I need someone from support to look at my account", TICKET),
+    ("Can you create a support ticket for me?", TICKET),
+    ("The dashboard shows a 500 error for our whole team", TICKET),
+    ("Our SSO login is broken for everyone, we are locked out", TICKET),
+    ("I want to cancel my subscription and get a refund", TICKET),
+    ("Critical: Snowflake monitors stopped running for all our tables", TICKET),
+    ("Please escalate this to engineering, the API returns errors for our workspace", TICKET),
+    ("Our account was suspended by mistake", TICKET),
+    ("I need to talk to a human about a billing problem", TICKET),
+    ("Alerts are firing thousands of times a minute for our account, urgent", TICKET),
+    ("Something is wrong with our workspace, nothing loads", TICKET),
+    ("I found a bug: lineage graph crashes when I open it", TICKET),
+    ("We have an outage affecting our data quality checks right now", TICKET),
+    ("Please reset the admin on our account, the owner left the company", TICKET),
+    ("Our monitors have been stuck in pending for two days", TICKET),
+    ("I need help with a production incident in our warehouse connection", TICKET),
+    ("Data from yesterday is missing in all our reports, please investigate", TICKET),
+    ("Please delete all of our company data under GDPR", TICKET),
+    ("Upgrade our account to enterprise and send a contract", TICKET),
+    ("Our API key was leaked, revoke it immediately", TICKET),
+    ("The billing page won't accept our credit card", TICKET),
+
+    # none: greetings, thanks, off-topic (left to the model)
+    ("Hi there", NONE),
+    ("Hello!", NONE),
+    ("Thanks, that helped", NONE),
+    ("Thank you so much", NONE),
+    ("Good morning", NONE),
+    ("Who are you?", NONE),
+    ("Bye", NONE),
+    ("ok", NONE),
+    ("That's all for now", NONE),
+    ("Can you tell me a joke?", NONE),
+    ("What's the weather like today?", NONE),
+    ("Great, thanks!", NONE),
+]
@@ -0,0 +1,436 @@
+"""Conversation session stores: append-only message history with optimistic concurrency and TTL expiry"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from agent.capture import to_plain
+from rag.logging_utils import get_logger
+
+logger = get_logger("agent.sessions")
+
+DEFAULT_DB_PATH = Path(__file__).parent.parent.parent / "data" / "sessions.db"
+
+# Messages larger than this are zlib-compressed (tool results are long and repetitive)
+COMPRESS_OVER = 512
+
+# What a turn sends the model from a long conversation (the stored history is kept whole)
+DEFAULT_MAX_HISTORY = 40
+DEFAULT_MAX_TOOL_RESULT_CHARS = 2000
+TRUNCATED_MARKER = "\n[... truncated]"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    updated_at REAL NOT NULL,
+    expires_at REAL,
+    generation TEXT
+);
+CREATE TABLE IF NOT EXISTS messages (
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (session_id, seq)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS sessions_expiry ON sessions (expires_at);
+"""
+
+
+class SessionConflictError(Exception):
+    """The session was appended to by someone else since it was loaded"""
+
+
+def encode_message(message: Dict) -> bytes:
+    """Compact JSON, zlib-compressed when large; the first byte says which"""
+    data = json.dumps(to_plain(message), separators=(",", ":"), ensure_ascii=False).encode()
+    if len(data) > COMPRESS_OVER:
+        return b"z" + zlib.compress(data, 6)
+    return b"j" + data
+
+
+def decode_message(blob: bytes) -> Dict:
+    data = zlib.decompress(blob[1:]) if blob[:1] == b"z" else blob[1:]
+    return json.loads(data)
+
+
+def new_generation() -> str:
+    return uuid.uuid4().hex
+
+
+class Session:
+    """A conversation's messages as loaded, and the version and generation to append against"""
+
+    __slots__ = ("id", "messages", "version", "generation")
+
+    def __init__(self, id: str, messages: List[Dict], version: int, generation: Optional[str] = None):
+        self.id = id
+        self.messages = messages
+        # Number of stored messages; append() must be given the version it loaded
+        self.version = version
+        # Identifies this conversation under its id: a session that expires or is
+        # deleted starts over with a new generation, even once it regrows past `version`
+        self.generation = generation
+
+    def __repr__(self):
+        return f"Session({self.id!r}, {self.version} messages)"
+
+
+def is_turn_start(message: Dict) -> bool:
+    """A user's own message (tool results come back as user messages with a list of blocks)"""
+    return message.get("role") == "user" and isinstance(message.get("content"), str)
+
+
+def truncate_tool_results(message: Dict, max_chars: int) -> Dict:
+    """Copy of a message with tool_result text cut to max_chars"""
+    content = message.get("content")
+    if not isinstance(content, list) or not any(
+            isinstance(block, dict) and block.get("type") == "tool_result"
+            and isinstance(block.get("content"), str) and len(block["content"]) > max_chars
+            for block in content):
+        return message
+    blocks = []
+    for block in content:
+        if (isinstance(block, dict) and block.get("type") == "tool_result"
+                and isinstance(block.get("content"), str) and len(block["content"]) > max_chars):
+            block = {**block, "content": block["content"][:max_chars] + TRUNCATED_MARKER}
+        blocks.append(block)
+    return {**message, "content": blocks}
+
+
+class SessionStore(ABC):
+    """
+    Base session store; subclasses implement load(), append(), delete() and purge_expired()
+
+    History is append-only: a turn adds messages after the ones it loaded
+    and never rewrites them. append() takes the version the caller loaded
+    and generation and fails with SessionConflictError if another worker
+    appended first, or the conversation was reset and started over, so
+    concurrent turns can't overwrite each other. Every append pushes the
+    session's expiry `ttl` seconds out; expired sessions load as empty.
+    history() bounds what a turn sends the model: the last whole turns
+    within `max_history` messages, with long tool results cut short.
+    """
+
+    def __init__(self, ttl: Optional[float] = 86400.0, max_history: Optional[int] = DEFAULT_MAX_HISTORY,
+                 max_tool_result_chars: Optional[int] = DEFAULT_MAX_TOOL_RESULT_CHARS):
+        """
+        Args:
+            ttl: Seconds of inactivity after which a session expires (None keeps sessions forever)
+            max_history: Most stored messages a turn sends the model (None sends them all)
+            max_tool_result_chars: Longest tool result sent from earlier turns (None keeps them whole)
+        """
+        self.ttl = ttl
+        self.max_history = max_history
+        self.max_tool_result_chars = max_tool_result_chars
+
+    @classmethod
+    def from_env(cls) -> Optional['SessionStore']:
+        """
+        Build from AGENT_SESSION_STORE / AGENT_SESSION_TTL (None if unset)
+
+        AGENT_SESSION_STORE is "memory", "sqlite" (data/sessions.db) or
+        "sqlite:<path>". AGENT_SESSION_MAX_MESSAGES and
+        AGENT_SESSION_MAX_TOOL_RESULT bound the history sent (0 = unbounded).
+        """
+        kind = os.getenv("AGENT_SESSION_STORE")
+        if not kind:
+            return None
+        ttl = os.getenv("AGENT_SESSION_TTL", "86400")
+        ttl = float(ttl) if ttl and float(ttl) > 0 else None
+        max_history = int(os.getenv("AGENT_SESSION_MAX_MESSAGES", str(DEFAULT_MAX_HISTORY))) or None
+        max_tool_result_chars = int(os.getenv("AGENT_SESSION_MAX_TOOL_RESULT",
+                                              str(DEFAULT_MAX_TOOL_RESULT_CHARS))) or None
+        limits = {"max_history": max_history, "max_tool_result_chars": max_tool_result_chars}
+        if kind == "memory":
+            return InMemorySessionStore(ttl=ttl, **limits)
+        if kind == "sqlite" or kind.startswith("sqlite:"):
+            path = kind.partition(":")[2] or str(DEFAULT_DB_PATH)
+            return SQLiteSessionStore(path, ttl=ttl, **limits)
+        raise ValueError(f"Unknown AGENT_SESSION_STORE: {kind!r} (use memory, sqlite or sqlite:<path>)")
+
+    def _expires_at(self, now: float) -> Optional[float]:
+        return now + self.ttl if self.ttl else None
+
+    @abstractmethod
+    def load(self, session_id: str) -> Session:
+        """Messages of a session (empty, version 0, new generation, if it doesn't exist or has expired)"""
+
+    @abstractmethod
+    def append(self, session_id: str, messages: List[Dict], expected_version: int, generation: str) -> int:
+        """
+        Append messages to a session
+
+        Args:
+            session_id: Session to append to (created if expected_version is 0)
+            messages: Messages to add after the stored ones
+            expected_version: Version returned by load()
+            generation: Generation returned by load() (stored when the session is created)
+
+        Returns:
+            New version
+
+        Raises:
+            SessionConflictError: The session's version is no longer expected_version,
+                or it is another generation of the conversation
+        """
+
+    @abstractmethod
+    def delete(self, session_id: str):
+        """Remove a session and its messages"""
+
+    @abstractmethod
+    def purge_expired(self) -> int:
+        """Delete expired sessions; returns how many were removed"""
+
+    def history(self, session: Session) -> List[Dict]:
+        """
+        The part of a session's messages to send the model with the next turn
+
+        Only whole turns are dropped (a turn starts at the user's own
+        message), so no tool_result is sent without its tool_use; the
+        last turn is kept even when it alone is longer than max_history.
+        Tool results longer than max_tool_result_chars are cut short.
+
+        Args:
+            session: Session as loaded
+
+        Returns:
+            Messages, oldest first
+        """
+        messages = session.messages
+        if self.max_history is not None and len(messages) > self.max_history:
+            cut = len(messages) - self.max_history
+            start = next((i for i in range(cut, len(messages)) if is_turn_start(messages[i])), None)
+            if start is None:
+                start = next((i for i in range(cut - 1, -1, -1) if is_turn_start(messages[i])), 0)
+            messages = messages[start:]
+        if self.max_tool_result_chars is not None:
+            messages = [truncate_tool_results(message, self.max_tool_result_chars) for message in messages]
+        return messages
+
+    def append_turn(self, session: Session, messages: List[Dict], max_attempts: int = 3) -> Session:
+        """
+        Append one turn's messages, moving them after any turn stored concurrently
+
+        A turn starts with a user message and ends with the assistant's
+        answer, so two turns that raced each other are still a valid
+        conversation one after the other. A conversation that expired or
+        was deleted during the turn is not continued, even if it has
+        grown again since: the turn was answered from history that no
+        longer exists.
+
+        Args:
+            session: Session as loaded at the start of the turn
+            messages: The turn's messages
+            max_attempts: Appends to try before giving up
+
+        Returns:
+            The session after the append, including turns stored concurrently
+
+        Raises:
+            SessionConflictError: The session was reset during the turn, or
+                other turns kept appending first for max_attempts tries
+        """
+        current = session
+        for attempt in range(max_attempts):
+            try:
+                version = self.append(session.id, messages, current.version, current.generation)
+                return Session(session.id, current.messages + messages, version, current.generation)
+            except SessionConflictError:
+                if attempt == max_attempts - 1:
+                    raise
+                current = self.load(session.id)
+                # A turn that started a conversation can follow whichever turn created it first
+                if session.version and current.generation != session.generation:
+                    raise SessionConflictError(f"Session {session.id} was reset during the turn")
+                logger.warning("Session %s changed during the turn; appending after the other turn", session.id,
+                               extra={"session": session.id})
+
+
+class InMemorySessionStore(SessionStore):
+    """Sessions in this process only (tests, single-worker deployments)"""
+
+    def __init__(self, ttl: Optional[float] = 86400.0, max_history: Optional[int] = DEFAULT_MAX_HISTORY,
+                 max_tool_result_chars: Optional[int] = DEFAULT_MAX_TOOL_RESULT_CHARS):
+        super().__init__(ttl, max_history, max_tool_result_chars)
+        self._lock = threading.Lock()
+        # session id -> (expires_at, encoded messages, generation)
+        self._sessions: Dict[str, tuple] = {}
+
+    def load(self, session_id: str) -> Session:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None or (entry[0] is not None and entry[0] <= time.time()):
+                return Session(session_id, [], 0, new_generation())
+            blobs = list(entry[1])
+            generation = entry[2]
+        return Session(session_id, [decode_message(blob) for blob in blobs], len(blobs), generation)
+
+    def append(self, session_id: str, messages: List[Dict], expected_version: int, generation: str) -> int:
+        encoded = [encode_message(message) for message in messages]
+        now = time.time()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None or (entry[0] is not None and entry[0] <= now):
+                entry = (None, [], generation)
+            version = len(entry[1])
+            if version != expected_version:
+                raise SessionConflictError(f"Session {session_id} is at version {version}, not {expected_version}")
+            if entry[2] != generation:
+                raise SessionConflictError(f"Session {session_id} was reset and started over")
+            entry[1].extend(encoded)
+            self._sessions[session_id] = (self._expires_at(now), entry[1], generation)
+            return len(entry[1])
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        with self._lock:
+            expired = [sid for sid, (expires_at, _, _) in self._sessions.items()
+                       if expires_at is not None and expires_at <= now]
+            for sid in expired:
+                del self._sessions[sid]
+        return len(expired)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Sessions in a SQLite database (WAL mode) shared by every worker on a host or volume
+
+    One row per message, keyed (session_id, seq), so an append inserts only
+    the new messages and a load is a single range scan. Appends check the
+    version inside a write transaction; readers never block the writer.
+    """
+
+    def __init__(self, path: str = str(DEFAULT_DB_PATH), ttl: Optional[float] = 86400.0,
+                 synchronous: str = "NORMAL", max_history: Optional[int] = DEFAULT_MAX_HISTORY,
+                 max_tool_result_chars: Optional[int] = DEFAULT_MAX_TOOL_RESULT_CHARS):
+        """
+        Initialize session store
+
+        Args:
+            path: SQLite database file
+            ttl: Seconds of inactivity after which a session expires (None keeps sessions forever)
+            synchronous: SQLite synchronous level (NORMAL survives process crashes; FULL also power loss)
+            max_history: Most stored messages a turn sends the model (None sends them all)
+            max_tool_result_chars: Longest tool result sent from earlier turns (None keeps them whole)
+        """
+        super().__init__(ttl, max_history, max_tool_result_chars)
+        self.path = str(path)
+        self.synchronous = synchronous
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        if "generation" not in {column[1] for column in conn.execute("PRAGMA table_info(sessions)")}:
+            # Databases from before generations: each stored session is its own first generation
+            conn.execute("ALTER TABLE sessions ADD COLUMN generation TEXT")
+            conn.execute("UPDATE sessions SET generation = id")
+
+    def _conn(self) -> sqlite3.Connection:
+        """Per-thread connection"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={self.synchronous}")
+            self._local.conn = conn
+        return conn
+
+    def load(self, session_id: str) -> Session:
+        conn = self._conn()
+        # One read transaction: version and messages from the same snapshot
+        conn.execute("BEGIN")
+        try:
+            row = conn.execute("SELECT version, expires_at, generation FROM sessions WHERE id = ?",
+                               (session_id,)).fetchone()
+            if row is None or (row[1] is not None and row[1] <= time.time()):
+                return Session(session_id, [], 0, new_generation())
+            blobs = conn.execute(
+                "SELECT data FROM messages WHERE session_id = ? AND seq < ? ORDER BY seq", (session_id, row[0])
+            ).fetchall()
+        finally:
+            conn.execute("COMMIT")
+        return Session(session_id, [decode_message(blob) for blob, in blobs], row[0], row[2])
+
+    def append(self, session_id: str, messages: List[Dict], expected_version: int, generation: str) -> int:
+        encoded = [encode_message(message) for message in messages]
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT version, expires_at, generation FROM sessions WHERE id = ?",
+                               (session_id,)).fetchone()
+            version = 0
+            stored_generation = generation
+            if row is not None:
+                version, stored_generation = row[0], row[2]
+                if row[1] is not None and row[1] <= now:
+                    # Expired: the conversation starts over
+                    conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+                    version, stored_generation = 0, generation
+            if version != expected_version:
+                raise SessionConflictError(f"Session {session_id} is at version {version}, not {expected_version}")
+            if stored_generation != generation:
+                raise SessionConflictError(f"Session {session_id} was reset and started over")
+            conn.executemany(
+                "INSERT INTO messages (session_id, seq, data) VALUES (?, ?, ?)",
+                [(session_id, version + i, blob) for i, blob in enumerate(encoded)]
+            )
+            version += len(encoded)
+            conn.execute(
+                "INSERT INTO sessions (id, version, updated_at, expires_at, generation) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET version = excluded.version, updated_at = excluded.updated_at, "
+                "expires_at = excluded.expires_at, generation = excluded.generation",
+                (session_id, version, now, self._expires_at(now), generation)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return version
+
+    def delete(self, session_id: str):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def purge_expired(self) -> int:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            expired = [sid for sid, in conn.execute(
+                "SELECT id FROM sessions WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),)
+            )]
+            for sid in expired:
+                conn.execute("DELETE FROM messages WHERE session_id = ?", (sid,))
+                conn.execute("DELETE FROM sessions WHERE id = ?", (sid,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if expired:
+            logger.info("Purged %d expired sessions", len(expired), extra={"sessions": len(expired)})
+        return len(expired)
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
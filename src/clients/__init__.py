@@ -0,0 +1,22 @@
+"""Shared upstream API clients with pooling, deadlines, retries and circuit breaking"""
+from .resilience import (THROTTLED_STATUS, CircuitBreaker, CircuitOpenError, Deadline, DeadlineExceededError,
+                         LatencyStats, Upstream, is_throttled, is_upstream_failure)
+from .api import get_anthropic_client, get_openai_client, get_upstream, get_upstream_stats, install_client, reset_clients
+
+__all__ = [
+    "THROTTLED_STATUS",
+    "CircuitBreaker",
+    "CircuitOpenError",
+    "Deadline",
+    "DeadlineExceededError",
+    "LatencyStats",
+    "Upstream",
+    "get_anthropic_client",
+    "get_openai_client",
+    "get_upstream",
+    "get_upstream_stats",
+    "install_client",
+    "is_throttled",
+    "is_upstream_failure",
+    "reset_clients",
+]
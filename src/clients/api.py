@@ -0,0 +1,144 @@
+"""Shared, pooled OpenAI and Anthropic clients with per-upstream policies"""
+import os
+import threading
+from typing import Any, Dict, Optional
+
+from .resilience import CircuitBreaker, Upstream
+
+# One keep-alive pool per upstream client, shared by every caller in the process
+POOL_LIMITS = {"max_connections": 20, "max_keepalive_connections": 10, "keepalive_expiry": 60.0}
+
+_lock = threading.Lock()
+_clients: Dict[str, Any] = {}
+_upstreams: Dict[str, Upstream] = {}
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def _http_client(read_timeout: float):
+    # httpx ships with both SDKs; imported lazily like the SDKs themselves
+    import httpx
+
+    return httpx.Client(
+        limits=httpx.Limits(**POOL_LIMITS),
+        timeout=httpx.Timeout(read_timeout, connect=_env_float("UPSTREAM_CONNECT_TIMEOUT", 3.0))
+    )
+
+
+def get_upstream(name: str) -> Upstream:
+    """
+    Get the shared policy for an upstream
+
+    Known upstreams:
+        openai_embeddings: short deadline, 2 retries, hedged after UPSTREAM_HEDGE_AFTER
+        anthropic_messages: breaker and stats only (streams are not retried mid-flight)
+    """
+    with _lock:
+        if name not in _upstreams:
+            breaker = CircuitBreaker(
+                failure_threshold=int(_env_float("UPSTREAM_BREAKER_FAILURES", 5)),
+                reset_timeout=_env_float("UPSTREAM_BREAKER_RESET", 30.0)
+            )
+            if name == "openai_embeddings":
+                _upstreams[name] = Upstream(
+                    name,
+                    deadline=_env_float("EMBEDDING_DEADLINE", 8.0),
+                    max_retries=2,
+                    hedge_after=_env_float("UPSTREAM_HEDGE_AFTER", 0.8),
+                    breaker=breaker
+                )
+            else:
+                _upstreams[name] = Upstream(name, deadline=_env_float("MODEL_DEADLINE", 60.0), breaker=breaker)
+        return _upstreams[name]
+
+
+def get_openai_client(api_key: Optional[str] = None, base_url: Optional[str] = None):
+    """
+    Get the process-wide OpenAI client
+
+    SDK-level retries are disabled: retries, hedging and deadlines are
+    applied by the openai_embeddings upstream so they are counted once.
+
+    Args:
+        api_key: Override OPENAI_API_KEY
+        base_url: Override OPENAI_BASE_URL (e.g. a local fake server)
+    """
+    from openai import OpenAI
+
+    key = f"openai:{base_url or ''}"
+    with _lock:
+        if key not in _clients:
+            _clients[key] = OpenAI(
+                api_key=api_key or os.getenv("OPENAI_API_KEY"),
+                base_url=base_url or os.getenv("OPENAI_BASE_URL") or None,
+                max_retries=0,
+                http_client=_http_client(_env_float("EMBEDDING_DEADLINE", 8.0))
+            )
+        return _clients[key]
+
+
+def get_anthropic_client(api_key: Optional[str] = None, base_url: Optional[str] = None):
+    """
+    Get the process-wide Anthropic client
+
+    The SDK's own retries are kept (bounded to 2): they happen before any
+    stream event is delivered, which is the only point a stream can be
+    retried safely.
+
+    Args:
+        api_key: Override ANTHROPIC_API_KEY
+        base_url: Override ANTHROPIC_BASE_URL (e.g. a local fake server)
+    """
+    from anthropic import Anthropic
+
+    key = f"anthropic:{base_url or ''}"
+    with _lock:
+        if key not in _clients:
+            _clients[key] = Anthropic(
+                api_key=api_key or os.getenv("ANTHROPIC_API_KEY"),
+                base_url=base_url or os.getenv("ANTHROPIC_BASE_URL") or None,
+                max_retries=2,
+                http_client=_http_client(_env_float("MODEL_DEADLINE", 60.0))
+            )
+        return _clients[key]
+
+
+def install_client(name: str, client: Any = None):
+    """
+    Replace the shared default client for an upstream
+
+    Used to wrap the real client (traffic capture) or swap in a local
+    stand-in (replay). Only the default client is replaced; callers passing
+    an explicit base_url keep their own.
+
+    Args:
+        name: "openai" or "anthropic"
+        client: Client to hand out, or None to go back to building the real one
+    """
+    key = f"{name}:"
+    with _lock:
+        if client is None:
+            _clients.pop(key, None)
+        else:
+            _clients[key] = client
+
+
+def get_upstream_stats() -> Dict[str, Dict[str, Any]]:
+    """Health (breaker state) and latency stats for every upstream used so far"""
+    with _lock:
+        upstreams = list(_upstreams.values())
+    return {u.name: u.health() for u in upstreams}
+
+
+def reset_clients():
+    """Drop shared clients and policies (tests, or after changing env settings)"""
+    with _lock:
+        for client in _clients.values():
+            close = getattr(client, "close", None)
+            if close:
+                close()
+        _clients.clear()
+        _upstreams.clear()
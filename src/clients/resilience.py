@@ -0,0 +1,363 @@
+"""Retry, hedging, circuit breaking and latency tracking for upstream API calls"""
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+from rag.logging_utils import get_logger
+
+logger = get_logger("clients.resilience")
+
+# Rate limited / overloaded: the upstream is healthy but throttling us, so the breaker ignores these
+THROTTLED_STATUS = {429, 529}
+
+
+# Raised when a request got no response: the SDKs' APIConnectionError (APITimeoutError is a
+# subclass) and httpx's TransportError. Matched by name so the SDKs stay lazy imports.
+TRANSPORT_ERRORS = {"APIConnectionError", "TransportError"}
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the upstream while its circuit breaker is open"""
+
+
+class DeadlineExceededError(Exception):
+    """Raised when a call's overall deadline passes before an attempt succeeds"""
+
+
+def is_throttled(error: BaseException) -> bool:
+    return getattr(error, "status_code", None) in THROTTLED_STATUS
+
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """
+    Whether an error says the upstream itself is unhealthy
+
+    5xx responses (other than overload), connection errors and timeouts
+    count; a 4xx is the request's fault and says nothing about the upstream.
+    """
+    status = getattr(error, "status_code", None)
+    if isinstance(status, int):
+        return status >= 500 and status not in THROTTLED_STATUS
+    return (isinstance(error, (ConnectionError, TimeoutError, DeadlineExceededError))
+            or any(cls.__name__ in TRANSPORT_ERRORS for cls in type(error).__mro__))
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Upstream failures and throttling are transient; a bad request fails the same way again"""
+    return is_upstream_failure(error) or is_throttled(error)
+
+
+class CircuitBreaker:
+    """
+    Classic three-state breaker
+
+    closed: calls pass; `failure_threshold` consecutive failures open it.
+    open: calls fail fast with CircuitOpenError for `reset_timeout` seconds.
+    half-open: one trial call passes; success closes, failure re-opens.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """Whether a call may go to the upstream now"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            # Half-open: let a single trial through
+            if self._trial_in_flight:
+                return False
+            self._state = self.HALF_OPEN
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def release(self):
+        """Give up a half-open trial without a verdict (the call was abandoned, not failed)"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning("Circuit opened after %d failures", self._failures,
+                                   extra={"failures": self._failures})
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class Deadline:
+    """Seconds left for a call that can't be timed out from the outside (e.g. a stream)"""
+
+    def __init__(self, name: str, seconds: float):
+        self.name = name
+        self.expires = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return self.expires - time.monotonic()
+
+    def check(self):
+        """Raise DeadlineExceededError once the deadline has passed"""
+        if self.remaining() <= 0:
+            raise DeadlineExceededError(f"{self.name} call exceeded its deadline")
+
+
+class LatencyStats:
+    """Call counts and a rolling window of latencies for percentile reporting"""
+
+    def __init__(self, window: int = 1000):
+        self.latencies: deque = deque(maxlen=window)
+        self.calls = 0
+        self.successes = 0
+        self.failures = 0
+        self.retries = 0
+        self.hedges = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, ok: bool):
+        with self._lock:
+            self.calls += 1
+            if ok:
+                self.successes += 1
+                self.latencies.append(latency)
+            else:
+                self.failures += 1
+
+    def increment(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def percentile(self, p: float) -> Optional[float]:
+        with self._lock:
+            if not self.latencies:
+                return None
+            ordered = sorted(self.latencies)
+        return ordered[min(int(len(ordered) * p), len(ordered) - 1)]
+
+    def snapshot(self) -> Dict[str, Any]:
+        def ms(value):
+            return round(value * 1000, 1) if value is not None else None
+
+        return {
+            "calls": self.calls,
+            "successes": self.successes,
+            "failures": self.failures,
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "rejected": self.rejected,
+            "p50_ms": ms(self.percentile(0.50)),
+            "p95_ms": ms(self.percentile(0.95)),
+            "p99_ms": ms(self.percentile(0.99)),
+        }
+
+
+class Upstream:
+    """
+    Policy wrapper for one upstream API (e.g. OpenAI embeddings)
+
+    Combines a per-call deadline, bounded retries with jittered exponential
+    backoff, optional hedged requests for idempotent calls, a circuit
+    breaker and latency stats.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        deadline: float = 10.0,
+        max_retries: int = 2,
+        backoff_base: float = 0.2,
+        backoff_max: float = 2.0,
+        hedge_after: Optional[float] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        retry_on: Callable[[BaseException], bool] = is_retryable
+    ):
+        """
+        Initialize upstream policy
+
+        Args:
+            name: Name used in stats and logs
+            deadline: Overall seconds allowed per call, across retries
+            max_retries: Extra attempts after the first failure
+            backoff_base: First backoff in seconds (doubles per retry, jittered)
+            backoff_max: Backoff cap in seconds
+            hedge_after: Send a duplicate request if the first hasn't answered
+                after this many seconds (None disables hedging)
+            breaker: Circuit breaker (a default one is created)
+            retry_on: Whether an error is worth retrying (default: upstream failures and throttling)
+        """
+        self.name = name
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_after = hedge_after
+        self.breaker = breaker or CircuitBreaker()
+        self.retry_on = retry_on
+        self.stats = LatencyStats()
+        self._executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix=f"hedge-{name}")
+
+    def call(self, fn: Callable[[float], Any], deadline: Optional[float] = None, hedge: bool = False,
+             on_request: Optional[Callable[[], None]] = None) -> Any:
+        """
+        Call `fn(timeout)` under this upstream's policy
+
+        Args:
+            fn: Performs one attempt; receives the seconds left before the deadline
+            deadline: Override the overall deadline for this call
+            hedge: Allow a hedged duplicate request (idempotent calls only)
+            on_request: Called before every request sent, retries and hedges
+                included (e.g. to charge for it); raising stops the call, or
+                for a hedge, skips the duplicate
+
+        Returns:
+            The first successful attempt's result
+        """
+        if not self.breaker.allow():
+            self.stats.increment("rejected")
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+        expires = time.monotonic() + (deadline or self.deadline)
+        attempt = 0
+        while True:
+            remaining = expires - time.monotonic()
+            if remaining <= 0:
+                self.breaker.record_failure()
+                raise DeadlineExceededError(f"{self.name} call exceeded its deadline")
+
+            if on_request is not None:
+                try:
+                    on_request()
+                except BaseException:
+                    self.breaker.release()
+                    raise
+
+            start = time.monotonic()
+            try:
+                if hedge and self.hedge_after is not None:
+                    result = self._hedged(fn, remaining, on_request)
+                else:
+                    result = fn(remaining)
+            except BaseException as e:
+                if not isinstance(e, Exception) or not self.retry_on(e):
+                    # Bad request or interrupt: fails the same way again, and only
+                    # an upstream failure counts towards the breaker
+                    if isinstance(e, Exception):
+                        self.stats.record(time.monotonic() - start, ok=False)
+                    self._settle(e)
+                    raise
+                self.stats.record(time.monotonic() - start, ok=False)
+                attempt += 1
+                backoff = min(self.backoff_base * 2 ** (attempt - 1), self.backoff_max) * random.uniform(0.5, 1.0)
+                if attempt > self.max_retries or time.monotonic() + backoff >= expires:
+                    self._settle(e)
+                    raise
+                logger.debug("%s attempt %d failed (%s); retrying in %.2fs", self.name, attempt, e, backoff,
+                             extra={"upstream": self.name, "attempt": attempt})
+                self.stats.increment("retries")
+                time.sleep(backoff)
+                continue
+
+            self.stats.record(time.monotonic() - start, ok=True)
+            self.breaker.record_success()
+            return result
+
+    def _settle(self, error: BaseException):
+        """Count a failed call towards the breaker only if the upstream was at fault"""
+        if is_upstream_failure(error):
+            self.breaker.record_failure()
+        else:
+            # Throttling, a 4xx or an interrupt: free a half-open trial without a verdict
+            self.breaker.release()
+
+    def _hedged(self, fn: Callable[[float], Any], remaining: float,
+                on_request: Optional[Callable[[], None]] = None) -> Any:
+        """Run fn; if it's slow, race a second copy and return whichever succeeds first"""
+        primary = self._executor.submit(fn, remaining)
+        done, _ = wait([primary], timeout=min(self.hedge_after, remaining))
+        if done:
+            return primary.result()
+
+        if on_request is not None:
+            try:
+                on_request()
+            except Exception as e:
+                # The duplicate wasn't allowed (e.g. over budget): wait for the first request
+                logger.debug("%s hedge skipped: %s", self.name, e, extra={"upstream": self.name})
+                return primary.result()
+
+        self.stats.increment("hedges")
+        hedged = self._executor.submit(fn, max(remaining - self.hedge_after, 0.001))
+        pending = {primary, hedged}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    @contextmanager
+    def guard(self, deadline: Optional[float] = None):
+        """
+        Breaker + stats around a block that can't be retried (e.g. a stream)
+
+        Raises CircuitOpenError without entering the block while open. The
+        block receives a Deadline for the overall call; a client timeout only
+        bounds each read, so a stream should call `deadline.check()` as
+        events arrive. Only upstream failures (5xx, connection errors,
+        timeouts) count towards opening the breaker; throttling and other
+        4xx errors are recorded in the stats only.
+
+        Args:
+            deadline: Override the overall deadline for this call
+        """
+        if not self.breaker.allow():
+            self.stats.increment("rejected")
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+        start = time.monotonic()
+        try:
+            yield Deadline(self.name, deadline or self.deadline)
+        except BaseException as e:
+            if isinstance(e, Exception):
+                self.stats.record(time.monotonic() - start, ok=False)
+            self._settle(e)
+            raise
+        self.stats.record(time.monotonic() - start, ok=True)
+        self.breaker.record_success()
+
+    def health(self) -> Dict[str, Any]:
+        return {"name": self.name, "state": self.breaker.state, **self.stats.snapshot()}
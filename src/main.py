@@ -1,5 +1,12 @@
 """Main entry point for the support agent"""
+import os
 from agent.core import chat_loop
+from rag.logging_utils import configure_logging
 
 if __name__ == "__main__":
-    chat_loop()
\ No newline at end of file
+    configure_logging(
+        level=os.getenv("LOG_LEVEL", "INFO"),
+        style_name=os.getenv("LOG_FORMAT", "kv"),
+        sample_rate=float(os.getenv("LOG_SAMPLE_RATE", "0.1"))
+    )
+    chat_loop()
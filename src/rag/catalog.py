@@ -0,0 +1,233 @@
+"""Metadata catalog for the knowledge base (sources, titles, sections, chunk counts)"""
+import json
+import os
+from pathlib import Path
+from typing import List, Dict, Optional
+
+
+def also_in_key(source: str) -> str:
+    """Metadata flag on a canonical chunk that also stands for a deduplicated chunk of `source`"""
+    return f"also_in:{source}"
+
+
+class UnknownSourceError(ValueError):
+    """A source name that matches no catalogued source, or more than one"""
+
+    def __init__(self, name: str, available: List[str], matches: Optional[List[str]] = None):
+        self.name = name
+        self.available = available
+        self.matches = matches or []
+        if self.matches:
+            message = f"Ambiguous source {name!r}: matches {', '.join(self.matches)}"
+        else:
+            message = f"Unknown source {name!r}; available: {', '.join(available) or 'none'}"
+        super().__init__(message)
+
+
+class MetadataCatalog:
+    """
+    Small JSON catalog maintained next to the vector store at ingest time
+
+    Lets the retriever list sources and scope queries without scanning the
+    whole collection.
+    """
+
+    def __init__(self, path: Optional[str] = None, entries: Optional[Dict[str, Dict]] = None):
+        """
+        Initialize catalog
+
+        Args:
+            path: JSON file the catalog is persisted to (None keeps it in memory)
+            entries: Initial entries (used instead of loading from disk)
+        """
+        self.path = Path(path) if path is not None else None
+        # source -> {"title": str, "chunks": int, "sections": {section: chunk count}}
+        self.entries: Dict[str, Dict] = {}
+        self._sorted_sources: List[str] = []
+        if entries is not None:
+            self.entries = entries
+            self._refresh()
+        else:
+            self.load()
+
+    def load(self):
+        """Load catalog from disk (empty if missing)"""
+        if self.path is not None and self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f).get("sources", {})
+        self._refresh()
+
+    def save(self):
+        """Persist catalog atomically"""
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"sources": self.entries}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def _refresh(self):
+        self._sorted_sources = sorted(self.entries)
+
+    def add(self, metadatas: List[Dict], save: bool = True):
+        """
+        Record chunk metadata for newly added documents
+
+        A canonical chunk's `also_in` references (see rag.dedup) count as
+        chunks of the sources they name, under "aliases", so those sources
+        stay listed and scopable even if all their own chunks were merged away.
+        """
+        for metadata in metadatas:
+            source = metadata.get('source')
+            if source is None:
+                continue
+            self._count(source, metadata.get('section', ''), metadata.get('title', ''))
+            for reference in filter(None, metadata.get('also_in', '').split('; ')):
+                alias, _, section = reference.partition(' > ')
+                if alias != source:
+                    entry = self._count(alias, section, '')
+                    entry["aliases"] = entry.get("aliases", 0) + 1
+
+        self._refresh()
+        if save:
+            self.save()
+
+    def _count(self, source: str, section: str, title: str) -> Dict:
+        entry = self.entries.setdefault(source, {"title": title, "chunks": 0, "sections": {}})
+        if not entry["title"]:
+            entry["title"] = title
+        entry["chunks"] += 1
+        entry["sections"][section] = entry["sections"].get(section, 0) + 1
+        return entry
+
+    def remove_source(self, source: str):
+        """Forget a source that was deleted from the store"""
+        if self.entries.pop(source, None) is not None:
+            self._refresh()
+            self.save()
+
+    def clear(self):
+        """Forget all sources"""
+        self.entries = {}
+        self._refresh()
+        self.save()
+
+    def is_empty(self) -> bool:
+        return not self.entries
+
+    def sources(self) -> List[str]:
+        """Sorted list of source files"""
+        return self._sorted_sources
+
+    def title(self, source: str) -> str:
+        return self.entries.get(source, {}).get("title", "")
+
+    def sections(self, source: str) -> List[str]:
+        """Section titles of a source"""
+        return list(self.entries.get(source, {}).get("sections", {}))
+
+    def chunk_count(self, source: Optional[str] = None, section: Optional[str] = None) -> int:
+        """Number of chunks in the whole catalog, a source, or a source section"""
+        if source is None:
+            return sum(entry["chunks"] for entry in self.entries.values())
+
+        entry = self.entries.get(source)
+        if entry is None:
+            return 0
+        if section is None:
+            return entry["chunks"]
+        return entry["sections"].get(section, 0)
+
+    def resolve_source(self, name: str) -> Optional[str]:
+        """
+        Resolve a user/model supplied source name to a catalogued source
+
+        Accepts exact file names, names without the .md extension or number
+        prefix (e.g. "bigquery_integration"), or a substring of the file name
+        or title (e.g. "bigquery").
+        """
+        matches = self._source_matches(name)
+        return matches[0] if len(matches) == 1 else None
+
+    def _source_matches(self, name: str) -> List[str]:
+        """Catalogued sources a name could refer to (one entry when it is exact)"""
+        if name in self.entries:
+            return [name]
+
+        needle = name.lower().strip().replace(' ', '_')
+        if needle.endswith('.md'):
+            needle = needle[:-3]
+
+        matches = []
+        for source in self._sorted_sources:
+            stem = source.lower()[:-3] if source.lower().endswith('.md') else source.lower()
+            title = self.title(source).lower().replace(' ', '_')
+            if needle == stem or stem.split('_', 1)[-1] == needle:
+                return [source]
+            if needle in stem or needle in title:
+                matches.append(source)
+
+        return matches
+
+    def build_filter(
+        self,
+        sources: Optional[List[str]] = None,
+        sections: Optional[List[str]] = None
+    ) -> Optional[Dict]:
+        """
+        Build a Chroma `where` filter scoping a query to sources/sections
+
+        A source whose chunks were deduplicated into another source's
+        canonical chunks also matches those chunks (via their also_in flag).
+        Sections always filter on a chunk's own section.
+
+        Returns None if nothing is scoped.
+
+        Raises:
+            UnknownSourceError: A source name resolves to no source or to
+                several (the scope is never silently widened to everything)
+        """
+        clauses = []
+
+        resolved = []
+        for name in sources or []:
+            matches = self._source_matches(name)
+            if len(matches) != 1:
+                raise UnknownSourceError(name, self._sorted_sources, matches)
+            resolved.append(matches[0])
+        if resolved:
+            clause = {"source": resolved[0]} if len(resolved) == 1 else {"source": {"$in": resolved}}
+            aliased = [{also_in_key(source): True} for source in resolved if self.entries[source].get("aliases")]
+            clauses.append({"$or": [clause, *aliased]} if aliased else clause)
+
+        if sections:
+            clauses.append({"section": sections[0]} if len(sections) == 1
+                           else {"section": {"$in": list(sections)}})
+
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+    def candidate_count(self, where: Optional[Dict]) -> int:
+        """Upper bound on the chunks a filter built by build_filter can match"""
+        if where is None:
+            return self.chunk_count()
+
+        clauses = where.get("$and", [where])
+        sources = self._sorted_sources
+        sections = None
+        for clause in clauses:
+            if "$or" in clause:
+                # Source clause plus also_in flags; aliases are already in the source's counts
+                clause = clause["$or"][0]
+            if "source" in clause:
+                value = clause["source"]
+                sources = value["$in"] if isinstance(value, dict) else [value]
+            if "section" in clause:
+                value = clause["section"]
+                sections = value["$in"] if isinstance(value, dict) else [value]
+
+        if sections is None:
+            return sum(self.chunk_count(source) for source in sources)
+        return sum(self.chunk_count(source, section) for source in sources for section in sections)
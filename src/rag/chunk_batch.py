@@ -0,0 +1,291 @@
+"""Columnar chunk batches: interned per-file metadata, integer offset arrays and a float32 embedding buffer"""
+import hashlib
+import sys
+from array import array
+from collections.abc import MutableMapping
+from typing import Dict, Iterator, List, Optional, Sequence
+
+# Metadata keys stored as columns; anything else lands in the sparse extra columns
+_COLUMN_KEYS = ("source", "title", "section", "section_number", "file_path", "chunk_id", "chunk_start", "chunk_end")
+
+
+def content_hash(text: str) -> int:
+    """First 32 bits of the content md5 (the 8 hex digits in a chunk id)"""
+    return int(hashlib.md5(text.encode()).hexdigest()[:8], 16)
+
+
+class FileMeta:
+    """Metadata shared by every chunk of one file"""
+
+    __slots__ = ("source", "title", "file_path")
+
+    def __init__(self, source: str, title: str, file_path: str):
+        self.source = sys.intern(source)
+        self.title = sys.intern(title)
+        self.file_path = sys.intern(file_path)
+
+
+class ChunkMetadata(MutableMapping):
+    """Dict-like view of one chunk's metadata; writes go back into the batch"""
+
+    __slots__ = ("batch", "index")
+
+    def __init__(self, batch: 'ChunkBatch', index: int):
+        self.batch = batch
+        self.index = index
+
+    def _items(self) -> Dict:
+        batch, i = self.batch, self.index
+        file = batch.files[batch.file_index[i]]
+        items = {
+            "source": file.source,
+            "title": file.title,
+            "section": batch.sections[batch.section_index[i]],
+            "section_number": batch.section_number[i],
+            "file_path": file.file_path,
+            "chunk_id": batch.chunk_id[i],
+            "chunk_start": batch.chunk_start[i],
+            "chunk_end": batch.chunk_end[i],
+        }
+        for key, values in batch.extra.items():
+            if i in values:
+                items[key] = values[i]
+        return items
+
+    def __getitem__(self, key):
+        return self._items()[key]
+
+    def __setitem__(self, key, value):
+        if key in _COLUMN_KEYS:
+            raise KeyError(f"{key} is a column of the batch and can't be changed per chunk")
+        self.batch.extra.setdefault(key, {})[self.index] = value
+
+    def __delitem__(self, key):
+        del self.batch.extra[key][self.index]
+
+    def __iter__(self):
+        return iter(self._items())
+
+    def __len__(self):
+        return len(self._items())
+
+
+class ChunkView:
+    """One chunk of a batch, with the attributes of a Document"""
+
+    __slots__ = ("batch", "index")
+
+    def __init__(self, batch: 'ChunkBatch', index: int):
+        self.batch = batch
+        self.index = index
+
+    @property
+    def content(self) -> str:
+        return self.batch.texts[self.index]
+
+    @property
+    def metadata(self) -> ChunkMetadata:
+        return ChunkMetadata(self.batch, self.index)
+
+    @property
+    def id(self) -> str:
+        return self.batch.id(self.index)
+
+
+class ChunkBatch:
+    """
+    Chunks stored column-wise instead of one Document (and dict) per chunk
+
+    source/title/file_path are stored once per file and section titles once
+    per distinct title, both interned; each chunk holds indices into those
+    tables plus its section number, chunk_id, offsets and content hash in unsigned int
+    arrays. Ids and metadata dicts are built on demand. Embeddings live in
+    one contiguous float32 buffer (row i at [i * dimension, (i + 1) *
+    dimension)). Rare keys (also_in, parent_id, ...) go to sparse extra
+    columns.
+
+    Indexing yields ChunkViews, so code written against Documents
+    (.content, .metadata, .id) works unchanged.
+    """
+
+    __slots__ = ("files", "sections", "texts", "file_index", "section_index", "section_number", "chunk_id",
+                 "chunk_start", "chunk_end", "hashes", "extra", "embeddings", "dimension",
+                 "_file_lookup", "_section_lookup")
+
+    def __init__(self):
+        self.files: List[FileMeta] = []
+        self.sections: List[str] = []
+        self.texts: List[str] = []
+        self.file_index = array('I')
+        self.section_index = array('I')
+        # Position of the chunk's section in its file (titles repeat, e.g. "Troubleshooting")
+        self.section_number = array('I')
+        self.chunk_id = array('I')
+        self.chunk_start = array('I')
+        self.chunk_end = array('I')
+        self.hashes = array('I')
+        # key -> {chunk index: value}
+        self.extra: Dict[str, Dict[int, object]] = {}
+        self.embeddings = array('f')
+        self.dimension = 0
+        self._file_lookup: Dict[str, int] = {}
+        self._section_lookup: Dict[str, int] = {}
+
+    def add_file(self, source: str, title: str, file_path: str) -> int:
+        """Register a file (once) and return its index"""
+        index = self._file_lookup.get(file_path)
+        if index is None:
+            index = self._file_lookup[file_path] = len(self.files)
+            self.files.append(FileMeta(source, title, file_path))
+        return index
+
+    def _section(self, title: str) -> int:
+        index = self._section_lookup.get(title)
+        if index is None:
+            index = self._section_lookup[title] = len(self.sections)
+            self.sections.append(sys.intern(title))
+        return index
+
+    def append(
+        self,
+        text: str,
+        file: int,
+        section: str,
+        chunk_id: int,
+        chunk_start: int,
+        chunk_end: int,
+        extra: Optional[Dict] = None,
+        section_number: int = 0
+    ) -> int:
+        """
+        Add one chunk
+
+        Args:
+            text: Chunk text
+            file: Index from add_file
+            section: Section title
+            chunk_id: Position of the chunk in its section
+            chunk_start: Start offset in the section text
+            chunk_end: End offset in the section text
+            extra: Additional metadata keys for this chunk
+            section_number: Position of the section in its file
+
+        Returns:
+            Index of the chunk
+        """
+        index = len(self.texts)
+        self.texts.append(text)
+        self.file_index.append(file)
+        self.section_index.append(self._section(section))
+        self.section_number.append(section_number)
+        self.chunk_id.append(chunk_id)
+        self.chunk_start.append(chunk_start)
+        self.chunk_end.append(chunk_end)
+        self.hashes.append(content_hash(text))
+        for key, value in (extra or {}).items():
+            self.extra.setdefault(key, {})[index] = value
+        return index
+
+    @classmethod
+    def from_documents(cls, documents: Sequence, texts: Optional[Sequence[str]] = None) -> 'ChunkBatch':
+        """
+        Build a batch from Document-like objects
+
+        Args:
+            documents: Objects with .content and .metadata
+            texts: Text to store for each document (default: document.content).
+                Ids keep hashing the original content, as Document ids do.
+        """
+        batch = cls()
+        for i, doc in enumerate(documents):
+            metadata = doc.metadata
+            file = batch.add_file(metadata['source'], metadata.get('title', ''),
+                                  metadata.get('file_path', metadata['source']))
+            extra = {k: v for k, v in metadata.items() if k not in _COLUMN_KEYS}
+            index = batch.append(
+                doc.content if texts is None else texts[i], file, metadata.get('section', ''),
+                metadata.get('chunk_id', 0), metadata.get('chunk_start', 0), metadata.get('chunk_end', 0), extra,
+                section_number=metadata.get('section_number', 0)
+            )
+            if texts is not None:
+                batch.hashes[index] = content_hash(doc.content)
+        return batch
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def __getitem__(self, index: int) -> ChunkView:
+        if not -len(self) <= index < len(self):
+            raise IndexError(index)
+        return ChunkView(self, index % len(self))
+
+    def __iter__(self) -> Iterator[ChunkView]:
+        return (ChunkView(self, i) for i in range(len(self)))
+
+    def id(self, index: int) -> str:
+        """Chunk id in the Document format: {source}_{chunk_id}_{md5[:8]}"""
+        source = self.files[self.file_index[index]].source
+        return f"{source}_{self.chunk_id[index]}_{self.hashes[index]:08x}"
+
+    def ids(self) -> List[str]:
+        return [self.id(i) for i in range(len(self))]
+
+    def metadata(self, index: int) -> Dict:
+        """Plain metadata dict of one chunk"""
+        return ChunkMetadata(self, index)._items()
+
+    def metadatas(self, start: int = 0, stop: Optional[int] = None) -> List[Dict]:
+        """Plain metadata dicts for a range of chunks (for APIs that need dicts)"""
+        return [self.metadata(i) for i in range(start, len(self) if stop is None else stop)]
+
+    def select(self, indices: Sequence[int]) -> 'ChunkBatch':
+        """New batch with the given chunks, in the given order (file and section tables are shared)"""
+        batch = ChunkBatch()
+        batch.files, batch._file_lookup = self.files, self._file_lookup
+        batch.sections, batch._section_lookup = self.sections, self._section_lookup
+        batch.texts = [self.texts[i] for i in indices]
+        for name in ("file_index", "section_index", "section_number", "chunk_id", "chunk_start", "chunk_end", "hashes"):
+            column = getattr(self, name)
+            setattr(batch, name, array('I', (column[i] for i in indices)))
+        position = {old: new for new, old in enumerate(indices)}
+        for key, values in self.extra.items():
+            kept = {position[i]: value for i, value in values.items() if i in position}
+            if kept:
+                batch.extra[key] = kept
+        if self.dimension and len(self.embeddings):
+            batch.dimension = self.dimension
+            for i in indices:
+                batch.embeddings.extend(self.embedding(i))
+        return batch
+
+    def set_embeddings(self, embeddings):
+        """
+        Store embeddings for all chunks in the float32 buffer
+
+        Args:
+            embeddings: Rows (lists of floats) or a flat float32 array of len(self) * dimension
+        """
+        if isinstance(embeddings, array):
+            if len(self) and len(embeddings) % len(self):
+                raise ValueError("Embedding buffer size is not a multiple of the chunk count")
+            self.embeddings = embeddings
+            self.dimension = len(embeddings) // len(self) if len(self) else 0
+            return
+        if len(embeddings) != len(self):
+            raise ValueError(f"Expected {len(self)} embeddings, got {len(embeddings)}")
+        self.embeddings = array('f')
+        self.dimension = len(embeddings[0]) if embeddings else 0
+        for row in embeddings:
+            if len(row) != self.dimension:
+                raise ValueError(f"Embedding dimension mismatch: expected {self.dimension}, got {len(row)}")
+            self.embeddings.extend(row)
+
+    def embedding(self, index: int) -> memoryview:
+        """Row of the embedding buffer (no copy)"""
+        start = index * self.dimension
+        return memoryview(self.embeddings)[start:start + self.dimension]
+
+    def embedding_rows(self, start: int = 0, stop: Optional[int] = None) -> List[List[float]]:
+        """Embeddings of a range of chunks as lists of floats (for APIs that need lists)"""
+        stop = len(self) if stop is None else stop
+        return [self.embedding(i).tolist() for i in range(start, stop)]
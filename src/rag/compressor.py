@@ -0,0 +1,212 @@
+"""Query-aware extractive compression of retrieved context: keep the sentences that answer the question"""
+import math
+import re
+import threading
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .document_processor import DocumentProcessor
+from .reranker import tokenize
+
+_FENCE_RE = re.compile(r"^```.*?^```[^\n]*$", re.MULTILINE | re.DOTALL)
+_HEADING_RE = re.compile(r"^\s*#+\s")
+
+# Question words carry no evidence about which sentence answers the question
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "can", "do", "does", "for", "how", "i", "in", "is", "it",
+    "me", "my", "of", "on", "or", "the", "to", "we", "what", "when", "where", "which", "who", "why",
+    "with", "you", "your"
+}
+
+GAP_MARKER = "\n[...]\n"
+
+
+def _stem(term: str) -> str:
+    """Fold plurals so 'alerts' matches 'alert'"""
+    if len(term) > 3 and term.endswith("s") and not term.endswith("ss"):
+        return term[:-1]
+    return term
+
+
+def _terms(text: str) -> List[str]:
+    return [_stem(t) for t in tokenize(text) if t not in _STOPWORDS]
+
+
+def _default_count_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class ExtractiveCompressor:
+    """
+    Shrinks assembled excerpts to their most query-relevant sentences
+
+    Sentences from all excerpts are scored together with BM25 against the
+    query (idf over the retrieved sentences, so no embedding calls), plus a
+    small prior for better-ranked excerpts. The best sentences are taken
+    greedily until the token budget is spent and each excerpt is rebuilt
+    from its kept sentences in their original order; dropped runs become
+    "[...]". Fenced code blocks are kept or dropped whole, and a line
+    ending in ':' is kept together with the block it introduces.
+    """
+
+    def __init__(self, max_tokens: int = 300, rank_prior: float = 0.15, k1: float = 1.2, b: float = 0.5):
+        """
+        Initialize compressor
+
+        Args:
+            max_tokens: Token budget for the kept sentences across all excerpts
+            rank_prior: Score discount per excerpt rank (0 ignores retrieval order)
+            k1: BM25 term-frequency saturation
+            b: BM25 length normalization strength
+        """
+        self.max_tokens = max_tokens
+        self.rank_prior = rank_prior
+        self.k1 = k1
+        self.b = b
+        self._processor = DocumentProcessor()
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    def units(self, text: str) -> List[Tuple[int, int]]:
+        """Sentence spans of text, with each fenced code block as one unit"""
+        spans = []
+        position = 0
+        for fence in _FENCE_RE.finditer(text):
+            spans.extend((position + s, position + e)
+                         for s, e in self._processor.split_sentences(text[position:fence.start()]))
+            spans.append((fence.start(), fence.end()))
+            position = fence.end()
+        spans.extend((position + s, position + e) for s, e in self._processor.split_sentences(text[position:]))
+        return spans
+
+    def compress(
+        self,
+        query: str,
+        excerpts: List[Dict],
+        max_tokens: Optional[int] = None,
+        count_tokens: Optional[Callable[[str], int]] = None
+    ) -> List[Dict]:
+        """
+        Keep the top-scoring sentences of the excerpts under a token budget
+
+        Args:
+            query: User question the context is for
+            excerpts: Ranked excerpts (dicts with 'content' and 'metadata')
+            max_tokens: Budget override for this call
+            count_tokens: Token counter (default: ~4 characters per token)
+
+        Returns:
+            Excerpts with compressed 'content' (excerpts left with no sentence
+            are dropped); unchanged if no sentence matches the query
+        """
+        budget = self.max_tokens if max_tokens is None else max_tokens
+        count_tokens = count_tokens or _default_count_tokens
+        query_terms = set(_terms(query))
+
+        # (excerpt index, start, end, term counts) for every unit
+        units = []
+        for index, excerpt in enumerate(excerpts):
+            content = excerpt['content']
+            # Headings score nothing: format_context already labels each excerpt with its section
+            units.extend(
+                (index, s, e, Counter() if _HEADING_RE.match(content[s:e]) else Counter(_terms(content[s:e])))
+                for s, e in self.units(content)
+            )
+        if not units or not query_terms:
+            return excerpts
+
+        scores = self._score(units, query_terms)
+        if max(scores) <= 0:
+            return excerpts
+
+        keep = set()
+        spent = 0
+        tokens = {}
+        for position in sorted(range(len(units)), key=lambda p: -scores[p]):
+            if scores[position] <= 0:
+                break
+            # A lead-in ending in ':' and the block it introduces go together
+            group = [position]
+            if self._introduces(units, excerpts, position - 1, position):
+                group.append(position - 1)
+            if self._introduces(units, excerpts, position, position + 1):
+                group.append(position + 1)
+            cost = 0
+            for p in group:
+                if p not in keep and p not in tokens:
+                    i, s, e, _ = units[p]
+                    tokens[p] = count_tokens(excerpts[i]['content'][s:e])
+                cost += 0 if p in keep else tokens[p]
+            if spent + cost > budget:
+                continue
+            keep.update(group)
+            spent += cost
+
+        compressed = []
+        for index, excerpt in enumerate(excerpts):
+            spans = [(s, e, p in keep) for p, (i, s, e, _) in enumerate(units) if i == index]
+            if any(kept for _, _, kept in spans):
+                compressed.append({**excerpt, 'content': self._join(excerpt['content'], spans)})
+
+        with self._lock:
+            self.calls += 1
+            self.input_tokens += sum(count_tokens(e['content']) for e in excerpts)
+            self.output_tokens += sum(count_tokens(e['content']) for e in compressed)
+        return compressed
+
+    def _introduces(self, units: List[tuple], excerpts: List[Dict], lead: int, block: int) -> bool:
+        if lead < 0 or block >= len(units) or units[lead][0] != units[block][0]:
+            return False
+        index, start, end, _ = units[lead]
+        return excerpts[index]['content'][start:end].rstrip().endswith(':')
+
+    def _score(self, units: List[tuple], query_terms: set) -> List[float]:
+        """BM25 of each unit against the query, discounted by its excerpt's rank"""
+        document_frequency = Counter()
+        for unit in units:
+            document_frequency.update(set(unit[3]) & query_terms)
+        total = len(units)
+        idf = {term: math.log(1 + (total - df + 0.5) / (df + 0.5)) for term, df in document_frequency.items()}
+        lengths = [sum(unit[3].values()) for unit in units]
+        average = (sum(lengths) / total) or 1.0
+
+        scores = []
+        for unit, length in zip(units, lengths):
+            counts = unit[3]
+            norm = self.k1 * (1 - self.b + self.b * length / average)
+            score = sum(
+                idf[term] * counts[term] * (self.k1 + 1) / (counts[term] + norm)
+                for term in query_terms if counts.get(term)
+            )
+            scores.append(score / (1 + self.rank_prior * unit[0]))
+        return scores
+
+    def _join(self, content: str, spans: List[Tuple[int, int, bool]]) -> str:
+        """Kept spans in order; adjacent ones keep the text between them, dropped runs become markers"""
+        runs = []
+        for i, (start, end, kept) in enumerate(spans):
+            if not kept:
+                continue
+            if runs and spans[i - 1][2]:
+                runs[-1][1] = end
+            else:
+                runs.append([start, end])
+
+        text = GAP_MARKER.join(content[start:end].strip() for start, end in runs)
+        if not spans[0][2]:
+            text = "[...] " + text
+        if not spans[-1][2]:
+            text += " [...]"
+        return text
+
+    def get_stats(self) -> Dict:
+        """Totals over all compressed contexts"""
+        with self._lock:
+            return {
+                "contexts": self.calls,
+                "input_tokens": self.input_tokens,
+                "output_tokens": self.output_tokens,
+                "ratio": round(self.output_tokens / self.input_tokens, 3) if self.input_tokens else None,
+            }
@@ -0,0 +1,147 @@
+"""Assemble retrieved chunks into contiguous, de-duplicated excerpts"""
+from typing import List, Dict
+
+
+# Rank given to fetched neighbours so they sort after every real hit
+_NEIGHBOR_RANK = 1_000_000
+
+
+def text_overlap(left: str, right: str, max_overlap: int) -> int:
+    """Length of the longest suffix of left that is a prefix of right"""
+    limit = min(len(left), len(right), max_overlap)
+    for size in range(limit, 0, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+class ContextAssembler:
+    """Groups hits by file and section and stitches overlapping chunk spans"""
+
+    def __init__(self, vector_store=None, expand_neighbors: int = 0, overlap_slack: int = 50):
+        """
+        Initialize assembler
+
+        Args:
+            vector_store: VectorStore used to fetch neighbouring chunks
+            expand_neighbors: Chunks to pull in on each side of every hit (0 disables)
+            overlap_slack: Extra characters to search beyond the offset-derived
+                overlap (stored text is cleaned, so offsets are approximate)
+        """
+        self.vector_store = vector_store
+        self.expand_neighbors = expand_neighbors
+        self.overlap_slack = overlap_slack
+
+    def assemble(self, results: List[Dict]) -> List[Dict]:
+        """
+        Merge ranked hits into excerpts
+
+        Hits from the same section of a file (its section_number: titles such
+        as "Troubleshooting" repeat) whose chunk_start/chunk_end spans overlap
+        or touch become one excerpt; the overlapping text is kept once.
+        Excerpts are ordered by their best-ranked hit.
+
+        Args:
+            results: Ranked search results (dicts with 'content', 'metadata', 'id')
+
+        Returns:
+            List of dicts with 'content', 'metadata', 'ids'
+        """
+        groups: Dict[tuple, List[tuple]] = {}
+        for rank, result in enumerate(results):
+            groups.setdefault(self._group_key(result['metadata']), []).append((rank, result))
+
+        if self.expand_neighbors and self.vector_store is not None:
+            for members in groups.values():
+                members.extend(self._fetch_neighbors(members))
+
+        excerpts = []
+        for members in groups.values():
+            members.sort(key=lambda item: item[1]['metadata'].get('chunk_start', 0))
+            span = [members[0]]
+            for member in members[1:]:
+                span_end = max(m[1]['metadata'].get('chunk_end', 0) for m in span)
+                if member[1]['metadata'].get('chunk_start', 0) <= span_end:
+                    span.append(member)
+                else:
+                    excerpts.extend(self._stitch(span))
+                    span = [member]
+            excerpts.extend(self._stitch(span))
+
+        # Drop spans made only of fetched neighbours
+        excerpts = [e for e in excerpts if e['rank'] < _NEIGHBOR_RANK]
+        excerpts.sort(key=lambda excerpt: excerpt['rank'])
+        return excerpts
+
+    def _group_key(self, metadata: Dict) -> tuple:
+        # Collections ingested before section_number existed fall back to the title
+        section = metadata.get('section_number')
+        return (metadata.get('file_path') or metadata.get('source'),
+                metadata.get('section') if section is None else section)
+
+    def _fetch_neighbors(self, members: List[tuple]) -> List[tuple]:
+        """Fetch chunks adjacent to the hits of one group that weren't retrieved"""
+        metadata = members[0][1]['metadata']
+        have = {m[1]['metadata'].get('chunk_id') for m in members}
+        wanted = set()
+        for chunk_id in have:
+            if chunk_id is None:
+                continue
+            for offset in range(1, self.expand_neighbors + 1):
+                wanted.update((chunk_id - offset, chunk_id + offset))
+        wanted = sorted(c for c in wanted - have if c >= 0)
+        if not wanted:
+            return []
+
+        neighbors = self.vector_store.get_chunks(
+            source=metadata.get('source'),
+            section=metadata.get('section'),
+            chunk_ids=wanted,
+            section_number=metadata.get('section_number')
+        )
+        return [(_NEIGHBOR_RANK, neighbor) for neighbor in neighbors]
+
+    def _stitch(self, span: List[tuple]) -> List[Dict]:
+        """
+        Concatenate a sorted span of chunks, dropping shared overlap
+
+        Offsets refer to the raw section text but stored content is cleaned,
+        so the overlap is confirmed on the text itself. Where it can't be
+        found the span is split: the chunk starts a separate excerpt rather
+        than repeating the overlap.
+        """
+        excerpts = []
+        members = [span[0]]
+        content = span[0][1]['content']
+        end = span[0][1]['metadata'].get('chunk_end', 0)
+
+        for member in span[1:]:
+            metadata = member[1]['metadata']
+            text = member[1]['content']
+            if metadata.get('chunk_end', 0) <= end and text in content:
+                # Fully contained in what we already have
+                members.append(member)
+                continue
+
+            expected = max(end - metadata.get('chunk_start', 0), 0)
+            overlap = text_overlap(content, text, expected + self.overlap_slack)
+            if overlap:
+                content += text[overlap:]
+                members.append(member)
+            else:
+                excerpts.append(self._excerpt(members, content, end))
+                members, content = [member], text
+            end = max(end, metadata.get('chunk_end', 0))
+
+        excerpts.append(self._excerpt(members, content, end))
+        return excerpts
+
+    @staticmethod
+    def _excerpt(members: List[tuple], content: str, end: int) -> Dict:
+        first = members[0][1]
+        return {
+            'content': content,
+            'metadata': {**first['metadata'], 'chunk_end': end},
+            'ids': [result['id'] for _, result in members],
+            'rank': min(rank for rank, _ in members)
+        }
@@ -0,0 +1,206 @@
+"""Near-duplicate chunk elimination with MinHash signatures and LSH banding"""
+import hashlib
+import random
+import re
+from typing import Dict, List, Optional, Set, Tuple
+
+from .catalog import also_in_key
+from .chunk_batch import ChunkBatch
+from .logging_utils import get_logger
+
+try:
+    import numpy as np
+except ImportError:  # Pure-Python signature fallback
+    np = None
+
+logger = get_logger("rag.dedup")
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+# Mersenne prime for the (a * x + b) mod p hash family; 32-bit shingle
+# hashes keep a * x + b below 2**63, so numpy can use uint64
+_PRIME = (1 << 31) - 1
+
+
+def shingles(text: str, size: int = 5) -> Set[int]:
+    """Hashed word n-grams of the lowercased text (the whole text if shorter)"""
+    words = _WORD_RE.findall(text.lower())
+    grams = [" ".join(words[i:i + size]) for i in range(max(len(words) - size + 1, 1))]
+    return {int.from_bytes(hashlib.blake2b(gram.encode(), digest_size=4).digest(), 'little') for gram in grams}
+
+
+class MinHasher:
+    """Fixed-length MinHash signatures estimating Jaccard similarity of shingle sets"""
+
+    def __init__(self, num_perm: int = 128, seed: int = 1):
+        self.num_perm = num_perm
+        rng = random.Random(seed)
+        self.a = [rng.randrange(1, _PRIME) for _ in range(num_perm)]
+        self.b = [rng.randrange(0, _PRIME) for _ in range(num_perm)]
+        if np is not None:
+            self._a = np.array(self.a, dtype=np.uint64)[:, None]
+            self._b = np.array(self.b, dtype=np.uint64)[:, None]
+
+    def signature(self, shingle_set: Set[int]) -> Tuple[int, ...]:
+        if np is not None:
+            values = np.fromiter(shingle_set, dtype=np.uint64, count=len(shingle_set))[None, :]
+            return tuple(int(v) for v in ((self._a * values + self._b) % _PRIME).min(axis=1))
+        return tuple(min((a * x + b) % _PRIME for x in shingle_set) for a, b in zip(self.a, self.b))
+
+    @staticmethod
+    def similarity(left: Tuple[int, ...], right: Tuple[int, ...]) -> float:
+        """Estimated Jaccard similarity (fraction of matching signature slots)"""
+        return sum(1 for x, y in zip(left, right) if x == y) / len(left)
+
+
+class ChunkDeduplicator:
+    """
+    Collapse near-duplicate chunks before they are embedded
+
+    Two kinds of duplicates are removed:
+
+    - Near-duplicates across the knowledge base (boilerplate repeated in
+      several files): chunks are MinHashed and split into LSH bands; chunks
+      sharing any band bucket become candidates, and candidates whose
+      estimated Jaccard similarity reaches `threshold` are clustered. The
+      first chunk of each cluster (in ingestion order) is kept as the
+      canonical chunk and lists the others in its `also_in` metadata
+      ("source > section" joined with "; ", since Chroma metadata values
+      must be scalars) with their number in `duplicate_count`. For each
+      other source it stands for, it is also flagged `also_in:<source>`.
+    - Overlap tails: the chunker's overlap can leave a short final chunk
+      whose words all appear in the previous chunk of the same section.
+      Such chunks are dropped outright; their text is already indexed.
+
+    Scoped searches match a chunk's own `source` or its also_in flags
+    (see MetadataCatalog.build_filter), so a search restricted to a file
+    still finds text that was merged into another file's chunk.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.8,
+        num_perm: int = 128,
+        bands: int = 16,
+        shingle_size: int = 5,
+        containment: float = 0.95
+    ):
+        """
+        Initialize deduplicator
+
+        Args:
+            threshold: Minimum estimated Jaccard similarity to merge two chunks
+            num_perm: MinHash signature length
+            bands: LSH bands (num_perm / bands rows each); more bands find
+                lower-similarity candidates at the cost of more comparisons
+            shingle_size: Words per shingle
+            containment: Share of a chunk's shingles that must appear in the
+                previous chunk of its section for it to be dropped as a tail
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.containment = containment
+        self.hasher = MinHasher(num_perm=num_perm)
+
+    def _candidate_pairs(self, signatures: List[Tuple[int, ...]]) -> Set[Tuple[int, int]]:
+        pairs = set()
+        for band in range(self.bands):
+            buckets: Dict[Tuple[int, ...], List[int]] = {}
+            lo, hi = band * self.rows, (band + 1) * self.rows
+            for i, signature in enumerate(signatures):
+                buckets.setdefault(signature[lo:hi], []).append(i)
+            for members in buckets.values():
+                for x in range(len(members)):
+                    for y in range(x + 1, len(members)):
+                        pairs.add((members[x], members[y]))
+        return pairs
+
+    def deduplicate(self, documents: List, texts: Optional[List[str]] = None) -> Tuple[List, Dict]:
+        """
+        Remove near-duplicate and overlap-tail chunks
+
+        Args:
+            documents: Document chunks (or a ChunkBatch) in ingestion order
+            texts: Text to compare for each document (default: document.content)
+
+        Returns:
+            Tuple of (kept documents in original order, a ChunkBatch if one
+            was passed in, and a stats dict with
+            input_chunks, output_chunks, near_duplicates, overlap_tails,
+            clusters, chars_saved)
+        """
+        texts = texts if texts is not None else [doc.content for doc in documents]
+        shingle_sets = [shingles(text, self.shingle_size) for text in texts]
+
+        # Overlap tails: compare each chunk with its predecessor in the same section
+        dropped = set()
+        for i in range(1, len(documents)):
+            previous, current = documents[i - 1].metadata, documents[i].metadata
+            if (previous.get('file_path'), previous.get('section')) != (current.get('file_path'), current.get('section')):
+                continue
+            shared = len(shingle_sets[i] & shingle_sets[i - 1])
+            if shared >= self.containment * len(shingle_sets[i]):
+                dropped.add(i)
+        overlap_tails = len(dropped)
+
+        # Near-duplicates: LSH candidates, verified on the signature, clustered with union-find
+        live = [i for i in range(len(documents)) if i not in dropped]
+        signatures = [self.hasher.signature(shingle_sets[i]) for i in live]
+        parent = list(range(len(live)))
+
+        def find(x: int) -> int:
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        for x, y in self._candidate_pairs(signatures):
+            if MinHasher.similarity(signatures[x], signatures[y]) >= self.threshold:
+                root_x, root_y = find(x), find(y)
+                if root_x != root_y:
+                    # Lower index (earlier in ingestion order) stays canonical
+                    parent[max(root_x, root_y)] = min(root_x, root_y)
+
+        clusters: Dict[int, List[int]] = {}
+        for position in range(len(live)):
+            clusters.setdefault(find(position), []).append(position)
+
+        near_duplicates = 0
+        for root, members in clusters.items():
+            if len(members) == 1:
+                continue
+            canonical = documents[live[root]]
+            references = []
+            for member in members[1:]:
+                index = live[member]
+                dropped.add(index)
+                near_duplicates += 1
+                metadata = documents[index].metadata
+                references.append(f"{metadata.get('source', '')} > {metadata.get('section', '')}")
+                if metadata.get('source') != canonical.metadata.get('source'):
+                    canonical.metadata[also_in_key(metadata.get('source', ''))] = True
+            canonical.metadata["also_in"] = "; ".join(references)
+            canonical.metadata["duplicate_count"] = len(references)
+
+        survivors = [i for i in range(len(documents)) if i not in dropped]
+        if isinstance(documents, ChunkBatch):
+            kept = documents.select(survivors)
+        else:
+            kept = [documents[i] for i in survivors]
+        stats = {
+            "input_chunks": len(documents),
+            "output_chunks": len(kept),
+            "near_duplicates": near_duplicates,
+            "overlap_tails": overlap_tails,
+            "clusters": sum(1 for members in clusters.values() if len(members) > 1),
+            "chars_saved": sum(len(texts[i]) for i in dropped),
+        }
+
+        logger.info("Deduplicated %d chunks -> %d (%d near-duplicates, %d overlap tails)",
+                    stats["input_chunks"], stats["output_chunks"], near_duplicates, overlap_tails,
+                    extra=stats)
+        return kept, stats
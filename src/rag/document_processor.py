@@ -1,13 +1,29 @@
 """Document processing utilities for RAG"""
 import os
 import re
-from typing import List, Dict
+from typing import List, Dict, Tuple
 from pathlib import Path
+from .chunk_batch import ChunkBatch
+from .logging_utils import get_logger
+
+logger = get_logger("rag.document_processor")
+
+# Sentence end (not a "1." list marker), blank line, or the start of a list item / header line
+_SENTENCE_BOUNDARY_RE = re.compile(r"(?<=[^\d\s][.!?])\s+|\n\s*\n|\n(?=\s*(?:[-*+]|\d+\.|#+)\s)")
+
+
+
+def _is_heading(text: str) -> bool:
+    """A single markdown header or horizontal-rule line"""
+    text = text.strip()
+    return '\n' not in text and (text.startswith('#') or text == '---')
 
 
 class Document:
     """Represents a document chunk"""
 
+    __slots__ = ("content", "metadata", "id")
+
     def __init__(self, content: str, metadata: Dict[str, any]):
         import hashlib
         self.content = content
@@ -83,8 +99,28 @@ class DocumentProcessor:
             List of Document objects
         """
         chunks = []
+        for chunk_id, (start, end, chunk_text) in enumerate(self.chunk_spans(text)):
+            # Create document
+            chunk_metadata = {
+                **metadata,
+                "chunk_id": chunk_id,
+                "chunk_start": start,
+                "chunk_end": end
+            }
+
+            chunks.append(Document(chunk_text, chunk_metadata))
+
+        return chunks
+
+    def chunk_spans(self, text: str) -> List[Tuple[int, int, str]]:
+        """
+        Overlapping chunk boundaries of text
+
+        Returns:
+            List of (start, end, stripped chunk text)
+        """
+        spans = []
         start = 0
-        chunk_id = 0
 
         while start < len(text):
             # Get chunk
@@ -102,21 +138,132 @@ class DocumentProcessor:
                     chunk_text = chunk_text[:break_point + 1]
                     end = start + break_point + 1
 
-            # Create document
-            chunk_metadata = {
-                **metadata,
-                "chunk_id": chunk_id,
-                "chunk_start": start,
-                "chunk_end": end
-            }
-
-            chunks.append(Document(chunk_text.strip(), chunk_metadata))
+            spans.append((start, end, chunk_text.strip()))
 
             # Move start position with overlap
             start = end - self.chunk_overlap
-            chunk_id += 1
 
-        return chunks
+        return spans
+
+    def split_sentences(self, text: str) -> List[tuple]:
+        """
+        Split text into sentence-like units with their character offsets
+
+        Sentences end at ., ! or ? followed by whitespace; blank lines, list
+        items and headers also start a new unit.
+
+        Returns:
+            List of (start, end) offsets into text
+        """
+        spans = []
+        start = 0
+        for match in _SENTENCE_BOUNDARY_RE.finditer(text):
+            if text[start:match.start()].strip():
+                spans.append((start, match.start()))
+            start = match.end()
+        if text[start:].strip():
+            spans.append((start, len(text)))
+        return spans
+
+    def chunk_sentences(self, text: str, metadata: Dict[str, any], child_size: int = 300) -> List[Document]:
+        """
+        Pack whole sentences into small child chunks of up to child_size characters
+
+        A single sentence longer than child_size becomes its own chunk.
+
+        Args:
+            text: Section text
+            metadata: Metadata to attach to each chunk
+            child_size: Target maximum characters per chunk
+
+        Returns:
+            List of Document objects with chunk_start/chunk_end offsets into text
+        """
+        chunks = []
+        current = None
+        for start, end in self.split_sentences(text):
+            # A lone header line always stays with the text that follows it
+            if current is not None and end - current[0] > child_size and not _is_heading(text[current[0]:current[1]]):
+                chunks.append(current)
+                current = None
+            current = (current[0] if current else start, end)
+        if current is not None:
+            if chunks and _is_heading(text[current[0]:current[1]]):
+                # Trailing rule or header: fold into the last chunk
+                chunks[-1] = (chunks[-1][0], current[1])
+            else:
+                chunks.append(current)
+
+        return [
+            Document(text[start:end].strip(), {**metadata, "chunk_id": i, "chunk_start": start, "chunk_end": end})
+            for i, (start, end) in enumerate(chunks)
+        ]
+
+    def process_file_hierarchical(self, file_path: str, child_size: int = 300) -> Tuple[List[Dict], List[Document]]:
+        """
+        Process a markdown file into parent sections and sentence-sized child chunks
+
+        Children are embedded and searched; each carries the `parent_id` of
+        the section it came from, which is stored once and returned as context.
+
+        Args:
+            file_path: Path to markdown file
+            child_size: Target maximum characters per child chunk
+
+        Returns:
+            Tuple of (parents as dicts with 'id', 'content', 'metadata'; child Documents)
+        """
+        content = self.load_markdown_file(file_path)
+        title = self.extract_title(content)
+        file_name = Path(file_path).name
+
+        parents = []
+        children = []
+        for index, section in enumerate(self.split_by_sections(content)):
+            metadata = {
+                "source": file_name,
+                "title": title,
+                "section": section["title"],
+                "section_number": index,
+                "file_path": file_path
+            }
+            if all(_is_heading(line) for line in section["content"].split('\n') if line.strip()):
+                # Header-only section (its subsections follow as their own sections)
+                continue
+            parent_id = f"{file_name}#{index}"
+            parents.append({"id": parent_id, "content": section["content"], "metadata": metadata})
+            children.extend(self.chunk_sentences(section["content"], {**metadata, "parent_id": parent_id}, child_size))
+
+        return parents, children
+
+    def process_directory_hierarchical(
+        self,
+        directory_path: str,
+        pattern: str = "*.md",
+        child_size: int = 300
+    ) -> Tuple[List[Dict], List[Document]]:
+        """
+        Process all markdown files in a directory into parents and children
+
+        Returns:
+            Tuple of (all parents, all child Documents)
+        """
+        all_parents = []
+        all_children = []
+        files = sorted(Path(directory_path).glob(pattern))
+
+        logger.info("Found %d markdown files", len(files), extra={"files": len(files)})
+
+        for file_path in files:
+            parents, children = self.process_file_hierarchical(str(file_path), child_size)
+            logger.info("Processed %s: %d sections, %d child chunks", file_path.name, len(parents), len(children),
+                        extra={"source": file_path.name, "sections": len(parents), "chunks": len(children)})
+            all_parents.extend(parents)
+            all_children.extend(children)
+
+        logger.info("Total: %d sections, %d child chunks", len(all_parents), len(all_children),
+                    extra={"sections": len(all_parents), "chunks": len(all_children)})
+        return all_parents, all_children
 
     def process_file(self, file_path: str) -> List[Document]:
         """
@@ -141,11 +288,12 @@ class DocumentProcessor:
         # Process each section
         all_documents = []
 
-        for section in sections:
+        for index, section in enumerate(sections):
             metadata = {
                 "source": file_name,
                 "title": title,
                 "section": section["title"],
+                "section_number": index,
                 "file_path": file_path
             }
 
@@ -172,17 +320,49 @@ class DocumentProcessor:
         # Find all matching files
         files = sorted(directory.glob(pattern))
 
-        print(f"Found {len(files)} markdown files")
+        logger.info("Found %d markdown files", len(files), extra={"files": len(files)})
 
         for file_path in files:
-            print(f"\nProcessing: {file_path.name}")
             documents = self.process_file(str(file_path))
-            print(f"  Created {len(documents)} chunks")
+            logger.info("Processed %s: %d chunks", file_path.name, len(documents),
+                        extra={"source": file_path.name, "chunks": len(documents)})
             all_documents.extend(documents)
 
-        print(f"\nTotal documents: {len(all_documents)}")
+        logger.info("Total documents: %d", len(all_documents), extra={"chunks": len(all_documents)})
         return all_documents
 
+    def process_directory_batch(self, directory_path: str, pattern: str = "*.md") -> ChunkBatch:
+        """
+        Process all markdown files in a directory into one columnar ChunkBatch
+
+        Same chunks and ids as process_directory, without a Document and
+        metadata dict per chunk.
+
+        Args:
+            directory_path: Path to directory
+            pattern: File pattern to match
+
+        Returns:
+            ChunkBatch of all chunks
+        """
+        batch = ChunkBatch()
+        files = sorted(Path(directory_path).glob(pattern))
+
+        logger.info("Found %d markdown files", len(files), extra={"files": len(files)})
+
+        for file_path in files:
+            before = len(batch)
+            content = self.load_markdown_file(str(file_path))
+            file = batch.add_file(file_path.name, self.extract_title(content), str(file_path))
+            for index, section in enumerate(self.split_by_sections(content)):
+                for chunk_id, (start, end, chunk_text) in enumerate(self.chunk_spans(section["content"])):
+                    batch.append(chunk_text, file, section["title"], chunk_id, start, end, section_number=index)
+            logger.info("Processed %s: %d chunks", file_path.name, len(batch) - before,
+                        extra={"source": file_path.name, "chunks": len(batch) - before})
+
+        logger.info("Total documents: %d", len(batch), extra={"chunks": len(batch)})
+        return batch
+
 
 def clean_text(text: str) -> str:
     """Clean text for better embedding quality"""
@@ -0,0 +1,486 @@
+"""Versioned embedding spaces: one collection per model, budgeted re-embedding, shadow reads and cutover"""
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from clients import LatencyStats
+from .logging_utils import get_logger
+
+logger = get_logger("rag.embedding_spaces")
+
+DEFAULT_MODEL = "text-embedding-3-small"
+
+# Native output dimension of each supported embedding model
+EMBEDDING_DIMENSIONS = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536,
+}
+
+# Space lifecycle: building -> ready -> active -> retired
+BUILDING = "building"
+READY = "ready"
+ACTIVE = "active"
+RETIRED = "retired"
+
+
+class SpaceRegistry:
+    """
+    Which embedding space (model + collection) serves queries
+
+    Persisted as {collection_prefix}_spaces.json next to the ChromaDB data:
+    the active space, an optional shadow space and per-space metadata
+    (model, dimension, version, status, re-embedding spend). Vectors from
+    different models are not comparable, so each space has its own
+    collection and a query is only ever embedded with its space's model.
+
+    A directory without a registry file is the legacy layout: a single
+    "datapulse_docs" collection embedded with text-embedding-3-small.
+    """
+
+    def __init__(self, persist_directory: str, collection_prefix: str = "datapulse_docs"):
+        self.persist_directory = persist_directory
+        self.collection_prefix = collection_prefix
+        self.path = Path(persist_directory) / f"{collection_prefix}_spaces.json"
+        self._lock = threading.Lock()
+
+    def _legacy(self) -> Dict:
+        return {
+            "active": self.collection_prefix,
+            "shadow": None,
+            "spaces": {
+                self.collection_prefix: {
+                    "model": DEFAULT_MODEL,
+                    "dimension": EMBEDDING_DIMENSIONS[DEFAULT_MODEL],
+                    "version": 1,
+                    "status": ACTIVE,
+                    "spent_usd": 0.0,
+                    "budget_usd": 0.0,
+                }
+            }
+        }
+
+    def _load(self) -> Dict:
+        # Re-read every time: the migration script and the server share the file
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return self._legacy()
+
+    def _save(self, data: Dict):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".json.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def mtime(self) -> Optional[int]:
+        """Modification time of the registry file (None for the legacy layout)"""
+        try:
+            return self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _space(self, data: Dict, name: Optional[str]) -> Optional[Dict]:
+        if name is None or name not in data["spaces"]:
+            return None
+        return {"name": name, **data["spaces"][name]}
+
+    def active(self) -> Dict:
+        """The space queries are served from"""
+        data = self._load()
+        return self._space(data, data["active"])
+
+    def shadow(self) -> Optional[Dict]:
+        """The space receiving shadow reads, if any"""
+        data = self._load()
+        return self._space(data, data.get("shadow"))
+
+    def get(self, name: str) -> Optional[Dict]:
+        return self._space(self._load(), name)
+
+    def spaces(self) -> List[Dict]:
+        data = self._load()
+        return [self._space(data, name) for name in sorted(data["spaces"], key=lambda n: data["spaces"][n]["version"])]
+
+    def create(self, model: str) -> Dict:
+        """
+        Register a new space for `model` (reuses one that is still building)
+
+        Args:
+            model: OpenAI embedding model
+
+        Returns:
+            The space dict (its "name" is the collection to fill)
+        """
+        if model not in EMBEDDING_DIMENSIONS:
+            raise ValueError(f"Unknown embedding model {model!r}; expected one of {sorted(EMBEDDING_DIMENSIONS)}")
+        with self._lock:
+            data = self._load()
+            for name, space in data["spaces"].items():
+                if space["model"] == model and space["status"] in (BUILDING, READY):
+                    return self._space(data, name)
+
+            version = max(space["version"] for space in data["spaces"].values()) + 1
+            name = f"{self.collection_prefix}__{model}__v{version}"
+            data["spaces"][name] = {
+                "model": model,
+                "dimension": EMBEDDING_DIMENSIONS[model],
+                "version": version,
+                "status": BUILDING,
+                "spent_usd": 0.0,
+                "budget_usd": 0.0,
+                "created": time.time(),
+            }
+            self._save(data)
+            return self._space(data, name)
+
+    def update(self, name: str, **fields) -> Dict:
+        """Set fields on a space (status, spent_usd, budget_usd, dimension, ...)"""
+        with self._lock:
+            data = self._load()
+            data["spaces"][name].update(fields)
+            self._save(data)
+            return self._space(data, name)
+
+    def set_shadow(self, name: Optional[str]):
+        """Start (or with None stop) shadow reads against a ready space"""
+        with self._lock:
+            data = self._load()
+            if name is not None and data["spaces"][name]["status"] not in (READY, RETIRED):
+                raise ValueError(f"Space {name!r} is {data['spaces'][name]['status']}, not ready")
+            data["shadow"] = name
+            self._save(data)
+
+    def cutover(self, name: Optional[str] = None) -> Dict:
+        """
+        Make a space active in one atomic registry write
+
+        The previously active space is marked retired but its collection is
+        kept, so cutting back over to it is an instant rollback.
+
+        Args:
+            name: Space to activate (default: the shadow space)
+
+        Returns:
+            The newly active space
+        """
+        with self._lock:
+            data = self._load()
+            name = name or data.get("shadow")
+            if name is None or name not in data["spaces"]:
+                raise ValueError("No space to cut over to")
+            if data["spaces"][name]["status"] not in (READY, RETIRED):
+                raise ValueError(f"Space {name!r} is {data['spaces'][name]['status']}, not ready")
+
+            previous = data["active"]
+            if previous != name:
+                data["spaces"][previous]["status"] = RETIRED
+            data["spaces"][name]["status"] = ACTIVE
+            data["spaces"][name]["activated"] = time.time()
+            data["active"] = name
+            if data.get("shadow") == name:
+                data["shadow"] = None
+            self._save(data)
+
+        logger.info("Cut over embedding space %s -> %s", previous, name, extra={"space": name, "previous": previous})
+        return self._space(data, name)
+
+    def remove(self, name: str):
+        """Forget a retired or unfinished space (drop its collection separately)"""
+        with self._lock:
+            data = self._load()
+            if name == data["active"]:
+                raise ValueError("Cannot remove the active space")
+            data["spaces"].pop(name, None)
+            if data.get("shadow") == name:
+                data["shadow"] = None
+            self._save(data)
+
+
+class ReembedJob:
+    """
+    Copy a collection into a new embedding space, throttled and within budget
+
+    Chunks are re-embedded from their stored text in batches. Ids are
+    content-hashed and identical across spaces, so the job is resumable:
+    each run only embeds chunks the target doesn't have yet, and chunks
+    deleted from the source since the last run are removed from the target.
+
+    Before each batch the job stops if its cost would pass `budget_usd`,
+    and waits as needed to stay under `tokens_per_minute` so the migration
+    doesn't eat the rate limit that live query embeddings share.
+    """
+
+    def __init__(
+        self,
+        source,
+        target,
+        embedding_manager,
+        budget_usd: float,
+        tokens_per_minute: Optional[int] = None,
+        batch_size: int = 100,
+        on_progress: Optional[Callable[[Dict], None]] = None
+    ):
+        """
+        Initialize job
+
+        Args:
+            source: VectorStore of the active space (texts and metadata are read from it)
+            target: VectorStore of the new space
+            embedding_manager: EmbeddingManager for the new space's model
+            budget_usd: Most this run may spend
+            tokens_per_minute: Embedding throughput cap (None for unthrottled)
+            batch_size: Chunks per embedding request
+            on_progress: Called with the progress dict after every batch
+        """
+        self.source = source
+        self.target = target
+        self.embedding_manager = embedding_manager
+        self.budget_usd = budget_usd
+        self.tokens_per_minute = tokens_per_minute
+        self.batch_size = batch_size
+        self.on_progress = on_progress
+        self.stop_event = threading.Event()
+        self.progress = {"status": "pending", "embedded": 0, "remaining": 0, "spent_usd": 0.0, "tokens": 0}
+        self._thread: Optional[threading.Thread] = None
+
+    def pending(self) -> List[Dict]:
+        """Source chunks not yet in the target; drops target chunks no longer in the source"""
+        chunks = self.source.get_all_chunks()
+        source_ids = {chunk['id'] for chunk in chunks}
+        target_ids = set(self.target.get_ids())
+
+        stale = target_ids - source_ids
+        if stale:
+            self.target.delete_ids(sorted(stale))
+        return [chunk for chunk in chunks if chunk['id'] not in target_ids]
+
+    def _throttle(self, started: float, tokens_so_far: int):
+        """Sleep until the run's average rate is back under tokens_per_minute"""
+        if not self.tokens_per_minute:
+            return
+        earliest = started + tokens_so_far / self.tokens_per_minute * 60
+        delay = earliest - time.monotonic()
+        if delay > 0:
+            self.stop_event.wait(delay)
+
+    def run(self) -> Dict:
+        """
+        Re-embed pending chunks until done, out of budget or stopped
+
+        Returns:
+            Progress dict: status ("complete", "budget", "stopped"), embedded,
+            remaining, spent_usd, tokens
+        """
+        pending = self.pending()
+        self.progress.update(status="running", remaining=len(pending))
+        if not self.source.parents.is_empty():
+            # Hierarchical index: the new space needs the parent sections too
+            self.target.parents.update(self.source.parents.entries)
+        started = time.monotonic()
+
+        for i in range(0, len(pending), self.batch_size):
+            if self.stop_event.is_set():
+                self.progress["status"] = "stopped"
+                break
+
+            batch = pending[i:i + self.batch_size]
+            texts = [chunk['content'] for chunk in batch]
+            tokens = sum(self.embedding_manager.count_tokens(text) for text in texts)
+            cost = self.embedding_manager.calculate_cost(tokens)
+            if self.progress["spent_usd"] + cost > self.budget_usd:
+                self.progress["status"] = "budget"
+                break
+
+            self._throttle(started, self.progress["tokens"])
+            if self.stop_event.is_set():
+                self.progress["status"] = "stopped"
+                break
+
+            embeddings = self.embedding_manager.create_embeddings_batch(texts, batch_size=len(texts))
+            self.target.add_documents(
+                documents=texts,
+                embeddings=embeddings,
+                metadatas=[chunk['metadata'] for chunk in batch],
+                ids=[chunk['id'] for chunk in batch]
+            )
+
+            self.progress["embedded"] += len(batch)
+            self.progress["remaining"] -= len(batch)
+            self.progress["tokens"] += tokens
+            self.progress["spent_usd"] += cost
+            if embeddings:
+                self.progress["dimension"] = len(embeddings[0])
+            if self.on_progress is not None:
+                self.on_progress(dict(self.progress))
+        else:
+            self.progress["status"] = "complete"
+
+        logger.info("Re-embedding %s: %d embedded, %d remaining ($%.4f)", self.progress["status"],
+                    self.progress["embedded"], self.progress["remaining"], self.progress["spent_usd"],
+                    extra={"collection": self.target.collection_name, **self.progress})
+        return dict(self.progress)
+
+    def start(self) -> threading.Thread:
+        """Run in a background thread (see `progress`, `stop()` and `join()`)"""
+        self._thread = threading.Thread(target=self.run, name="reembed", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def stop(self):
+        """Finish the current batch and stop"""
+        self.stop_event.set()
+
+    def join(self, timeout: Optional[float] = None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+class ShadowComparator:
+    """
+    Replays a sample of live queries against a shadow space, off the request path
+
+    A sampled live search is repeated on the shadow space with the same
+    arguments (and its own model's query embedding); the live search's
+    result ids are reused, so the primary space isn't queried again. The
+    result-id overlap and per-space latency show whether the new space
+    retrieves the same chunks before it is cut over. At most `max_pending`
+    comparisons wait at a time; samples beyond that are dropped.
+    compare() runs a plain top-k search on both spaces (offline checks).
+    """
+
+    def __init__(self, primary, shadow, sample_rate: float = 0.1, n_results: int = 5, max_workers: int = 1,
+                 max_pending: int = 32):
+        """
+        Initialize comparator
+
+        Args:
+            primary: RAGRetriever over the active space
+            shadow: RAGRetriever over the candidate space
+            sample_rate: Fraction of observed queries that are compared
+            n_results: k for the overlap@k comparison in compare()
+            max_workers: Comparisons run concurrently in the background
+            max_pending: Sampled queries queued or running at once (more are dropped)
+        """
+        self.primary = primary
+        self.shadow = shadow
+        self.sample_rate = sample_rate
+        self.n_results = n_results
+        self.primary_latency = LatencyStats()
+        self.shadow_latency = LatencyStats()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="shadow")
+        self._pending = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self.dropped = 0
+        self.compared = 0
+        self.overlap_sum = 0.0
+        self.top1_matches = 0
+        self.shadow_errors = 0
+
+    def observe(self, query: str, primary_ids: List[str], seconds: float, **search_args):
+        """
+        Sample a live search for background comparison (never blocks or raises)
+
+        Args:
+            query: The live query
+            primary_ids: Ids of the chunks the live search returned
+            seconds: How long the live search took
+            search_args: search_with_context() arguments to repeat on the shadow space
+        """
+        if random.random() >= self.sample_rate:
+            return
+        if not self._pending.acquire(blocking=False):
+            with self._lock:
+                self.dropped += 1
+            return
+        self.primary_latency.record(seconds, ok=True)
+        try:
+            self._executor.submit(self._compare_live, query, list(primary_ids), search_args)
+        except RuntimeError:
+            # Closed by a cutover meanwhile
+            self._pending.release()
+
+    def _compare_live(self, query: str, primary_ids: List[str], search_args: Dict):
+        try:
+            shadow_ids = []
+            self._timed(self.shadow_latency, lambda: self.shadow.search_with_context(
+                query, hit_ids=shadow_ids, **search_args))
+            self._score(query, primary_ids, shadow_ids, len(primary_ids))
+        except Exception as e:
+            with self._lock:
+                self.shadow_errors += 1
+            logger.debug("Shadow comparison failed: %s", e)
+        finally:
+            self._pending.release()
+
+    @staticmethod
+    def _timed(stats: LatencyStats, search: Callable[[], object]):
+        start = time.perf_counter()
+        try:
+            result = search()
+        except Exception:
+            stats.record(time.perf_counter() - start, ok=False)
+            raise
+        stats.record(time.perf_counter() - start, ok=True)
+        return result
+
+    def _timed_search(self, retriever, stats: LatencyStats, query: str, filters: Optional[Dict]) -> List[str]:
+        results = self._timed(stats, lambda: retriever.search(query, n_results=self.n_results, filters=filters))
+        return [result['id'] for result in results]
+
+    def compare(self, query: str, filters: Optional[Dict] = None) -> Dict:
+        """
+        Run one query against both spaces
+
+        Returns:
+            Dict with primary/shadow ids, overlap (|shared| / k) and top1 agreement
+        """
+        primary_ids = self._timed_search(self.primary, self.primary_latency, query, filters)
+        try:
+            shadow_ids = self._timed_search(self.shadow, self.shadow_latency, query, filters)
+        except Exception:
+            with self._lock:
+                self.shadow_errors += 1
+            raise
+        return self._score(query, primary_ids, shadow_ids, self.n_results)
+
+    def _score(self, query: str, primary_ids: List[str], shadow_ids: List[str], k: int) -> Dict:
+        overlap = len(set(primary_ids) & set(shadow_ids)) / max(len(primary_ids), 1)
+        top1 = bool(primary_ids) and bool(shadow_ids) and primary_ids[0] == shadow_ids[0]
+        with self._lock:
+            self.compared += 1
+            self.overlap_sum += overlap
+            self.top1_matches += int(top1)
+
+        logger.debug("Shadow overlap@%d %.2f for %r", k, overlap, query,
+                     extra={"overlap": overlap, "top1": top1, "sample": True})
+        return {"primary": primary_ids, "shadow": shadow_ids, "overlap": overlap, "top1": top1}
+
+    def get_stats(self) -> Dict:
+        """Mean overlap@k, top-1 agreement and latency percentiles of both spaces"""
+        with self._lock:
+            compared = self.compared
+            return {
+                "compared": compared,
+                "k": self.n_results,
+                "mean_overlap": self.overlap_sum / compared if compared else None,
+                "top1_agreement": self.top1_matches / compared if compared else None,
+                "shadow_errors": self.shadow_errors,
+                "dropped": self.dropped,
+                "primary": self.primary_latency.snapshot(),
+                "shadow": self.shadow_latency.snapshot(),
+            }
+
+    def close(self):
+        """Stop comparing; queued samples are dropped and nothing waits for a running one"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -1,14 +1,37 @@
 """Embedding utilities using OpenAI and cost tracking with tiktoken"""
-import os
 import tiktoken
-from typing import List, Dict, Tuple
-from openai import OpenAI
+from array import array
+from typing import Callable, List, Dict, Optional, Sequence, Tuple
+from clients import get_openai_client, get_upstream
+from .logging_utils import get_logger
+from .tenants import QuotaExceededError
+
+logger = get_logger("rag.embeddings")
+
+# Cost per 1M tokens (as of 2024)
+EMBEDDING_COSTS = {
+    "text-embedding-3-small": 0.02,
+    "text-embedding-3-large": 0.13,
+    "text-embedding-ada-002": 0.10
+}
+
+
+def get_encoding():
+    """Tokenizer of the embedding models (cl100k_base)"""
+    return tiktoken.encoding_for_model("gpt-3.5-turbo")  # Same cl100k_base encoding as text-embedding-3-*
 
 
 class EmbeddingManager:
     """Manages embeddings with cost tracking"""
 
-    def __init__(self, model: str = "text-embedding-3-small"):
+    def __init__(
+        self,
+        model: str = "text-embedding-3-small",
+        spend_guard: Optional[Callable[[float], None]] = None,
+        on_spend: Optional[Callable[[int, float], None]] = None,
+        max_spend: Optional[float] = None,
+        budget_check: Optional[Callable[[float], None]] = None
+    ):
         """
         Initialize embedding manager
 
@@ -17,31 +40,79 @@ class EmbeddingManager:
                 - text-embedding-3-small: $0.02 per 1M tokens (recommended)
                 - text-embedding-3-large: $0.13 per 1M tokens
                 - text-embedding-ada-002: $0.10 per 1M tokens (legacy)
+            spend_guard: Called with the cost of each request before it is sent
+                (retries and hedged duplicates included); raise to refuse it
+                (e.g. a tenant quota)
+            on_spend: Called with (tokens, cost) for each request sent
+            max_spend: Refuse (QuotaExceededError) any request that would take
+                this manager's total past this many dollars
+            budget_check: Called by check_budget() with a planned cost; raise if
+                the budget can't cover it (nothing is charged)
         """
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        # Shared keep-alive client; deadlines, retries, hedging and the
+        # circuit breaker come from the openai_embeddings upstream policy
+        self.client = get_openai_client()
+        self.upstream = get_upstream("openai_embeddings")
         self.model = model
-        self.encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")  # Close enough for counting
-
-        # Cost per 1M tokens (as of 2024)
-        self.costs = {
-            "text-embedding-3-small": 0.02,
-            "text-embedding-3-large": 0.13,
-            "text-embedding-ada-002": 0.10
-        }
+        self.encoding = get_encoding()
+        self.costs = EMBEDDING_COSTS
 
         # Track usage
         self.total_tokens = 0
         self.total_cost = 0.0
+        self.spend_guard = spend_guard
+        self.on_spend = on_spend
+        self.max_spend = max_spend
+        self.budget_check = budget_check
 
     def count_tokens(self, text: str) -> int:
         """Count tokens in text using tiktoken"""
-        return len(self.encoding.encode(text))
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def _check_spend(self, cost: float):
+        """Run the spend guard and the spending ceiling before a request"""
+        if self.spend_guard is not None:
+            self.spend_guard(cost)
+        if self.max_spend is not None and self.total_cost + cost > self.max_spend:
+            raise QuotaExceededError(
+                f"Embedding spend ceiling reached: ${self.total_cost:.6f} spent, next request "
+                f"${cost:.6f}, ceiling ${self.max_spend:.6f}"
+            )
+
+    def check_budget(self, cost: float):
+        """
+        Check that a planned spend fits the budget and the ceiling, without charging it
+
+        Raises:
+            QuotaExceededError: `cost` more would pass the budget or max_spend
+        """
+        if self.budget_check is not None:
+            self.budget_check(cost)
+        if self.max_spend is not None and self.total_cost + cost > self.max_spend:
+            raise QuotaExceededError(
+                f"Embedding spend ceiling reached: ${self.total_cost:.6f} spent, planned "
+                f"${cost:.6f}, ceiling ${self.max_spend:.6f}"
+            )
 
     def calculate_cost(self, token_count: int) -> float:
         """Calculate cost for given token count"""
         cost_per_token = self.costs.get(self.model, 0.02) / 1_000_000
         return token_count * cost_per_token
 
+    def _track(self, token_count: int) -> float:
+        """Add a request to the usage totals and report it"""
+        cost = self.calculate_cost(token_count)
+        self.total_tokens += token_count
+        self.total_cost += cost
+        if self.on_spend is not None:
+            self.on_spend(token_count, cost)
+        return cost
+
+    def _spend(self, token_count: int, spent: List[float]):
+        """Check and record one request about to be sent (OpenAI bills retries and hedges too)"""
+        self._check_spend(self.calculate_cost(token_count))
+        spent.append(self._track(token_count))
+
     def create_embedding(self, text: str) -> List[float]:
         """
         Create embedding for a single text
@@ -55,31 +126,40 @@ class EmbeddingManager:
         # Count tokens before embedding
         token_count = self.count_tokens(text)
 
-        # Create embedding
-        response = self.client.embeddings.create(
-            model=self.model,
-            input=text
+        # Create embedding (single queries are latency-sensitive: hedge slow calls);
+        # every request sent is charged, duplicates included
+        spent = []
+        response = self.upstream.call(
+            lambda timeout: self.client.embeddings.create(model=self.model, input=text, timeout=timeout),
+            hedge=True,
+            on_request=lambda: self._spend(token_count, spent)
         )
+        cost = sum(spent)
 
-        # Track usage
-        self.total_tokens += token_count
-        cost = self.calculate_cost(token_count)
-        self.total_cost += cost
-
-        print(f"   Embedded {token_count} tokens (${cost:.6f})")
+        logger.debug("Embedded %d tokens ($%.6f)", token_count, cost,
+                     extra={"tokens": token_count, "cost": cost, "sample": True})
 
         return response.data[0].embedding
 
-    def create_embeddings_batch(self, texts: List[str], batch_size: int = 100) -> List[List[float]]:
+    def create_embeddings_batch(
+        self,
+        texts: List[str],
+        batch_size: int = 100,
+        out: Optional[array] = None,
+        token_counts: Optional[Sequence[int]] = None
+    ):
         """
         Create embeddings for multiple texts in batches
 
         Args:
             texts: List of texts to embed
             batch_size: Number of texts per API call (max 2048 for OpenAI)
+            out: float32 array to append each batch's vectors to, row after row,
+                instead of collecting lists of floats (see ChunkBatch.set_embeddings)
+            token_counts: Token count of each text, if already known (see rag.ingest_plan)
 
         Returns:
-            List of embeddings
+            List of embeddings, or `out`
         """
         all_embeddings = []
 
@@ -87,26 +167,31 @@ class EmbeddingManager:
             batch = texts[i:i + batch_size]
 
             # Count tokens in batch
-            batch_tokens = sum(self.count_tokens(text) for text in batch)
-
-            # Create embeddings
-            response = self.client.embeddings.create(
-                model=self.model,
-                input=batch
+            if token_counts is not None:
+                batch_tokens = sum(token_counts[i:i + batch_size])
+            else:
+                batch_tokens = sum(len(tokens) for tokens in self.encoding.encode_batch(batch, disallowed_special=()))
+
+            # Create embeddings (bulk ingestion: retried, but not hedged to avoid double spend)
+            spent = []
+            response = self.upstream.call(
+                lambda timeout: self.client.embeddings.create(model=self.model, input=batch, timeout=timeout),
+                deadline=max(self.upstream.deadline, 60.0),
+                on_request=lambda: self._spend(batch_tokens, spent)
             )
 
             # Extract embeddings
-            embeddings = [item.embedding for item in response.data]
-            all_embeddings.extend(embeddings)
-
-            # Track usage
-            self.total_tokens += batch_tokens
-            cost = self.calculate_cost(batch_tokens)
-            self.total_cost += cost
+            if out is not None:
+                for item in response.data:
+                    out.extend(item.embedding)
+            else:
+                all_embeddings.extend(item.embedding for item in response.data)
 
-            print(f"   Batch {i//batch_size + 1}: {len(batch)} texts, {batch_tokens} tokens (${cost:.6f})")
+            cost = sum(spent)
+            logger.info("Batch %d: %d texts, %d tokens ($%.6f)", i // batch_size + 1, len(batch), batch_tokens, cost,
+                        extra={"texts": len(batch), "tokens": batch_tokens, "cost": cost})
 
-        return all_embeddings
+        return out if out is not None else all_embeddings
 
     def get_usage_stats(self) -> Dict[str, any]:
         """Get usage statistics"""
@@ -141,16 +226,10 @@ def estimate_embedding_cost(text_length: int, model: str = "text-embedding-3-sma
     Returns:
         Tuple of (estimated_tokens, estimated_cost)
     """
-    # Rough estimate: 1 token ≈ 4 characters
+    # Rough estimate: 1 token ≈ 4 characters (see rag.ingest_plan for exact counts)
     estimated_tokens = text_length // 4
 
-    costs = {
-        "text-embedding-3-small": 0.02,
-        "text-embedding-3-large": 0.13,
-        "text-embedding-ada-002": 0.10
-    }
-
-    cost_per_token = costs.get(model, 0.02) / 1_000_000
+    cost_per_token = EMBEDDING_COSTS.get(model, 0.02) / 1_000_000
     estimated_cost = estimated_tokens * cost_per_token
 
     return estimated_tokens, estimated_cost
@@ -0,0 +1,149 @@
+"""Parent sections for a hierarchical index: small child chunks are searched, whole sections are returned"""
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .document_processor import clean_text
+
+
+class ParentStore:
+    """
+    Section texts keyed by parent_id, stored once next to the child collection
+
+    Child chunks (sentence-sized, embedded and searched) carry a `parent_id`
+    in their metadata. Persisted as JSON like the MetadataCatalog.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Initialize parent store
+
+        Args:
+            path: JSON file the parents are persisted to (None keeps them in memory)
+        """
+        self.path = Path(path) if path is not None else None
+        # parent_id -> {"content": str, "metadata": dict}
+        self.entries: Dict[str, Dict] = {}
+        self.load()
+
+    def load(self):
+        """Load parents from disk (empty if missing)"""
+        if self.path is not None and self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f).get("parents", {})
+
+    def save(self):
+        """Persist parents atomically"""
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"parents": self.entries}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def add(self, parents: List[Dict]):
+        """Store parents (dicts with 'id', 'content', 'metadata')"""
+        for parent in parents:
+            self.entries[parent['id']] = {"content": parent['content'], "metadata": parent['metadata']}
+        self.save()
+
+    def update(self, entries: Dict[str, Dict]):
+        """Copy entries from another ParentStore"""
+        self.entries.update(entries)
+        self.save()
+
+    def remove_source(self, source: str):
+        """Forget the parents of a source file"""
+        before = len(self.entries)
+        self.entries = {pid: p for pid, p in self.entries.items() if p["metadata"].get("source") != source}
+        if len(self.entries) != before:
+            self.save()
+
+    def clear(self):
+        self.entries = {}
+        self.save()
+
+    def delete_file(self):
+        self.entries = {}
+        if self.path is not None and self.path.exists():
+            self.path.unlink()
+
+    def is_empty(self) -> bool:
+        return not self.entries
+
+    def excerpt(self, parent_id: str, hits: List[Dict], max_chars: int) -> str:
+        """
+        Text of a parent section, trimmed to the part around its hits if too long
+
+        Args:
+            parent_id: Parent to return
+            hits: Child hits in this parent (their chunk_start/chunk_end locate the window)
+            max_chars: Longest excerpt to return
+
+        Returns:
+            Cleaned section text
+        """
+        content = self.entries[parent_id]["content"]
+        if len(content) <= max_chars:
+            return clean_text(content)
+
+        # Centre a max_chars window on the matched span, snapped to line starts
+        start = min(hit['metadata'].get('chunk_start', 0) for hit in hits)
+        end = max(hit['metadata'].get('chunk_end', 0) for hit in hits)
+        slack = max(max_chars - (end - start), 0)
+        start = max(start - slack // 2, 0)
+        end = min(start + max_chars, len(content))
+        start = max(end - max_chars, 0)
+        if start > 0:
+            newline = content.rfind('\n', 0, start)
+            start = newline + 1 if newline >= 0 and start - newline < 200 else start
+        return clean_text(content[start:end])
+
+    def expand(self, results: List[Dict], limit: int, max_chars: int = 4000) -> List[Dict]:
+        """
+        Replace child hits with their parent sections, each section once
+
+        Sections are ordered by their best-ranked child; children whose
+        parent is unknown pass through unchanged.
+
+        Args:
+            results: Ranked child hits (dicts with 'content', 'metadata', 'id')
+            limit: Maximum sections to return
+            max_chars: Longest excerpt per section
+
+        Returns:
+            List of dicts with 'content', 'metadata', 'ids', 'score'
+        """
+        groups: Dict[str, List[Dict]] = {}
+        order = []
+        for result in results:
+            key = result['metadata'].get('parent_id')
+            if key not in self.entries:
+                key = f"child:{result['id']}"
+            if key not in groups:
+                groups[key] = []
+                order.append(key)
+            groups[key].append(result)
+
+        excerpts = []
+        for key in order[:limit]:
+            hits = groups[key]
+            if key.startswith("child:"):
+                hit = hits[0]
+                excerpts.append({'content': hit['content'], 'metadata': hit['metadata'],
+                                 'ids': [hit['id']], 'score': hit.get('score')})
+                continue
+
+            metadata = dict(self.entries[key]["metadata"])
+            also_in = [hit['metadata']['also_in'] for hit in hits if hit['metadata'].get('also_in')]
+            if also_in:
+                metadata['also_in'] = "; ".join(dict.fromkeys(also_in))
+            excerpts.append({
+                'content': self.excerpt(key, hits, max_chars),
+                'metadata': {**metadata, 'parent_id': key, 'matched_children': len(hits)},
+                'ids': [hit['id'] for hit in hits],
+                'score': hits[0].get('score')
+            })
+        return excerpts
@@ -0,0 +1,164 @@
+"""Ingestion planning: exact token counts, cost, request count and duration before any embedding is bought"""
+import os
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from .embeddings import EMBEDDING_COSTS, get_encoding
+from .logging_utils import get_logger
+
+logger = get_logger("rag.ingest_plan")
+
+# OpenAI embedding input limits
+MAX_INPUT_TOKENS = 8191
+MAX_REQUEST_TOKENS = 300_000
+
+
+def count_tokens(texts: Sequence[str], encoding=None, num_threads: Optional[int] = None,
+                 slice_size: int = 1000) -> array:
+    """
+    Exact token count of each text
+
+    tiktoken's encode_batch tokenizes on a thread pool in its Rust core
+    (the GIL is released), so counting a whole corpus is a few calls of
+    `slice_size` texts rather than one Python call per chunk.
+
+    Args:
+        texts: Texts to count
+        encoding: tiktoken encoding (default: the embedding models' cl100k_base)
+        num_threads: Tokenizer threads (default: CPU count, up to 8)
+        slice_size: Texts per encode_batch call (bounds the token lists held at once)
+
+    Returns:
+        Unsigned int array, one count per text
+    """
+    encoding = encoding or get_encoding()
+    num_threads = num_threads or min(os.cpu_count() or 1, 8)
+    counts = array('I')
+    for start in range(0, len(texts), slice_size):
+        batch = list(texts[start:start + slice_size])
+        counts.extend(len(tokens) for tokens in
+                      encoding.encode_batch(batch, num_threads=num_threads, disallowed_special=()))
+    return counts
+
+
+class IngestPlan:
+    """What an ingestion will embed and what it will cost"""
+
+    def __init__(
+        self,
+        model: str,
+        chunks: int,
+        indices: List[int],
+        token_counts: array,
+        batch_size: int,
+        rpm: int,
+        tpm: int,
+        request_seconds: float
+    ):
+        """
+        Args:
+            model: Embedding model
+            chunks: Chunks processed
+            indices: Positions of the chunks that need embedding, in order
+            token_counts: Token count of each chunk in `indices`
+            batch_size: Texts per embedding request
+            rpm: Requests per minute allowed by the rate limit
+            tpm: Tokens per minute allowed by the rate limit
+            request_seconds: Typical latency of one embedding request
+        """
+        self.model = model
+        self.chunks = chunks
+        self.indices = indices
+        self.token_counts = token_counts
+        self.batch_size = batch_size
+
+        self.to_embed = len(indices)
+        self.existing = chunks - self.to_embed
+        self.tokens = sum(token_counts)
+        self.cost = self.tokens * EMBEDDING_COSTS.get(model, 0.02) / 1_000_000
+        self.requests = -(-self.to_embed // batch_size)
+        request_tokens = [sum(token_counts[i:i + batch_size]) for i in range(0, self.to_embed, batch_size)]
+        self.max_request_tokens = max(request_tokens, default=0)
+        self.max_input_tokens = max(token_counts, default=0)
+        self.oversized = [i for i, n in zip(indices, token_counts) if n > MAX_INPUT_TOKENS]
+
+        # Requests are sent one after another: the slowest of latency and the two rate limits wins
+        bounds = {
+            "latency": self.requests * request_seconds,
+            "requests/min": self.requests / rpm * 60,
+            "tokens/min": self.tokens / tpm * 60,
+        }
+        self.bound = max(bounds, key=bounds.get)
+        self.estimated_seconds = bounds[self.bound]
+
+    @property
+    def warnings(self) -> List[str]:
+        """Problems the embedding API would reject"""
+        warnings = []
+        if self.oversized:
+            warnings.append(f"{len(self.oversized)} chunks exceed {MAX_INPUT_TOKENS} tokens "
+                            f"(largest {self.max_input_tokens}); the API will reject them")
+        if self.max_request_tokens > MAX_REQUEST_TOKENS:
+            warnings.append(f"A request of {self.max_request_tokens:,} tokens exceeds the "
+                            f"{MAX_REQUEST_TOKENS:,}-token request limit; lower the batch size")
+        return warnings
+
+    def to_dict(self) -> Dict:
+        return {
+            "model": self.model,
+            "chunks": self.chunks,
+            "existing": self.existing,
+            "to_embed": self.to_embed,
+            "tokens": self.tokens,
+            "cost_usd": round(self.cost, 6),
+            "requests": self.requests,
+            "batch_size": self.batch_size,
+            "max_input_tokens": self.max_input_tokens,
+            "max_request_tokens": self.max_request_tokens,
+            "estimated_seconds": round(self.estimated_seconds, 1),
+            "bound": self.bound,
+            "warnings": self.warnings,
+        }
+
+
+def plan_ingest(
+    texts: Sequence[str],
+    ids: Sequence[str],
+    existing_ids: Iterable[str] = (),
+    model: str = "text-embedding-3-small",
+    batch_size: int = 100,
+    rpm: int = 3000,
+    tpm: int = 1_000_000,
+    request_seconds: float = 0.5,
+    num_threads: Optional[int] = None
+) -> IngestPlan:
+    """
+    Plan an ingestion: which chunks need embedding and what that costs
+
+    Chunk ids embed a content hash, so a chunk whose id is already stored
+    has an embedding for exactly this text and is not counted (or bought)
+    again. Only the remaining chunks are tokenized.
+
+    Args:
+        texts: Chunk texts as they will be embedded
+        ids: Chunk ids
+        existing_ids: Ids already in the vector store
+        model: Embedding model (sets the price)
+        batch_size: Texts per embedding request
+        rpm: Requests per minute allowed by the rate limit
+        tpm: Tokens per minute allowed by the rate limit
+        request_seconds: Typical latency of one embedding request
+        num_threads: Tokenizer threads
+
+    Returns:
+        IngestPlan
+    """
+    existing = set(existing_ids)
+    indices = [i for i, chunk_id in enumerate(ids) if chunk_id not in existing]
+    token_counts = count_tokens([texts[i] for i in indices], num_threads=num_threads)
+    plan = IngestPlan(model, len(texts), indices, token_counts, batch_size, rpm, tpm, request_seconds)
+
+    logger.info("Ingest plan: %d of %d chunks to embed, %d tokens, $%.6f", plan.to_embed, plan.chunks,
+                plan.tokens, plan.cost,
+                extra={"chunks": plan.chunks, "to_embed": plan.to_embed, "tokens": plan.tokens, "cost": plan.cost})
+    return plan
@@ -0,0 +1,90 @@
+"""Local BM25 index: keyword retrieval that needs no embedding API"""
+import heapq
+import math
+from collections import Counter
+from typing import Dict, List, Optional
+
+from .reranker import tokenize
+from .snapshot import matches_where
+
+
+class LexicalIndex:
+    """
+    In-memory BM25 index over knowledge-base chunks
+
+    Used as the degraded retrieval path when the embedding upstream is
+    unavailable. Results have the same shape as RAGRetriever.search, with
+    'score' expressed as a distance (lower is better) so downstream
+    thresholds and the context assembler keep working.
+    """
+
+    def __init__(self, chunks: List[Dict], k1: float = 1.5, b: float = 0.75):
+        """
+        Build the index
+
+        Args:
+            chunks: Dicts with 'content', 'metadata', 'id'
+            k1: Term-frequency saturation
+            b: Length normalization strength
+        """
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        self.term_counts = [Counter(tokenize(c['content'])) for c in chunks]
+        self.lengths = [sum(counts.values()) for counts in self.term_counts]
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+
+        document_frequency = Counter()
+        for counts in self.term_counts:
+            document_frequency.update(counts.keys())
+        total = len(chunks)
+        self.idf = {
+            term: math.log(1 + (total - df + 0.5) / (df + 0.5))
+            for term, df in document_frequency.items()
+        }
+
+    def _score(self, index: int, terms: List[str]) -> float:
+        counts = self.term_counts[index]
+        norm = self.k1 * (1 - self.b + self.b * self.lengths[index] / (self.avg_length or 1.0))
+        score = 0.0
+        for term in terms:
+            tf = counts.get(term, 0)
+            if tf:
+                score += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+        return score
+
+    def search(self, query: str, n_results: int = 5, where: Optional[Dict] = None) -> List[Dict]:
+        """
+        Top chunks by BM25 score
+
+        Args:
+            query: Search query
+            n_results: Number of results to return
+            where: Optional Chroma-style metadata filter
+
+        Returns:
+            List of dicts with 'content', 'metadata', 'score', 'id'
+        """
+        terms = list(set(tokenize(query)))
+        if not terms:
+            return []
+
+        scored = []
+        for i, chunk in enumerate(self.chunks):
+            if where and not matches_where(chunk['metadata'], where):
+                continue
+            score = self._score(i, terms)
+            if score > 0:
+                scored.append((score, i))
+
+        top = heapq.nlargest(n_results, scored)
+        return [
+            {
+                'content': self.chunks[i]['content'],
+                'metadata': self.chunks[i]['metadata'],
+                # Map relevance to a distance-like value in (0, 1]
+                'score': 1.0 / (1.0 + score),
+                'id': self.chunks[i]['id']
+            }
+            for score, i in top
+        ]
@@ -0,0 +1,166 @@
+"""Structured, leveled logging with sampling and an off-thread queue handler"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from typing import Optional, TextIO
+
+
+ROOT_LOGGER = "datapulse"
+
+# Attributes every LogRecord has; anything else came from `extra=` and is a structured field
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "sample"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Get a logger under the datapulse namespace
+
+    Use lazy %-style arguments so messages are only formatted when emitted:
+        logger.debug("Embedded %d tokens", count, extra={"tokens": count, "sample": True})
+
+    Records with extra={"sample": True} are per-query messages subject to sampling.
+    """
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def structured_fields(record: logging.LogRecord) -> dict:
+    return {k: v for k, v in vars(record).items() if k not in _RESERVED}
+
+
+class SamplingFilter(logging.Filter):
+    """Passes only a fraction of records marked sample=True; everything else passes"""
+
+    def __init__(self, rate: float = 1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "sample", False) and self.rate < 1.0:
+            return random.random() < self.rate
+        return True
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    Formats records as plain text, key=value text, or JSON lines
+
+    Args:
+        style_name: "plain" (message only), "kv" (timestamp, level, logger,
+            message, fields) or "json"
+    """
+
+    def __init__(self, style_name: str = "kv"):
+        super().__init__(datefmt="%Y-%m-%dT%H:%M:%S")
+        self.style_name = style_name
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            message = f"{message}\n{record.exc_text}"
+        fields = structured_fields(record)
+
+        if self.style_name == "plain":
+            return message
+        if self.style_name == "json":
+            return json.dumps({
+                "ts": self.formatTime(record, self.datefmt),
+                "level": record.levelname,
+                "logger": record.name,
+                "message": message,
+                **fields
+            }, default=str)
+
+        extras = " ".join(f"{k}={v}" for k, v in fields.items())
+        line = f"{self.formatTime(record, self.datefmt)} {record.levelname:<7} {record.name} {message}"
+        return f"{line} {extras}" if extras else line
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Enqueues records as-is so message merging and formatting run on the listener thread
+
+    The stock QueueHandler.prepare() formats each record in the caller
+    before enqueueing, which is the cost the queue is meant to move off hot
+    paths. The queue never leaves the process, so the record doesn't need to
+    be made picklable. As with any deferred formatting, don't mutate objects
+    after passing them as log arguments.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def configure_logging(
+    level: str = "INFO",
+    style_name: str = "kv",
+    sample_rate: float = 1.0,
+    stream: Optional[TextIO] = None,
+    use_queue: bool = True
+) -> logging.Logger:
+    """
+    Configure the datapulse logger tree (idempotent)
+
+    With use_queue=True, callers only pay for filtering and enqueueing;
+    message merging, formatting and writing happen on a QueueListener
+    thread, so hot paths never wait on the stdout/stderr lock.
+
+    Args:
+        level: Minimum level (DEBUG, INFO, WARNING, ...)
+        style_name: "plain", "kv" or "json"
+        sample_rate: Fraction of sample=True records to keep
+        stream: Output stream (default: sys.stderr)
+        use_queue: Hand records to a background thread
+
+    Returns:
+        The root datapulse logger
+    """
+    global _listener
+
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    root.propagate = False
+
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(StructuredFormatter(style_name))
+
+    if use_queue:
+        records: "queue.SimpleQueue" = queue.SimpleQueue()
+        handler = _DeferredQueueHandler(records)
+        _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+        _listener.start()
+    else:
+        handler = output
+
+    # Sample before enqueueing so dropped records cost nothing downstream
+    handler.addFilter(SamplingFilter(sample_rate))
+    root.addHandler(handler)
+    return root
+
+
+def shutdown_logging():
+    """Flush and stop the background listener"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+# Library default: silent unless the application configures logging
+logging.getLogger(ROOT_LOGGER).addHandler(logging.NullHandler())
+
+# Registered once; a no-op unless configure_logging started a listener
+atexit.register(shutdown_logging)
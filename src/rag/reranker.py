@@ -0,0 +1,121 @@
+"""Re-ranking utilities for RAG search results"""
+import math
+import re
+from collections import Counter
+from typing import List, Dict
+
+
+_TOKEN_RE = re.compile(r"[a-z0-9_]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens used for lexical scoring"""
+    return _TOKEN_RE.findall(text.lower())
+
+
+def cosine_similarity(a: List[float], b: List[float]) -> float:
+    """Cosine similarity between two vectors"""
+    dot = 0.0
+    norm_a = 0.0
+    norm_b = 0.0
+    for x, y in zip(a, b):
+        dot += x * y
+        norm_a += x * x
+        norm_b += y * y
+
+    if norm_a == 0.0 or norm_b == 0.0:
+        return 0.0
+    return dot / math.sqrt(norm_a * norm_b)
+
+
+def lexical_score(query: str, text: str) -> float:
+    """
+    Cheap query/document term overlap score in [0, 1]
+
+    Counts query terms present in the text, damped by term frequency,
+    and normalizes by the number of distinct query terms.
+    """
+    query_terms = set(tokenize(query))
+    if not query_terms:
+        return 0.0
+
+    counts = Counter(tokenize(text))
+    score = 0.0
+    for term in query_terms:
+        tf = counts.get(term, 0)
+        if tf:
+            score += tf / (tf + 1.0)
+
+    return score / len(query_terms)
+
+
+class MMRReranker:
+    """Maximal-marginal-relevance re-ranking over candidate embeddings"""
+
+    def __init__(self, lambda_mult: float = 0.7, lexical_weight: float = 0.0):
+        """
+        Initialize re-ranker
+
+        Args:
+            lambda_mult: Trade-off between relevance (1.0) and diversity (0.0)
+            lexical_weight: Weight of the optional lexical re-score (0 disables it)
+        """
+        self.lambda_mult = lambda_mult
+        self.lexical_weight = lexical_weight
+
+    def relevance(self, query: str, query_embedding: List[float], result: Dict) -> float:
+        """Blend of embedding similarity and (optional) lexical overlap"""
+        score = cosine_similarity(query_embedding, result['embedding'])
+        if self.lexical_weight:
+            score = (1 - self.lexical_weight) * score + \
+                self.lexical_weight * lexical_score(query, result['content'])
+        return score
+
+    def rerank(
+        self,
+        query: str,
+        query_embedding: List[float],
+        results: List[Dict],
+        k: int
+    ) -> List[Dict]:
+        """
+        Select k diverse, relevant results from an over-fetched candidate list
+
+        Args:
+            query: Search query
+            query_embedding: Embedding of the query
+            results: Candidates from RAGRetriever.search (with 'embedding')
+            k: Number of results to keep
+
+        Returns:
+            Selected results in MMR order
+        """
+        candidates = [r for r in results if r.get('embedding') is not None]
+        if not candidates:
+            return results[:k]
+
+        relevance = [self.relevance(query, query_embedding, r) for r in candidates]
+        selected: List[int] = []
+        # Max similarity of each candidate to anything already selected
+        redundancy = [0.0] * len(candidates)
+
+        while len(selected) < min(k, len(candidates)):
+            best_index = None
+            best_score = -math.inf
+            for i in range(len(candidates)):
+                if i in selected:
+                    continue
+                mmr = self.lambda_mult * relevance[i] - (1 - self.lambda_mult) * redundancy[i]
+                if mmr > best_score:
+                    best_index, best_score = i, mmr
+
+            selected.append(best_index)
+            chosen = candidates[best_index]['embedding']
+            for i in range(len(candidates)):
+                if i not in selected:
+                    redundancy[i] = max(
+                        redundancy[i],
+                        cosine_similarity(candidates[i]['embedding'], chosen)
+                    )
+
+        return [candidates[i] for i in selected]
@@ -1,86 +1,321 @@
 """High-level RAG retriever for the chatbot"""
 import os
+import time
+import weakref
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Dict, List, Optional
 from .embeddings import EmbeddingManager
 from .vector_store import VectorStore, RAGRetriever
+from .sharded_store import ShardedVectorStore
+from .embedding_spaces import ShadowComparator, SpaceRegistry
+from .compressor import ExtractiveCompressor
+from .snapshot import SnapshotStore
+from .logging_utils import get_logger
+
+logger = get_logger("rag.retriever")
+
+# How often a running retriever checks the space registry for a cutover
+SPACE_CHECK_INTERVAL = 5.0
 
 
 class KnowledgeBaseRetriever:
-    """Singleton retriever for knowledge base"""
+    """
+    Retriever for a knowledge base
+
+    Called without a location it is the process-wide singleton over
+    data/chroma_db (or KB_SNAPSHOT_PATH). With an explicit location (e.g. a
+    tenant's index) each call creates an independent instance.
+
+    `self.retriever` holds the store and its embedding manager together and
+    is never modified; reloads build a new one and swap it in with a single
+    assignment, so a search that read it sees one consistent knowledge base.
+    """
 
     _instance: Optional['KnowledgeBaseRetriever'] = None
     _initialized = False
 
-    def __new__(cls):
+    def __new__(cls, persist_dir: Optional[str] = None, snapshot_path: Optional[str] = None, **kwargs):
+        if persist_dir is not None or snapshot_path is not None:
+            return super().__new__(cls)
         if cls._instance is None:
             cls._instance = super().__new__(cls)
         return cls._instance
 
-    def __init__(self):
-        """Initialize retriever (only once)"""
+    def __init__(
+        self,
+        persist_dir: Optional[str] = None,
+        snapshot_path: Optional[str] = None,
+        spend_guard: Optional[Callable[[float], None]] = None,
+        on_spend: Optional[Callable[[int, float], None]] = None
+    ):
+        """
+        Initialize retriever (only once per instance)
+
+        Args:
+            persist_dir: ChromaDB directory (default: data/chroma_db)
+            snapshot_path: Snapshot preferred over ChromaDB when it exists
+                (default: KB_SNAPSHOT_PATH or data/kb.snapshot)
+            spend_guard: Passed to EmbeddingManager (refuse over-budget calls)
+            on_spend: Passed to EmbeddingManager (record embedding spend)
+        """
         if not self._initialized:
-            self._setup()
+            self.retriever: Optional[RAGRetriever] = None
+            self.spend_guard = spend_guard
+            self.on_spend = on_spend
+            self.spaces: Optional[SpaceRegistry] = None
+            self.space: Optional[str] = None
+            self.shadow: Optional[ShadowComparator] = None
+            self._space_mtime = None
+            self._space_checked = 0.0
+            # Query-aware sentence extraction of search results (off unless a budget is set)
+            compression_tokens = os.getenv("KB_COMPRESSION_TOKENS")
+            self.compressor = ExtractiveCompressor(int(compression_tokens)) if compression_tokens else None
+            self._setup(persist_dir, snapshot_path)
             self._initialized = True
 
-    def _setup(self):
+    @property
+    def vector_store(self):
+        """Store of the knowledge base being served"""
+        return self.retriever.vector_store if self.retriever is not None else None
+
+    @property
+    def embedding_manager(self) -> Optional[EmbeddingManager]:
+        return self.retriever.embedding_manager if self.retriever is not None else None
+
+    def _swap(self, retriever: Optional[RAGRetriever]):
+        """Serve a new store; the old one is closed once no search holds it"""
+        previous = self.retriever
+        self.retriever = retriever
+        if previous is None or (retriever is not None and previous.vector_store is retriever.vector_store):
+            return
+        self._release(previous)
+
+    @staticmethod
+    def _release(retriever: RAGRetriever):
+        """Close a retriever's store once no search holds the retriever"""
+        close = getattr(retriever.vector_store, "close", None)
+        if close is not None:
+            # Searches in flight keep `retriever` alive; close when the last one lets go
+            store = retriever.vector_store
+            weakref.finalize(retriever, _close_quietly, close,
+                             getattr(store, "path", None) or getattr(store, "persist_directory", None))
+
+    def close(self):
+        """Stop serving (e.g. an evicted tenant); each store is closed once no search holds it"""
+        self.ready = False
+        shadow, self.shadow = self.shadow, None
+        if shadow is not None:
+            shadow.close()
+            self._release(shadow.shadow)
+        self._swap(None)
+
+    def _embedding_manager(self, model: str) -> EmbeddingManager:
+        return EmbeddingManager(model=model, spend_guard=self.spend_guard, on_spend=self.on_spend)
+
+    def _setup(self, persist_dir: Optional[str] = None, snapshot_path: Optional[str] = None):
         """Set up retriever components"""
         # Get paths
         base_dir = Path(__file__).parent.parent.parent
-        persist_dir = base_dir / "data" / "chroma_db"
+        persist_dir = Path(persist_dir) if persist_dir else base_dir / "data" / "chroma_db"
+        if snapshot_path is None:
+            snapshot_path = os.getenv("KB_SNAPSHOT_PATH", base_dir / "data" / "kb.snapshot")
+        snapshot_path = Path(snapshot_path)
+
+        # Prefer a prebuilt snapshot: it opens without touching ChromaDB
+        if snapshot_path.exists():
+            try:
+                self.load_snapshot(str(snapshot_path))
+                return
+            except Exception as e:
+                logger.warning("Could not open snapshot %s: %s", snapshot_path, e)
 
         # Check if vector store exists
         if not persist_dir.exists():
-            print("\n⚠️  Warning: Vector database not found!")
-            print("Please run: python scripts/ingest_documents.py")
+            logger.warning("Vector database not found at %s. Please run: python scripts/ingest_documents.py",
+                           persist_dir)
             self.ready = False
             return
 
         # Initialize components
         try:
-            self.embedding_manager = EmbeddingManager(model="text-embedding-3-small")
-            self.vector_store = VectorStore(
-                persist_directory=str(persist_dir),
-                collection_name="datapulse_docs"
-            )
-            self.retriever = RAGRetriever(self.vector_store, self.embedding_manager)
+            if ShardedVectorStore.exists(str(persist_dir), "datapulse_docs"):
+                # Ingested with --sharded: one collection per product area
+                self._swap(RAGRetriever(ShardedVectorStore(str(persist_dir), "datapulse_docs"),
+                                        self._embedding_manager("text-embedding-3-small")))
+            else:
+                # The registry says which collection and model serve queries
+                self.spaces = SpaceRegistry(str(persist_dir), "datapulse_docs")
+                self._load_spaces()
             self.ready = True
 
             # Get info
             info = self.vector_store.get_collection_info()
-            print(f"\n✅ Knowledge base loaded: {info['count']} documents")
+            logger.info("Knowledge base loaded: %d documents", info['count'], extra={"documents": info['count']})
 
         except Exception as e:
-            print(f"\n❌ Error initializing RAG system: {e}")
+            logger.error("Error initializing RAG system: %s", e)
             self.ready = False
 
-    def search(self, query: str, n_results: int = 3) -> str:
+    def _space_retriever(self, space: Dict) -> RAGRetriever:
+        store = VectorStore(persist_directory=self.spaces.persist_directory, collection_name=space["name"])
+        return RAGRetriever(store, self._embedding_manager(space["model"]))
+
+    def _load_spaces(self):
+        """Serve the registry's active space and shadow-read its shadow space"""
+        self._space_mtime = self.spaces.mtime()
+        active = self.spaces.active()
+        if active["name"] != self.space:
+            self._swap(self._space_retriever(active))
+            if self.space is not None:
+                logger.info("Switched to embedding space %s (%s)", active["name"], active["model"],
+                            extra={"space": active["name"], "model": active["model"]})
+            self.space = active["name"]
+
+        shadow = self.spaces.shadow()
+        previous = self.shadow
+        if shadow is None:
+            self.shadow = None
+        elif previous is None or previous.shadow.vector_store.collection_name != shadow["name"] \
+                or previous.primary is not self.retriever:
+            self.shadow = ShadowComparator(
+                self.retriever,
+                self._space_retriever(shadow),
+                sample_rate=float(os.getenv("KB_SHADOW_SAMPLE_RATE", "0.1"))
+            )
+        if previous is not None and previous is not self.shadow:
+            previous.close()
+            self._release(previous.shadow)
+
+    def _check_spaces(self):
+        """Pick up a cutover or shadow change made by scripts/migrate_embeddings.py"""
+        if self.spaces is None or time.monotonic() - self._space_checked < SPACE_CHECK_INTERVAL:
+            return
+        self._space_checked = time.monotonic()
+        if self.spaces.mtime() != self._space_mtime:
+            try:
+                self._load_spaces()
+            except Exception as e:
+                logger.warning("Could not switch embedding space: %s", e)
+
+    def load_snapshot(self, path: str):
+        """
+        Open a knowledge-base snapshot and swap it in atomically
+
+        The new store is fully opened before it replaces the current one, so
+        concurrent searches see either the old or the new knowledge base. The
+        old snapshot is unmapped when the last search using it finishes.
+
+        Args:
+            path: Snapshot file written by scripts/export_snapshot.py
+        """
+        store = SnapshotStore(path)
+        self._swap(RAGRetriever(store, self._embedding_manager(store.model)))
+        self.ready = True
+
+        info = store.get_collection_info()
+        logger.info("Knowledge base snapshot loaded: %d documents (%s, %dd)", info['count'], info['model'],
+                    info['dimension'], extra={"documents": info['count'], "snapshot": path})
+
+    def search(
+        self,
+        query: str,
+        n_results: int = 3,
+        sources: Optional[List[str]] = None,
+        max_tokens: int = 3000,
+        max_distance: Optional[float] = None,
+        hit_ids: Optional[List[str]] = None
+    ) -> str:
         """
         Search knowledge base and return formatted context
 
         Args:
             query: Search query
             n_results: Number of results to retrieve
+            sources: Optional source files to restrict the search to
+            max_tokens: Token budget for the returned context
+            max_distance: Drop hits farther than this distance (relevance threshold)
+            hit_ids: If given, the ids of the chunks the context was built from are appended to it
 
         Returns:
             Formatted context string for LLM
+
+        Raises:
+            UnknownSourceError: A requested source isn't in the catalog
+            Exception: The search itself failed (logged and re-raised, so no
+                error text is ever passed off as documentation)
         """
         if not self.ready:
             return "Knowledge base not available. Please run ingestion script."
 
+        self._check_spaces()
+        # One read: the whole search runs against the same store even if a reload swaps it
+        retriever = self.retriever
+        # Raises UnknownSourceError for a source that isn't in the catalog
+        retriever.vector_store.catalog.build_filter(sources=sources)
+        shadow = self.shadow
+        # The shadow space is compared against this search's own hits
+        ids = hit_ids if hit_ids is not None or shadow is None else []
+        first = len(ids) if ids is not None else 0
+
         try:
             # Get context
-            context = self.retriever.search_with_context(
+            started = time.perf_counter()
+            context = retriever.search_with_context(
                 query=query,
                 n_results=n_results,
-                max_tokens=3000
+                max_tokens=max_tokens,
+                sources=sources,
+                max_distance=max_distance,
+                compressor=self.compressor,
+                hit_ids=ids
             )
+            if shadow is not None:
+                shadow.observe(query, ids[first:], time.perf_counter() - started, n_results=n_results,
+                               max_tokens=max_tokens, sources=sources, max_distance=max_distance)
 
             return context
 
         except Exception as e:
-            print(f"Error searching knowledge base: {e}")
-            return f"Error searching knowledge base: {str(e)}"
+            logger.error("Error searching knowledge base: %s", e)
+            raise
+
+    def search_batch(
+        self,
+        queries: List[str],
+        n_results: int = 3,
+        max_tokens: int = 3000,
+        max_distance: Optional[float] = None
+    ) -> List[str]:
+        """
+        Search for many queries at once (one embedding request, one vector query)
+
+        Args:
+            queries: Search queries
+            n_results: Number of results per query
+            max_tokens: Token budget for each returned context
+            max_distance: Drop hits farther than this distance (relevance threshold)
+
+        Returns:
+            Formatted context per query, in order
+
+        Raises:
+            Exception: The search failed (logged and re-raised, as in search())
+        """
+        if not self.ready:
+            return ["Knowledge base not available. Please run ingestion script."] * len(queries)
+
+        self._check_spaces()
+        try:
+            return self.retriever.search_with_context_batch(
+                queries,
+                n_results=n_results,
+                max_tokens=max_tokens,
+                max_distance=max_distance,
+                compressor=self.compressor
+            )
+        except Exception as e:
+            logger.error("Error searching knowledge base: %s", e)
+            raise
 
     def get_relevant_docs(self, query: str, n_results: int = 3):
         """
@@ -99,16 +334,40 @@ class KnowledgeBaseRetriever:
         try:
             return self.retriever.search(query, n_results=n_results)
         except Exception as e:
-            print(f"Error retrieving documents: {e}")
+            logger.error("Error retrieving documents: %s", e)
             return []
 
+    def list_sources(self) -> List[str]:
+        """List source files in the knowledge base (from the metadata catalog)"""
+        if not self.ready:
+            return []
+        return self.retriever.vector_store.list_sources()
+
+
+def _close_quietly(close: Callable[[], None], path: Optional[str]):
+    try:
+        close()
+    except Exception as e:
+        logger.warning("Could not close replaced store %s: %s", path, e)
+
 
 # Global instance
 _retriever = None
 
 
 def get_retriever() -> KnowledgeBaseRetriever:
-    """Get or create the global retriever instance"""
+    """
+    Get the retriever for the current context
+
+    Inside `tenant_scope(tenant_id)` (see rag.tenants) this is that tenant's
+    knowledge base; otherwise the global instance.
+    """
+    from .tenants import current_tenant, get_tenant_registry
+
+    tenant_id = current_tenant.get()
+    if tenant_id is not None:
+        return get_tenant_registry().get(tenant_id)
+
     global _retriever
     if _retriever is None:
         _retriever = KnowledgeBaseRetriever()
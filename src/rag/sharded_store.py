@@ -0,0 +1,463 @@
+"""Knowledge base split across several ChromaDB collections (shards) with parallel fan-out queries"""
+import heapq
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from .catalog import MetadataCatalog
+from .chunk_batch import ChunkBatch
+from .logging_utils import get_logger
+from .vector_store import VectorStore
+
+logger = get_logger("rag.sharded_store")
+
+# Keyword in the source file name -> product-area shard
+SOURCE_FAMILIES = {
+    "snowflake": "integrations",
+    "bigquery": "integrations",
+    "redshift": "integrations",
+    "dbt": "integrations",
+    "pricing": "account",
+    "security": "account",
+    "faq": "account",
+    "api": "developer",
+    "troubleshooting": "developer",
+}
+
+SOURCE_FAMILY = "source_family"
+
+# (documents, embeddings, metadatas, ids) for one slice of a shard
+ShardPart = Tuple[List[str], List[List[float]], List[Dict], List[str]]
+
+_UNSAFE_NAME_RE = re.compile(r"[^A-Za-z0-9_-]")
+
+
+def source_family(metadata: Dict) -> str:
+    """Product area of a chunk, from its source file name (default "product")"""
+    source = metadata.get('source', '').lower()
+    for keyword, family in SOURCE_FAMILIES.items():
+        if keyword in source:
+            return family
+    return "product"
+
+
+class ShardedVectorStore:
+    """
+    VectorStore interface over one ChromaDB collection per shard
+
+    Chunks are partitioned by `partition_by`: "source_family" (product area,
+    see SOURCE_FAMILIES) or the name of a metadata field such as "tenant_id".
+    Queries fan out to the shards whose catalogs can match the filter, run in
+    parallel on a thread pool, and the per-shard top-k lists (already sorted
+    by distance) are k-way merged with a heap.
+
+    A manifest ({collection_prefix}_shards.json) maps each shard to its
+    current collection. Rebuilding a shard writes a new collection and
+    then swaps the manifest entry, so queries keep hitting the old one
+    until the new one is complete and other shards are never touched.
+    """
+
+    def __init__(
+        self,
+        persist_directory: str = "./data/chroma_db",
+        collection_prefix: str = "datapulse_docs",
+        partition_by: Optional[str] = None,
+        max_workers: int = 4
+    ):
+        """
+        Initialize sharded store
+
+        Args:
+            persist_directory: Directory holding the ChromaDB data and manifest
+            collection_prefix: Prefix of the shard collection names
+            partition_by: "source_family" or a metadata field; defaults to the
+                manifest's setting, or "source_family" for a new store
+            max_workers: Shards queried concurrently
+        """
+        self.persist_directory = persist_directory
+        self.collection_name = collection_prefix
+        self.manifest_path = Path(persist_directory) / f"{collection_prefix}_shards.json"
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="shard")
+        self._lock = threading.Lock()
+        self._catalog: Optional[MetadataCatalog] = None
+        # Bumped by every write so derived indexes know when to rebuild
+        self.write_version = 0
+
+        manifest = self._load_manifest()
+        self.partition_by = partition_by or manifest.get("partition_by", SOURCE_FAMILY)
+        if manifest and manifest.get("partition_by", self.partition_by) != self.partition_by:
+            raise ValueError(
+                f"{self.manifest_path} is partitioned by {manifest['partition_by']!r}, not {self.partition_by!r}"
+            )
+
+        # shard name -> VectorStore over the shard's current collection
+        self.shards: Dict[str, VectorStore] = {
+            shard: VectorStore(persist_directory, collection_name)
+            for shard, collection_name in manifest.get("shards", {}).items()
+        }
+
+    @staticmethod
+    def exists(persist_directory: str, collection_prefix: str = "datapulse_docs") -> bool:
+        """Whether a sharded knowledge base has been ingested at this location"""
+        return (Path(persist_directory) / f"{collection_prefix}_shards.json").exists()
+
+    def _load_manifest(self) -> Dict:
+        if self.manifest_path.exists():
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {}
+
+    def _save_manifest(self):
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_suffix(".json.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "partition_by": self.partition_by,
+                "shards": {shard: store.collection_name for shard, store in self.shards.items()}
+            }, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def shard_for(self, metadata: Dict) -> str:
+        """Shard a chunk belongs to"""
+        if self.partition_by == SOURCE_FAMILY:
+            return source_family(metadata)
+        return str(metadata.get(self.partition_by, "default"))
+
+    def partition(self, metadatas: List[Dict]) -> Dict[str, List[int]]:
+        """Group chunk indices by shard"""
+        groups: Dict[str, List[int]] = {}
+        for i, metadata in enumerate(metadatas):
+            groups.setdefault(self.shard_for(metadata), []).append(i)
+        return groups
+
+    def partition_batch(self, batch: ChunkBatch, window: int = 1000) -> Dict[str, List[int]]:
+        """Group a ChunkBatch's chunk indices by shard, building metadata dicts one window at a time"""
+        groups: Dict[str, List[int]] = {}
+        for start in range(0, len(batch), window):
+            metadatas = batch.metadatas(start, min(start + window, len(batch)))
+            for i, metadata in enumerate(metadatas, start):
+                groups.setdefault(self.shard_for(metadata), []).append(i)
+        return groups
+
+    def _collection_for(self, shard: str, version: int) -> str:
+        # Chroma collection names allow only [A-Za-z0-9._-]; tenant ids may not
+        return f"{self.collection_name}__{_UNSAFE_NAME_RE.sub('-', shard)}__v{version}"
+
+    def _shard(self, shard: str) -> VectorStore:
+        with self._lock:
+            if shard not in self.shards:
+                self.shards[shard] = VectorStore(self.persist_directory, self._collection_for(shard, 1))
+                self._save_manifest()
+            return self.shards[shard]
+
+    @property
+    def catalog(self) -> MetadataCatalog:
+        """Read-only union of the shard catalogs"""
+        if self._catalog is None:
+            merged: Dict[str, Dict] = {}
+            for store in self.shards.values():
+                for source, entry in store.catalog.entries.items():
+                    target = merged.setdefault(source, {"title": entry["title"], "chunks": 0, "sections": {}})
+                    target["title"] = target["title"] or entry["title"]
+                    target["chunks"] += entry["chunks"]
+                    if entry.get("aliases"):
+                        target["aliases"] = target.get("aliases", 0) + entry["aliases"]
+                    for section, count in entry["sections"].items():
+                        target["sections"][section] = target["sections"].get(section, 0) + count
+            self._catalog = MetadataCatalog(entries=merged)
+        return self._catalog
+
+    def add_documents(
+        self,
+        documents: List[str],
+        embeddings: List[List[float]],
+        metadatas: List[Dict],
+        ids: List[str]
+    ):
+        """Add documents, routing each to its shard"""
+        for shard, indices in self.partition(metadatas).items():
+            self._shard(shard).add_documents(
+                documents=[documents[i] for i in indices],
+                embeddings=[embeddings[i] for i in indices],
+                metadatas=[metadatas[i] for i in indices],
+                ids=[ids[i] for i in indices]
+            )
+        self._catalog = None
+        self.write_version += 1
+
+    def rebuild_shard(self, shard: str, parts: Iterable[ShardPart]):
+        """
+        Replace one shard's contents without touching the others
+
+        The new contents go into a fresh collection, one part at a time (so
+        a caller can produce them window by window); the manifest is switched
+        to it afterwards and the old collection dropped. No parts drops the
+        shard.
+
+        Args:
+            shard: Shard name
+            parts: (documents, embeddings, metadatas, ids) slices of the new contents
+        """
+        with self._lock:
+            old = self.shards.get(shard)
+        version = 1
+        if old is not None:
+            version = int(old.collection_name.rsplit("__v", 1)[-1]) + 1
+
+        new = VectorStore(self.persist_directory, self._collection_for(shard, version))
+        if new.collection.count():
+            # Leftover from an interrupted rebuild
+            new.reset_collection()
+        added = 0
+        for documents, embeddings, metadatas, ids in parts:
+            if documents:
+                new.add_documents(documents=documents, embeddings=embeddings, metadatas=metadatas, ids=ids)
+                added += len(documents)
+
+        with self._lock:
+            if added:
+                self.shards[shard] = new
+            else:
+                self.shards.pop(shard, None)
+            self._save_manifest()
+            self._catalog = None
+            self.write_version += 1
+
+        if old is not None:
+            old.drop()
+        if not added:
+            new.drop()
+        logger.info("Rebuilt shard '%s' (%d documents)", shard, added,
+                    extra={"shard": shard, "documents": added})
+
+    def _relevant_shards(self, where: Optional[Dict], n_results: int):
+        """(store, n) for shards that can match the filter"""
+        selected = []
+        for store in list(self.shards.values()):
+            candidates = store.catalog.candidate_count(where)
+            if candidates > 0:
+                selected.append((store, min(n_results, candidates)))
+        return selected
+
+    def query(
+        self,
+        query_embedding: List[float],
+        n_results: int = 5,
+        where: Optional[Dict] = None,
+        where_document: Optional[Dict] = None,
+        include_embeddings: bool = False
+    ) -> Dict:
+        """
+        Query the relevant shards in parallel and merge their top-k
+
+        Returns:
+            Dict with 'ids', 'documents', 'metadatas', 'distances'
+            (and 'embeddings' if requested), like VectorStore.query
+        """
+        selected = self._relevant_shards(where, n_results)
+        futures = [
+            self._executor.submit(store.query, query_embedding, n, where, where_document, include_embeddings)
+            for store, n in selected
+        ]
+
+        fields = ['ids', 'documents', 'metadatas', 'distances'] + (['embeddings'] if include_embeddings else [])
+        # Each shard's hits are sorted by distance; k-way merge them lazily
+        per_shard = []
+        for future in futures:
+            results = future.result()
+            rows = zip(*(results[field][0] for field in fields))
+            per_shard.append(rows)
+
+        distance_index = fields.index('distances')
+        top = list(islice(heapq.merge(*per_shard, key=lambda row: row[distance_index]), n_results))
+
+        return {field: [[row[i] for row in top]] for i, field in enumerate(fields)}
+
+    def query_batch(
+        self,
+        query_embeddings: List[List[float]],
+        n_results: int = 5,
+        where: Optional[Dict] = None,
+        include_embeddings: bool = False
+    ) -> Dict:
+        """
+        One batched query per relevant shard, in parallel, merged per query
+
+        Returns:
+            Dict like query(), with one inner list per query embedding
+        """
+        selected = self._relevant_shards(where, n_results)
+        futures = [
+            self._executor.submit(store.query_batch, query_embeddings, n, where, include_embeddings)
+            for store, n in selected
+        ]
+        shard_results = [future.result() for future in futures]
+
+        fields = ['ids', 'documents', 'metadatas', 'distances'] + (['embeddings'] if include_embeddings else [])
+        distance_index = fields.index('distances')
+        merged = {field: [] for field in fields}
+        for q in range(len(query_embeddings)):
+            per_shard = [zip(*(results[field][q] for field in fields)) for results in shard_results]
+            top = list(islice(heapq.merge(*per_shard, key=lambda row: row[distance_index]), n_results))
+            for i, field in enumerate(fields):
+                merged[field].append([row[i] for row in top])
+        return merged
+
+    def get_chunks(self, source: str, section: str, chunk_ids: List[int],
+                   section_number: Optional[int] = None) -> List[Dict]:
+        """Fetch specific chunks of a source section from the shards that hold the source"""
+        chunks = []
+        for store in list(self.shards.values()):
+            if store.catalog.chunk_count(source, section):
+                chunks.extend(store.get_chunks(source, section, chunk_ids, section_number))
+        return chunks
+
+    def get_all_chunks(self, include_embeddings: bool = False) -> List[Dict]:
+        """Every chunk across all shards"""
+        chunks = []
+        for store in list(self.shards.values()):
+            chunks.extend(store.get_all_chunks(include_embeddings=include_embeddings))
+        return chunks
+
+    def get_collection_info(self) -> Dict:
+        """Totals plus per-shard document counts"""
+        counts = {shard: store.collection.count() for shard, store in self.shards.items()}
+        return {
+            "name": self.collection_name,
+            "count": sum(counts.values()),
+            "persist_directory": self.persist_directory,
+            "partition_by": self.partition_by,
+            "shards": counts
+        }
+
+    def reset_collection(self):
+        """Drop every shard"""
+        with self._lock:
+            stores = list(self.shards.values())
+            self.shards.clear()
+            self._save_manifest()
+            self._catalog = None
+            self.write_version += 1
+        for store in stores:
+            store.drop()
+
+    def delete_by_source(self, source: str):
+        """Delete a source file's documents from whichever shards hold it"""
+        for store in list(self.shards.values()):
+            if store.catalog.chunk_count(source):
+                store.delete_by_source(source)
+        self._catalog = None
+        self.write_version += 1
+
+    def list_sources(self) -> List[str]:
+        return self.catalog.sources()
+
+    def close(self):
+        """Close every shard's store; queries still running finish on their own threads"""
+        with self._lock:
+            stores = list(self.shards.values())
+        for store in stores:
+            store.close()
+        self._executor.shutdown(wait=False)
+
+
+def reusable_ids(store: ShardedVectorStore, batch: ChunkBatch, ids: List[str], window: int = 1000) -> Set[str]:
+    """
+    Ids whose stored embeddings sync_shards will reuse (already in the shard they belong to)
+
+    Args:
+        store: Sharded store
+        batch: Processed chunks
+        ids: Chunk ids (batch.ids())
+        window: Chunks whose metadata dicts are built at once
+    """
+    reusable = set()
+    for shard, indices in store.partition_batch(batch, window).items():
+        existing = store.shards.get(shard)
+        if existing is not None:
+            stored = set(existing.get_ids())
+            reusable.update(ids[i] for i in indices if ids[i] in stored)
+    return reusable
+
+
+def _shard_parts(
+    batch: ChunkBatch,
+    indices: List[int],
+    shard_ids: List[str],
+    existing: Optional[VectorStore],
+    stored: Set[str],
+    embed_fn: Callable[[List[str]], List[List[float]]],
+    window: int,
+    embedded: List[int]
+) -> Iterator[ShardPart]:
+    """One shard's new contents, window by window: stored embeddings reused, the rest embedded"""
+    for start in range(0, len(indices), window):
+        part = indices[start:start + window]
+        part_ids = shard_ids[start:start + window]
+        embeddings = existing.get_embeddings([i for i in part_ids if i in stored]) if stored else {}
+        missing = [chunk_id for chunk_id in part_ids if chunk_id not in embeddings]
+        if missing:
+            texts = [batch.texts[i] for i, chunk_id in zip(part, part_ids) if chunk_id not in embeddings]
+            embeddings.update(zip(missing, embed_fn(texts)))
+            embedded[0] += len(missing)
+        yield (
+            [batch.texts[i] for i in part],
+            [embeddings[chunk_id] for chunk_id in part_ids],
+            [batch.metadata(i) for i in part],
+            part_ids
+        )
+
+
+def sync_shards(
+    store: ShardedVectorStore,
+    batch: ChunkBatch,
+    embed_fn: Callable[[List[str]], List[List[float]]],
+    window: int = 1000
+) -> Dict[str, str]:
+    """
+    Incrementally bring a sharded store in line with freshly processed documents
+
+    Chunk ids embed a content hash, so a shard whose id set is unchanged is
+    skipped entirely. A changed shard is rebuilt on its own, reusing the
+    stored embeddings of chunks that didn't change and embedding only the
+    new ones. Shards that no longer have any documents are dropped.
+
+    Texts, metadata dicts and embeddings are only materialized for `window`
+    chunks at a time, as in VectorStore.add_batch.
+
+    Args:
+        store: Sharded store to update
+        batch: Processed chunks (texts cleaned, as they should be stored)
+        embed_fn: Embeds a list of texts (e.g. EmbeddingManager.create_embeddings_batch)
+        window: Chunks fetched, embedded and written per step
+
+    Returns:
+        shard -> "unchanged", "rebuilt (N new embeddings)" or "dropped"
+    """
+    report = {}
+    groups = store.partition_batch(batch, window)
+
+    for shard, indices in sorted(groups.items()):
+        shard_ids = [batch.id(i) for i in indices]
+        existing = store.shards.get(shard)
+        stored = set(existing.get_ids()) if existing is not None else set()
+
+        if existing is not None and len(shard_ids) == len(stored) and stored.issuperset(shard_ids):
+            report[shard] = "unchanged"
+            continue
+
+        embedded = [0]
+        store.rebuild_shard(shard, _shard_parts(batch, indices, shard_ids, existing, stored, embed_fn, window,
+                                                embedded))
+        report[shard] = f"rebuilt ({embedded[0]} new embeddings)"
+
+    for shard in sorted(set(store.shards) - set(groups)):
+        store.rebuild_shard(shard, [])
+        report[shard] = "dropped"
+
+    return report
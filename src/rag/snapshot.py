@@ -0,0 +1,415 @@
+"""Portable single-file knowledge-base snapshots with zero-copy, memory-mapped reads"""
+import heapq
+import json
+import mmap
+import os
+import struct
+import time
+from array import array
+from pathlib import Path
+from typing import List, Dict, Optional, Tuple
+
+from .catalog import MetadataCatalog
+
+try:
+    import numpy as np
+except ImportError:  # Pure-Python scoring fallback
+    np = None
+
+
+MAGIC = b"DPKBSNAP"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+# magic, format version, manifest length
+HEADER = struct.Struct("<8sII")
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def matches_where(metadata: Dict, where: Optional[Dict]) -> bool:
+    """Evaluate a Chroma-style metadata `where` filter against one metadata dict"""
+    if not where:
+        return True
+
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for op, operand in condition.items():
+                if op == "$eq" and value != operand:
+                    return False
+                if op == "$ne" and value == operand:
+                    return False
+                if op == "$in" and value not in operand:
+                    return False
+                if op == "$nin" and value in operand:
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+
+    return True
+
+
+def write_snapshot(
+    path: str,
+    ids: List[str],
+    texts: List[str],
+    metadatas: List[Dict],
+    embeddings: List[List[float]],
+    token_counts: List[int],
+    model: str,
+    extra: Optional[Dict] = None
+) -> Dict:
+    """
+    Write a versioned knowledge-base snapshot to a single file
+
+    Layout (all sections 64-byte aligned, little endian):
+        header | manifest JSON | embeddings float32[count x dim] | norms float32[count]
+        | text offsets uint64[count + 1] | text blob utf-8 | token counts uint32[count]
+        | ids + metadata + catalog JSON
+
+    The file is written next to `path` and renamed into place, so readers
+    never observe a partial snapshot.
+
+    Returns:
+        The manifest
+    """
+    count = len(ids)
+    dimension = len(embeddings[0]) if count else 0
+
+    matrix = array('f')
+    norms = array('f')
+    for embedding in embeddings:
+        if len(embedding) != dimension:
+            raise ValueError(f"Embedding dimension mismatch: expected {dimension}, got {len(embedding)}")
+        matrix.extend(embedding)
+        norms.append(sum(x * x for x in embedding))
+
+    encoded = [text.encode('utf-8') for text in texts]
+    offsets = array('Q', [0])
+    for blob in encoded:
+        offsets.append(offsets[-1] + len(blob))
+
+    catalog = MetadataCatalog()
+    catalog.add(metadatas, save=False)
+    records = json.dumps({"ids": ids, "metadatas": metadatas, "catalog": catalog.entries}).encode('utf-8')
+
+    sections = [
+        ("embeddings", matrix.tobytes()),
+        ("norms", norms.tobytes()),
+        ("text_offsets", offsets.tobytes()),
+        ("texts", b"".join(encoded)),
+        ("token_counts", array('I', token_counts).tobytes()),
+        ("records", records),
+    ]
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "model": model,
+        "dimension": dimension,
+        "count": count,
+        "created_at": time.time(),
+        "total_tokens": sum(token_counts),
+        **(extra or {}),
+    }
+
+    # Section offsets depend on the manifest size, which depends on the offsets;
+    # reserve generous room for the manifest so one pass is enough.
+    layout = {}
+    position = _align(HEADER.size + 4096)
+    for name, data in sections:
+        layout[name] = [position, len(data)]
+        position = _align(position + len(data))
+    manifest["sections"] = layout
+    manifest_bytes = json.dumps(manifest).encode('utf-8')
+    if HEADER.size + len(manifest_bytes) > layout["embeddings"][0]:
+        raise ValueError("Snapshot manifest too large")
+
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(manifest_bytes)))
+        f.write(manifest_bytes)
+        for name, data in sections:
+            f.seek(layout[name][0])
+            f.write(data)
+        f.truncate(position)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+    return manifest
+
+
+def export_vector_store(vector_store, embedding_manager, path: str) -> Dict:
+    """
+    Export a ChromaDB-backed VectorStore (or ShardedVectorStore) to a snapshot file
+
+    Args:
+        vector_store: VectorStore or ShardedVectorStore to export
+        embedding_manager: EmbeddingManager (model name and token counting)
+        path: Snapshot file to write
+
+    Returns:
+        The manifest
+    """
+    chunks = vector_store.get_all_chunks(include_embeddings=True)
+    return write_snapshot(
+        path,
+        ids=[chunk['id'] for chunk in chunks],
+        texts=[chunk['content'] for chunk in chunks],
+        metadatas=[chunk['metadata'] for chunk in chunks],
+        embeddings=[chunk['embedding'] for chunk in chunks],
+        token_counts=[embedding_manager.count_tokens(chunk['content']) for chunk in chunks],
+        model=embedding_manager.model,
+        extra={"collection_name": vector_store.collection_name}
+    )
+
+
+class SnapshotStore:
+    """
+    Read-only VectorStore backed by a memory-mapped snapshot file
+
+    Embeddings, norms, offsets and token counts are views over the mapping
+    (no copies); chunk texts are decoded on access. Implements the subset of
+    the VectorStore interface used by RAGRetriever.
+    """
+
+    def __init__(self, path: str):
+        """
+        Open a snapshot
+
+        Args:
+            path: Snapshot file written by write_snapshot
+        """
+        self.path = str(path)
+        self._file = open(self.path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+
+        magic, version, manifest_length = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a knowledge-base snapshot")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot format version {version}")
+
+        self.manifest = json.loads(bytes(self._view[HEADER.size:HEADER.size + manifest_length]))
+        self.count = self.manifest["count"]
+        self.dimension = self.manifest["dimension"]
+        self.model = self.manifest["model"]
+        self.collection_name = self.manifest.get("collection_name", Path(path).stem)
+        self.persist_directory = str(Path(path).parent)
+
+        self.embeddings = self._section("embeddings").cast('f')
+        self.norms = self._section("norms").cast('f')
+        self.text_offsets = self._section("text_offsets").cast('Q')
+        self.token_counts = self._section("token_counts").cast('I')
+        self._texts = self._section("texts")
+
+        if np is not None:
+            self.matrix = np.frombuffer(self.embeddings, dtype=np.float32).reshape(self.count, self.dimension)
+            self._norms = np.frombuffer(self.norms, dtype=np.float32)
+
+        # ids/metadata are parsed lazily; opening only touches the header
+        self._records = None
+        self._catalog = None
+        self._sections = None
+
+    def _section(self, name: str) -> memoryview:
+        offset, length = self.manifest["sections"][name]
+        return self._view[offset:offset + length]
+
+    @property
+    def records(self) -> Dict:
+        if self._records is None:
+            self._records = json.loads(bytes(self._section("records")))
+        return self._records
+
+    @property
+    def ids(self) -> List[str]:
+        return self.records["ids"]
+
+    @property
+    def metadatas(self) -> List[Dict]:
+        return self.records["metadatas"]
+
+    @property
+    def catalog(self) -> MetadataCatalog:
+        if self._catalog is None:
+            self._catalog = MetadataCatalog(entries=self.records["catalog"])
+        return self._catalog
+
+    @property
+    def sections(self) -> Dict[Tuple, List[int]]:
+        """
+        Rows of each (source, section_number, section), in snapshot order
+
+        Every row is also listed under section_number None, which matches
+        any occurrence of the section title.
+        """
+        if self._sections is None:
+            sections = {}
+            for i, metadata in enumerate(self.metadatas):
+                source, section = metadata.get('source'), metadata.get('section')
+                sections.setdefault((source, metadata.get('section_number'), section), []).append(i)
+                if metadata.get('section_number') is not None:
+                    sections.setdefault((source, None, section), []).append(i)
+            self._sections = sections
+        return self._sections
+
+    def text(self, index: int) -> str:
+        """Decode the text of one chunk"""
+        start, end = self.text_offsets[index], self.text_offsets[index + 1]
+        return str(self._texts[start:end], 'utf-8')
+
+    def embedding(self, index: int) -> memoryview:
+        """Zero-copy view of one embedding row"""
+        return self.embeddings[index * self.dimension:(index + 1) * self.dimension]
+
+    def _distances(self, query_embedding: List[float], candidates: Optional[List[int]]):
+        """Squared L2 distances (Chroma's default space) for candidate rows"""
+        if np is not None:
+            query = np.asarray(query_embedding, dtype=np.float32)
+            rows = self.matrix if candidates is None else self.matrix[candidates]
+            norms = self._norms if candidates is None else self._norms[candidates]
+            distances = norms + float(query @ query) - 2.0 * (rows @ query)
+            indices = range(self.count) if candidates is None else candidates
+            return list(zip(distances.tolist(), indices))
+
+        query_norm = sum(x * x for x in query_embedding)
+        indices = range(self.count) if candidates is None else candidates
+        results = []
+        for index in indices:
+            row = self.embedding(index)
+            dot = sum(x * y for x, y in zip(row, query_embedding))
+            results.append((self.norms[index] + query_norm - 2.0 * dot, index))
+        return results
+
+    def query(
+        self,
+        query_embedding: List[float],
+        n_results: int = 5,
+        where: Optional[Dict] = None,
+        where_document: Optional[Dict] = None,
+        include_embeddings: bool = False
+    ) -> Dict:
+        """
+        Exact nearest-neighbour search over the snapshot
+
+        Returns results in the same shape as VectorStore.query.
+        """
+        candidates = None
+        if where:
+            candidates = [i for i, metadata in enumerate(self.metadatas) if matches_where(metadata, where)]
+        if where_document and "$contains" in where_document:
+            needle = where_document["$contains"]
+            pool = range(self.count) if candidates is None else candidates
+            candidates = [i for i in pool if needle in self.text(i)]
+
+        top = heapq.nsmallest(n_results, self._distances(query_embedding, candidates))
+        results = {
+            'ids': [[self.ids[i] for _, i in top]],
+            'documents': [[self.text(i) for _, i in top]],
+            'metadatas': [[self.metadatas[i] for _, i in top]],
+            'distances': [[d for d, _ in top]],
+        }
+        if include_embeddings:
+            results['embeddings'] = [[self.embedding(i).tolist() for _, i in top]]
+        return results
+
+    def query_batch(
+        self,
+        query_embeddings: List[List[float]],
+        n_results: int = 5,
+        where: Optional[Dict] = None,
+        include_embeddings: bool = False
+    ) -> Dict:
+        """
+        Exact nearest-neighbour search for many queries
+
+        With numpy all distances come from one matrix product over the
+        snapshot instead of one pass per query.
+
+        Returns results in the same shape as VectorStore.query_batch.
+        """
+        fields = ['ids', 'documents', 'metadatas', 'distances'] + (['embeddings'] if include_embeddings else [])
+        results = {field: [] for field in fields}
+        if np is None or not len(query_embeddings):
+            for query_embedding in query_embeddings:
+                single = self.query(query_embedding, n_results, where, include_embeddings=include_embeddings)
+                for field in fields:
+                    results[field].append(single[field][0])
+            return results
+
+        candidates = None
+        if where:
+            candidates = [i for i, metadata in enumerate(self.metadatas) if matches_where(metadata, where)]
+        rows = self.matrix if candidates is None else self.matrix[candidates]
+        norms = self._norms if candidates is None else self._norms[candidates]
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        distances = norms[None, :] + (queries * queries).sum(axis=1)[:, None] - 2.0 * (queries @ rows.T)
+
+        k = min(n_results, distances.shape[1])
+        for row in distances:
+            if k == 0:
+                top = []
+            else:
+                nearest = np.argpartition(row, k - 1)[:k]
+                top = sorted((float(row[j]), j if candidates is None else candidates[j]) for j in nearest)
+            results['ids'].append([self.ids[i] for _, i in top])
+            results['documents'].append([self.text(i) for _, i in top])
+            results['metadatas'].append([self.metadatas[i] for _, i in top])
+            results['distances'].append([d for d, _ in top])
+            if include_embeddings:
+                results['embeddings'].append([self.embedding(i).tolist() for _, i in top])
+        return results
+
+    def get_chunks(self, source: str, section: str, chunk_ids: List[int],
+                   section_number: Optional[int] = None) -> List[Dict]:
+        """Fetch specific chunks of a source section by chunk_id"""
+        wanted = set(chunk_ids)
+        return [
+            {'content': self.text(i), 'metadata': self.metadatas[i], 'id': self.ids[i]}
+            for i in self.sections.get((source, section_number, section), [])
+            if self.metadatas[i].get('chunk_id') in wanted
+        ]
+
+    def get_all_chunks(self, include_embeddings: bool = False) -> List[Dict]:
+        """Every chunk's text and metadata (and embedding if requested)"""
+        chunks = []
+        for i, metadata in enumerate(self.metadatas):
+            chunk = {'content': self.text(i), 'metadata': metadata, 'id': self.ids[i]}
+            if include_embeddings:
+                chunk['embedding'] = self.embedding(i).tolist()
+            chunks.append(chunk)
+        return chunks
+
+    def get_collection_info(self) -> Dict:
+        return {
+            "name": self.collection_name,
+            "count": self.count,
+            "persist_directory": self.persist_directory,
+            "model": self.model,
+            "dimension": self.dimension,
+            "snapshot": self.path
+        }
+
+    def list_sources(self) -> List[str]:
+        return self.catalog.sources()
+
+    def close(self):
+        """Release the mapping (callers must drop views first)"""
+        if np is not None:
+            self.matrix = None
+            self._norms = None
+        for view in (self.embeddings, self.norms, self.text_offsets, self.token_counts, self._texts, self._view):
+            view.release()
+        self._mmap.close()
+        self._file.close()
@@ -0,0 +1,395 @@
+"""Per-tenant knowledge bases: lazy loading, LRU eviction under a memory cap, and spend quotas"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .logging_utils import get_logger
+
+logger = get_logger("rag.tenants")
+
+# Tenant whose knowledge base and quotas apply to the current request (None = single-tenant mode)
+current_tenant: ContextVar[Optional[str]] = ContextVar("current_tenant", default=None)
+
+_TENANT_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# USD per 1M (input, output) tokens
+LLM_COSTS = {
+    "claude-sonnet-4-20250514": (3.00, 15.00),
+    "claude-3-5-haiku-20241022": (0.80, 4.00),
+}
+
+# Rough resident size of one ChromaDB chunk: float32 embedding + text/metadata/HNSW links
+_CHROMA_BYTES_PER_CHUNK = 1536 * 4 + 2048
+
+EMBEDDING = "embedding"
+LLM = "llm"
+
+
+class QuotaExceededError(Exception):
+    """Raised when a tenant's spend for the current period would pass its budget"""
+
+
+class UnknownTenantError(ValueError):
+    """Raised for a well-formed tenant id that has no directory (nothing was ingested for it)"""
+
+
+def validate_tenant_id(tenant_id: str) -> str:
+    """Tenant ids become directory names, so only [A-Za-z0-9_-] is allowed"""
+    if not _TENANT_ID_RE.match(tenant_id or ""):
+        raise ValueError(f"Invalid tenant id: {tenant_id!r}")
+    return tenant_id
+
+
+@contextmanager
+def tenant_scope(tenant_id: str):
+    """Route get_retriever() and quota accounting to a tenant for the enclosed code"""
+    token = current_tenant.set(validate_tenant_id(tenant_id))
+    try:
+        yield
+    finally:
+        current_tenant.reset(token)
+
+
+def llm_cost(model: str, input_tokens: int, output_tokens: int) -> float:
+    input_rate, output_rate = LLM_COSTS.get(model, LLM_COSTS["claude-sonnet-4-20250514"])
+    return (input_tokens * input_rate + output_tokens * output_rate) / 1_000_000
+
+
+class SpendLedger:
+    """
+    Monthly spend per category, persisted in SQLite
+
+    Totals reset when the calendar month (UTC) changes. Every change is a
+    single transaction, so an ingest run and the server (or several server
+    processes) charge the same ledger without losing each other's spend,
+    and charge() checks a budget and adds to it atomically.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS spend ("
+            "period TEXT NOT NULL, kind TEXT NOT NULL, amount REAL NOT NULL, PRIMARY KEY (period, kind))"
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        """Per-thread connection (WAL readers don't block writers)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    @property
+    def period(self) -> str:
+        return time.strftime("%Y-%m", time.gmtime())
+
+    @staticmethod
+    def _spent(conn: sqlite3.Connection, period: str, kind: str) -> float:
+        row = conn.execute("SELECT amount FROM spend WHERE period = ? AND kind = ?", (period, kind)).fetchone()
+        return row[0] if row else 0.0
+
+    def total(self, kind: str) -> float:
+        return self._spent(self._connection(), self.period, kind)
+
+    def check(self, kind: str, amount: float, limit: Optional[float]):
+        """Raise QuotaExceededError if spending `amount` more would pass `limit` (nothing is charged)"""
+        if limit is None:
+            return
+        spent = self.total(kind)
+        if spent + amount > limit:
+            raise QuotaExceededError(
+                f"{kind} budget exhausted for {self.period}: ${spent:.4f} of ${limit:.2f} spent"
+            )
+
+    def charge(self, kind: str, amount: float, limit: Optional[float]):
+        """
+        Check `limit` and record `amount` in one transaction
+
+        Concurrent callers can't both pass the check and then overspend.
+
+        Raises:
+            QuotaExceededError: Spending `amount` more would pass `limit` (nothing is charged)
+        """
+        conn = self._connection()
+        period = self.period
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            spent = self._spent(conn, period, kind)
+            if limit is not None and spent + amount > limit:
+                raise QuotaExceededError(
+                    f"{kind} budget exhausted for {period}: ${spent:.4f} of ${limit:.2f} spent"
+                )
+            self._add(conn, period, kind, amount)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def record(self, kind: str, amount: float):
+        """Add `amount` to this month's spend"""
+        self._add(self._connection(), self.period, kind, amount)
+
+    @staticmethod
+    def _add(conn: sqlite3.Connection, period: str, kind: str, amount: float):
+        conn.execute(
+            "INSERT INTO spend (period, kind, amount) VALUES (?, ?, ?) "
+            "ON CONFLICT (period, kind) DO UPDATE SET amount = amount + excluded.amount",
+            (period, kind, amount)
+        )
+
+
+class TenantKnowledgeBase:
+    """
+    One tenant's retriever plus its budgets
+
+    Exposes the KnowledgeBaseRetriever methods the tools use (ready, search,
+    get_relevant_docs, list_sources). Each embedding request is charged to
+    the ledger before it is sent (EmbeddingManager's spend guard), in the
+    same transaction as the budget check (a request that then fails stays
+    charged); when the embedding budget is
+    exhausted, searches fall back to the local lexical index instead of failing.
+    """
+
+    def __init__(self, tenant_id: str, root: Path, embedding_budget: Optional[float],
+                 llm_budget: Optional[float]):
+        from .retriever import KnowledgeBaseRetriever
+
+        self.tenant_id = tenant_id
+        self.root = root
+        self.ledger = SpendLedger(str(root / "spend.db"))
+
+        config = self._load_config(root / "tenant.json")
+        self.embedding_budget = config.get("embedding_budget_usd", embedding_budget)
+        self.llm_budget = config.get("llm_budget_usd", llm_budget)
+
+        # The guard must not reference self: eviction closes the retriever once the tenant is unreferenced
+        ledger, budget = self.ledger, self.embedding_budget
+        self.retriever = KnowledgeBaseRetriever(
+            persist_dir=str(root / "chroma_db"),
+            snapshot_path=str(root / "kb.snapshot"),
+            spend_guard=lambda cost: ledger.charge(EMBEDDING, cost, budget)
+        )
+        self.last_used = time.monotonic()
+
+    @staticmethod
+    def _load_config(path: Path) -> Dict:
+        if path.exists():
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {}
+
+    @property
+    def ready(self) -> bool:
+        return getattr(self.retriever, "ready", False)
+
+    def search(self, query: str, **kwargs) -> str:
+        return self.retriever.search(query, **kwargs)
+
+    def get_relevant_docs(self, query: str, n_results: int = 3):
+        return self.retriever.get_relevant_docs(query, n_results=n_results)
+
+    def list_sources(self) -> List[str]:
+        return self.retriever.list_sources()
+
+    def check_llm(self):
+        """Raise QuotaExceededError if the tenant has no LLM budget left"""
+        if self.llm_budget is not None and self.ledger.total(LLM) >= self.llm_budget:
+            raise QuotaExceededError(
+                f"llm budget exhausted for {self.ledger.period}: ${self.llm_budget:.2f} spent"
+            )
+
+    def record_llm_usage(self, model: str, input_tokens: int, output_tokens: int):
+        self.ledger.record(LLM, llm_cost(model, input_tokens, output_tokens))
+
+    def memory_bytes(self) -> int:
+        """Estimated resident size of the tenant's index"""
+        store = getattr(self.retriever, "vector_store", None)
+        if store is None:
+            return 0
+        snapshot = getattr(store, "path", None)
+        if snapshot is not None:
+            return os.path.getsize(snapshot)
+        return store.get_collection_info()["count"] * _CHROMA_BYTES_PER_CHUNK
+
+    def usage(self) -> Dict:
+        return {
+            "tenant": self.tenant_id,
+            "period": self.ledger.period,
+            "embedding_usd": round(self.ledger.total(EMBEDDING), 6),
+            "embedding_budget_usd": self.embedding_budget,
+            "llm_usd": round(self.ledger.total(LLM), 6),
+            "llm_budget_usd": self.llm_budget,
+        }
+
+
+def _close_when_released(tenant: TenantKnowledgeBase):
+    """Close an evicted tenant's stores once the last request using it finishes"""
+    weakref.finalize(tenant, tenant.retriever.close)
+
+
+class TenantRegistry:
+    """
+    Loads tenant knowledge bases on first use and keeps the hot ones resident
+
+    Layout under `base_dir` (one directory per tenant):
+        {tenant}/chroma_db      ChromaDB index (scripts/ingest_documents.py --tenant)
+        {tenant}/kb.snapshot    optional snapshot, preferred when present
+        {tenant}/tenant.json    optional {"embedding_budget_usd": .., "llm_budget_usd": ..}
+        {tenant}/spend.db       spend ledger (SQLite), totals per month
+
+    When the estimated size of loaded indexes passes `memory_cap_bytes`,
+    least-recently-used tenants are evicted: dropped from the registry, and
+    their stores closed (freeing chromadb's cached index or the snapshot
+    mapping) once in-flight requests let go of them. Only tenants with a
+    directory are served; ingestion (scripts/ingest_documents.py --tenant)
+    creates it.
+    """
+
+    def __init__(
+        self,
+        base_dir: str,
+        memory_cap_bytes: int = 512 * 1024 * 1024,
+        embedding_budget: Optional[float] = None,
+        llm_budget: Optional[float] = None
+    ):
+        """
+        Initialize registry
+
+        Args:
+            base_dir: Directory containing one subdirectory per tenant
+            memory_cap_bytes: Evict cold tenants beyond this estimated total
+            embedding_budget: Default monthly embedding budget in USD (None = unlimited)
+            llm_budget: Default monthly LLM budget in USD (None = unlimited)
+        """
+        self.base_dir = Path(base_dir)
+        self.memory_cap_bytes = memory_cap_bytes
+        self.embedding_budget = embedding_budget
+        self.llm_budget = llm_budget
+        self._loaded: "OrderedDict[str, TenantKnowledgeBase]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.evictions = 0
+
+    def tenant_dir(self, tenant_id: str) -> Path:
+        return self.base_dir / validate_tenant_id(tenant_id)
+
+    def tenants(self) -> List[str]:
+        """Tenants with a directory under base_dir"""
+        if not self.base_dir.exists():
+            return []
+        return sorted(p.name for p in self.base_dir.iterdir() if p.is_dir() and _TENANT_ID_RE.match(p.name))
+
+    def get(self, tenant_id: str) -> TenantKnowledgeBase:
+        """
+        Tenant knowledge base, loading it (and evicting cold tenants) if needed
+
+        Raises:
+            ValueError: Malformed tenant id
+            UnknownTenantError: No such tenant (no directory is created for it)
+        """
+        root = self.tenant_dir(tenant_id)
+        with self._lock:
+            tenant = self._loaded.get(tenant_id)
+            if tenant is not None:
+                self._loaded.move_to_end(tenant_id)
+                tenant.last_used = time.monotonic()
+                return tenant
+
+        if not root.is_dir():
+            raise UnknownTenantError(f"Unknown tenant: {tenant_id!r}")
+
+        # Load outside the lock so one slow tenant doesn't block the others
+        tenant = TenantKnowledgeBase(tenant_id, root, self.embedding_budget, self.llm_budget)
+        size = tenant.memory_bytes()
+
+        with self._lock:
+            if tenant_id in self._loaded:
+                # Another thread loaded it meanwhile; keep theirs
+                return self._loaded[tenant_id]
+            self._loaded[tenant_id] = tenant
+            self._sizes[tenant_id] = size
+            self.loads += 1
+            self._evict_over_cap()
+
+        logger.info("Loaded tenant %s (%.1f MB)", tenant_id, size / 1e6,
+                    extra={"tenant": tenant_id, "bytes": size})
+        return tenant
+
+    def _evict_over_cap(self):
+        while len(self._loaded) > 1 and sum(self._sizes.values()) > self.memory_cap_bytes:
+            tenant_id, tenant = self._loaded.popitem(last=False)
+            size = self._sizes.pop(tenant_id)
+            self.evictions += 1
+            _close_when_released(tenant)
+            logger.info("Evicted tenant %s (%.1f MB)", tenant_id, size / 1e6,
+                        extra={"tenant": tenant_id, "bytes": size})
+
+    def evict(self, tenant_id: str):
+        """Drop a tenant (e.g. after re-ingesting its documents)"""
+        with self._lock:
+            tenant = self._loaded.pop(tenant_id, None)
+            self._sizes.pop(tenant_id, None)
+        if tenant is not None:
+            _close_when_released(tenant)
+
+    def embedding_manager_for(self, tenant_id: str, model: str = "text-embedding-3-small"):
+        """EmbeddingManager that charges a tenant's embedding budget (for ingestion)"""
+        from .embeddings import EmbeddingManager
+
+        root = self.tenant_dir(tenant_id)
+        config = TenantKnowledgeBase._load_config(root / "tenant.json")
+        budget = config.get("embedding_budget_usd", self.embedding_budget)
+        ledger = SpendLedger(str(root / "spend.db"))
+        return EmbeddingManager(
+            model=model,
+            spend_guard=lambda cost: ledger.charge(EMBEDDING, cost, budget),
+            budget_check=lambda cost: ledger.check(EMBEDDING, cost, budget)
+        )
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "loaded": list(self._loaded),
+                "resident_bytes": sum(self._sizes.values()),
+                "memory_cap_bytes": self.memory_cap_bytes,
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
+
+
+def _env_budget(name: str) -> Optional[float]:
+    value = os.getenv(name)
+    return float(value) if value else None
+
+
+_registry: Optional[TenantRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_tenant_registry() -> TenantRegistry:
+    """Global registry configured from TENANTS_DIR, TENANT_MEMORY_CAP_MB and TENANT_*_BUDGET_USD"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            base_dir = Path(__file__).parent.parent.parent / "data" / "tenants"
+            _registry = TenantRegistry(
+                base_dir=os.getenv("TENANTS_DIR", str(base_dir)),
+                memory_cap_bytes=int(float(os.getenv("TENANT_MEMORY_CAP_MB", "512")) * 1024 * 1024),
+                embedding_budget=_env_budget("TENANT_EMBEDDING_BUDGET_USD"),
+                llm_budget=_env_budget("TENANT_LLM_BUDGET_USD")
+            )
+        return _registry
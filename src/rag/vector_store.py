@@ -1,9 +1,28 @@
 """Vector store using ChromaDB"""
 import os
+import threading
 import chromadb
 from chromadb.config import Settings
 from typing import List, Dict, Optional
 from pathlib import Path
+from .reranker import MMRReranker
+from .context_assembler import ContextAssembler
+from .catalog import MetadataCatalog
+from .lexical import LexicalIndex
+from .hierarchy import ParentStore
+from .compressor import ExtractiveCompressor
+from .chunk_batch import ChunkBatch
+from .logging_utils import get_logger
+
+logger = get_logger("rag.vector_store")
+
+# Child chunks fetched per section returned by a hierarchical search
+CHILDREN_PER_PARENT = 3
+
+# Open stores per ChromaDB directory: chromadb caches one system (and its
+# in-memory indexes) per path, shared by every client of that path
+_open_stores: Dict[str, int] = {}
+_open_stores_lock = threading.Lock()
 
 
 class VectorStore:
@@ -24,6 +43,10 @@ class VectorStore:
         Path(persist_directory).mkdir(parents=True, exist_ok=True)
 
         # Initialize ChromaDB client
+        self._client_key = str(Path(persist_directory).resolve())
+        with _open_stores_lock:
+            _open_stores[self._client_key] = _open_stores.get(self._client_key, 0) + 1
+        self._closed = False
         self.client = chromadb.PersistentClient(
             path=persist_directory,
             settings=Settings(
@@ -40,6 +63,18 @@ class VectorStore:
             embedding_function=None  # We provide embeddings explicitly
         )
 
+        # Metadata catalog (sources, sections, chunk counts) maintained at ingest time
+        self.catalog = MetadataCatalog(Path(persist_directory) / f"{collection_name}_catalog.json")
+        if self.catalog.is_empty() and self.collection.count() > 0:
+            # Collection was built before the catalog existed; index it once
+            self.catalog.add(self.collection.get(include=["metadatas"])['metadatas'])
+
+        # Parent sections of a hierarchical index (empty for flat chunking)
+        self.parents = ParentStore(Path(persist_directory) / f"{collection_name}_parents.json")
+
+        # Bumped by every write so derived indexes know when to rebuild
+        self.write_version = 0
+
     def add_documents(
         self,
         documents: List[str],
@@ -62,15 +97,46 @@ class VectorStore:
             metadatas=metadatas,
             ids=ids
         )
+        self.catalog.add(metadatas)
+        self.write_version += 1
+
+        logger.info("Added %d documents to collection '%s'", len(documents), self.collection_name,
+                    extra={"documents": len(documents), "collection": self.collection_name})
+
+    def add_batch(self, batch: ChunkBatch, batch_size: int = 1000):
+        """
+        Add an embedded ChunkBatch to the vector store
+
+        ChromaDB takes lists, so ids, metadata dicts and embedding rows are
+        built one slice at a time instead of for the whole batch.
+
+        Args:
+            batch: Chunks with embeddings set
+            batch_size: Chunks per ChromaDB add call
+        """
+        for start in range(0, len(batch), batch_size):
+            stop = min(start + batch_size, len(batch))
+            metadatas = batch.metadatas(start, stop)
+            self.collection.add(
+                documents=batch.texts[start:stop],
+                embeddings=batch.embedding_rows(start, stop),
+                metadatas=metadatas,
+                ids=[batch.id(i) for i in range(start, stop)]
+            )
+            self.catalog.add(metadatas, save=False)
+        self.catalog.save()
+        self.write_version += 1
 
-        print(f"Added {len(documents)} documents to collection '{self.collection_name}'")
+        logger.info("Added %d documents to collection '%s'", len(batch), self.collection_name,
+                    extra={"documents": len(batch), "collection": self.collection_name})
 
     def query(
         self,
         query_embedding: List[float],
         n_results: int = 5,
         where: Optional[Dict] = None,
-        where_document: Optional[Dict] = None
+        where_document: Optional[Dict] = None,
+        include_embeddings: bool = False
     ) -> Dict:
         """
         Query the vector store
@@ -80,19 +146,56 @@ class VectorStore:
             n_results: Number of results to return
             where: Filter on metadata
             where_document: Filter on document content
+            include_embeddings: Also return stored embeddings (for re-ranking)
 
         Returns:
             Dict with 'ids', 'documents', 'metadatas', 'distances'
+            (and 'embeddings' if requested)
         """
+        include = ["documents", "metadatas", "distances"]
+        if include_embeddings:
+            include.append("embeddings")
+
         results = self.collection.query(
             query_embeddings=[query_embedding],
             n_results=n_results,
             where=where,
-            where_document=where_document
+            where_document=where_document,
+            include=include
         )
 
         return results
 
+    def query_batch(
+        self,
+        query_embeddings: List[List[float]],
+        n_results: int = 5,
+        where: Optional[Dict] = None,
+        include_embeddings: bool = False
+    ) -> Dict:
+        """
+        Query the vector store with many embeddings in one call
+
+        Args:
+            query_embeddings: One embedding per query
+            n_results: Number of results per query
+            where: Filter on metadata (shared by all queries)
+            include_embeddings: Also return stored embeddings (for re-ranking)
+
+        Returns:
+            Dict like query(), with one inner list per query embedding
+        """
+        include = ["documents", "metadatas", "distances"]
+        if include_embeddings:
+            include.append("embeddings")
+
+        return self.collection.query(
+            query_embeddings=list(query_embeddings),
+            n_results=n_results,
+            where=where,
+            include=include
+        )
+
     def get_collection_info(self) -> Dict:
         """Get information about the collection"""
         count = self.collection.count()
@@ -109,7 +212,10 @@ class VectorStore:
             name=self.collection_name,
             metadata={"description": "DataPulse documentation embeddings"}
         )
-        print(f"Reset collection '{self.collection_name}'")
+        self.catalog.clear()
+        self.parents.clear()
+        self.write_version += 1
+        logger.info("Reset collection '%s'", self.collection_name, extra={"collection": self.collection_name})
 
     def delete_by_source(self, source: str):
         """Delete all documents from a specific source file"""
@@ -120,20 +226,133 @@ class VectorStore:
 
         if results['ids']:
             self.collection.delete(ids=results['ids'])
-            print(f"Deleted {len(results['ids'])} documents from source '{source}'")
+            if any(entry.get("aliases") for entry in self.catalog.entries.values()):
+                # Other sources' canonical chunks may stand for this one (and vice versa)
+                self._rebuild_catalog()
+            else:
+                self.catalog.remove_source(source)
+            self.parents.remove_source(source)
+            self.write_version += 1
+            logger.info("Deleted %d documents from source '%s'", len(results['ids']), source,
+                        extra={"documents": len(results['ids']), "source": source})
+
+    def get_chunks(self, source: str, section: str, chunk_ids: List[int],
+                   section_number: Optional[int] = None) -> List[Dict]:
+        """
+        Fetch specific chunks of a source section by chunk_id
 
-    def list_sources(self) -> List[str]:
-        """List all unique source files in the collection"""
-        # Get all documents
-        results = self.collection.get()
+        Args:
+            source: Source file name
+            section: Section title
+            chunk_ids: chunk_id values to fetch
+            section_number: Position of the section in the file (titles can repeat)
+
+        Returns:
+            List of dicts with 'content', 'metadata', 'id'
+        """
+        clauses = [
+            {"source": source},
+            {"section": section},
+            {"chunk_id": {"$in": list(chunk_ids)}}
+        ]
+        if section_number is not None:
+            clauses.append({"section_number": section_number})
+        results = self.collection.get(where={"$and": clauses})
+
+        return [
+            {'content': document, 'metadata': metadata, 'id': doc_id}
+            for doc_id, document, metadata in zip(
+                results['ids'], results['documents'], results['metadatas']
+            )
+        ]
+
+    def get_all_chunks(self, include_embeddings: bool = False) -> List[Dict]:
+        """
+        Fetch every chunk's text and metadata
 
-        # Extract unique sources
-        sources = set()
-        for metadata in results['metadatas']:
-            if 'source' in metadata:
-                sources.add(metadata['source'])
+        Args:
+            include_embeddings: Also return each chunk's stored embedding
 
-        return sorted(list(sources))
+        Returns:
+            List of dicts with 'content', 'metadata', 'id' (and 'embedding')
+        """
+        include = ["documents", "metadatas"] + (["embeddings"] if include_embeddings else [])
+        results = self.collection.get(include=include)
+
+        chunks = []
+        for i, doc_id in enumerate(results['ids']):
+            chunk = {'content': results['documents'][i], 'metadata': results['metadatas'][i], 'id': doc_id}
+            if include_embeddings:
+                chunk['embedding'] = list(results['embeddings'][i])
+            chunks.append(chunk)
+        return chunks
+
+    def get_embeddings(self, ids: List[str]) -> Dict[str, List[float]]:
+        """Stored embeddings for whichever of `ids` exist (id -> embedding)"""
+        if not ids:
+            return {}
+        results = self.collection.get(ids=list(ids), include=["embeddings"])
+        return {doc_id: list(embedding) for doc_id, embedding in zip(results['ids'], results['embeddings'])}
+
+    def get_ids(self) -> List[str]:
+        """Ids of every chunk in the collection"""
+        return self.collection.get(include=[])['ids']
+
+    def delete_ids(self, ids: List[str]):
+        """Delete specific chunks and rebuild the catalog from what remains"""
+        if not ids:
+            return
+        self.collection.delete(ids=list(ids))
+        self._rebuild_catalog()
+        self.write_version += 1
+        logger.info("Deleted %d documents from collection '%s'", len(ids), self.collection_name,
+                    extra={"documents": len(ids), "collection": self.collection_name})
+
+    def _rebuild_catalog(self):
+        """Rebuild the catalog from the metadata of the remaining chunks"""
+        self.catalog.entries = {}
+        self.catalog.add(self.collection.get(include=["metadatas"])['metadatas'])
+
+    def drop(self):
+        """Delete the collection and its catalog file"""
+        self.client.delete_collection(self.collection_name)
+        if self.catalog.path is not None and self.catalog.path.exists():
+            self.catalog.path.unlink()
+        self.parents.delete_file()
+        logger.info("Dropped collection '%s'", self.collection_name, extra={"collection": self.collection_name})
+        self.close()
+
+    def close(self):
+        """
+        Release this store's client
+
+        The last store closed on a directory stops chromadb's cached system
+        for it, which frees its indexes; other stores on the same directory
+        (another collection or embedding space) keep it running.
+        """
+        with _open_stores_lock:
+            if self._closed:
+                return
+            self._closed = True
+            remaining = _open_stores.get(self._client_key, 1) - 1
+            if remaining > 0:
+                _open_stores[self._client_key] = remaining
+                return
+            _open_stores.pop(self._client_key, None)
+        # chromadb 0.4 spells the cache "_identifer_to_system"; later versions fixed it
+        cache = getattr(type(self.client), "_identifer_to_system", None)
+        if cache is None:
+            cache = getattr(type(self.client), "_identifier_to_system", None)
+        identifier = getattr(self.client, "_identifier", None)
+        system = cache.pop(identifier, None) if cache is not None and identifier is not None else None
+        if system is not None:
+            system.stop()
+        logger.debug("Closed ChromaDB client for %s", self.persist_directory,
+                     extra={"persist_directory": self.persist_directory})
+
+    def list_sources(self) -> List[str]:
+        """List all unique source files in the collection"""
+        return self.catalog.sources()
 
 
 class RAGRetriever:
@@ -149,12 +368,30 @@ class RAGRetriever:
         """
         self.vector_store = vector_store
         self.embedding_manager = embedding_manager
+        self._lexical_index = None
+        self._lexical_key = None
+
+    @property
+    def lexical_index(self) -> LexicalIndex:
+        """
+        BM25 index over all chunks, built on first use
+
+        Rebuilt when the store has been written since (write_version) or its
+        chunk count changed (e.g. another process ingested into it).
+        """
+        key = (getattr(self.vector_store, "write_version", 0), self.vector_store.get_collection_info()["count"])
+        if self._lexical_index is None or key != self._lexical_key:
+            self._lexical_index = LexicalIndex(self.vector_store.get_all_chunks())
+            self._lexical_key = key
+        return self._lexical_index
 
     def search(
         self,
         query: str,
         n_results: int = 5,
-        filters: Optional[Dict] = None
+        filters: Optional[Dict] = None,
+        query_embedding: Optional[List[float]] = None,
+        include_embeddings: bool = False
     ) -> List[Dict]:
         """
         Search for relevant documents
@@ -163,52 +400,280 @@ class RAGRetriever:
             query: Search query
             n_results: Number of results to return
             filters: Optional metadata filters
+            query_embedding: Precomputed query embedding (skips the embedding call)
+            include_embeddings: Attach stored embeddings to each result
 
         Returns:
             List of dicts with 'content', 'metadata', 'score'
         """
         # Create query embedding
-        query_embedding = self.embedding_manager.create_embedding(query)
+        if query_embedding is None:
+            query_embedding = self.embedding_manager.create_embedding(query)
+
+        # Scoped queries can't ask for more chunks than the filter matches
+        if filters:
+            n_results = min(n_results, self.vector_store.catalog.candidate_count(filters))
+            if n_results == 0:
+                return []
 
         # Search vector store
         results = self.vector_store.query(
             query_embedding=query_embedding,
             n_results=n_results,
-            where=filters
+            where=filters,
+            include_embeddings=include_embeddings
         )
 
-        # Format results
+        return self._format_results(results, 0, include_embeddings)
+
+    @staticmethod
+    def _format_results(results: Dict, q: int, include_embeddings: bool) -> List[Dict]:
+        """Hits of query `q` of a vector store result as dicts with 'content', 'metadata', 'score', 'id'"""
         formatted_results = []
-        for i in range(len(results['ids'][0])):
-            formatted_results.append({
-                'content': results['documents'][0][i],
-                'metadata': results['metadatas'][0][i],
-                'score': results['distances'][0][i],
-                'id': results['ids'][0][i]
-            })
+        for i in range(len(results['ids'][q])):
+            result = {
+                'content': results['documents'][q][i],
+                'metadata': results['metadatas'][q][i],
+                'score': results['distances'][q][i],
+                'id': results['ids'][q][i]
+            }
+            if include_embeddings:
+                result['embedding'] = results['embeddings'][q][i]
+            formatted_results.append(result)
 
         return formatted_results
 
+    def search_reranked(
+        self,
+        query: str,
+        n_results: int = 3,
+        fetch_k_multiplier: int = 4,
+        lambda_mult: float = 0.7,
+        lexical_weight: float = 0.0,
+        filters: Optional[Dict] = None,
+        query_embedding: Optional[List[float]] = None
+    ) -> List[Dict]:
+        """
+        Over-fetch candidates and re-rank them with MMR
+
+        MMR only keeps near-duplicate neighbours from crowding out other
+        sections; overlapping adjacent chunks that both survive are merged
+        afterwards by ContextAssembler, not here.
+
+        Args:
+            query: Search query
+            n_results: Number of results to return
+            fetch_k_multiplier: Candidates fetched per returned result
+            lambda_mult: MMR relevance/diversity trade-off
+            lexical_weight: Weight of the lexical re-score (0 disables it)
+            filters: Optional metadata filters
+            query_embedding: Precomputed query embedding (skips the embedding call)
+
+        Returns:
+            Diverse results in MMR order
+        """
+        if query_embedding is None:
+            query_embedding = self.embedding_manager.create_embedding(query)
+        candidates = self.search(
+            query,
+            n_results=n_results * max(fetch_k_multiplier, 1),
+            filters=filters,
+            query_embedding=query_embedding,
+            include_embeddings=True
+        )
+
+        reranker = MMRReranker(lambda_mult=lambda_mult, lexical_weight=lexical_weight)
+        return reranker.rerank(query, query_embedding, candidates, k=n_results)
+
     def search_with_context(
         self,
         query: str,
         n_results: int = 3,
-        max_tokens: int = 3000
+        max_tokens: int = 3000,
+        rerank: bool = True,
+        fetch_k_multiplier: int = 4,
+        lexical_weight: float = 0.0,
+        expand_neighbors: int = 0,
+        sources: Optional[List[str]] = None,
+        sections: Optional[List[str]] = None,
+        max_distance: Optional[float] = None,
+        compressor: Optional[ExtractiveCompressor] = None,
+        hit_ids: Optional[List[str]] = None
     ) -> str:
         """
         Search and format results as context for LLM
 
+        With a hierarchical index (see rag.hierarchy) the hits are child
+        chunks and each matched parent section is returned once instead.
+
         Args:
             query: Search query
-            n_results: Number of results to retrieve
+            n_results: Number of results (sections, for a hierarchical index) to retrieve
             max_tokens: Maximum tokens in context
+            rerank: Over-fetch and re-rank candidates with MMR
+            fetch_k_multiplier: Candidates fetched per result when re-ranking
+            lexical_weight: Weight of the lexical re-score (0 disables it)
+            expand_neighbors: Neighbouring chunks to stitch onto each hit
+            sources: Only search these source files (names resolved via the catalog)
+            sections: Only search these section titles
+            max_distance: Drop hits farther than this distance (None keeps all)
+            compressor: Keep only the excerpts' query-relevant sentences (see rag.compressor)
+            hit_ids: If given, the ids of the hits the context was built from are appended to it
 
         Returns:
             Formatted context string
         """
-        results = self.search(query, n_results=n_results)
+        filters = self.vector_store.catalog.build_filter(sources=sources, sections=sections)
+
+        # Hierarchical index: search small child chunks, return each matched section once
+        parents = getattr(self.vector_store, 'parents', None)
+        hierarchical = parents is not None and not parents.is_empty()
+        n_parents = n_results
+        if hierarchical:
+            n_results *= CHILDREN_PER_PARENT
+
+        try:
+            query_embedding = self.embedding_manager.create_embedding(query)
+        except Exception as e:
+            # Embedding upstream down or its circuit open: answer from the local keyword index
+            logger.warning("Embedding unavailable (%s); using lexical retrieval", e,
+                           extra={"degraded": True})
+            results = self.lexical_index.search(query, n_results=n_results, where=filters)
+            if hit_ids is not None:
+                hit_ids.extend(r['id'] for r in results)
+            if hierarchical:
+                excerpts = parents.expand(results, n_parents)
+            else:
+                excerpts = ContextAssembler(self.vector_store).assemble(results)
+            return self._format_excerpts(query, excerpts, max_tokens, compressor)
+
+        if rerank:
+            results = self.search_reranked(
+                query,
+                n_results=n_results,
+                fetch_k_multiplier=fetch_k_multiplier,
+                lexical_weight=lexical_weight,
+                filters=filters,
+                query_embedding=query_embedding
+            )
+        else:
+            results = self.search(query, n_results=n_results, filters=filters, query_embedding=query_embedding)
 
-        # Build context
+        return self._context_from_results(query, results, n_parents, max_tokens, expand_neighbors,
+                                          max_distance, compressor, hit_ids)
+
+    def search_with_context_batch(
+        self,
+        queries: List[str],
+        n_results: int = 3,
+        max_tokens: int = 3000,
+        rerank: bool = True,
+        fetch_k_multiplier: int = 4,
+        expand_neighbors: int = 0,
+        max_distance: Optional[float] = None,
+        compressor: Optional[ExtractiveCompressor] = None
+    ) -> List[str]:
+        """
+        search_with_context for many queries with one embedding request and one vector query
+
+        Re-ranking, assembly and formatting still run per query. If the
+        embedding request fails each query is searched on its own, which
+        falls back to lexical retrieval.
+
+        Args:
+            queries: Search queries
+            n_results: Number of results (sections, for a hierarchical index) per query
+            max_tokens: Maximum tokens in each context
+            rerank: Over-fetch and re-rank candidates with MMR
+            fetch_k_multiplier: Candidates fetched per result when re-ranking
+            expand_neighbors: Neighbouring chunks to stitch onto each hit
+            max_distance: Drop hits farther than this distance (None keeps all)
+            compressor: Keep only the excerpts' query-relevant sentences (see rag.compressor)
+
+        Returns:
+            One formatted context per query, in order
+        """
+        if not queries:
+            return []
+
+        parents = getattr(self.vector_store, 'parents', None)
+        hierarchical = parents is not None and not parents.is_empty()
+        n_chunks = n_results * CHILDREN_PER_PARENT if hierarchical else n_results
+
+        try:
+            embeddings = self.embedding_manager.create_embeddings_batch(queries, batch_size=min(len(queries), 2048))
+        except Exception as e:
+            logger.warning("Batch embedding failed (%s); searching queries one by one", e,
+                           extra={"degraded": True, "queries": len(queries)})
+            return [
+                self.search_with_context(query, n_results=n_results, max_tokens=max_tokens, rerank=rerank,
+                                         fetch_k_multiplier=fetch_k_multiplier, expand_neighbors=expand_neighbors,
+                                         max_distance=max_distance, compressor=compressor)
+                for query in queries
+            ]
+
+        fetch = n_chunks * max(fetch_k_multiplier, 1) if rerank else n_chunks
+        raw = self.vector_store.query_batch(embeddings, n_results=fetch, include_embeddings=rerank)
+
+        contexts = []
+        reranker = MMRReranker() if rerank else None
+        for q, query in enumerate(queries):
+            results = self._format_results(raw, q, rerank)
+            if reranker is not None:
+                results = reranker.rerank(query, embeddings[q], results, k=n_chunks)
+            contexts.append(self._context_from_results(query, results, n_results, max_tokens, expand_neighbors,
+                                                       max_distance, compressor))
+        return contexts
+
+    def _context_from_results(
+        self,
+        query: str,
+        results: List[Dict],
+        n_parents: int,
+        max_tokens: int,
+        expand_neighbors: int,
+        max_distance: Optional[float],
+        compressor: Optional[ExtractiveCompressor],
+        hit_ids: Optional[List[str]] = None
+    ) -> str:
+        """Threshold, assemble (or expand to parent sections) and format the hits of one query"""
+        if max_distance is not None:
+            results = [r for r in results if r['score'] <= max_distance]
+        if hit_ids is not None:
+            hit_ids.extend(r['id'] for r in results)
+
+        parents = getattr(self.vector_store, 'parents', None)
+        if parents is not None and not parents.is_empty():
+            return self._format_excerpts(query, parents.expand(results, n_parents), max_tokens, compressor)
+
+        # Stitch overlapping/adjacent chunks into contiguous excerpts
+        assembler = ContextAssembler(self.vector_store, expand_neighbors=expand_neighbors)
+        results = assembler.assemble(results)
+
+        return self._format_excerpts(query, results, max_tokens, compressor)
+
+    def _format_excerpts(
+        self,
+        query: str,
+        excerpts: List[Dict],
+        max_tokens: int,
+        compressor: Optional[ExtractiveCompressor]
+    ) -> str:
+        if compressor is not None:
+            excerpts = compressor.compress(query, excerpts, count_tokens=self.embedding_manager.count_tokens)
+        return self.format_context(excerpts, max_tokens)
+
+    def format_context(self, results: List[Dict], max_tokens: int = 3000) -> str:
+        """
+        Format assembled results as source-labelled context within a token budget
+
+        Args:
+            results: Results from ContextAssembler.assemble
+            max_tokens: Maximum tokens in context
+
+        Returns:
+            Formatted context string
+        """
         context_parts = []
         total_tokens = 0
 
@@ -221,6 +686,9 @@ class RAGRetriever:
             part = f"--- Source: {source}"
             if section:
                 part += f" | Section: {section}"
+            if result['metadata'].get('also_in'):
+                # Canonical chunk of text repeated elsewhere (see rag.dedup)
+                part += f" | Also in: {result['metadata']['also_in']}"
             part += f" ---\n{content}\n"
 
             # Check token count
@@ -233,6 +701,7 @@ class RAGRetriever:
 
         context = "\n".join(context_parts)
 
-        print(f"\nRetrieved {len(context_parts)} documents ({total_tokens} tokens)")
+        logger.debug("Retrieved %d documents (%d tokens)", len(context_parts), total_tokens,
+                     extra={"documents": len(context_parts), "tokens": total_tokens, "sample": True})
 
         return context
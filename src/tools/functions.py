@@ -1,4 +1,14 @@
 """Tool definitions and implementations for the agent"""
+from contextvars import ContextVar
+from typing import Optional
+
+from rag.catalog import UnknownSourceError
+from rag.logging_utils import get_logger
+
+logger = get_logger("tools.functions")
+
+# The tool call being executed (tenant, conversation and tool_use_id), set by the agent loop
+current_tool_call: ContextVar[Optional[str]] = ContextVar("current_tool_call", default=None)
 
 # Tool schemas (what Claude sees)
 TOOLS = [
@@ -11,6 +21,11 @@ TOOLS = [
                 "query": {
                     "type": "string",
                     "description": "The search query to find relevant documentation"
+                },
+                "sources": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Optional documentation files to restrict the search to (e.g. '06_bigquery_integration.md' or 'bigquery')"
                 }
             },
             "required": ["query"]
@@ -18,7 +33,7 @@ TOOLS = [
     },
     {
         "name": "check_plan_feature",
-        "description": "Check if a specific feature is available on a given pricing plan (free, pro, or enterprise).",
+        "description": "Check if one or more features are available on the given pricing plans (free, pro, or enterprise). Answers instantly from the compiled pricing matrix; pass several features and plans in one call instead of calling repeatedly.",
         "input_schema": {
             "type": "object",
             "properties": {
@@ -30,9 +45,18 @@ TOOLS = [
                     "type": "string",
                     "enum": ["free", "pro", "enterprise"],
                     "description": "The pricing plan to check"
+                },
+                "features": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Several features to check in one call"
+                },
+                "plans": {
+                    "type": "array",
+                    "items": {"type": "string", "enum": ["free", "pro", "enterprise"]},
+                    "description": "Several plans to check in one call (defaults to all plans if no plan is given)"
                 }
-            },
-            "required": ["feature", "plan"]
+            }
         }
     },
     {
@@ -57,7 +81,7 @@ TOOLS = [
 ]
 
 # Tool implementations (actual functions)
-def search_documentation(query: str) -> str:
+def search_documentation(query: str, sources: list = None) -> str:
     """
     Search the DataPulse documentation using RAG (Retrieval-Augmented Generation).
     Uses ChromaDB + OpenAI embeddings to find relevant documentation.
@@ -65,27 +89,41 @@ def search_documentation(query: str) -> str:
     try:
         # Import here to avoid circular dependencies
         from rag.retriever import get_retriever
+        from rag.tenants import current_tenant
 
-        # Get retriever instance
+        # Get retriever instance (the current tenant's, inside a tenant scope)
         retriever = get_retriever()
 
+        if not retriever.ready and current_tenant.get() is not None:
+            # Never answer a tenant from another doc set, not even the samples
+            return "No documentation has been ingested for this account yet."
+
         if not retriever.ready:
-            # Fallback to mock data if RAG not ready
+            # No knowledge base ingested yet (local development): keyword samples
+            logger.warning("Knowledge base not ready; answering from sample documentation")
             return _search_documentation_fallback(query)
 
-        # Search knowledge base
-        print(f"   🔍 Searching knowledge base for: '{query}'")
-        context = retriever.search(query, n_results=3)
+        # Search knowledge base (degrades to keyword retrieval if embeddings are unavailable)
+        logger.info("Searching knowledge base for: '%s'", query, extra={"sample": True})
+        context = retriever.search(query, n_results=3, sources=sources)
 
         # Return the context
         return context
 
-    except ImportError:
+    except ImportError as e:
         # If RAG dependencies not installed, use fallback
+        logger.warning("RAG dependencies missing (%s); answering from sample documentation", e)
         return _search_documentation_fallback(query)
+    except UnknownSourceError as e:
+        # Tell the model which names exist instead of searching everything
+        return f"{e}. Search again with one of the available sources, or without sources."
     except Exception as e:
-        print(f"   ⚠️  RAG search error: {e}")
-        return _search_documentation_fallback(query)
+        # Surface the failure instead of passing sample text off as documentation
+        logger.error("Documentation search failed: %s", e)
+        return (
+            "Documentation search is temporarily unavailable. Do not guess: tell the user you "
+            "couldn't look this up right now and offer to create a support ticket."
+        )
 
 
 def _search_documentation_fallback(query: str) -> str:
@@ -115,37 +153,57 @@ def _search_documentation_fallback(query: str) -> str:
 
     return "I found general documentation about DataPulse. Could you be more specific about what you're looking for? Try asking about: Snowflake, BigQuery, alerts, pricing, monitors, or API."
 
-def check_plan_feature(feature: str, plan: str) -> str:
+def check_plan_feature(feature: str = None, plan: str = None, features: list = None, plans: list = None) -> str:
     """
-    Check if a feature is available on a plan.
-    In real implementation, this would query a database.
+    Check if features are available on plans.
+    Backed by the plan matrix compiled from the pricing documentation.
     """
-    # Mock feature matrix
-    features = {
-        "custom_alerts": ["pro", "enterprise"],
-        "api_access": ["pro", "enterprise"],
-        "sso": ["enterprise"],
-        "basic_monitoring": ["free", "pro", "enterprise"],
-        "slack_integration": ["pro", "enterprise"],
-        "premium_support": ["enterprise"]
-    }
-    
-    if feature not in features:
-        return f"I don't recognize the feature '{feature}'. Available features: {', '.join(features.keys())}"
-    
-    if plan in features[feature]:
-        return f"✅ Yes, '{feature}' is available on the {plan.upper()} plan."
-    else:
-        available_plans = ", ".join([p.upper() for p in features[feature]])
-        return f"❌ No, '{feature}' is not available on the {plan.upper()} plan. It's available on: {available_plans}"
+    from tools.plan_matrix import get_plan_matrix, feature_key, PLANS
+
+    matrix = get_plan_matrix()
+    requested_features = ([feature] if feature else []) + list(features or [])
+    requested_plans = ([plan] if plan else []) + list(plans or [])
+    if not requested_features:
+        return "Please specify at least one feature to check."
+    if not requested_plans:
+        requested_plans = PLANS
+
+    lines = []
+    for name in requested_features:
+        key = matrix.resolve(name)
+        if key is None:
+            suggestions = matrix.suggestions(name)
+            hint = f" Did you mean: {', '.join(suggestions)}?" if suggestions else ""
+            lines.append(f"I don't recognize the feature '{name}'.{hint}")
+            continue
+
+        label = f"'{name}'" if feature_key(name) == key else f"'{name}' ({key})"
+        available_plans = ", ".join(p.upper() for p in matrix.plans_for(key))
+        for plan_name in requested_plans:
+            plan_name = plan_name.lower()
+            if plan_name not in PLANS:
+                lines.append(f"I don't recognize the plan '{plan_name}'. Plans: {', '.join(PLANS)}")
+                continue
+
+            detail = matrix.details.get(key, {}).get(plan_name)
+            suffix = f" ({detail})" if detail and detail != "Included" else ""
+            if matrix.is_available(key, plan_name):
+                lines.append(f"✅ Yes, {label} is available on the {plan_name.upper()} plan{suffix}.")
+            else:
+                lines.append(f"❌ No, {label} is not available on the {plan_name.upper()} plan. It's available on: {available_plans}")
+
+    return "\n".join(lines)
 
 def create_support_ticket(issue_description: str, priority: str) -> str:
     """
     Create a support ticket.
-    In real implementation, this would integrate with ticketing system.
+    Persisted in the local ticket store; executing the same tool call again returns the same ticket.
     """
-    ticket_id = f"TICKET-{hash(issue_description) % 10000:04d}"
-    return f"✅ Support ticket created: {ticket_id}\nPriority: {priority.upper()}\nOur team will respond within 24 hours."
+    from tools.ticket_store import get_ticket_store
+
+    ticket = get_ticket_store().create_ticket(issue_description, priority, scope=current_tool_call.get())
+    status = "created" if ticket["created"] else "already exists"
+    return f"✅ Support ticket {status}: {ticket['ticket_id']}\nPriority: {priority.upper()}\nOur team will respond within 24 hours."
 
 # Map tool names to functions
 TOOL_FUNCTIONS = {
@@ -0,0 +1,241 @@
+"""Compiled plan/feature matrix built from the pricing documentation"""
+import difflib
+import json
+import os
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Dict, Optional, Tuple
+
+
+# One bit per plan; a feature's value is the OR of the plans that include it
+PLANS = ["free", "pro", "enterprise"]
+PLAN_BITS = {plan: 1 << i for i, plan in enumerate(PLANS)}
+
+BASE_DIR = Path(__file__).parent.parent.parent
+PRICING_DOC = BASE_DIR / "docs" / "knowledge_base" / "03_pricing_plans.md"
+MATRIX_PATH = BASE_DIR / "data" / "plan_matrix.json"
+
+# Quantity variants name what is counted rather than the feature: 'Unlimited API requests'
+# is the Enterprise limit of API access, not a feature of its own
+QUANTITY_FEATURES = {
+    "api_requests": "api_access",
+}
+
+# Names the model (and the old mock matrix) use for features whose doc wording differs
+ALIASES = {
+    "custom_alerts": "custom_alert_rules",
+    "alerts": "custom_alert_rules",
+    "api": "api_access",
+    "slack": "slack_integration",
+    "pagerduty": "slack_pagerduty_integrations",
+    "pagerduty_integration": "slack_pagerduty_integrations",
+    "premium_support": "24_7_premium_support",
+    "24_7_support": "24_7_premium_support",
+    "single_sign_on": "sso",
+    "saml": "sso",
+    "lineage": "data_lineage",
+    "data_lineage_visualization": "data_lineage",
+    "custom_sql": "custom_sql_monitors",
+    "anomaly_detection_with_ml": "anomaly_detection",
+    "ml_anomaly_detection": "anomaly_detection",
+    "role_based_access_control": "rbac",
+    "on_premise_deployment_option": "on_premise",
+    "on_prem": "on_premise",
+    "webhooks": "webhook_notifications",
+    "email_alerts": "email_notifications",
+    "retention": "data_retention",
+    "users": "team_members",
+    "seats": "team_members",
+    **QUANTITY_FEATURES,
+}
+
+_SECTION_PLANS = {
+    "free": ["free", "pro", "enterprise"],
+    "pro": ["pro", "enterprise"],
+    "enterprise": ["enterprise"],
+}
+
+
+def feature_key(name: str) -> str:
+    """Normalize a feature name: 'SSO (SAML, OAuth)' -> 'sso', 'Slack & PagerDuty' -> 'slack_pagerduty'"""
+    name = re.sub(r'\(.*?\)', '', name.lower()).strip()
+    name = re.sub(r'^(up to \d+|unlimited|\d+ days? of|\d+ years?\+? )\s*', '', name)
+    return re.sub(r'[^a-z0-9]+', '_', name).strip('_')
+
+
+def feature_quantity(name: str) -> Optional[str]:
+    """The limit a feature line states: 'Unlimited API requests' -> 'Unlimited', 'API access (10,000 requests/month)' -> '10,000 requests/month'"""
+    if re.match(r'unlimited\b', name.strip(), re.IGNORECASE):
+        return "Unlimited"
+    quantity = re.search(r'\(([^)]*\d[^)]*)\)', name)
+    return quantity.group(1).strip() if quantity else None
+
+
+def parse_pricing_doc(content: str) -> Tuple[Dict[str, int], Dict[str, Dict[str, str]]]:
+    """
+    Parse the pricing markdown into a feature bitset matrix
+
+    Reads the per-plan feature lists (plans inherit the lists of cheaper
+    plans), the Free plan's limitations, and the feature comparison table,
+    which takes precedence. Limits stated in the lists ('10,000
+    requests/month') become the detail of a plan the table only ticks.
+
+    Returns:
+        Tuple of (feature -> plan bitset, feature -> {plan: detail from the table})
+    """
+    matrix: Dict[str, int] = {}
+    details: Dict[str, Dict[str, str]] = {}
+    quantities: Dict[str, Dict[str, str]] = {}
+    plan = None
+    in_table = False
+
+    for line in content.split('\n'):
+        stripped = line.strip()
+
+        heading = re.match(r'^##\s+(Free|Pro|Enterprise) Plan', stripped)
+        if heading:
+            plan = heading.group(1).lower()
+            continue
+        if stripped.startswith('## '):
+            plan = None
+            in_table = stripped == "## Feature Comparison Table"
+            continue
+
+        if in_table and stripped.startswith('|'):
+            cells = [cell.strip() for cell in stripped.strip('|').split('|')]
+            if len(cells) != len(PLANS) + 1 or cells[0] in ("Feature", "") or set(cells[0]) <= {'-'}:
+                continue
+            key = feature_key(cells[0])
+            bits = 0
+            for plan_name, cell in zip(PLANS, cells[1:]):
+                if cell not in ("❌", "None"):
+                    bits |= PLAN_BITS[plan_name]
+            matrix[key] = bits
+            details[key] = {
+                plan_name: cell.replace('✅', '').strip() or "Included"
+                for plan_name, cell in zip(PLANS, cells[1:])
+            }
+            continue
+
+        if plan is None or not stripped.startswith('- '):
+            continue
+
+        item = stripped[2:]
+        if item.startswith('❌'):
+            # Limitation of this plan: the next tier up is the cheapest that has it
+            key = feature_key(item.lstrip('❌').replace('No ', '', 1))
+            matrix.setdefault(key, 0)
+            continue
+
+        item = item.lstrip('✅')
+        key = feature_key(item)
+        key = QUANTITY_FEATURES.get(key, key)
+        quantity = feature_quantity(item)
+        if key and quantity:
+            quantities.setdefault(key, {})[plan] = quantity
+        if key and key not in details:
+            for plan_name in _SECTION_PLANS[plan]:
+                matrix[key] = matrix.get(key, 0) | PLAN_BITS[plan_name]
+
+    # Limitations listed on the Free plan are available from Pro up unless listed elsewhere
+    for key, bits in matrix.items():
+        if bits == 0:
+            matrix[key] = PLAN_BITS["pro"] | PLAN_BITS["enterprise"]
+
+    for key, plan_quantities in quantities.items():
+        for plan_name, quantity in plan_quantities.items():
+            if key in details and details[key].get(plan_name) == "Included":
+                details[key][plan_name] = quantity
+
+    return matrix, details
+
+
+def compile_plan_matrix(pricing_doc: str = str(PRICING_DOC), output_path: str = str(MATRIX_PATH)) -> Dict:
+    """
+    Compile the pricing doc into a JSON plan matrix (run at ingest time)
+
+    Args:
+        pricing_doc: Path to the pricing markdown file
+        output_path: Where to write the compiled matrix
+
+    Returns:
+        The compiled matrix dict
+    """
+    with open(pricing_doc, 'r', encoding='utf-8') as f:
+        matrix, details = parse_pricing_doc(f.read())
+
+    compiled = {"plans": PLANS, "features": matrix, "details": details, "aliases": ALIASES}
+
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(compiled, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, output_path)
+
+    return compiled
+
+
+class PlanMatrix:
+    """In-memory feature -> plan bitset index with alias and fuzzy lookup"""
+
+    def __init__(self, features: Dict[str, int], details: Dict[str, Dict[str, str]], aliases: Dict[str, str]):
+        self.features = features
+        self.details = details
+        self.aliases = {k: v for k, v in aliases.items() if v in features}
+        self._names = sorted(set(features) | set(self.aliases))
+        # Resolution is cached per instance; the matrix is immutable once built
+        self.resolve = lru_cache(maxsize=1024)(self._resolve)
+
+    @classmethod
+    def load(cls, path: str = str(MATRIX_PATH), pricing_doc: str = str(PRICING_DOC)) -> 'PlanMatrix':
+        """Load the compiled matrix, compiling from the pricing doc if it's missing"""
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                compiled = json.load(f)
+        else:
+            with open(pricing_doc, 'r', encoding='utf-8') as f:
+                matrix, details = parse_pricing_doc(f.read())
+            compiled = {"features": matrix, "details": details, "aliases": ALIASES}
+
+        return cls(compiled["features"], compiled.get("details", {}), compiled.get("aliases", ALIASES))
+
+    def _resolve(self, name: str) -> Optional[str]:
+        """Map a user/model supplied feature name to a matrix key"""
+        key = feature_key(name)
+        if key in self.features:
+            return key
+        if key in self.aliases:
+            return self.aliases[key]
+
+        # Feature named inside a longer key, e.g. 'lineage' -> 'data_lineage'
+        containing = [f for f in self.features if key and key in f.split('_')]
+        if len(containing) == 1:
+            return containing[0]
+
+        close = difflib.get_close_matches(key, self._names, n=1, cutoff=0.75)
+        if close:
+            return self.aliases.get(close[0], close[0])
+        return None
+
+    def suggestions(self, name: str, n: int = 3) -> List[str]:
+        return difflib.get_close_matches(feature_key(name), list(self.features), n=n, cutoff=0.4)
+
+    def plans_for(self, feature: str) -> List[str]:
+        """Plans a (resolved) feature is available on"""
+        bits = self.features[feature]
+        return [plan for plan in PLANS if bits & PLAN_BITS[plan]]
+
+    def is_available(self, feature: str, plan: str) -> bool:
+        return bool(self.features[feature] & PLAN_BITS[plan])
+
+
+_matrix: Optional[PlanMatrix] = None
+
+
+def get_plan_matrix() -> PlanMatrix:
+    """Get or load the global plan matrix"""
+    global _matrix
+    if _matrix is None:
+        _matrix = PlanMatrix.load()
+    return _matrix
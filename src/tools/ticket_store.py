@@ -0,0 +1,342 @@
+"""Durable support-ticket store (SQLite, WAL mode) with group commit and an outbox"""
+import asyncio
+import hashlib
+import json
+import queue
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+
+DEFAULT_DB_PATH = Path(__file__).parent.parent.parent / "data" / "tickets.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tickets (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    description TEXT NOT NULL,
+    priority TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'open',
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ticket_id INTEGER NOT NULL REFERENCES tickets(id),
+    payload TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    delivered_at REAL,
+    external_id TEXT
+);
+CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (delivered_at, next_attempt_at);
+"""
+
+
+def format_ticket_id(ticket_id: int) -> str:
+    return f"TICKET-{ticket_id:06d}"
+
+
+def make_idempotency_key(issue_description: str, priority: str, scope: str) -> str:
+    """
+    Derive an idempotency key for a ticket request
+
+    The same (normalized) description and priority within the same scope map
+    to the same key. The scope must identify the request, e.g. tenant,
+    conversation and tool_use_id, so that a re-executed tool call returns
+    its ticket while other users filing the same text get their own.
+    """
+    normalized = re.sub(r'\s+', ' ', issue_description.strip().lower())
+    return hashlib.sha256(f"{scope}|{priority.lower()}|{normalized}".encode()).hexdigest()
+
+
+class TicketStore:
+    """
+    SQLite ticket store with monotonic ids, idempotency keys and group commit
+
+    All writes go through one writer thread, which commits every request
+    queued while the previous transaction was running (plus any arriving
+    within `batch_window` seconds) in one transaction, so many concurrent
+    sessions share a single fsync. Each new ticket also
+    gets an outbox row in the same transaction for later forwarding.
+    Outbox updates go through the same writer.
+    """
+
+    def __init__(
+        self,
+        path: str = str(DEFAULT_DB_PATH),
+        batch_window: float = 0.0,
+        max_batch: int = 128,
+        synchronous: str = "FULL",
+        write_timeout: float = 30.0
+    ):
+        """
+        Initialize ticket store
+
+        Args:
+            path: SQLite database file
+            batch_window: Seconds to linger for more writes before committing
+            max_batch: Maximum ticket writes per transaction
+            synchronous: SQLite synchronous level (FULL fsyncs every commit)
+            write_timeout: Seconds to wait for the writer before failing a write
+        """
+        self.path = str(path)
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.synchronous = synchronous
+        self.write_timeout = write_timeout
+
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._queue: "queue.Queue" = queue.Queue()
+        self._closed = False
+
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        conn.commit()
+
+        # Stats
+        self.transactions = 0
+        self.writes = 0
+
+        self._writer = threading.Thread(target=self._write_loop, name="ticket-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        """Per-thread read connection (WAL readers don't block the writer)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    def _submit(self, op: str, args: tuple):
+        """Queue a write for the writer thread and wait for its transaction"""
+        if self._closed:
+            raise RuntimeError("TicketStore is closed")
+        if not self._writer.is_alive():
+            raise RuntimeError("Ticket writer thread is not running")
+
+        future: Future = Future()
+        self._queue.put((op, args, future))
+        # Raises TimeoutError instead of hanging if the writer stalls or dies
+        return future.result(timeout=self.write_timeout)
+
+    def create_ticket(
+        self,
+        issue_description: str,
+        priority: str,
+        idempotency_key: Optional[str] = None,
+        scope: Optional[str] = None
+    ) -> Dict:
+        """
+        Create a ticket, or return the existing one for a repeated key
+
+        Args:
+            issue_description: Description of the user's issue
+            priority: low, medium or high
+            idempotency_key: Key identifying this request
+            scope: Request scope to derive the key from (see make_idempotency_key);
+                with neither, every call creates a new ticket
+
+        Returns:
+            Dict with 'id', 'ticket_id', 'priority', 'created' (False on replay)
+        """
+        key = idempotency_key
+        if key is None:
+            key = make_idempotency_key(issue_description, priority, scope) if scope else uuid.uuid4().hex
+        return self._submit("ticket", (key, issue_description, priority.lower()))
+
+    def _write_loop(self):
+        conn = self._connect()
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            # Take everything already queued; optionally linger for more
+            batch = [item]
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=timeout)
+                    except queue.Empty:
+                        break
+                if item is None:
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+
+            self._commit_batch(conn, batch)
+
+        conn.close()
+
+    def _commit_batch(self, conn: sqlite3.Connection, batch: List[tuple]):
+        results = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            for op, args, _ in batch:
+                if op == "update":
+                    conn.execute(*args)
+                    results.append(None)
+                    continue
+                key, description, priority = args
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO tickets (idempotency_key, description, priority, created_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, description, priority, now)
+                )
+                created = cursor.rowcount == 1
+                if created:
+                    ticket_id = cursor.lastrowid
+                    payload = json.dumps({
+                        "ticket_id": format_ticket_id(ticket_id),
+                        "description": description,
+                        "priority": priority,
+                        "created_at": now
+                    })
+                    conn.execute("INSERT INTO outbox (ticket_id, payload) VALUES (?, ?)", (ticket_id, payload))
+                else:
+                    ticket_id = conn.execute(
+                        "SELECT id FROM tickets WHERE idempotency_key = ?", (key,)
+                    ).fetchone()[0]
+                results.append({
+                    "id": ticket_id,
+                    "ticket_id": format_ticket_id(ticket_id),
+                    "priority": priority,
+                    "created": created
+                })
+            conn.execute("COMMIT")
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for *_, future in batch:
+                future.set_exception(e)
+            return
+
+        self.transactions += 1
+        self.writes += len(batch)
+        for (*_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def get_ticket(self, ticket_id: int) -> Optional[Dict]:
+        """Fetch a ticket by numeric id"""
+        row = self._reader().execute("SELECT * FROM tickets WHERE id = ?", (ticket_id,)).fetchone()
+        return dict(row) if row else None
+
+    def count(self) -> int:
+        return self._reader().execute("SELECT COUNT(*) FROM tickets").fetchone()[0]
+
+    def pending_outbox(self, limit: int = 100) -> List[Dict]:
+        """Undelivered outbox rows that are due for an attempt"""
+        rows = self._reader().execute(
+            "SELECT id, ticket_id, payload, attempts FROM outbox "
+            "WHERE delivered_at IS NULL AND next_attempt_at <= ? ORDER BY id LIMIT ?",
+            (time.time(), limit)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def mark_delivered(self, outbox_id: int, external_id: Optional[str] = None):
+        self._submit("update", (
+            "UPDATE outbox SET delivered_at = ?, external_id = ? WHERE id = ?",
+            (time.time(), external_id, outbox_id)
+        ))
+
+    def mark_failed(self, outbox_id: int, attempts: int, backoff: float):
+        self._submit("update", (
+            "UPDATE outbox SET attempts = ?, next_attempt_at = ? WHERE id = ?",
+            (attempts, time.time() + backoff, outbox_id)
+        ))
+
+    def get_stats(self) -> Dict:
+        return {
+            "writes": self.writes,
+            "transactions": self.transactions,
+            "avg_batch_size": self.writes / self.transactions if self.transactions else 0.0
+        }
+
+    def close(self):
+        """Flush pending writes and stop the writer thread"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join()
+
+
+class OutboxForwarder:
+    """
+    Asynchronously forwards new tickets to an external ticketing system
+
+    `send` receives the ticket payload dict and returns the external id.
+    Failed deliveries are retried with exponential backoff.
+    """
+
+    def __init__(
+        self,
+        store: TicketStore,
+        send: Callable[[Dict], Awaitable[Optional[str]]],
+        poll_interval: float = 1.0,
+        max_backoff: float = 300.0
+    ):
+        self.store = store
+        self.send = send
+        self.poll_interval = poll_interval
+        self.max_backoff = max_backoff
+
+    async def drain_once(self) -> int:
+        """Attempt delivery of all due outbox rows; returns the number delivered"""
+        rows = await asyncio.to_thread(self.store.pending_outbox)
+        delivered = 0
+        for row in rows:
+            try:
+                external_id = await self.send(json.loads(row["payload"]))
+            except Exception:
+                attempts = row["attempts"] + 1
+                backoff = min(2 ** attempts, self.max_backoff)
+                await asyncio.to_thread(self.store.mark_failed, row["id"], attempts, backoff)
+                continue
+            await asyncio.to_thread(self.store.mark_delivered, row["id"], external_id)
+            delivered += 1
+        return delivered
+
+    async def run(self, stop: Optional[asyncio.Event] = None):
+        """Poll the outbox until `stop` is set"""
+        stop = stop or asyncio.Event()
+        while not stop.is_set():
+            await self.drain_once()
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+_store: Optional[TicketStore] = None
+_store_lock = threading.Lock()
+
+
+def get_ticket_store() -> TicketStore:
+    """Get or create the global ticket store"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = TicketStore()
+        return _store
@@ -11,6 +11,11 @@ TEST_CASES = [
         "expected_tool": "check_plan_feature",
         "expected_contains": ["api", "pro", "enterprise"]
     },
+    {
+        "query": "Does the Pro plan include API requests?",
+        "expected_tool": "check_plan_feature",
+        "expected_contains": ["api", "pro", "10,000"]
+    },
     {
         "query": "I need help with a critical data quality issue",
         "expected_tool": "create_support_ticket",